@@ -23,8 +23,14 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from app.database import Base
 from app.models.user import User
+from app.models.place import Place
 from app.models.bookmark import Bookmark
+from app.models.bookmark_cluster import BookmarkCluster
 from app.models.generated_route import GeneratedRoute
+from app.models.route_revision import RouteRevision
+from app.models.itinerary_stop import ItineraryStop
+from app.models.chat_session import ChatSession
+from app.models.chat_message import ChatMessage
 
 target_metadata = Base.metadata
 # target_metadata = mymodel.Base.metadata
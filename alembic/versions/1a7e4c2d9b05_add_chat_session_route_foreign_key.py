@@ -0,0 +1,32 @@
+"""add chat_sessions.generated_route_id foreign key
+
+Revision ID: 1a7e4c2d9b05
+Revises: a22795864a24
+Create Date: 2026-10-19 05:14:02.551930
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1a7e4c2d9b05'
+down_revision: Union[str, Sequence[str], None] = 'a22795864a24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # the name Postgres gives the constraint when create_all builds the table
+    with op.batch_alter_table('chat_sessions') as batch_op:
+        batch_op.create_foreign_key(
+            'chat_sessions_generated_route_id_fkey', 'generated_routes', ['generated_route_id'], ['id'],
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('chat_sessions') as batch_op:
+        batch_op.drop_constraint('chat_sessions_generated_route_id_fkey', type_='foreignkey')
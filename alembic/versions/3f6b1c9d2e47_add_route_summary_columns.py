@@ -0,0 +1,54 @@
+"""add title, preview and content_hash to generated_routes
+
+Revision ID: 3f6b1c9d2e47
+Revises: 5cd29d23abb9
+Create Date: 2026-10-19 09:12:41.307215
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.utils.route_summary import summarize_route_text, route_text_hash
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f6b1c9d2e47'
+down_revision: Union[str, Sequence[str], None] = '5cd29d23abb9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('generated_routes', sa.Column('title', sa.String(length=80), nullable=True))
+    op.add_column('generated_routes', sa.Column('preview', sa.String(length=200), nullable=True))
+    op.add_column('generated_routes', sa.Column('content_hash', sa.String(length=64), nullable=True))
+    op.create_index('ix_generated_routes_user_id_id', 'generated_routes', ['user_id', 'id'], unique=False)
+
+    # Backfill the derived columns for routes saved before this revision.
+    routes = sa.table(
+        'generated_routes',
+        sa.column('id', sa.Integer),
+        sa.column('route_text', sa.Text),
+        sa.column('title', sa.String),
+        sa.column('preview', sa.String),
+        sa.column('content_hash', sa.String),
+    )
+    bind = op.get_bind()
+    for route_id, route_text in bind.execute(sa.select(routes.c.id, routes.c.route_text)).fetchall():
+        title, preview = summarize_route_text(route_text)
+        bind.execute(
+            routes.update()
+            .where(routes.c.id == route_id)
+            .values(title=title, preview=preview, content_hash=route_text_hash(route_text))
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_generated_routes_user_id_id', table_name='generated_routes')
+    op.drop_column('generated_routes', 'content_hash')
+    op.drop_column('generated_routes', 'preview')
+    op.drop_column('generated_routes', 'title')
@@ -0,0 +1,146 @@
+"""add places; bookmarks reference them by place_id
+
+Revision ID: 5e8a2f4c9b17
+Revises: c61d0b7e42a5
+Create Date: 2026-10-20 09:41:06.318522
+
+"""
+import hashlib
+import unicodedata
+from typing import Optional, Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e8a2f4c9b17'
+down_revision: Union[str, Sequence[str], None] = 'c61d0b7e42a5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PLACE_COLUMNS = ('title', 'address', 'latitude', 'longitude', 'google_maps_url', 'category')
+
+places = sa.table(
+    'places',
+    sa.column('id', sa.Integer),
+    sa.column('fingerprint', sa.String),
+    *(sa.column(name) for name in PLACE_COLUMNS),
+)
+bookmarks = sa.table(
+    'bookmarks',
+    sa.column('id', sa.Integer),
+    sa.column('place_id', sa.Integer),
+    *(sa.column(name) for name in PLACE_COLUMNS),
+)
+
+
+def _normalize(value: str) -> str:
+    decomposed = unicodedata.normalize('NFKD', value.casefold())
+    return ''.join(ch if ch.isalnum() else ' ' for ch in decomposed if not unicodedata.combining(ch))
+
+
+def place_fingerprint(name: str, latitude: float, longitude: float, maps_url: Optional[str] = None) -> str:
+    """app.utils.places.place_fingerprint as of this revision, frozen so the backfill never changes."""
+    name = ' '.join(_normalize(name).split())
+    key = f'geo:{latitude:.3f},{longitude:.3f}:{name}'
+    if maps_url:
+        key = 'url:' + maps_url.strip().split('://', 1)[-1].removeprefix('www.') + ' ' + key
+    if len(key) > 255:
+        key = 'sha256:' + hashlib.sha256(key.encode('utf-8')).hexdigest()
+    return key
+
+
+def _pg_trgm(bind) -> bool:
+    return bind.dialect.name == 'postgresql' and bind.execute(
+        sa.text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+    ).first() is not None
+
+
+def _trigram_indexes(table: str) -> None:
+    for column in ('title', 'address'):
+        op.create_index(
+            f'ix_{table}_{column}_trgm', table, [column], unique=False,
+            postgresql_using='gin', postgresql_ops={column: 'gin_trgm_ops'},
+        )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'places',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('fingerprint', sa.String(length=255), nullable=True),
+        sa.Column('title', sa.String(), nullable=True),
+        sa.Column('address', sa.String(), nullable=True),
+        sa.Column('latitude', sa.Float(), nullable=True),
+        sa.Column('longitude', sa.Float(), nullable=True),
+        sa.Column('google_maps_url', sa.String(), nullable=True),
+        sa.Column('category', sa.String(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('fingerprint'),
+    )
+    op.create_index(op.f('ix_places_id'), 'places', ['id'], unique=False)
+    op.add_column('bookmarks', sa.Column('place_id', sa.Integer(), nullable=True))
+
+    # One place per fingerprint; the first bookmark of it gives the columns,
+    # the first non-empty category among its bookmarks the category.
+    bind = op.get_bind()
+    fields, place_of = {}, {}
+    rows = bind.execute(
+        sa.select(bookmarks.c.id, *(bookmarks.c[name] for name in PLACE_COLUMNS)).order_by(bookmarks.c.id)
+    ).fetchall()
+    for row in rows:
+        fingerprint = place_fingerprint(row.title or '', row.latitude or 0.0, row.longitude or 0.0,
+                                        row.google_maps_url)
+        place_of[row.id] = fingerprint
+        place = fields.setdefault(fingerprint, {name: getattr(row, name) for name in PLACE_COLUMNS})
+        if not place['category']:
+            place['category'] = row.category or ''
+    if fields:
+        bind.execute(places.insert(), [dict(place, fingerprint=fp) for fp, place in fields.items()])
+        ids = dict(bind.execute(sa.select(places.c.fingerprint, places.c.id)).fetchall())
+        bind.execute(
+            bookmarks.update().where(bookmarks.c.id == sa.bindparam('b_id'))
+            .values(place_id=sa.bindparam('b_place_id')),
+            [{'b_id': bookmark_id, 'b_place_id': ids[fp]} for bookmark_id, fp in place_of.items()],
+        )
+
+    if bind.dialect.name == 'postgresql':
+        op.drop_index('ix_bookmarks_address_trgm', table_name='bookmarks', if_exists=True)
+        op.drop_index('ix_bookmarks_title_trgm', table_name='bookmarks', if_exists=True)
+        if _pg_trgm(bind):
+            _trigram_indexes('places')
+    with op.batch_alter_table('bookmarks') as batch_op:
+        batch_op.alter_column('place_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.create_index(batch_op.f('ix_bookmarks_place_id'), ['place_id'], unique=False)
+        batch_op.create_foreign_key('fk_bookmarks_place_id_places', 'places', ['place_id'], ['id'])
+        for name in PLACE_COLUMNS:
+            batch_op.drop_column(name)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('bookmarks') as batch_op:
+        batch_op.add_column(sa.Column('title', sa.String(), nullable=True))
+        batch_op.add_column(sa.Column('address', sa.String(), nullable=True))
+        batch_op.add_column(sa.Column('latitude', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('longitude', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('category', sa.String(), nullable=True))
+        batch_op.add_column(sa.Column('google_maps_url', sa.String(), nullable=True))
+    bind = op.get_bind()
+    bind.execute(bookmarks.update().values({
+        bookmarks.c[name]: sa.select(places.c[name]).where(places.c.id == bookmarks.c.place_id).scalar_subquery()
+        for name in PLACE_COLUMNS
+    }))
+    with op.batch_alter_table('bookmarks') as batch_op:
+        batch_op.drop_constraint('fk_bookmarks_place_id_places', type_='foreignkey')
+        batch_op.drop_index(batch_op.f('ix_bookmarks_place_id'))
+        batch_op.drop_column('place_id')
+    if bind.dialect.name == 'postgresql':
+        op.drop_index('ix_places_address_trgm', table_name='places', if_exists=True)
+        op.drop_index('ix_places_title_trgm', table_name='places', if_exists=True)
+        if _pg_trgm(bind):
+            _trigram_indexes('bookmarks')
+    op.drop_index(op.f('ix_places_id'), table_name='places')
+    op.drop_table('places')
@@ -0,0 +1,34 @@
+"""add precomputed diff columns to chat_messages
+
+Revision ID: 8d2e5a7c41b0
+Revises: 3f6b1c9d2e47
+Create Date: 2026-10-19 11:40:03.518844
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d2e5a7c41b0'
+down_revision: Union[str, Sequence[str], None] = '3f6b1c9d2e47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('chat_messages', sa.Column('diff_base_hash', sa.String(length=64), nullable=True))
+    op.add_column('chat_messages', sa.Column('diff_patched_text', sa.Text(), nullable=True))
+    op.add_column('chat_messages', sa.Column('diff_strategy', sa.String(length=20), nullable=True))
+    op.add_column('chat_messages', sa.Column('diff_apply_error', sa.Text(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('chat_messages', 'diff_apply_error')
+    op.drop_column('chat_messages', 'diff_strategy')
+    op.drop_column('chat_messages', 'diff_patched_text')
+    op.drop_column('chat_messages', 'diff_base_hash')
@@ -1,7 +1,7 @@
 """create generated_route table
 
 Revision ID: a22795864a24
-Revises: 
+Revises: 0f3b9d1a6c28
 Create Date: 2025-10-29 05:18:35.978709
 
 """
@@ -13,7 +13,7 @@ import sqlalchemy as sa
 
 # revision identifiers, used by Alembic.
 revision: str = 'a22795864a24'
-down_revision: Union[str, Sequence[str], None] = None
+down_revision: Union[str, Sequence[str], None] = '0f3b9d1a6c28'
 branch_labels: Union[str, Sequence[str], None] = None
 depends_on: Union[str, Sequence[str], None] = None
 
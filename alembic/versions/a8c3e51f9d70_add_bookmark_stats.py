@@ -0,0 +1,50 @@
+"""add bookmark_stats and an index on bookmarks.user_id
+
+Revision ID: a8c3e51f9d70
+Revises: f4a9d27c6e10
+Create Date: 2026-10-19 21:14:06.318452
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a8c3e51f9d70'
+down_revision: Union[str, Sequence[str], None] = 'f4a9d27c6e10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'bookmark_stats',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.Column('south', sa.Float(), nullable=True),
+        sa.Column('west', sa.Float(), nullable=True),
+        sa.Column('north', sa.Float(), nullable=True),
+        sa.Column('east', sa.Float(), nullable=True),
+        sa.Column('fingerprint', sa.String(length=64), nullable=True),
+        sa.Column('uploaded_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id'),
+    )
+    # every bookmark query filters by user; also makes the EXISTS fallback cheap
+    op.create_index(op.f('ix_bookmarks_user_id'), 'bookmarks', ['user_id'], unique=False)
+    # counts and bounding boxes for users who already have bookmarks; the
+    # fingerprint and upload time are filled in by their next upload
+    op.execute(
+        'INSERT INTO bookmark_stats (user_id, count, south, west, north, east) '
+        'SELECT user_id, COUNT(*), MIN(latitude), MIN(longitude), MAX(latitude), MAX(longitude) '
+        'FROM bookmarks WHERE user_id IS NOT NULL GROUP BY user_id'
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('bookmark_stats')
+    op.drop_index(op.f('ix_bookmarks_user_id'), table_name='bookmarks')
@@ -0,0 +1,47 @@
+"""add route_revisions and generated_routes.head_revision
+
+Revision ID: b41e07d5c9a3
+Revises: 8d2e5a7c41b0
+Create Date: 2026-10-19 14:05:27.518362
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b41e07d5c9a3'
+down_revision: Union[str, Sequence[str], None] = '8d2e5a7c41b0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'route_revisions',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('route_id', sa.Integer(), nullable=False),
+        sa.Column('number', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=10), nullable=False),
+        sa.Column('payload', sa.Text(), nullable=False),
+        sa.Column('content_hash', sa.String(length=64), nullable=False),
+        sa.Column('source', sa.String(length=20), nullable=False),
+        sa.Column('source_id', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['route_id'], ['generated_routes.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('route_id', 'number', name='uq_route_revisions_route_id_number'),
+    )
+    op.create_index(op.f('ix_route_revisions_id'), 'route_revisions', ['id'], unique=False)
+    # Existing routes get their revision 1 lazily, the first time their history is touched.
+    op.add_column('generated_routes', sa.Column('head_revision', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('generated_routes', 'head_revision')
+    op.drop_index(op.f('ix_route_revisions_id'), table_name='route_revisions')
+    op.drop_table('route_revisions')
@@ -0,0 +1,36 @@
+"""add cache_entries for the shared cache
+
+Revision ID: c61d0b7e42a5
+Revises: a8c3e51f9d70
+Create Date: 2026-10-19 23:02:41.770915
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c61d0b7e42a5'
+down_revision: Union[str, Sequence[str], None] = 'a8c3e51f9d70'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'cache_entries',
+        sa.Column('key', sa.String(length=255), nullable=False),
+        sa.Column('value', sa.LargeBinary(), nullable=False),
+        sa.Column('expires_at', sa.Float(), nullable=True),
+        sa.PrimaryKeyConstraint('key'),
+    )
+    op.create_index(op.f('ix_cache_entries_expires_at'), 'cache_entries', ['expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_cache_entries_expires_at'), table_name='cache_entries')
+    op.drop_table('cache_entries')
@@ -0,0 +1,51 @@
+"""add itinerary_stops and chat_messages.stop_operations
+
+Revision ID: c7a95e3f1d28
+Revises: b41e07d5c9a3
+Create Date: 2026-10-19 16:40:12.904417
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7a95e3f1d28'
+down_revision: Union[str, Sequence[str], None] = 'b41e07d5c9a3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'itinerary_stops',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('route_id', sa.Integer(), nullable=False),
+        sa.Column('position', sa.Integer(), nullable=False),
+        sa.Column('start_time', sa.String(length=5), nullable=False),
+        sa.Column('end_time', sa.String(length=5), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('description', sa.Text(), nullable=False),
+        sa.Column('address', sa.String(), nullable=True),
+        sa.Column('bookmark_id', sa.Integer(), nullable=True),
+        sa.Column('latitude', sa.Float(), nullable=True),
+        sa.Column('longitude', sa.Float(), nullable=True),
+        sa.ForeignKeyConstraint(['route_id'], ['generated_routes.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['bookmark_id'], ['bookmarks.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(op.f('ix_itinerary_stops_id'), 'itinerary_stops', ['id'], unique=False)
+    op.create_index('ix_itinerary_stops_route_id_position', 'itinerary_stops', ['route_id', 'position'], unique=False)
+    op.add_column('chat_messages', sa.Column('stop_operations', sa.JSON(), nullable=True))
+    # Existing routes keep working as free text; their stops are derived the next time their text changes.
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('chat_messages', 'stop_operations')
+    op.drop_index('ix_itinerary_stops_route_id_position', table_name='itinerary_stops')
+    op.drop_index(op.f('ix_itinerary_stops_id'), table_name='itinerary_stops')
+    op.drop_table('itinerary_stops')
@@ -0,0 +1,29 @@
+"""add bookmarks.neighbors
+
+Revision ID: d93a1f6b7e52
+Revises: c7a95e3f1d28
+Create Date: 2026-10-19 18:05:31.220947
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd93a1f6b7e52'
+down_revision: Union[str, Sequence[str], None] = 'c7a95e3f1d28'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # filled in by the next bookmark upload of each user
+    op.add_column('bookmarks', sa.Column('neighbors', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('bookmarks', 'neighbors')
@@ -0,0 +1,48 @@
+"""add trigram indexes on bookmarks.title and address (Postgres)
+
+Revision ID: e6c40b8d2f19
+Revises: d93a1f6b7e52
+Create Date: 2026-10-19 19:12:47.508316
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e6c40b8d2f19'
+down_revision: Union[str, Sequence[str], None] = 'd93a1f6b7e52'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return  # other databases use the in-memory trigram index
+    try:
+        # needs a role allowed to create extensions; without it must-visit
+        # resolution falls back to the in-memory index
+        with bind.begin_nested():
+            bind.execute(sa.text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+    except sa.exc.DBAPIError:
+        return
+    op.create_index(
+        'ix_bookmarks_title_trgm', 'bookmarks', ['title'], unique=False,
+        postgresql_using='gin', postgresql_ops={'title': 'gin_trgm_ops'},
+    )
+    op.create_index(
+        'ix_bookmarks_address_trgm', 'bookmarks', ['address'], unique=False,
+        postgresql_using='gin', postgresql_ops={'address': 'gin_trgm_ops'},
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.drop_index('ix_bookmarks_address_trgm', table_name='bookmarks', if_exists=True)
+    op.drop_index('ix_bookmarks_title_trgm', table_name='bookmarks', if_exists=True)
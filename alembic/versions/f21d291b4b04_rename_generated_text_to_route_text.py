@@ -1,7 +1,7 @@
 """rename generated_text to route_text
 
 Revision ID: f21d291b4b04
-Revises: a22795864a24
+Revises: 1a7e4c2d9b05
 Create Date: 2025-10-29 06:14:47.684748
 
 """
@@ -13,7 +13,7 @@ import sqlalchemy as sa
 
 # revision identifiers, used by Alembic.
 revision: str = 'f21d291b4b04'
-down_revision: Union[str, Sequence[str], None] = 'a22795864a24'
+down_revision: Union[str, Sequence[str], None] = '1a7e4c2d9b05'
 branch_labels: Union[str, Sequence[str], None] = None
 depends_on: Union[str, Sequence[str], None] = None
 
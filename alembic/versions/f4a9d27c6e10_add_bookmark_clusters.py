@@ -0,0 +1,56 @@
+"""add bookmark_clusters and bookmarks.cluster_id
+
+Revision ID: f4a9d27c6e10
+Revises: e6c40b8d2f19
+Create Date: 2026-10-19 20:03:18.662071
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f4a9d27c6e10'
+down_revision: Union[str, Sequence[str], None] = 'e6c40b8d2f19'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'bookmark_clusters',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('size', sa.Integer(), nullable=False),
+        sa.Column('latitude', sa.Float(), nullable=False),
+        sa.Column('longitude', sa.Float(), nullable=False),
+        sa.Column('radius_m', sa.Integer(), nullable=False),
+        sa.Column('anchor_bookmark_id', sa.Integer(), nullable=True),
+        sa.Column('name', sa.String(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(op.f('ix_bookmark_clusters_id'), 'bookmark_clusters', ['id'], unique=False)
+    op.create_index(op.f('ix_bookmark_clusters_user_id'), 'bookmark_clusters', ['user_id'], unique=False)
+    # clusters are computed on each user's next bookmark upload
+    with op.batch_alter_table('bookmarks') as batch_op:
+        batch_op.add_column(sa.Column('cluster_id', sa.Integer(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_bookmarks_cluster_id'), ['cluster_id'], unique=False)
+        batch_op.create_foreign_key(
+            'fk_bookmarks_cluster_id_bookmark_clusters', 'bookmark_clusters', ['cluster_id'], ['id'],
+            ondelete='SET NULL',
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('bookmarks') as batch_op:
+        batch_op.drop_constraint('fk_bookmarks_cluster_id_bookmark_clusters', type_='foreignkey')
+        batch_op.drop_index(batch_op.f('ix_bookmarks_cluster_id'))
+        batch_op.drop_column('cluster_id')
+    op.drop_index(op.f('ix_bookmark_clusters_user_id'), table_name='bookmark_clusters')
+    op.drop_index(op.f('ix_bookmark_clusters_id'), table_name='bookmark_clusters')
+    op.drop_table('bookmark_clusters')
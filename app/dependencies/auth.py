@@ -1,10 +1,44 @@
+import logging
+import os
+from typing import Optional
 from fastapi import Depends
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, make_transient_to_detached
 from fastapi import HTTPException, status
+from app.utils.cache import get_cache
 from app.utils.token import verify_token, oauth2_scheme
 from app.database import get_db
 from app.models.user import User
 
+logger = logging.getLogger(__name__)
+
+# every authenticated request looks its user up; keep the row (minus the
+# password hash) in the shared cache and drop it whenever the user changes
+USER_CACHE_TTL_S = float(os.getenv("USER_CACHE_TTL_S", "60"))
+USER_CACHE_NAMESPACE = "users"
+_CACHED_COLUMNS = ("id", "email", "username", "avatar_url")
+
+
+def forget_user(user_id) -> None:
+    """Call after committing a change to the user's row."""
+    get_cache().delete(USER_CACHE_NAMESPACE, str(user_id))
+
+
+def _load_user(db: Session, user_id) -> Optional[User]:
+    cached = get_cache().get(USER_CACHE_NAMESPACE, str(user_id))
+    if cached is not None:
+        # attach without a SELECT; hashed_password stays unloaded and is
+        # fetched lazily if anything reads it
+        user = User(**cached)
+        make_transient_to_detached(user)
+        return db.merge(user, load=False)
+    user = db.query(User).filter(User.id == user_id).first()
+    if user is not None:
+        get_cache().set(
+            USER_CACHE_NAMESPACE, str(user_id),
+            {column: getattr(user, column) for column in _CACHED_COLUMNS}, USER_CACHE_TTL_S,
+        )
+    return user
+
 def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -17,21 +51,13 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
 
     user_id = payload.get("sub")
 
-    # ✅✅✅ 打印调试信息
-    print("🧪 Token payload:", payload)
-    print("🧪 user_id:", user_id)
-
     if user_id is None:
         raise credentials_exception
 
-    user = db.query(User).filter(User.id == user_id).first()
-
-    # ✅✅✅ 打印是否找到用户
-    print("🧪 Found user:", user)
+    user = _load_user(db, user_id)
 
     if user is None:
+        logger.info("Token subject %s does not match any user", user_id)
         raise credentials_exception
 
     return user
-
-print("✅ 正在加载 auth.py 中的 get_current_user 函数")
\ No newline at end of file
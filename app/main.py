@@ -1,64 +1,108 @@
+import os
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Depends
 from sqlalchemy.orm import Session
-from .database import SessionLocal, engine, Base
 from sqlalchemy import text
+from fastapi.middleware.cors import CORSMiddleware
+
+# app.database 导入时已加载 .env（只加载一次）
+from .database import Base, engine, get_db
 from app.routers import user
 from app.routers import bookmark
 from app.routers import generate
 from app.routers import generated_route
 from app.routers import chat
-from dotenv import load_dotenv
-import openai
-import os
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-
-# 加载环境变量
-load_dotenv()
-openai.api_key = os.getenv("OPENAI_API_KEY")
-
-# 初始化数据库
-Base.metadata.create_all(bind=engine)
-
-# 初始化 FastAPI
-app = FastAPI()
-
-# ⭐⭐⭐ 正确的 CORS 中间件 —— 必须放在 include_router **前面**
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],         # ←← 完全放开
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# 数据库 Session
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-# 测试
-@app.get("/")
-def read_root():
-    return {"message": "FastAPI is working!"}
-
-# ⭐⭐⭐ 只 include 一次（你之前 include 了两次！）
-app.include_router(user.router)
-app.include_router(bookmark.router)
-app.include_router(generate.router)
-app.include_router(generated_route.router)
-app.include_router(chat.router, prefix="/chat", tags=["chat"])
-
-# 测试数据库
-@app.get("/test-db")
-def test_db_connection(db: Session = Depends(get_db)):
-    try:
-        db.execute(text("SELECT 1"))
-        return {"message": "Database connected successfully"}
-    except Exception as e:
-        return {"error": str(e)}
-
-app.mount("/static", StaticFiles(directory="app/static"), name="static")
+from app.routers import admin
+from app.utils import avatars, cache, enrichment, outbound
+from app.utils.log import setup_logging
+from app.utils.compression import CompressionMiddleware
+from app.utils.deadline import DeadlineMiddleware
+from app.utils.idempotency import IdempotencyMiddleware
+from app.utils.metrics import MetricsMiddleware, metrics_endpoint
+from app.utils.profiling import ProfilingMiddleware, profiling_enabled
+from app.utils.responses import FastJSONResponse
+from app.utils.static_files import CachedStaticFiles
+
+
+def create_all_enabled() -> bool:
+    """
+    DB_CREATE_ALL=1 creates missing tables at startup (local dev only;
+    deployments run `alembic upgrade head`). A database built by create_all
+    must then be marked current with `alembic stamp head`, or the upgrade
+    fails adding columns that already exist.
+    """
+    return os.getenv("DB_CREATE_ALL", "").lower() in ("1", "true", "yes")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if create_all_enabled():
+        Base.metadata.create_all(bind=engine)
+    yield
+    # OpenAI / Yelp 客户端在第一次调用时创建，这里统一关闭
+    outbound.close_clients()
+    avatars.shutdown_pool()
+    enrichment.shutdown_pool()
+    cache.close_cache()
+    engine.dispose()
+
+
+def create_app() -> FastAPI:
+    setup_logging()
+    # orjson 序列化所有 JSON 响应
+    app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
+
+    # ⭐⭐⭐ 正确的 CORS 中间件 —— 必须放在 include_router **前面**
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],         # ←← 完全放开
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    # 仅在设置了 PROFILE_ADMIN_TOKEN 时启用按请求 profiling
+    if profiling_enabled():
+        app.add_middleware(ProfilingMiddleware)
+    # 带 Idempotency-Key 的重试直接返回第一次的响应，不再重复执行
+    app.add_middleware(IdempotencyMiddleware)
+    # 按 Accept-Encoding 压缩较大的响应（br / gzip）
+    app.add_middleware(CompressionMiddleware)
+    # 每个请求的截止时间（X-Request-Timeout 或默认值）；客户端断开时取消后续的上游调用和 DB 写入
+    app.add_middleware(DeadlineMiddleware)
+    # 最外层：记录每个路由的延迟和 DB 查询次数
+    app.add_middleware(MetricsMiddleware)
+
+    # Prometheus 指标
+    app.add_route("/metrics", metrics_endpoint, include_in_schema=False)
+
+    # 测试
+    @app.get("/")
+    def read_root():
+        return {"message": "FastAPI is working!"}
+
+    # ⭐⭐⭐ 只 include 一次（你之前 include 了两次！）
+    app.include_router(user.router)
+    app.include_router(bookmark.router)
+    app.include_router(generate.router)
+    app.include_router(generated_route.router)
+    app.include_router(chat.router, prefix="/chat", tags=["chat"])
+    app.include_router(admin.router, prefix="/admin", tags=["admin"])
+
+    # 测试数据库
+    @app.get("/test-db")
+    def test_db_connection(db: Session = Depends(get_db)):
+        try:
+            db.execute(text("SELECT 1"))
+            return {"message": "Database connected successfully"}
+        except Exception as e:
+            return {"error": str(e)}
+
+    # 头像按内容哈希命名，会被标记为 immutable；其余静态文件带 ETag 按需重新验证
+    app.mount(avatars.AVATAR_URL_PREFIX, CachedStaticFiles(directory=avatars.AVATAR_DIR, check_dir=False),
+              name="avatars")
+    app.mount("/static", CachedStaticFiles(directory="app/static"), name="static")
+    return app
+
+
+app = create_app()
@@ -1,6 +1,14 @@
 from .user import User
+from .place import Place
 from .bookmark import Bookmark
+from .bookmark_cluster import BookmarkCluster
+from .bookmark_stats import BookmarkStats
+from .cache_entry import CacheEntry
 from .generated_route import GeneratedRoute
+from .route_revision import RouteRevision
+from .itinerary_stop import ItineraryStop
+from .chat_session import ChatSession
+from .chat_message import ChatMessage
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
\ No newline at end of file
@@ -1,18 +1,38 @@
 # app/models/bookmark.py
-from sqlalchemy import Column, Integer, String, Float, ForeignKey
+from sqlalchemy import Column, Integer, ForeignKey, JSON
 from sqlalchemy.orm import relationship
 from app.database import Base
 
+def _place_attribute(name):
+    """
+    Read-only view of a column of the bookmark's place. The place is shared
+    with other users' bookmarks, so it is never edited through one of them;
+    give the bookmark another place instead.
+    """
+    def get(self):
+        return getattr(self.place, name) if self.place is not None else None
+
+    return property(get)
+
 class Bookmark(Base):
     __tablename__ = "bookmarks"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
-    title = Column(String)
-    address = Column(String)
-    latitude = Column(Float)
-    longitude = Column(Float)
-    category = Column(String)
-    google_maps_url = Column(String)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    # shared with every other user who bookmarked the same place
+    place_id = Column(Integer, ForeignKey("places.id"), nullable=False, index=True)
+    # k nearest other bookmarks of the same user: [[bookmark_id, distance_m, walk_min], ...]
+    neighbors = Column(JSON, nullable=True)
+    cluster_id = Column(Integer, ForeignKey("bookmark_clusters.id", ondelete="SET NULL"), nullable=True, index=True)
+
+    user = relationship("User", back_populates="bookmarks")
+    cluster = relationship("BookmarkCluster", back_populates="bookmarks")
+    place = relationship("Place", back_populates="bookmarks", lazy="joined", innerjoin=True)
 
-    user = relationship("User", back_populates="bookmarks")
\ No newline at end of file
+    # the place's columns, for code that works with bookmarks; queries use Place's
+    title = _place_attribute("title")
+    address = _place_attribute("address")
+    latitude = _place_attribute("latitude")
+    longitude = _place_attribute("longitude")
+    category = _place_attribute("category")
+    google_maps_url = _place_attribute("google_maps_url")
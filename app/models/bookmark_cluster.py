@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Integer, String, Float, ForeignKey
+from sqlalchemy.orm import relationship
+from app.database import Base
+
+class BookmarkCluster(Base):
+    """
+    A walkable neighbourhood of a user's bookmarks, recomputed on upload
+    (see app/utils/clustering.py). Bookmarks point to it via cluster_id.
+    """
+    __tablename__ = "bookmark_clusters"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    size = Column(Integer, nullable=False)
+    latitude = Column(Float, nullable=False)
+    longitude = Column(Float, nullable=False)
+    radius_m = Column(Integer, nullable=False)
+    # the bookmark closest to the middle, a natural center landmark (no FK: rows are rebuilt together)
+    anchor_bookmark_id = Column(Integer, nullable=True)
+    name = Column(String, nullable=True)
+
+    bookmarks = relationship("Bookmark", back_populates="cluster", passive_deletes=True)
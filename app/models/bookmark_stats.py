@@ -0,0 +1,23 @@
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Float, ForeignKey, Integer, String
+from app.database import Base
+
+class BookmarkStats(Base):
+    """
+    Per-user summary of the bookmarks, rewritten on every upload
+    (see app/utils/bookmark_stats.py) so existence checks and summaries
+    never have to scan the bookmarks table.
+    """
+    __tablename__ = "bookmark_stats"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+    # bounding box of the bookmarks; NULL when there are none
+    south = Column(Float, nullable=True)
+    west = Column(Float, nullable=True)
+    north = Column(Float, nullable=True)
+    east = Column(Float, nullable=True)
+    # sha256 over the bookmarks' keys and positions, independent of order; NULL until the next upload for backfilled rows
+    fingerprint = Column(String(64), nullable=True)
+    uploaded_at = Column(DateTime, nullable=True, default=datetime.utcnow)
@@ -0,0 +1,14 @@
+from sqlalchemy import Column, Float, LargeBinary, String
+from app.database import Base
+
+class CacheEntry(Base):
+    """
+    One entry of the shared cache when CACHE_URL points at a database
+    (see app/utils/cache.py). Keys carry their namespace as a prefix.
+    """
+    __tablename__ = "cache_entries"
+
+    key = Column(String(255), primary_key=True)
+    value = Column(LargeBinary, nullable=False)
+    # unix time; NULL never expires
+    expires_at = Column(Float, nullable=True, index=True)
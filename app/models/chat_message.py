@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Text, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, JSON
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.database import Base
@@ -12,6 +12,13 @@ class ChatMessage(Base):
     content = Column(Text, nullable=False)
     diff_content = Column(Text, nullable=True)
     chat_message = Column(Text, nullable=True)
+    # diff pre-applied when the assistant reply was stored, against the route text with this hash
+    diff_base_hash = Column(String(64), nullable=True)
+    diff_patched_text = Column(Text, nullable=True)
+    diff_strategy = Column(String(20), nullable=True)
+    diff_apply_error = Column(Text, nullable=True)
+    # structured edits the diff was generated from, when the plan is made of stops
+    stop_operations = Column(JSON, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
     chat_session = relationship("ChatSession", back_populates="messages")
@@ -1,15 +1,39 @@
-from sqlalchemy import Column, Integer, Text, ForeignKey, DateTime
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, Index
+from sqlalchemy.orm import relationship, validates
 from datetime import datetime
 from app.database import Base
+from app.utils.route_summary import summarize_route_text, route_text_hash
 
 class GeneratedRoute(Base):
     __tablename__ = "generated_routes"
+    __table_args__ = (
+        # keyset pagination of a user's routes (newest first)
+        Index("ix_generated_routes_user_id_id", "user_id", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     route_text = Column(Text, nullable=False)
+    # derived from route_text whenever it is assigned, so listings never load the full text
+    title = Column(String(80), nullable=True)
+    preview = Column(String(200), nullable=True)
+    content_hash = Column(String(64), nullable=True)
+    # number of the revision route_text corresponds to; NULL until the first revision is recorded
+    head_revision = Column(Integer, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
     user = relationship("User", back_populates="generated_routes")
-    chat_sessions = relationship("ChatSession", back_populates="generated_route", cascade="all, delete")
\ No newline at end of file
+    chat_sessions = relationship("ChatSession", back_populates="generated_route", cascade="all, delete")
+    revisions = relationship("RouteRevision", back_populates="route", cascade="all, delete")
+    stops = relationship(
+        "ItineraryStop",
+        back_populates="route",
+        order_by="ItineraryStop.position",
+        cascade="all, delete-orphan",
+    )
+
+    @validates("route_text")
+    def _update_derived_fields(self, key, route_text):
+        self.title, self.preview = summarize_route_text(route_text)
+        self.content_hash = route_text_hash(route_text)
+        return route_text
@@ -0,0 +1,28 @@
+from sqlalchemy import Column, Integer, String, Text, Float, ForeignKey, Index
+from sqlalchemy.orm import relationship
+from app.database import Base
+
+class ItineraryStop(Base):
+    """
+    A stop of a saved route, in order. Kept in sync with GeneratedRoute.route_text,
+    which is the rendering of these rows (see app/utils/itinerary.py).
+    """
+    __tablename__ = "itinerary_stops"
+    __table_args__ = (
+        Index("ix_itinerary_stops_route_id_position", "route_id", "position"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    route_id = Column(Integer, ForeignKey("generated_routes.id", ondelete="CASCADE"), nullable=False)
+    position = Column(Integer, nullable=False)
+    start_time = Column(String(5), nullable=False)
+    end_time = Column(String(5), nullable=False)
+    name = Column(String, nullable=False)
+    description = Column(Text, nullable=False, default="")
+    address = Column(String, nullable=True)
+    # an upload deletes the bookmarks that are no longer in the file, so the reference may go away
+    bookmark_id = Column(Integer, ForeignKey("bookmarks.id", ondelete="SET NULL"), nullable=True)
+    latitude = Column(Float, nullable=True)
+    longitude = Column(Float, nullable=True)
+
+    route = relationship("GeneratedRoute", back_populates="stops")
@@ -0,0 +1,25 @@
+# app/models/place.py
+from sqlalchemy import Column, Integer, String, Float
+from sqlalchemy.orm import relationship
+from app.database import Base
+
+class Place(Base):
+    """
+    One real-world place, stored once however many users bookmarked it
+    (see app/utils/places.py). Bookmarks reference it by place_id.
+    """
+    __tablename__ = "places"
+
+    id = Column(Integer, primary_key=True, index=True)
+    # [Google Maps link] normalized name at rounded coordinates; NULL for places
+    # not created by an upload, which are never shared
+    fingerprint = Column(String(255), unique=True, nullable=True)
+    title = Column(String)
+    address = Column(String)
+    latitude = Column(Float)
+    longitude = Column(Float)
+    google_maps_url = Column(String)
+    # "" until app.utils.enrichment classifies the place
+    category = Column(String, nullable=False, default="")
+
+    bookmarks = relationship("Bookmark", back_populates="place")
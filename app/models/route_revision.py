@@ -0,0 +1,28 @@
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, UniqueConstraint
+from sqlalchemy.orm import relationship
+from datetime import datetime
+from app.database import Base
+
+class RouteRevision(Base):
+    """
+    One version of a saved route. Snapshots store the full text; deltas store
+    the change against the previous revision (see app/utils/route_delta.py).
+    The latest version is always GeneratedRoute.route_text itself.
+    """
+    __tablename__ = "route_revisions"
+    __table_args__ = (
+        UniqueConstraint("route_id", "number", name="uq_route_revisions_route_id_number"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    route_id = Column(Integer, ForeignKey("generated_routes.id", ondelete="CASCADE"), nullable=False)
+    number = Column(Integer, nullable=False)  # 1, 2, 3 ... per route
+    kind = Column(String(10), nullable=False)  # "snapshot" | "delta"
+    payload = Column(Text, nullable=False)
+    content_hash = Column(String(64), nullable=False)
+    # what produced it: "save", "chat" (source_id = chat message id) or "revert" (source_id = revision number)
+    source = Column(String(20), nullable=False)
+    source_id = Column(Integer, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    route = relationship("GeneratedRoute", back_populates="revisions")
@@ -14,6 +14,8 @@ class User(Base):
     hashed_password = Column(String, nullable=False)
 
     bookmarks = relationship("Bookmark", back_populates="user", cascade="all, delete")
+    bookmark_clusters = relationship("BookmarkCluster", cascade="all, delete")
+    bookmark_stats = relationship("BookmarkStats", uselist=False, cascade="all, delete")
     generated_routes = relationship("GeneratedRoute", back_populates="user")
     chat_sessions = relationship("ChatSession", back_populates="user", cascade="all, delete")
 
@@ -0,0 +1,36 @@
+# app/routers/admin.py
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import FileResponse, PlainTextResponse
+from typing import Optional
+from app.utils.profiling import is_admin_token, profiling_enabled, store
+
+router = APIRouter()
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not profiling_enabled():
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+    if not is_admin_token(x_admin_token):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+# Profiles are taken one request at a time per process; a flagged request overlapping
+# another runs unprofiled. An async endpoint's profile also holds the work of any other
+# requests the event loop ran meanwhile, so sample those on an idle worker.
+
+#list stored profiles, newest first
+@router.get("/profiles", dependencies=[Depends(require_admin)])
+def list_profiles():
+    return {"profiles": store.list()}
+
+#download a profile: raw pstats (open with snakeviz / pstats) or a text summary
+@router.get("/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+def get_profile(profile_id: str, format: str = "text"):
+    if format == "pstats":
+        path = store.stats_path(profile_id)
+        if path is None:
+            raise HTTPException(status_code=404, detail="Profile not found")
+        return FileResponse(path, media_type="application/octet-stream", filename=f"{profile_id}.prof")
+
+    report = store.render_text(profile_id)
+    if report is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(report)
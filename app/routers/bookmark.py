@@ -1,38 +1,62 @@
 # app/routers/bookmark.py
 import json
+import logging
 from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
+from sqlalchemy import update
 from sqlalchemy.orm import Session
 from app.database import get_db
 from app.dependencies.auth import get_current_user
 from app.models.bookmark import Bookmark
+from app.models.bookmark_cluster import BookmarkCluster
+from app.models.place import Place
 from app.models.user import User
 from app import schemas
 from typing import List
+from app.utils.log import log_payload
+from app.utils.profiling import ProfiledRoute
+from app.utils.responses import rows_response, schema_columns
+from app.utils.neighbors import update_neighbors
+from app.utils.clustering import refresh_clusters
+from app.utils.bookmark_stats import get_stats, has_bookmarks, refresh_stats
+from app.utils import bookmark_stats, enrichment
+from app.utils.places import get_or_create_places, place_fingerprint
 
-router = APIRouter()
+router = APIRouter(route_class=ProfiledRoute)
+logger = logging.getLogger(__name__)
 
+def _update_neighbor_graph(db, bookmarks, changed_ids, removed_ids):
+    """Rewrite the neighbour lists the upload invalidated (all of them on the first upload), in one executemany."""
+    points = {b.id: (b.latitude, b.longitude) for b in bookmarks}
+    graph = {b.id: b.neighbors for b in bookmarks}
+    updates = update_neighbors(graph, points, changed_ids, removed_ids)
+    if updates:
+        db.execute(update(Bookmark), [{"id": i, "neighbors": neighbors} for i, neighbors in updates.items()])
+
+# 普通 def：解析、邻居图、聚类和统计都是 CPU / 同步 DB 工作，放在线程池里跑，不阻塞事件循环
 @router.post("/upload-bookmarks")
-async def upload_bookmarks(
+def upload_bookmarks(
     file: UploadFile = File(...),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    content = await file.read()
+    content = file.file.read()
     try:
         raw_data = json.loads(content)
         features = raw_data.get("features", [])
-        print("🛠️ 上传的 features 内容如下：")
-        for f in features[:3]:  # 只打印前几个，防止太长
-            print(json.dumps(f, indent=2)) 
+        log_payload(logger, "Uploaded bookmark features", sample=features[:3], total=len(features))
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid JSON format")
 
-    # 删除用户旧数据
-    db.query(Bookmark).filter(Bookmark.user_id == current_user.id).delete()
-
-    # 插入新数据
+    # 与已有数据同步：未变化的收藏保留原 id，只增删有变化的部分
+    existing = {}
+    duplicates = []  # left over from uploads before bookmarks were synced
+    for b in db.query(Bookmark).filter(Bookmark.user_id == current_user.id):
+        if b.place_id in existing:
+            duplicates.append(b)
+        else:
+            existing[b.place_id] = b
+    fields = {}  # place fingerprint -> place columns, in upload order
     skipped = 0
-    added = 0
 
     for item in features:
         try:
@@ -47,28 +71,58 @@ async def upload_bookmarks(
             maps_url = properties.get("google_maps_url", "")
 
             if not title or not address or latitude is None or longitude is None or latitude == 0 or longitude == 0:
-                print("⚠️ Skipping invalid bookmark:", title, address, latitude, longitude)
+                logger.debug("Skipping invalid bookmark: %s | %s | (%s, %s)", title, address, latitude, longitude)
                 skipped += 1
                 continue
 
-            print(f"✅ Parsed bookmark: {title} | {address} | ({latitude}, {longitude})")
-
-            bookmark = Bookmark(
-                user_id=current_user.id,
-                title=title,
-                address=address,
-                latitude=latitude,
-                longitude=longitude,
-                category="",
-                google_maps_url=maps_url
-            )
-            db.add(bookmark)
-            added += 1
+            fingerprint = place_fingerprint(title, latitude, longitude, maps_url)
+            if fingerprint in fields:
+                logger.debug("Skipping duplicate bookmark: %s | %s", title, address)
+                skipped += 1
+                continue
+            fields[fingerprint] = {"title": title, "address": address, "latitude": latitude,
+                                   "longitude": longitude, "google_maps_url": maps_url}
         except Exception as e:
-            print("❌ Error parsing bookmark:", e)
+            logger.debug("Error parsing bookmark: %s", e)
             skipped += 1
 
+    # 地点全体用户共用（places 表），收藏只引用 place_id
+    places = get_or_create_places(db, fields)
+    kept = set()
+    created = []  # the only changed bookmarks: a moved one is another place
+    for fingerprint in fields:
+        place = places[fingerprint]
+        kept.add(place.id)
+        if place.id not in existing:
+            bookmark = Bookmark(user_id=current_user.id, place=place)
+            db.add(bookmark)
+            created.append(bookmark)
+    added = len(fields)
+
+    removed = [b for place_id, b in existing.items() if place_id not in kept] + duplicates
+    removed_ids = {b.id for b in removed}
+    if removed_ids:
+        db.query(Bookmark).filter(Bookmark.id.in_(removed_ids)).delete(synchronize_session=False)
+    db.flush()  # assigns ids to the new bookmarks
+
+    current = [b for place_id, b in existing.items() if place_id in kept] + created
+    _update_neighbor_graph(db, current, {b.id for b in created}, removed_ids)
+    # 街区聚类只在收藏有变化（或还没算过）时重算
+    if created or removed_ids or not db.query(
+        db.query(BookmarkCluster).filter(BookmarkCluster.user_id == current_user.id).exists()
+    ).scalar():
+        refresh_clusters(db, current_user.id, current)
+    refresh_stats(db, current_user.id, current)
+
     db.commit()
+    # 提交之后再清缓存，否则并发的查询可能把旧的统计重新写进缓存
+    bookmark_stats.forget(current_user.id)
+    logger.info(
+        "User %s uploaded bookmarks: added=%d skipped=%d changed=%d removed=%d",
+        current_user.id, added, skipped, len(created), len(removed_ids),
+    )
+    # 未分类收藏的类别（菜系/酒吧等）在后台批量补全，不拖慢上传
+    enrichment.schedule(current_user.id)
 
     return {
         "message": f"📥 Bookmarks uploaded successfully. Added: {added}, Skipped: {skipped}"
@@ -79,13 +133,38 @@ def get_user_bookmarks(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    bookmarks = db.query(Bookmark).filter(Bookmark.user_id == current_user.id).all()
-    return bookmarks
+    # 只查响应需要的列（不加载 neighbors JSON），直接序列化，不再逐行经过 ORM 和 Pydantic
+    rows = (
+        db.query(*schema_columns(schemas.BookmarkResponse, Place, id=Bookmark.id))
+        .join(Bookmark.place)
+        .filter(Bookmark.user_id == current_user.id)
+        .all()
+    )
+    return rows_response(schemas.BookmarkResponse, rows)
 
-#check if bookmarks exist for a user
+#walkable neighbourhoods of the current user's bookmarks, largest first (center landmark suggestions)
+@router.get("/bookmark-clusters", response_model=List[schemas.BookmarkClusterResponse])
+def get_bookmark_clusters(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    rows = (
+        db.query(*schema_columns(schemas.BookmarkClusterResponse, BookmarkCluster))
+        .filter(BookmarkCluster.user_id == current_user.id)
+        .order_by(BookmarkCluster.size.desc(), BookmarkCluster.id)
+        .all()
+    )
+    return rows_response(schemas.BookmarkClusterResponse, rows)
+
+#check if bookmarks exist for a user (stats row or EXISTS, never loads the bookmarks)
 @router.get("/check-bookmarks/{user_id}")
 def check_user_bookmarks(user_id: int, db: Session = Depends(get_db)):
-    print(f"🧪 Checking bookmarks for user: {user_id}")
-    bookmarks = db.query(Bookmark).filter(Bookmark.user_id == user_id).all()
-    print(f"📊 Found {len(bookmarks)} bookmarks")
-    return {"exists": len(bookmarks) > 0}
\ No newline at end of file
+    return {"exists": has_bookmarks(db, user_id)}
+
+#count, bounding box and fingerprint of the current user's bookmarks
+@router.get("/bookmark-stats", response_model=schemas.BookmarkStatsResponse)
+def get_bookmark_stats(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    return get_stats(db, current_user.id)
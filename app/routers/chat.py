@@ -1,4 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, Body
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from typing import List
 from app.database import get_db
@@ -9,19 +11,91 @@ from app.models.generated_route import GeneratedRoute
 from app.schemas.chat_session import ChatSessionCreate, ChatSessionResponse, ChatSessionWithRoute
 from app.schemas.chat_message import ChatMessageCreate, ChatMessageResponse
 from app.schemas.ai_response import AIResponse
-from app.utils.diff_utils import apply_diff
+from app.schemas.itinerary import StopOperation
+from app.utils.diff_utils import apply_diff, apply_diff_with_report, generate_diff
+from app.utils.itinerary import (
+    STOP_OPERATIONS_SCHEMA,
+    apply_stop_operations,
+    format_stops_for_prompt,
+    json_schema_format,
+    locate_stops,
+    parse_itinerary_text,
+    render_itinerary,
+    replace_route_stops,
+    sync_route_stops,
+)
+from app.utils.route_summary import route_text_hash
+from app.utils.route_revisions import SOURCE_CHAT, record_revision
+from app.utils import outbound
+from app.utils.metrics import record_openai_usage
+from app.utils.outbound import UpstreamUnavailable, upstream_unavailable
+from app.utils.profiling import ProfiledRoute
+from app.utils.responses import schema_columns
 from app.dependencies.auth import get_current_user
-from openai import OpenAI
 import json
-from pydantic import BaseModel
+import logging
+from pydantic import BaseModel, ValidationError
 
-router = APIRouter()
-client = OpenAI()
+router = APIRouter(route_class=ProfiledRoute)
+logger = logging.getLogger(__name__)
 
 
 class ApplyDiffPayload(BaseModel):
     route_text: str | None = None
 
+DIFF_NOT_APPLICABLE = "Failed to apply diff - invalid diff format"
+OPERATIONS_NOT_APPLICABLE = "The suggested changes refer to stops that are not in the plan"
+# diff_strategy of replies whose change came as stop operations and was applied locally
+STRATEGY_STOP_OPERATIONS = "stop_operations"
+
+
+def _precompute_diff(message: ChatMessage, base_text: str) -> None:
+    """
+    Apply the assistant's diff as soon as the reply arrives, so a broken diff
+    is reported with the message and /apply-diff only has to store the result.
+    """
+    result = apply_diff_with_report(base_text, message.diff_content)
+    message.diff_base_hash = route_text_hash(base_text)
+    message.diff_strategy = result.strategy
+    if result.text is None:
+        message.diff_apply_error = DIFF_NOT_APPLICABLE
+    else:
+        message.diff_patched_text = result.text
+
+
+def _structured_edit(message: ChatMessage, base_text: str, stops, operations: List[StopOperation],
+                     db: Session, user_id: int) -> None:
+    """
+    Apply the assistant's stop operations to the plan right away. The
+    resulting text diff is generated locally, so it always applies.
+    """
+    message.diff_base_hash = route_text_hash(base_text)
+    message.diff_strategy = STRATEGY_STOP_OPERATIONS
+    try:
+        new_stops = apply_stop_operations(stops, operations)
+    except ValueError as exc:
+        logger.warning("Unusable stop operations from assistant: %s", exc)
+        message.diff_apply_error = OPERATIONS_NOT_APPLICABLE
+        return
+    locate_stops(db, user_id, new_stops)
+    message.diff_patched_text = render_itinerary(new_stops)
+    message.diff_content = generate_diff(base_text, message.diff_patched_text) or None
+    message.stop_operations = [operation.model_dump() for operation in operations]
+
+
+def _patched_route_text(message: ChatMessage, base_hash: str, load_base_text) -> str:
+    """Patched text for the current route: the precomputed one if the route is unchanged, else re-applied."""
+    if message.diff_base_hash == base_hash:
+        if message.diff_patched_text is None:
+            raise HTTPException(status_code=400, detail=message.diff_apply_error or DIFF_NOT_APPLICABLE)
+        return message.diff_patched_text
+
+    # route edited since the reply was stored (or the message predates precomputation)
+    updated_route_text = apply_diff(load_base_text(), message.diff_content)
+    if updated_route_text is None:
+        raise HTTPException(status_code=400, detail=DIFF_NOT_APPLICABLE)
+    return updated_route_text
+
 @router.post("/sessions", response_model=ChatSessionResponse)
 def create_chat_session(
     session_data: ChatSessionCreate,
@@ -103,16 +177,16 @@ def get_chat_session(
         "route_text": route.route_text if route else None
     }
 
-@router.post("/sessions/{session_id}/messages", response_model=ChatMessageResponse)
-async def send_chat_message(
-    session_id: int,
-    message_data: ChatMessageCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
+class _ChatTurn:
+    """What the LLM call for one user message needs, and what storing its reply needs."""
+    __slots__ = ("route_text", "stops", "structured", "prompt", "response_format")
+
+
+def _start_turn(db: Session, session_id: int, message_data: ChatMessageCreate, user_id: int) -> _ChatTurn:
+    """Store the user's message and build the prompt for the reply (synchronous DB work, run in the threadpool)."""
     session = db.query(ChatSession).filter(
         ChatSession.id == session_id,
-        ChatSession.user_id == current_user.id
+        ChatSession.user_id == user_id
     ).first()
 
     if not session:
@@ -129,20 +203,35 @@ async def send_chat_message(
     )
     db.add(user_message)
     db.commit()
-    db.refresh(user_message)
 
-    messages_history = db.query(ChatMessage).filter(
-        ChatMessage.chat_session_id == session_id
-    ).order_by(ChatMessage.created_at.asc()).all()
+    route_text_context = route.route_text if route else (message_data.route_text or "")
 
-    chat_messages = [
-        {"role": msg.role, "content": msg.content}
-        for msg in messages_history
-    ]
+    # Plans made of stops are edited with structured operations; free-form text falls back to diffs.
+    stops = route.stops if route else parse_itinerary_text(route_text_context)
+    structured = bool(stops) and render_itinerary(stops) == route_text_context
 
-    route_text_context = route.route_text if route else (message_data.route_text or "")
+    if structured:
+        prompt = f"""
+You are a knowledgeable tour guide assistant. You have access to the user's tour plan below, as numbered stops.
+Use this plan as context to answer the user's questions.
 
-    prompt = f"""
+Tour Plan:
+{format_stops_for_prompt(stops)}
+
+User Question: {message_data.content}
+
+Reply with "chat_message": a friendly message explaining what you're suggesting.
+If the user wants to modify the plan, return the changes as "operations" on the numbered stops:
+- {{"op": "update", "index": n, "stop": {{...}}}} replaces stop n with the given stop
+- {{"op": "insert", "index": n, "stop": {{...}}}} adds a new stop after stop n (index 0 adds it before the first stop)
+- {{"op": "remove", "index": n, "stop": null}} removes stop n
+Indexes always refer to the numbering above, not to the plan after earlier operations.
+Use "update" operations to shift the times of neighbouring stops if needed, and keep bookmark_id for bookmarked places.
+If the user is just asking a question, set "operations" to null.
+"""
+        response_format = json_schema_format("stop_operations", STOP_OPERATIONS_SCHEMA)
+    else:
+        prompt = f"""
 You are a knowledgeable tour guide assistant. You have access to the user's generated tour plan below.
 Use this plan as context to answer the user's questions. If the user wants to modify the plan, you must provide a Git-style diff.
 
@@ -167,43 +256,77 @@ Example diff format:
  11:30 - 12:30: Lunch at Italian Restaurant
  12:30 - 13:30: Museum Visit
 """
+        response_format = {"type": "json_object"}
 
+    turn = _ChatTurn()
+    turn.route_text, turn.stops, turn.structured = route_text_context, stops, structured
+    turn.prompt, turn.response_format = prompt, response_format
+    return turn
+
+
+def _store_reply(db: Session, session_id: int, turn: _ChatTurn, ai_response_text: str, user_id: int) -> ChatMessage:
+    """Store the assistant's reply with its change applied in advance (synchronous, run in the threadpool)."""
     try:
-        response = client.chat.completions.create(
-            model="gpt-4.1",
-            messages=[
-                {"role": "system", "content": "You are a tour guide assistant that responds with valid JSON only."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=1500,
-            temperature=0.7,
-        )
+        ai_response = AIResponse.model_validate_json(ai_response_text)
+        chat_msg = ai_response.chat_message
+        diff_content = ai_response.diff
+    except ValidationError:
+        ai_response = None
+        chat_msg = ai_response_text
+        diff_content = None
+
+    assistant_message = ChatMessage(
+        chat_session_id=session_id,
+        role="assistant",
+        content=chat_msg,
+        diff_content=diff_content,
+        chat_message=chat_msg
+    )
+    if turn.structured and ai_response is not None and ai_response.operations:
+        _structured_edit(assistant_message, turn.route_text, turn.stops, ai_response.operations, db, user_id)
+    elif diff_content:
+        _precompute_diff(assistant_message, turn.route_text)
+    db.add(assistant_message)
+    db.commit()
+    db.refresh(assistant_message)
+    return assistant_message
 
-        ai_response_text = response.choices[0].message.content.strip()
 
-        try:
-            ai_response_json = json.loads(ai_response_text)
-            chat_msg = ai_response_json.get("chat_message", "")
-            diff_content = ai_response_json.get("diff")
-        except json.JSONDecodeError:
-            chat_msg = ai_response_text
-            diff_content = None
-
-        assistant_message = ChatMessage(
-            chat_session_id=session_id,
-            role="assistant",
-            content=chat_msg,
-            diff_content=diff_content,
-            chat_message=chat_msg
+@router.post("/sessions/{session_id}/messages", response_model=ChatMessageResponse)
+async def send_chat_message(
+    session_id: int,
+    message_data: ChatMessageCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    # 同步的 DB 查询、diff 预应用和地点定位都放进线程池，事件循环只负责等待
+    turn = await run_in_threadpool(_start_turn, db, session_id, message_data, current_user.id)
+
+    try:
+        messages = [
+            {"role": "system", "content": "You are a tour guide assistant that responds with valid JSON only."},
+            {"role": "user", "content": turn.prompt}
+        ]
+        # 在线程池里等 LLM，事件循环不被阻塞；客户端断开时这里直接取消，不再写入回复
+        response = await run_in_threadpool(
+            outbound.call, "openai", "chat", lambda: outbound.openai_client().chat.completions.create(
+                model="gpt-4.1",
+                messages=messages,
+                max_tokens=1500,
+                temperature=0.7,
+                response_format=turn.response_format,
+            ), tokens=outbound.estimate_tokens(messages, 1500),
         )
-        db.add(assistant_message)
-        db.commit()
-        db.refresh(assistant_message)
+        record_openai_usage("chat", response)
 
-        return assistant_message
+        ai_response_text = response.choices[0].message.content.strip()
+        return await run_in_threadpool(_store_reply, db, session_id, turn, ai_response_text, current_user.id)
 
-    except Exception as e:
-        print("❌ OpenAI API 报错：", str(e))
+    except UpstreamUnavailable as exc:
+        logger.warning("Skipped chat reply for session %s: %s", session_id, exc)
+        raise upstream_unavailable(exc)
+    except Exception:
+        logger.exception("OpenAI request failed for chat session %s", session_id)
         raise HTTPException(status_code=500, detail="Failed to get AI response")
 
 @router.get("/sessions/{session_id}/messages", response_model=List[ChatMessageResponse])
@@ -220,7 +343,8 @@ def get_chat_messages(
     if not session:
         raise HTTPException(status_code=404, detail="Chat session not found")
 
-    messages = db.query(ChatMessage).filter(
+    # 只查响应里的列（不加载 diff_patched_text）；stop_operations 是嵌套结构，仍由 response_model 校验
+    messages = db.query(*schema_columns(ChatMessageResponse, ChatMessage)).filter(
         ChatMessage.chat_session_id == session_id
     ).order_by(ChatMessage.created_at.asc()).all()
 
@@ -280,17 +404,26 @@ def apply_diff_to_route(
         if not route:
             raise HTTPException(status_code=404, detail="Generated route not found")
 
-        updated_route_text = apply_diff(route.route_text, message.diff_content)
-
-        if updated_route_text is None:
-            raise HTTPException(status_code=400, detail="Failed to apply diff - invalid diff format")
+        base_hash = route.content_hash or route_text_hash(route.route_text)
+        updated_route_text = _patched_route_text(message, base_hash, lambda: route.route_text)
 
-        route.route_text = updated_route_text
-        db.commit()
+        record_revision(db, route, updated_route_text, source=SOURCE_CHAT, source_id=message.id)
+        if message.stop_operations and message.diff_base_hash == base_hash:
+            # same stops the operations were made against: no need to re-derive them from text
+            operations = [StopOperation.model_validate(op) for op in message.stop_operations]
+            replace_route_stops(route, apply_stop_operations(route.stops, operations))
+        else:
+            sync_route_stops(route)
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            raise HTTPException(status_code=409, detail="Route was modified concurrently, please retry")
 
         return {
             "message": "Diff applied successfully",
-            "updated_route_text": updated_route_text
+            "updated_route_text": updated_route_text,
+            "revision": route.head_revision
         }
 
     # No persisted route; require route_text from client and return patched text without saving.
@@ -298,10 +431,7 @@ def apply_diff_to_route(
     if base_text is None:
         raise HTTPException(status_code=400, detail="route_text is required when no saved route exists")
 
-    updated_route_text = apply_diff(base_text, message.diff_content)
-
-    if updated_route_text is None:
-        raise HTTPException(status_code=400, detail="Failed to apply diff - invalid diff format")
+    updated_route_text = _patched_route_text(message, route_text_hash(base_text), lambda: base_text)
 
     return {
         "message": "Diff applied successfully (not saved)",
@@ -1,19 +1,68 @@
+import asyncio
 import math
 import json
+import logging
+import os
+from dataclasses import dataclass
+from datetime import date, timedelta
 
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from app.database import get_db
 from app.dependencies.auth import get_current_user
-from app.schemas.preference import PreferenceRequest
+from app.schemas.preference import PreferenceRequest, TripRequest
 from app.models.user import User
 from app.models.bookmark import Bookmark
-from openai import OpenAI  # 使用新版 openai SDK
+from app.models.bookmark_cluster import BookmarkCluster
+from pydantic import ValidationError
 from app.models.generated_route import GeneratedRoute
+from app.schemas.itinerary import Itinerary, ItineraryStopBase
+from app.utils.itinerary import (
+    ITINERARY_SCHEMA,
+    json_schema_format,
+    locate_stops,
+    parse_itinerary_text,
+    render_itinerary,
+)
 from app.utils.yelp import search_businesses
-
-router = APIRouter()
-client = OpenAI()  # 自动从环境变量读取 OPENAI_API_KEY
+from app.utils.name_index import NameIndex, resolve_bookmarks
+from app.utils.route_planner import DETOUR_FACTOR, Candidate, Plan, format_clock, plan_route, speed_for_modes
+from app.utils.clustering import anchor_bookmark, partition_days, reach_km, select_clusters
+from app.utils.log import log_payload
+from app.utils import outbound
+from app.utils.cache import get_cache
+from app.utils.enrichment import filter_by_preferences, parse_category
+from app.utils.metrics import record_openai_usage
+from app.utils.outbound import UpstreamUnavailable, upstream_unavailable
+from app.utils.profiling import ProfiledRoute
+
+router = APIRouter(route_class=ProfiledRoute)
+logger = logging.getLogger(__name__)
+
+# 餐厅候选只能在午餐/晚餐时段开始（分钟，自午夜起）
+MEAL_WINDOWS = ((11 * 60 + 30, 14 * 60), (18 * 60, 21 * 60))
+# 已分类的收藏按类别的常见营业时间安排；其他类别不限
+VISIT_WINDOWS = {"restaurant": MEAL_WINDOWS, "bar": ((17 * 60, 23 * 60),)}
+
+# must-visit 解析结果
+MUST_VISIT_BOOKMARK = "bookmark"
+MUST_VISIT_YELP = "yelp"
+MUST_VISIT_OUT_OF_AREA = "out_of_area"  # a bookmark, but more than 50 km from the start point
+MUST_VISIT_AMBIGUOUS = "ambiguous"
+MUST_VISIT_UNRESOLVED = "unresolved"
+
+# 一次规划最多考虑的收藏数（按街区整体选取）
+MAX_AREA_BOOKMARKS = 300
+
+# 多日行程：同时进行的逐日 LLM 调用数
+TRIP_DAY_CONCURRENCY = int(os.getenv("TRIP_DAY_CONCURRENCY", "3"))
+YELP_MAX_LIMIT = 50  # Yelp search returns at most 50 businesses
+
+# 地标 → 坐标几乎不变，放进共享缓存，所有 worker 共用
+GEOCODE_CACHE_TTL_S = float(os.getenv("GEOCODE_CACHE_TTL_S", str(7 * 24 * 3600)))
 
 def distance_km(lon1, lat1, lon2, lat2):
     """
@@ -40,24 +89,6 @@ def distance_km(lon1, lat1, lon2, lat2):
 
     return round(distance, 2)
 
-def distance_and_walk_time_str(lon1, lat1, lon2, lat2, walk_speed_kmh=5.0):
-    """
-    Example：
-    - "distance 1.23 km, walk time 15 min - 22 min"
-    - "distance 5.67 km, walk time > 68 min"
-    """
-    dist = distance_km(lon1, lat1, lon2, lat2)  # km
-
-    t_min = dist / walk_speed_kmh * 60
-    t_max = dist * math.sqrt(2) / walk_speed_kmh * 60
-    t_min_rounded = int(round(t_min))
-    t_max_rounded = int(round(t_max))
-
-    if t_min_rounded > 60:
-        return f"distance {dist} km, walk time > {t_min_rounded} min"
-    else:
-        return f"distance {dist} km, walk time {t_min_rounded} min - {t_max_rounded} min"
-
 def generate_center_coordinate(center_landmark: str):
     prompt = """
 Your task: extract a precise geo-coordinate from the user message. 
@@ -83,21 +114,31 @@ Your response: "{
 User message: "{center_landmark}"
 Your response:
 """
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4.1",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=1500,
-            temperature=0.7,
-        )
-    except Exception as e:
-        print("❌ OpenAI API 报错：", str(e))
-        raise HTTPException(status_code=500, detail="OpenAI API 请求失败")
-    
-    result = response.choices[0].message.content
-    result_obj = json.loads(result)
-    coordinate = (result_obj["longitude"], result_obj["latitude"])
-    print("✅ 解析出的坐标：", coordinate)
+    messages = [{"role": "user", "content": prompt}]
+
+    def geocode():
+        try:
+            response = outbound.call("openai", "geocode", lambda: outbound.openai_client().chat.completions.create(
+                model="gpt-4.1",
+                messages=messages,
+                max_tokens=1500,
+                temperature=0.7,
+            ), tokens=outbound.estimate_tokens(messages, 1500))
+        except UpstreamUnavailable as exc:
+            logger.warning("Skipped geocoding center landmark: %s", exc)
+            raise upstream_unavailable(exc)
+        except Exception:
+            logger.exception("OpenAI request failed while geocoding center landmark")
+            raise HTTPException(status_code=500, detail="OpenAI API 请求失败")
+        record_openai_usage("geocode", response)
+
+        result_obj = json.loads(response.choices[0].message.content)
+        return [result_obj["longitude"], result_obj["latitude"]]
+
+    # 大小写/空白不同的同一地标共用一条缓存；失败不缓存
+    key = " ".join(center_landmark.lower().split())
+    coordinate = tuple(get_cache().get_or_set("geocode", key, geocode, GEOCODE_CACHE_TTL_S))
+    logger.debug("Center landmark %r resolved to %s", center_landmark, coordinate)
     return coordinate
 
 def filter_bookmarks_by_center_landmark(bookmarks, center_lon, center_lat, max_distance_km=100.0):
@@ -106,16 +147,223 @@ def filter_bookmarks_by_center_landmark(bookmarks, center_lon, center_lat, max_d
         dist = distance_km(center_lon, center_lat, b.longitude, b.latitude)
         if dist <= max_distance_km:
             filtered.append(b)
-    print(f"✅ 过滤后剩余 {len(filtered)} 个 bookmark（距离中心地标 {max_distance_km} km 内）")
+    logger.debug("%d bookmarks within %s km of the center landmark", len(filtered), max_distance_km)
     return filtered
 
+def select_area_bookmarks(db, user_id, bookmarks, center, max_commute_min, speed_kmh, must_visit):
+    """
+    Narrow the bookmarks near the center down to the walkable clusters
+    within one commute leg of it, the unclustered bookmarks within that
+    reach and the must-visit bookmarks. Without stored clusters (nothing
+    uploaded since clustering was added) all bookmarks are kept.
+    """
+    clusters = db.query(BookmarkCluster).filter(BookmarkCluster.user_id == user_id).all()
+    if not clusters:
+        return bookmarks
+    reach = reach_km(max_commute_min, speed_kmh, DETOUR_FACTOR)
+    chosen = {c.id for c in select_clusters(clusters, center, reach, MAX_AREA_BOOKMARKS)}
+    must_ids = must_visit_bookmark_ids(must_visit)
+    selected = [
+        b for b in bookmarks
+        if b.cluster_id in chosen
+        or b.id in must_ids
+        or (b.cluster_id is None and distance_km(center[1], center[0], b.longitude, b.latitude) <= reach)
+    ]
+    logger.debug(
+        "%d of %d bookmarks in %d of %d clusters within %.1f km",
+        len(selected), len(bookmarks), len(chosen), len(clusters), reach,
+    )
+    return selected
+
+def must_visit_bookmark_ids(must_visit):
+    return {r["bookmark_id"] for r in must_visit if r["status"] == MUST_VISIT_BOOKMARK}
+
+def resolve_must_visit(db, user_id, must_visit, all_bookmarks, area_bookmarks, yelp_places):
+    """
+    Match each must-visit entry to one of the user's bookmarks (trigram
+    name/address match), else to a Yelp result. Every entry comes back with
+    a status; only "bookmark" and "yelp" ones are forced into the plan.
+    """
+    queries = [name.strip() for name in must_visit if name.strip()]
+    in_area = {b.id for b in area_bookmarks}
+    by_id = {b.id: b for b in all_bookmarks}
+    places = [p for p in yelp_places if p.get("latitude") is not None and p.get("longitude") is not None]
+    place_index = None
+
+    resolutions = []
+    for query, match in zip(queries, resolve_bookmarks(db, user_id, queries, all_bookmarks)):
+        entry = {"query": query, "status": MUST_VISIT_UNRESOLVED, "bookmark_id": None, "name": None,
+                 "latitude": None, "longitude": None, "score": None}
+        bookmark = by_id.get(match.key) if match else None
+        if bookmark is not None:
+            if match.ambiguous:
+                status = MUST_VISIT_AMBIGUOUS
+            elif bookmark.id in in_area:
+                status = MUST_VISIT_BOOKMARK
+            else:
+                status = MUST_VISIT_OUT_OF_AREA
+            entry.update(status=status, bookmark_id=bookmark.id, name=bookmark.title,
+                         latitude=bookmark.latitude, longitude=bookmark.longitude, score=match.score)
+        elif places:
+            if place_index is None:
+                place_index = NameIndex((i, (p["name"], p.get("address"))) for i, p in enumerate(places))
+            place_match = place_index.resolve(query)
+            if place_match is not None and not place_match.ambiguous:
+                place = places[place_match.key]
+                entry.update(status=MUST_VISIT_YELP, name=place["name"], latitude=place["latitude"],
+                             longitude=place["longitude"], score=place_match.score)
+        resolutions.append(entry)
+    return resolutions
+
+def build_candidates(bookmarks, yelp_places, must_visit, meals_from_yelp):
+    """
+    Candidate places for the planner: the user's bookmarks (preferred) and
+    the Yelp results. `must_visit` are resolve_must_visit() results.
+    """
+    must_bookmarks = must_visit_bookmark_ids(must_visit)
+    must_places = {r["name"].casefold() for r in must_visit if r["status"] == MUST_VISIT_YELP}
+    candidates = []
+    for b in bookmarks:
+        kind, _ = parse_category(b.category)
+        candidates.append(Candidate(
+            name=b.title,
+            latitude=b.latitude,
+            longitude=b.longitude,
+            duration_min=75.0 if kind == "restaurant" else 60.0,
+            score=2.0,
+            must_visit=b.id in must_bookmarks,
+            windows=VISIT_WINDOWS.get(kind, ()),
+            group="meal" if kind == "restaurant" else None,
+            address=b.address,
+            bookmark_id=b.id,
+        ))
+
+    seen = {c.name.casefold() for c in candidates}
+    for place in yelp_places:
+        if place.get("latitude") is None or place.get("longitude") is None or place["name"].casefold() in seen:
+            continue
+        candidates.append(Candidate(
+            name=place["name"],
+            latitude=place["latitude"],
+            longitude=place["longitude"],
+            duration_min=75.0 if meals_from_yelp else 60.0,
+            score=1.0 + (place.get("rating") or 0) / 5.0,
+            windows=MEAL_WINDOWS if meals_from_yelp else (),
+            group="meal" if meals_from_yelp else None,
+            address=place.get("address"),
+            must_visit=place["name"].casefold() in must_places,
+        ))
+    return candidates
+
+def candidate_neighbours(candidates, bookmarks):
+    """
+    Planner neighbour lists from the bookmark neighbour graph, as candidate
+    indexes. Yelp places and bookmarks without a graph entry get None.
+    """
+    index_by_bookmark = {c.bookmark_id: i for i, c in enumerate(candidates) if c.bookmark_id is not None}
+    neighbours = [None] * len(candidates)
+    for b in bookmarks:
+        if b.neighbors is not None and b.id in index_by_bookmark:
+            neighbours[index_by_bookmark[b.id]] = [
+                index_by_bookmark[n[0]] for n in b.neighbors if n[0] in index_by_bookmark
+            ]
+    return neighbours
+
+def describe_plan(plan, mode):
+    lines = []
+    for number, stop in enumerate(plan.stops, start=1):
+        place = stop.candidate
+        line = f"{number}. {format_clock(stop.start_min)} - {format_clock(stop.end_min)}: {place.name}"
+        if place.address:
+            line += f", {place.address}"
+        if place.bookmark_id is not None:
+            line += f" [bookmark {place.bookmark_id}]"
+        line += f" ({mode} {round(stop.commute_min)} min from the {'start point' if number == 1 else 'previous stop'})"
+        lines.append(line)
+    return "\n".join(lines)
+
+def stops_from_plan(plan, narrated_stops):
+    """
+    The planned stops with the model's descriptions. Times and places always
+    come from the plan; if the model changed the number of stops, its output
+    cannot be matched up and is used as is.
+    """
+    if len(narrated_stops) != len(plan.stops):
+        return None
+    for planned, stop in zip(plan.stops, narrated_stops):
+        place = planned.candidate
+        stop.start_time = format_clock(planned.start_min)
+        stop.end_time = format_clock(planned.end_min)
+        stop.name = place.name
+        stop.address = place.address
+        stop.bookmark_id = place.bookmark_id
+        stop.latitude, stop.longitude = place.latitude, place.longitude
+    return narrated_stops
+
+def planned_stops(plan):
+    """The plan as itinerary stops, without descriptions."""
+    return stops_from_plan(plan, [ItineraryStopBase(start_time="", end_time="", name="") for _ in plan.stops])
+
+def mark_planned(must_visit, plans):
+    """Set "planned" (and "day" for trips) on each must-visit entry."""
+    for day, plan in enumerate(plans, start=1):
+        planned = {stop.candidate.name.casefold() for stop in plan.stops}
+        for entry in must_visit:
+            if entry["name"] is not None and entry["name"].casefold() in planned and not entry.get("planned"):
+                entry["planned"] = True
+                if len(plans) > 1:
+                    entry["day"] = day
+    for entry in must_visit:
+        entry.setdefault("planned", False)
+
+def route_prompt(preferences, plan, mode, start_point, day_line=""):
+    not_placed = [c.name for c in plan.missed_must_visits]
+    not_placed_text = (
+        f"\nThese must-visit places could not be fitted into the plan; mention them in the descriptions only if relevant: {', '.join(not_placed)}\n"
+        if not_placed else ""
+    )
+
+    # ✅ 使用 snake_case 字段访问
+    return f"""
+You are a smart travel planning AI assistant. The user's **one-day travel itinerary** has already been planned:
+the stops below were chosen from the user's bookmarks and Yelp, ordered and timed so that every commute fits.
+{day_line}
+【User Preferences】
+- Start Point: {start_point}
+- Preferred Transportation Modes: {', '.join(preferences.transport_modes)}
+- Allow Alcohol: {"Yes" if preferences.allow_alcohol else "No"}
+- Preferred Cuisines: {', '.join(preferences.preferred_cuisine)}
+
+【Planned Stops】
+{describe_plan(plan, mode) if plan.stops else "No stops could be planned."}
+{not_placed_text}
+Please output the itinerary as a list of stops, exactly the planned stops in the same order, with the same
+start_time, end_time, name (place name only) and bookmark_id (null when there is none). For each stop, write
+a brief, friendly explanation of the activity as description (e.g., museum visit, lunch, coffee break).
+"""
+
+def narrate_plan(prompt, operation):
+    """Ask the model to describe the planned stops; returns its raw (JSON) answer."""
+    messages = [{"role": "user", "content": prompt}]
+    response = outbound.call("openai", operation, lambda: outbound.openai_client().chat.completions.create(
+        model="gpt-4.1",
+        messages=messages,
+        max_tokens=1500,
+        temperature=0.7,
+        response_format=json_schema_format("itinerary", ITINERARY_SCHEMA),
+    ), tokens=outbound.estimate_tokens(messages, 1500))
+    record_openai_usage(operation, response)
+    log_payload(logger, "OpenAI route response", response=response)
+    return response.choices[0].message.content
+
 @router.post("/generate-route")
 def generate_route(
     preferences: PreferenceRequest,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    print("✅ 收到 preferences：", preferences.dict())
+    logger.info("Generating route for user %s", current_user.id)
+    log_payload(logger, "Route preferences", preferences=preferences)
 
     # 查询当前用户上传的 bookmark
     bookmarks = db.query(Bookmark).filter(Bookmark.user_id == current_user.id).all()
@@ -126,12 +374,9 @@ def generate_route(
     center_lon, center_lat = generate_center_coordinate(preferences.center_landmark)
 
     # 过滤无关的 bookmark
+    all_bookmarks = bookmarks
     bookmarks = filter_bookmarks_by_center_landmark(bookmarks, center_lon, center_lat, max_distance_km=50.0)
 
-    # 整理 bookmarks 数据为字符串
-    bookmark_list = [f"{b.title}, {b.address}" for b in bookmarks]
-    bookmark_text = "\n".join(bookmark_list)
-
     # Yelp 兜底推荐（优先使用用户偏好的 cuisine 作为关键词）
     cuisine_term = ", ".join(preferences.preferred_cuisine) if preferences.preferred_cuisine else "restaurants and sights"
     yelp_places = search_businesses(
@@ -141,75 +386,226 @@ def generate_route(
         categories=None,
         limit=6,
     )
-    yelp_text = "\n".join(
-        f"{p['name']} - {p['address']} "
-        f"(rating {p['rating']}, reviews {p['review_count']}) "
-        f"{' / ' + ', '.join(p['categories']) if p.get('categories') else ''}"
-        for p in yelp_places
-    ) if yelp_places else "No Yelp results (or YELP_API_KEY not set)."
-
-    # Calculate distance info between any 2 bookmarks (for debugging)
-    distance_info = []
-    for i in range(len(bookmarks)):
-        for j in range(i + 1, len(bookmarks)):
-            b1 = bookmarks[i]
-            b2 = bookmarks[j]
-            dist_info = distance_and_walk_time_str(
-                b1.longitude, b1.latitude,
-                b2.longitude, b2.latitude
-            )
-            distance_info.append(f"Distance between '{b1.title}' and '{b2.title}': {dist_info}")
-    distance_info_text = "\n".join(distance_info)
-
-    # ✅ 使用 snake_case 字段访问
-    prompt = f"""
-You are a smart travel planning AI assistant. Please generate a **one-day travel itinerary** for the user based on the following preferences:
 
-1. Prioritize places from the user's uploaded bookmarks (restaurants, landmarks, cafes, etc.)
-2. If no matching places are found in the bookmarks (e.g., preferred cuisine), recommend high-rated alternatives from Yelp
-3. All places must fit within the user's time range and commute limitations. Each single trip should not exceed {preferences.max_commute_time} minutes.
-4. The commute time between places should be calculated based on walking speed.
-
-【User Preferences】
-- Start Point: {preferences.center_landmark}
-- Must-Visit Places: {', '.join(preferences.must_visit)}
-- Start Time: {preferences.start_time}
-- End Time: {preferences.end_time}
-- Preferred Transportation Modes: {', '.join(preferences.transport_modes)}
-- Allow Alcohol: {"Yes" if preferences.allow_alcohol else "No"}
-- Preferred Cuisines: {', '.join(preferences.preferred_cuisine)}
-- Max Single Commute Time: {preferences.max_commute_time} minutes
+    # 本地规划：选点、排序、排时间，保证每段通勤和结束时间都满足偏好
+    # must-visit 先解析成具体地点，未解析的只在响应里标出，不再原样写进 prompt
+    must_visit = resolve_must_visit(
+        db, current_user.id, preferences.must_visit, all_bookmarks, bookmarks, yelp_places
+    )
+    speed_kmh = speed_for_modes(preferences.transport_modes)
+    # 只保留一段通勤可达的街区，避免把整个城市的收藏都交给规划器
+    bookmarks = select_area_bookmarks(
+        db, current_user.id, bookmarks, (center_lat, center_lon), preferences.max_commute_time, speed_kmh, must_visit
+    )
+    # 按类别预筛：不喝酒时去掉酒吧，指定了菜系时去掉其他菜系的餐厅（未分类和 must-visit 的保留）
+    bookmarks = filter_by_preferences(
+        bookmarks, preferences.allow_alcohol, preferences.preferred_cuisine, must_visit_bookmark_ids(must_visit)
+    )
+    candidates = build_candidates(
+        bookmarks, yelp_places, must_visit, meals_from_yelp=bool(preferences.preferred_cuisine)
+    )
+    mode = preferences.transport_modes[0] if preferences.transport_modes else "walking"
+    plan = plan_route(
+        candidates,
+        origin=(center_lat, center_lon),
+        start_time=preferences.start_time,
+        end_time=preferences.end_time,
+        max_commute_min=preferences.max_commute_time,
+        speed_kmh=speed_kmh,
+        neighbours=candidate_neighbours(candidates, bookmarks),
+    )
+    logger.info(
+        "Planned %d stops from %d candidates (travel %.0f min)", len(plan.stops), len(candidates), plan.travel_min
+    )
 
-【User Bookmarks】 (prioritize selections from below):
-{bookmark_text}
+    mark_planned(must_visit, [plan])
+    prompt = route_prompt(preferences, plan, mode, preferences.center_landmark)
+    log_payload(logger, "Constructed route prompt", prompt=prompt)
 
-【Yelp Alternatives】 (use when bookmarks do not match preferences):
-{yelp_text}
+    try:
+        result = narrate_plan(prompt, "generate_route")
+    except UpstreamUnavailable as exc:
+        logger.warning("Skipped route description: %s", exc)
+        raise upstream_unavailable(exc)
+    except Exception:
+        logger.exception("OpenAI request failed while generating route")
+        raise HTTPException(status_code=500, detail="OpenAI API 请求失败")
 
-【Distance Information】
-{distance_info_text}
+    try:
+        narrated_stops = Itinerary.model_validate_json(result).stops
+    except ValidationError:
+        # model ignored the schema; keep its text and use stops only if it happens to be canonical
+        logger.warning("Route response is not a valid itinerary; returning it as text")
+        stops = parse_itinerary_text(result)
+        return {
+            "generated_route": result,
+            "itinerary": {"stops": stops} if stops else None,
+            "must_visit": must_visit,
+        }
+
+    stops = stops_from_plan(plan, narrated_stops)
+    if stops is None:
+        logger.warning("Model returned %d stops for a plan of %d", len(narrated_stops), len(plan.stops))
+        stops = narrated_stops
+        locate_stops(db, current_user.id, stops, yelp_places)
+    return {"generated_route": render_itinerary(stops), "itinerary": {"stops": stops}, "must_visit": must_visit}
+
+@dataclass
+class TripDay:
+    number: int
+    date: date
+    start_point: dict
+    plan: Plan
+    prompt: str
+
+def plan_trip(trip: TripRequest, db: Session, user: User):
+    """
+    Everything a trip needs before the LLM: one geocode, one bookmark load,
+    one Yelp search, then bookmarks split into one group of nearby places
+    per day and a plan for each day. Returns (days, must_visit).
+    """
+    bookmarks = db.query(Bookmark).filter(Bookmark.user_id == user.id).all()
+    if not bookmarks:
+        raise HTTPException(status_code=400, detail="请先上传收藏夹 JSON 文件")
 
-Please output the itinerary in the following format:
-09:00 - 10:00: Head to [Place Name], brief explanation (e.g., museum, restaurant, landmark, etc.)
-10:00 - 11:30: Activity such as visit, dining, resting, etc.
+    center_lon, center_lat = generate_center_coordinate(trip.center_landmark)
+    center = (center_lat, center_lon)
+    all_bookmarks = bookmarks
+    bookmarks = filter_bookmarks_by_center_landmark(bookmarks, center_lon, center_lat, max_distance_km=50.0)
 
-Plan a full-day itinerary with reasonable timing for meals, sightseeing, and breaks. No need to include returning home.
-"""
-    print("🧾 Constructed Prompt:\n", prompt)
+    cuisine_term = ", ".join(trip.preferred_cuisine) if trip.preferred_cuisine else "restaurants and sights"
+    yelp_places = search_businesses(
+        term=cuisine_term,
+        latitude=center_lat,
+        longitude=center_lon,
+        categories=None,
+        limit=min(YELP_MAX_LIMIT, 6 * trip.day_count),
+    )
+    must_visit = resolve_must_visit(db, user.id, trip.must_visit, all_bookmarks, bookmarks, yelp_places)
+    bookmarks = filter_by_preferences(
+        bookmarks, trip.allow_alcohol, trip.preferred_cuisine, must_visit_bookmark_ids(must_visit)
+    )
 
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4.1",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=1500,
-            temperature=0.7,
+    # 每天一个街区：按聚类/距离把收藏分给各天，不重复；每天从该街区中心出发
+    groups = partition_days(bookmarks, trip.day_count, center)
+    anchors = [anchor_bookmark(group) for group in groups]
+    origins = [(a.latitude, a.longitude) for a in anchors] + [center] * (trip.day_count - len(groups))
+    day_places = [[] for _ in origins]
+    for place in yelp_places:
+        if place.get("latitude") is None or place.get("longitude") is None:
+            continue
+        nearest = min(
+            range(len(origins)),
+            key=lambda i: (distance_km(origins[i][1], origins[i][0], place["longitude"], place["latitude"]), i),
         )
-    except Exception as e:
-        print("❌ OpenAI API 报错：", str(e))
-        raise HTTPException(status_code=500, detail="OpenAI API 请求失败")
-    
-    result = response.choices[0].message.content
-    print("🧠 OpenAI 完整返回：", response)
-    print("📌 bookmark_text 内容：\n", bookmark_text)
-    print("✅ OpenAI 返回的结果：\n", result)
-    return {"generated_route": result}
+        day_places[nearest].append(place)
+
+    speed_kmh = speed_for_modes(trip.transport_modes)
+    mode = trip.transport_modes[0] if trip.transport_modes else "walking"
+    days = []
+    for index, origin in enumerate(origins):
+        day_bookmarks = groups[index] if index < len(groups) else []
+        if index < len(anchors):
+            anchor = anchors[index]
+            start_point = {"name": anchor.title, "bookmark_id": anchor.id,
+                           "latitude": anchor.latitude, "longitude": anchor.longitude}
+        else:
+            start_point = {"name": trip.center_landmark, "bookmark_id": None,
+                           "latitude": center_lat, "longitude": center_lon}
+        candidates = build_candidates(
+            day_bookmarks, day_places[index], must_visit, meals_from_yelp=bool(trip.preferred_cuisine)
+        )
+        plan = plan_route(
+            candidates,
+            origin=origin,
+            start_time=trip.start_time,
+            end_time=trip.end_time,
+            max_commute_min=trip.max_commute_time,
+            speed_kmh=speed_kmh,
+            neighbours=candidate_neighbours(candidates, day_bookmarks),
+        )
+        day_date = trip.start_date + timedelta(days=index)
+        day_line = f"\nThis is day {index + 1} of a {trip.day_count}-day trip ({day_date.isoformat()}), based at {trip.center_landmark}.\n"
+        days.append(TripDay(index + 1, day_date, start_point, plan,
+                            route_prompt(trip, plan, mode, start_point["name"], day_line)))
+        logger.info("Trip day %d: %d stops from %d candidates", index + 1, len(plan.stops), len(candidates))
+
+    mark_planned(must_visit, [day.plan for day in days])
+    return days, must_visit
+
+def trip_day_result(day: TripDay, result=None, error=None):
+    """One NDJSON line of /generate-trip; falls back to the bare plan if the model's answer is unusable."""
+    stops = None
+    if result is not None:
+        try:
+            stops = stops_from_plan(day.plan, Itinerary.model_validate_json(result).stops)
+        except ValidationError:
+            pass
+        if stops is None:
+            logger.warning("Trip day %d: model answer does not match the plan; returning the plan", day.number)
+    if stops is None:
+        stops = planned_stops(day.plan)
+    line = {
+        "type": "day",
+        "day": day.number,
+        "date": day.date.isoformat(),
+        "start_point": day.start_point,
+        "generated_route": render_itinerary(stops),
+        "itinerary": {"stops": stops},
+    }
+    if error is not None:
+        line["error"] = error
+    return line
+
+def _ndjson(value):
+    return json.dumps(jsonable_encoder(value), ensure_ascii=False) + "\n"
+
+async def stream_trip(days, must_visit):
+    """
+    Summary line first, then one line per day as soon as its description is
+    back (not in day order), then a "done" line. At most TRIP_DAY_CONCURRENCY
+    days are with the model at once.
+    """
+    yield _ndjson({
+        "type": "trip",
+        "days": [
+            {"day": d.number, "date": d.date.isoformat(), "start_point": d.start_point, "stops": len(d.plan.stops)}
+            for d in days
+        ],
+        "must_visit": must_visit,
+    })
+    semaphore = asyncio.Semaphore(TRIP_DAY_CONCURRENCY)
+
+    async def narrate(day):
+        async with semaphore:
+            try:
+                result = await run_in_threadpool(narrate_plan, day.prompt, "generate_trip_day")
+            except Exception:
+                logger.exception("OpenAI request failed for trip day %d", day.number)
+                return trip_day_result(day, error="OpenAI API 请求失败")
+        return trip_day_result(day, result)
+
+    for day in days:
+        if not day.plan.stops:
+            yield _ndjson(trip_day_result(day))
+    tasks = [asyncio.create_task(narrate(day)) for day in days if day.plan.stops]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            yield _ndjson(await finished)
+    finally:
+        # client went away: don't start the days still waiting for the semaphore
+        for task in tasks:
+            task.cancel()
+    yield _ndjson({"type": "done"})
+
+@router.post("/generate-trip")
+async def generate_trip(
+    trip: TripRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    logger.info("Generating %d-day trip for user %s", trip.day_count, current_user.id)
+    log_payload(logger, "Trip preferences", trip=trip)
+    # 共享部分（地理编码、收藏、Yelp、逐日规划）在线程池里做一次；之后只有 LLM 调用并发进行
+    days, must_visit = await run_in_threadpool(plan_trip, trip, db, current_user)
+    return StreamingResponse(stream_trip(days, must_visit), media_type="application/x-ndjson")
@@ -1,12 +1,33 @@
 # routers/generated_route.py
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from app.database import get_db
 from app import models
 from app.models.generated_route import GeneratedRoute
-from app.schemas.generated_route import GeneratedRouteCreate, GeneratedRouteResponse
+from app.schemas.generated_route import (
+    GeneratedRouteCreate,
+    GeneratedRouteResponse,
+    GeneratedRouteSummaryPage,
+)
+from app.schemas.route_revision import RouteRevisionList, RouteRevisionResponse
+from app.utils.itinerary import (
+    locate_stops,
+    parse_itinerary_text,
+    render_itinerary,
+    replace_route_stops,
+    sync_route_stops,
+)
+from app.utils.route_revisions import (
+    SOURCE_REVERT,
+    ensure_initial_revision,
+    list_revisions,
+    record_revision,
+    revision_text,
+)
+from app.utils.route_summary import etag_matches
 from app.models.user import User
 from app.dependencies.auth import get_current_user
 
@@ -24,6 +45,17 @@ def save_generated_route(
         route_text=route_data.route_text,
     )
     db.add(new_route)
+    ensure_initial_revision(db, new_route)
+
+    # keep the structured stops only if route_text is exactly their rendering
+    itinerary = route_data.itinerary
+    if itinerary and render_itinerary(itinerary.stops) == route_data.route_text:
+        stops = itinerary.stops
+    else:
+        stops = parse_itinerary_text(route_data.route_text)
+    if stops:
+        locate_stops(db, current_user.id, stops)
+    replace_route_stops(new_route, stops)
     db.commit()
     db.refresh(new_route)
     return new_route
@@ -50,6 +82,137 @@ def get_routes_by_user(user_id: int, db: Session = Depends(get_db)):
     }
 
 
+#list saved routes of the current user, newest first, without the full text
+@router.get("/saved-routes", response_model=GeneratedRouteSummaryPage)
+def list_saved_routes(
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[int] = Query(None, description="next_cursor from the previous page"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Keyset-paginated listing: only id, title, preview and created_at are
+    selected, and each page is an index range scan on (user_id, id).
+    """
+    query = db.query(
+        GeneratedRoute.id,
+        GeneratedRoute.title,
+        GeneratedRoute.preview,
+        GeneratedRoute.created_at,
+    ).filter(GeneratedRoute.user_id == current_user.id)
+    if cursor is not None:
+        query = query.filter(GeneratedRoute.id < cursor)
+
+    rows = query.order_by(GeneratedRoute.id.desc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        "routes": [row._asdict() for row in rows],
+        "next_cursor": rows[-1].id if has_more else None,
+    }
+
+#get a single saved route with its full text, honouring If-None-Match
+@router.get("/saved-routes/{route_id}", response_model=GeneratedRouteResponse)
+def get_saved_route(
+    route_id: int,
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    content_hash = (
+        db.query(GeneratedRoute.content_hash)
+        .filter(GeneratedRoute.id == route_id, GeneratedRoute.user_id == current_user.id)
+        .scalar()
+    )
+    if content_hash is None:
+        # unknown route, or a legacy row whose hash was never computed
+        route = (
+            db.query(GeneratedRoute)
+            .filter(GeneratedRoute.id == route_id, GeneratedRoute.user_id == current_user.id)
+            .first()
+        )
+        if not route:
+            raise HTTPException(status_code=404, detail="Route not found")
+        route.route_text = route.route_text  # recomputes title/preview/content_hash
+        db.commit()
+        content_hash = route.content_hash
+
+    etag = f'"{content_hash}"'
+    if etag_matches(request.headers.get("if-none-match", ""), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    route = db.query(GeneratedRoute).filter(GeneratedRoute.id == route_id).first()
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, no-cache"
+    return route
+
+
+def _get_owned_route(db: Session, route_id: int, user: User) -> GeneratedRoute:
+    route = (
+        db.query(GeneratedRoute)
+        .filter(GeneratedRoute.id == route_id, GeneratedRoute.user_id == user.id)
+        .first()
+    )
+    if not route:
+        raise HTTPException(status_code=404, detail="Route not found")
+    if route.head_revision is None:
+        # saved before revisions existed: its current text becomes revision 1
+        ensure_initial_revision(db, route)
+        db.commit()
+    return route
+
+#list the revisions of a saved route, newest first
+@router.get("/saved-routes/{route_id}/revisions", response_model=RouteRevisionList)
+def get_route_revisions(
+    route_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    route = _get_owned_route(db, route_id, current_user)
+    return {
+        "route_id": route.id,
+        "head_revision": route.head_revision,
+        "revisions": [row._asdict() for row in list_revisions(db, route.id)],
+    }
+
+#get the text of any revision of a saved route
+@router.get("/saved-routes/{route_id}/revisions/{number}", response_model=RouteRevisionResponse)
+def get_route_revision(
+    route_id: int,
+    number: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    route = _get_owned_route(db, route_id, current_user)
+    text = revision_text(db, route, number)
+    if text is None:
+        raise HTTPException(status_code=404, detail="Revision not found")
+    return {"route_id": route.id, "number": number, "head_revision": route.head_revision, "route_text": text}
+
+#revert a saved route to an earlier revision; recorded as a new revision, so it can be undone too
+@router.post("/saved-routes/{route_id}/revisions/{number}/revert", response_model=RouteRevisionResponse)
+def revert_route(
+    route_id: int,
+    number: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    route = _get_owned_route(db, route_id, current_user)
+    text = revision_text(db, route, number)
+    if text is None:
+        raise HTTPException(status_code=404, detail="Revision not found")
+
+    record_revision(db, route, text, source=SOURCE_REVERT, source_id=number)
+    sync_route_stops(route)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Route was modified concurrently, please retry")
+    return {"route_id": route.id, "number": route.head_revision, "head_revision": route.head_revision, "route_text": text}
+
+
 @router.delete("/routes/{route_id}")
 def delete_route(route_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     """
@@ -1,14 +1,14 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from app.schemas.user import UserCreate, UserResponse, UserLogin, TokenResponse
 from app.models.user import User
+from app.models.generated_route import GeneratedRoute
 from app.database import get_db
 from app.utils.hash import hash_password, verify_password
 from app.utils.token import create_access_token
 from app import schemas
-from fastapi import UploadFile, File
-import uuid
-import shutil
+from app.utils.avatars import DEFAULT_SIZE, InvalidImage, avatar_urls, process_avatar, read_upload
 
 router = APIRouter()
 
@@ -50,7 +50,7 @@ def login(user_data: UserLogin, db: Session = Depends(get_db)):
     }
 
 # Get current user info
-from app.dependencies.auth import get_current_user
+from app.dependencies.auth import forget_user, get_current_user
 @router.get("/me", response_model=schemas.UserResponse)
 def get_me(current_user: User = Depends(get_current_user)):
     return current_user
@@ -61,37 +61,39 @@ def get_user_routes(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
+    # 只查询 route_text 一列，不再重复查询 User 再懒加载关系
     routes = (
-        db.query(User)
-        .filter(User.id == current_user.id)
-        .first()
-        .generated_routes
+        db.query(GeneratedRoute.route_text)
+        .filter(GeneratedRoute.user_id == current_user.id)
+        .order_by(GeneratedRoute.id)
+        .all()
     )
 
     # 返回 route_text 字段
     return {
-        "routes": [r.route_text for r in routes] if routes else []
+        "routes": [r.route_text for r in routes]
     }
 
 @router.post("/upload-avatar")
-def upload_avatar(
-    file: UploadFile = File(...),
+async def upload_avatar(
+    request: Request,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    ext = file.filename.split(".")[-1]
-    new_filename = f"{uuid.uuid4()}.{ext}"
-    file_path = f"app/static/avatars/{new_filename}"
+    # 边读边检查大小；超过上限立即 413，不先把整个文件落盘
+    data = await read_upload(request)
 
-    # 保存上传的图片
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    # 在头像线程池里生成缩略图；按内容哈希存储，同一张图只处理一次
+    try:
+        digest = await process_avatar(data)
+    except InvalidImage:
+        raise HTTPException(status_code=400, detail="无法识别的图片文件")
 
-    # 存储头像 URL
-    avatar_url = f"/static/avatars/{new_filename}"
-    current_user.avatar_url = avatar_url
+    # 存储头像 URL（默认尺寸的 WebP），其余尺寸/格式一并返回
+    urls = avatar_urls(digest)
+    user_id = current_user.id
+    current_user.avatar_url = urls[DEFAULT_SIZE]["webp"]
+    await run_in_threadpool(db.commit)
+    await run_in_threadpool(forget_user, user_id)
 
-    db.commit()
-    db.refresh(current_user)
-
-    return {"avatar_url": avatar_url}
+    return {"avatar_url": current_user.avatar_url, "avatars": urls}
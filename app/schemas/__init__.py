@@ -1,2 +1,2 @@
 from app.schemas.user import UserLogin, UserResponse, UserCreate, TokenResponse
-from .bookmark import BookmarkResponse
\ No newline at end of file
+from .bookmark import BookmarkResponse, BookmarkClusterResponse, BookmarkStatsResponse
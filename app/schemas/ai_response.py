@@ -1,6 +1,8 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
+from app.schemas.itinerary import StopOperation
 
 class AIResponse(BaseModel):
     chat_message: str
     diff: Optional[str] = None
+    operations: Optional[List[StopOperation]] = None  # structured edits, when the plan has stops
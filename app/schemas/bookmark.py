@@ -1,5 +1,6 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from typing import Optional
+from datetime import datetime
 
 class BookmarkBase(BaseModel):
     title: str
@@ -15,5 +16,27 @@ class BookmarkCreate(BookmarkBase):
 class BookmarkResponse(BookmarkBase):
     id: int
 
-    class Config:
-        orm_mode = True
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)
+
+class BookmarkClusterResponse(BaseModel):
+    id: int
+    size: int
+    latitude: float
+    longitude: float
+    radius_m: int
+    anchor_bookmark_id: Optional[int] = None
+    name: Optional[str] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+class BookmarkBounds(BaseModel):
+    south: float
+    west: float
+    north: float
+    east: float
+
+class BookmarkStatsResponse(BaseModel):
+    count: int
+    bounds: Optional[BookmarkBounds] = None
+    fingerprint: Optional[str] = None  # changes whenever the bookmarks do; None until the next upload
+    uploaded_at: Optional[datetime] = None
@@ -1,6 +1,7 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, ConfigDict
+from typing import List, Optional
 from datetime import datetime
+from app.schemas.itinerary import StopOperation
 
 
 class ChatMessageCreate(BaseModel):
@@ -15,7 +16,9 @@ class ChatMessageResponse(BaseModel):
     content: str
     diff_content: Optional[str] = None
     chat_message: Optional[str] = None
+    diff_strategy: Optional[str] = None  # how the diff applied to the plan when the reply was stored
+    diff_apply_error: Optional[str] = None  # set when the diff could not be applied
+    stop_operations: Optional[List[StopOperation]] = None  # structured form of the change, if any
     created_at: datetime
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
@@ -1,17 +1,31 @@
 # schemas/generated_route.py
 
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, ConfigDict
+from typing import List, Optional
 from datetime import datetime
+from app.schemas.itinerary import Itinerary, ItineraryStopResponse
 
 class GeneratedRouteCreate(BaseModel):
     route_text: str
+    itinerary: Optional[Itinerary] = None  # as returned by /generate-route
 
 class GeneratedRouteResponse(BaseModel):
     id: int
     user_id: int
     route_text: str
+    stops: List[ItineraryStopResponse] = []
     created_at: datetime
 
-    class Config:
-        orm_mode = True
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)
+
+class GeneratedRouteSummary(BaseModel):
+    id: int
+    title: Optional[str] = None
+    preview: Optional[str] = None
+    created_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+class GeneratedRouteSummaryPage(BaseModel):
+    routes: List[GeneratedRouteSummary]
+    next_cursor: Optional[int] = None  # pass back as ?cursor= to fetch the next page
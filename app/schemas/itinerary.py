@@ -0,0 +1,32 @@
+# schemas/itinerary.py
+
+from pydantic import BaseModel, ConfigDict, Field
+from typing import List, Literal, Optional
+
+from app.schemas.preference import CLOCK_PATTERN
+
+class ItineraryStopBase(BaseModel):
+    start_time: str = Field(..., pattern=CLOCK_PATTERN)  # "HH:MM"
+    end_time: str = Field(..., pattern=CLOCK_PATTERN)
+    name: str
+    description: str = ""
+    address: Optional[str] = None
+    bookmark_id: Optional[int] = None  # set when the stop is one of the user's bookmarks
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+
+class ItineraryStopResponse(ItineraryStopBase):
+    model_config = ConfigDict(from_attributes=True)
+
+class Itinerary(BaseModel):
+    stops: List[ItineraryStopBase]
+
+class StopOperation(BaseModel):
+    """
+    One edit to a plan. index is the 1-based number of a stop in the plan
+    the edit was made against; "insert" puts the new stop after that stop
+    (index 0 = before the first one).
+    """
+    op: Literal["update", "insert", "remove"]
+    index: int
+    stop: Optional[ItineraryStopBase] = None
@@ -1,15 +1,38 @@
-from pydantic import BaseModel, Field, ConfigDict
+from datetime import date
+from pydantic import BaseModel, Field, ConfigDict, model_validator
 from typing import List
 
+# 单次行程最多天数
+MAX_TRIP_DAYS = 14
+# 24 小时制 HH:MM（小时可以是一位数）
+CLOCK_PATTERN = r"^([01]?\d|2[0-3]):[0-5]\d$"
+
 class PreferenceRequest(BaseModel):
     center_landmark: str = Field(..., alias="centerLandmark")
     must_visit: List[str] = Field(..., alias="mustVisit")
-    start_time: str = Field(..., alias="startTime")
-    end_time: str = Field(..., alias="endTime")
+    start_time: str = Field(..., alias="startTime", pattern=CLOCK_PATTERN)
+    end_time: str = Field(..., alias="endTime", pattern=CLOCK_PATTERN)
     transport_modes: List[str] = Field(..., alias="transportModes")
     allow_alcohol: bool = Field(..., alias="allowAlcohol")
     preferred_cuisine: List[str] = Field(..., alias="preferredCuisine")
     max_commute_time: int = Field(..., alias="maxCommuteTime")
 
     # ✅ Pydantic v2 新写法
-    model_config = ConfigDict(populate_by_name=True)
\ No newline at end of file
+    model_config = ConfigDict(populate_by_name=True)
+
+class TripRequest(PreferenceRequest):
+    """Preferences for every day of a trip from start_date to end_date (inclusive)."""
+    start_date: date = Field(..., alias="startDate")
+    end_date: date = Field(..., alias="endDate")
+
+    @model_validator(mode="after")
+    def check_dates(self):
+        if self.end_date < self.start_date:
+            raise ValueError("endDate must not be before startDate")
+        if self.day_count > MAX_TRIP_DAYS:
+            raise ValueError(f"a trip can span at most {MAX_TRIP_DAYS} days")
+        return self
+
+    @property
+    def day_count(self) -> int:
+        return (self.end_date - self.start_date).days + 1
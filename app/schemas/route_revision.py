@@ -0,0 +1,26 @@
+# schemas/route_revision.py
+
+from pydantic import BaseModel, ConfigDict
+from typing import List, Optional
+from datetime import datetime
+
+class RouteRevisionSummary(BaseModel):
+    number: int
+    kind: str
+    content_hash: str
+    source: str
+    source_id: Optional[int] = None
+    created_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+class RouteRevisionList(BaseModel):
+    route_id: int
+    head_revision: int
+    revisions: List[RouteRevisionSummary]  # newest first
+
+class RouteRevisionResponse(BaseModel):
+    route_id: int
+    number: int
+    head_revision: int
+    route_text: str
@@ -1,5 +1,5 @@
 from typing import List, Optional
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, ConfigDict
 from .bookmark import BookmarkResponse 
 
 class UserCreate(BaseModel):
@@ -13,8 +13,7 @@ class UserResponse(BaseModel):
     avatar_url: Optional[str] = None  
     bookmarks: List[BookmarkResponse] = []
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class UserLogin(BaseModel):
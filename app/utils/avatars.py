@@ -0,0 +1,179 @@
+"""
+Avatar uploads.
+
+The upload is parsed from a size-limited stream. The request is cut off
+with 413 as soon as it passes AVATAR_MAX_BYTES, instead of being spooled
+whole first. It is then turned into square thumbnails (AVATAR_SIZES, WebP
+and JPEG) in a small thread pool of its own, so image work never takes
+request threads. Pillow releases the GIL while decoding, resizing and
+encoding, and JPEGs are decoded at a reduced scale (draft mode), which
+does most of the work for phone photos.
+
+Files are named by the SHA-256 of the upload: {digest}-{size}.{ext}. A
+picture uploaded again, by anyone, is found on disk and not processed
+twice. A name never changes content, so the files are served as
+immutable. The original is not kept, and neither is its EXIF metadata,
+which often holds a GPS position.
+"""
+import asyncio
+import hashlib
+import io
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Dict, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, Request
+from starlette.datastructures import UploadFile
+from starlette.formparsers import MultiPartException, MultiPartParser
+
+AVATAR_DIR = os.getenv("AVATAR_DIR", os.path.join("app", "static", "avatars"))
+AVATAR_URL_PREFIX = "/static/avatars"
+AVATAR_MAX_BYTES = int(os.getenv("AVATAR_MAX_BYTES", str(10 * 1024 * 1024)))
+AVATAR_MAX_PIXELS = 50_000_000
+AVATAR_SIZES = (128, 512)
+DEFAULT_SIZE = 128  # stored as the user's avatar_url; 40 px at 3x
+AVATAR_WORKERS = int(os.getenv("AVATAR_WORKERS", "2"))
+MULTIPART_OVERHEAD = 16 * 1024  # boundaries and part headers around the file
+
+ENCODINGS = {
+    "webp": {"format": "WEBP", "quality": 80, "method": 4},
+    "jpeg": {"format": "JPEG", "quality": 85, "optimize": True, "progressive": True},
+}
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+def _too_large() -> HTTPException:
+    return HTTPException(status_code=413, detail=f"头像文件不能超过 {AVATAR_MAX_BYTES // (1024 * 1024)} MB")
+
+
+async def _limited(stream: AsyncIterator[bytes], max_bytes: int) -> AsyncIterator[bytes]:
+    received = 0
+    async for chunk in stream:
+        received += len(chunk)
+        if received > max_bytes:
+            raise _too_large()
+        yield chunk
+
+
+async def read_upload(request: Request, field: str = "file", max_bytes: int = AVATAR_MAX_BYTES) -> bytes:
+    """The bytes of the multipart file field `field`; 413 once the body passes the limit."""
+    length = request.headers.get("content-length", "")
+    if length.isdigit() and int(length) > max_bytes + MULTIPART_OVERHEAD:
+        raise _too_large()
+    parser = MultiPartParser(
+        request.headers, _limited(request.stream(), max_bytes + MULTIPART_OVERHEAD), max_files=1, max_fields=10,
+    )
+    try:
+        form = await parser.parse()
+    except (KeyError, MultiPartException):
+        raise HTTPException(status_code=400, detail="请以 multipart/form-data 上传头像文件")
+    upload = form.get(field)
+    if not isinstance(upload, UploadFile):
+        raise HTTPException(status_code=400, detail=f"缺少文件字段 {field}")
+    try:
+        data = await upload.read()
+    finally:
+        await form.close()
+    if len(data) > max_bytes:
+        raise _too_large()
+    return data
+
+
+def avatar_filename(digest: str, size: int, ext: str) -> str:
+    return f"{digest}-{size}.{ext}"
+
+
+def avatar_urls(digest: str) -> Dict[int, Dict[str, str]]:
+    return {
+        size: {ext: f"{AVATAR_URL_PREFIX}/{avatar_filename(digest, size, ext)}" for ext in ENCODINGS}
+        for size in AVATAR_SIZES
+    }
+
+
+def make_thumbnails(data: bytes, sizes: Sequence[int] = AVATAR_SIZES) -> Dict[Tuple[int, str], bytes]:
+    """Square, center-cropped thumbnails of an image in every size and encoding."""
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    largest = max(sizes)
+    try:
+        image = Image.open(io.BytesIO(data))
+        if image.width * image.height > AVATAR_MAX_PIXELS:
+            raise InvalidImage("image has too many pixels")
+        image.draft("RGB", (largest, largest))  # JPEG: decode at 1/2, 1/4 or 1/8 scale when that is enough
+        image = ImageOps.exif_transpose(image)
+        if image.mode in ("RGBA", "LA", "P"):
+            image = image.convert("RGBA")
+            background = Image.new("RGBA", image.size, (255, 255, 255, 255))
+            image = Image.alpha_composite(background, image)
+        image = image.convert("RGB")
+    except (UnidentifiedImageError, OSError, SyntaxError, Image.DecompressionBombError) as exc:
+        raise InvalidImage(str(exc)) from exc
+
+    square = ImageOps.fit(image, (largest, largest), Image.Resampling.LANCZOS)
+    thumbnails = {}
+    for size in sorted(sizes, reverse=True):
+        resized = square if size == largest else square.resize((size, size), Image.Resampling.LANCZOS)
+        for ext, options in ENCODINGS.items():
+            out = io.BytesIO()
+            resized.save(out, **options)
+            thumbnails[(size, ext)] = out.getvalue()
+    return thumbnails
+
+
+def _write_atomic(path: str, blob: bytes) -> None:
+    directory = os.path.dirname(path)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as handle:
+            handle.write(blob)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def store_avatar(data: bytes, directory: Optional[str] = None) -> str:
+    """Thumbnails of `data` on disk, made only if missing; returns the upload's digest."""
+    directory = directory or AVATAR_DIR
+    digest = hashlib.sha256(data).hexdigest()
+    paths = {
+        (size, ext): os.path.join(directory, avatar_filename(digest, size, ext))
+        for size in AVATAR_SIZES for ext in ENCODINGS
+    }
+    if all(os.path.exists(path) for path in paths.values()):
+        return digest
+    os.makedirs(directory, exist_ok=True)
+    for key, blob in make_thumbnails(data).items():
+        _write_atomic(paths[key], blob)
+    return digest
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=AVATAR_WORKERS, thread_name_prefix="avatar")
+        return _executor
+
+
+async def process_avatar(data: bytes) -> str:
+    """store_avatar in the avatar pool."""
+    return await asyncio.get_running_loop().run_in_executor(_pool(), store_avatar, data)
+
+
+def shutdown_pool() -> None:
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
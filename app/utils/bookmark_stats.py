@@ -0,0 +1,116 @@
+"""
+Per-user bookmark summary.
+
+Each upload rewrites one BookmarkStats row per user: count, bounding box,
+upload time and a fingerprint of the bookmarks that does not depend on
+their order. /check-bookmarks and /bookmark-stats then cost a primary-key
+lookup, however many bookmarks the user has. Users without a row (tables
+made by DB_CREATE_ALL, or no upload yet) fall back to an EXISTS query or
+one aggregate.
+
+Lookups are also kept in the shared cache (app.utils.cache, namespace
+"bookmark_stats") for STATS_CACHE_TTL_S seconds. An upload deletes the
+entry once it has committed (deleting it earlier would let a concurrent
+lookup cache the old row again); with a per-process backend other
+workers see the new numbers at most that much later. Cached uploaded_at
+values come back as ISO strings.
+"""
+import hashlib
+import os
+from datetime import datetime
+from typing import Dict, Optional, Sequence
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.models.bookmark import Bookmark
+from app.models.bookmark_stats import BookmarkStats
+from app.models.place import Place
+from app.utils.cache import get_cache
+
+STATS_CACHE_TTL_S = float(os.getenv("STATS_CACHE_TTL_S", "5"))
+CACHE_NAMESPACE = "bookmark_stats"
+
+
+def bookmark_fingerprint(bookmarks: Sequence[Bookmark]) -> str:
+    """sha256 over each bookmark's link, title, address and position, sorted."""
+    lines = sorted(
+        f"{b.google_maps_url or ''}\t{b.title}\t{b.address}\t{b.latitude!r}\t{b.longitude!r}" for b in bookmarks
+    )
+    return hashlib.sha256("\n".join(lines).encode("utf-8")).hexdigest()
+
+
+def _as_dict(row: BookmarkStats) -> Dict:
+    return {
+        "count": row.count,
+        "bounds": None if row.south is None else {
+            "south": row.south, "west": row.west, "north": row.north, "east": row.east,
+        },
+        "fingerprint": row.fingerprint,
+        "uploaded_at": row.uploaded_at,
+    }
+
+
+def _cached(user_id: int) -> Optional[Dict]:
+    return get_cache().get(CACHE_NAMESPACE, str(user_id))
+
+
+def _remember(user_id: int, stats: Dict) -> Dict:
+    get_cache().set(CACHE_NAMESPACE, str(user_id), stats, STATS_CACHE_TTL_S)
+    return stats
+
+
+def forget(user_id: Optional[int] = None) -> None:
+    """Drop the cached stats of one user, or of everyone."""
+    if user_id is None:
+        get_cache().invalidate(CACHE_NAMESPACE)
+    else:
+        get_cache().delete(CACHE_NAMESPACE, str(user_id))
+
+
+def refresh_stats(db: Session, user_id: int, bookmarks: Sequence[Bookmark]) -> BookmarkStats:
+    """
+    Rewrite the user's stats from `bookmarks`, all of the user's bookmarks
+    after an upload. The caller commits, then calls forget(user_id).
+    """
+    located = [b for b in bookmarks if b.latitude is not None and b.longitude is not None]
+    row = db.get(BookmarkStats, user_id) or BookmarkStats(user_id=user_id)
+    row.count = len(bookmarks)
+    row.south = min((b.latitude for b in located), default=None)
+    row.north = max((b.latitude for b in located), default=None)
+    row.west = min((b.longitude for b in located), default=None)
+    row.east = max((b.longitude for b in located), default=None)
+    row.fingerprint = bookmark_fingerprint(bookmarks)
+    row.uploaded_at = datetime.utcnow()
+    db.add(row)
+    return row
+
+
+def get_stats(db: Session, user_id: int) -> Dict:
+    """count, bounds (south/west/north/east or None), fingerprint and uploaded_at of the user's bookmarks."""
+    stats = _cached(user_id)
+    if stats is not None:
+        return stats
+    row = db.get(BookmarkStats, user_id)
+    if row is not None:
+        return _remember(user_id, _as_dict(row))
+    count, south, west, north, east = db.query(
+        func.count(Bookmark.id), func.min(Place.latitude), func.min(Place.longitude),
+        func.max(Place.latitude), func.max(Place.longitude),
+    ).join(Bookmark.place).filter(Bookmark.user_id == user_id).one()
+    return _remember(user_id, {
+        "count": count,
+        "bounds": None if south is None else {"south": south, "west": west, "north": north, "east": east},
+        "fingerprint": None,
+        "uploaded_at": None,
+    })
+
+
+def has_bookmarks(db: Session, user_id: int) -> bool:
+    stats = _cached(user_id)
+    if stats is not None:
+        return stats["count"] > 0
+    row = db.get(BookmarkStats, user_id)
+    if row is not None:
+        return _remember(user_id, _as_dict(row))["count"] > 0
+    return db.query(db.query(Bookmark.id).filter(Bookmark.user_id == user_id).exists()).scalar()
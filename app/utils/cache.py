@@ -0,0 +1,503 @@
+"""
+Shared cache.
+
+`get_cache()` returns the process-wide Cache. Its backend comes from
+CACHE_URL:
+
+- memory:// (default): an LRU in this process (CACHE_MEMORY_ENTRIES).
+  Fine for one worker; with several, each keeps its own copy.
+- sql:// uses the app's database, sqlite:///... or postgresql://... another
+  one: rows in the cache_entries table, shared by every worker that can
+  reach it.
+- redis://[:password@]host:port/db: any server speaking the Redis protocol
+  (Redis, Valkey, KeyDB, or a local stand-in in tests). The client is a
+  small RESP implementation with a connection pool, so no extra package is
+  needed.
+
+Keys live in namespaces ("geocode", "yelp", "users", ...). A namespace can
+be dropped as a whole with `invalidate(namespace)`. Values are stored as
+JSON, so they must be JSON-serializable (tuples come back as lists). TTLs
+are in seconds; None keeps an entry until it is evicted or invalidated.
+
+`get_or_set` fills a missing key once, however many callers ask for it
+at the same time (stampede protection). Within a process the other callers
+wait on the first one. Across workers a short-lived lock key (`add`, i.e.
+set-if-absent) elects one filler and the others poll for its result for
+up to CACHE_LOCK_WAIT_S before giving up and computing it themselves.
+
+The cache never fails a request: a backend error is logged and counted
+(cache_errors_total) and the call behaves like a miss. Hits and misses are
+counted per namespace in cache_requests_total.
+"""
+import hashlib
+import logging
+import os
+import socket
+import threading
+import time
+from collections import OrderedDict
+from queue import Empty, LifoQueue
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
+from urllib.parse import unquote, urlsplit
+
+import orjson
+
+from app.utils.metrics import CACHE_COALESCED, CACHE_ERRORS, record_cache_access
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+CACHE_URL = os.getenv("CACHE_URL", "memory://")
+CACHE_PREFIX = os.getenv("CACHE_PREFIX", "")
+CACHE_MEMORY_ENTRIES = int(os.getenv("CACHE_MEMORY_ENTRIES", "10000"))
+CACHE_LOCK_TTL_S = float(os.getenv("CACHE_LOCK_TTL_S", "30"))
+CACHE_LOCK_WAIT_S = float(os.getenv("CACHE_LOCK_WAIT_S", "10"))
+LOCK_POLL_S = 0.05
+MAX_KEY_LENGTH = 200  # longer keys (prompts, query strings) are hashed
+
+_MISSING = object()
+
+
+class CacheBackend:
+    """Byte storage with expiry. Keys already carry the namespace."""
+
+    name = "backend"
+
+    def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: bytes, ttl: Optional[float]) -> None:
+        raise NotImplementedError
+
+    def add(self, key: str, value: bytes, ttl: Optional[float]) -> bool:
+        """Store only if the key is absent (or expired); True if stored."""
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def clear(self, prefix: str) -> None:
+        """Delete every key starting with `prefix`."""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class MemoryBackend(CacheBackend):
+    name = "memory"
+
+    def __init__(self, max_entries: int = CACHE_MEMORY_ENTRIES, clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.clock = clock
+        self._entries: "OrderedDict[str, Tuple[Optional[float], bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _live(self, key: str) -> Optional[Tuple[Optional[float], bytes]]:
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] is not None and entry[0] <= self.clock():
+            del self._entries[key]
+            return None
+        return entry
+
+    def _store(self, key: str, value: bytes, ttl: Optional[float]) -> None:
+        self._entries[key] = (None if ttl is None else self.clock() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._live(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._store(key, value, ttl)
+
+    def add(self, key, value, ttl):
+        with self._lock:
+            if self._live(key) is not None:
+                return False
+            self._store(key, value, ttl)
+            return True
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self, prefix):
+        with self._lock:
+            for key in [key for key in self._entries if key.startswith(prefix)]:
+                del self._entries[key]
+
+
+class SQLBackend(CacheBackend):
+    """cache_entries rows (app.models.cache_entry); expired rows are purged every PURGE_EVERY writes."""
+
+    name = "sql"
+    PURGE_EVERY = 256
+
+    def __init__(self, engine=None, clock: Callable[[], float] = time.time):
+        if engine is None:
+            from app.database import engine
+        from app.models.cache_entry import CacheEntry
+        self.engine = engine
+        self.table = CacheEntry.__table__
+        self.clock = clock
+        self._writes = 0
+        if engine.dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        self._insert = insert
+
+    def _expires(self, ttl: Optional[float]) -> Optional[float]:
+        return None if ttl is None else self.clock() + ttl
+
+    def _maybe_purge(self, conn) -> None:
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            conn.execute(self.table.delete().where(self.table.c.expires_at < self.clock()))
+
+    def get(self, key):
+        from sqlalchemy import select
+        with self.engine.connect() as conn:
+            row = conn.execute(
+                select(self.table.c.value, self.table.c.expires_at).where(self.table.c.key == key)
+            ).first()
+        if row is None or (row.expires_at is not None and row.expires_at <= self.clock()):
+            return None
+        return row.value
+
+    def set(self, key, value, ttl):
+        statement = self._insert(self.table).values(key=key, value=value, expires_at=self._expires(ttl))
+        statement = statement.on_conflict_do_update(
+            index_elements=[self.table.c.key],
+            set_={"value": statement.excluded.value, "expires_at": statement.excluded.expires_at},
+        )
+        with self.engine.begin() as conn:
+            conn.execute(statement)
+            self._maybe_purge(conn)
+
+    def add(self, key, value, ttl):
+        c = self.table.c
+        with self.engine.begin() as conn:
+            conn.execute(self.table.delete().where(c.key == key, c.expires_at <= self.clock()))
+            result = conn.execute(
+                self._insert(self.table).values(key=key, value=value, expires_at=self._expires(ttl))
+                .on_conflict_do_nothing(index_elements=[c.key])
+            )
+            return result.rowcount == 1
+
+    def delete(self, key):
+        with self.engine.begin() as conn:
+            conn.execute(self.table.delete().where(self.table.c.key == key))
+
+    def clear(self, prefix):
+        escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        with self.engine.begin() as conn:
+            conn.execute(self.table.delete().where(self.table.c.key.like(escaped + "%", escape="\\")))
+
+
+class RedisError(Exception):
+    pass
+
+
+class RedisClient:
+    """Minimal RESP2 client: one command at a time per pooled connection."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 6379, db: int = 0, password: Optional[str] = None,
+                 timeout: float = 0.5, max_connections: int = 16):
+        self.host, self.port, self.db, self.password = host, port, db, password
+        self.timeout = timeout
+        self._pool: "LifoQueue" = LifoQueue(maxsize=max_connections)
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> "RedisClient":
+        parts = urlsplit(url)
+        db = parts.path.lstrip("/")
+        return cls(parts.hostname or "127.0.0.1", parts.port or 6379, int(db) if db else 0,
+                   unquote(parts.password) if parts.password else None, **kwargs)
+
+    @staticmethod
+    def _encode(args) -> bytes:
+        out = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode()
+            out.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        return b"".join(out)
+
+    @classmethod
+    def _read(cls, reader):
+        line = reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("connection closed by the server")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            raise RedisError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            return None if length < 0 else reader.read(length + 2)[:-2]
+        if kind == b"*":
+            length = int(rest)
+            return None if length < 0 else [cls._read(reader) for _ in range(length)]
+        raise RedisError(f"unexpected reply {line[:20]!r}")
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        connection = (sock, sock.makefile("rb"))
+        if self.password:
+            self._roundtrip(connection, ("AUTH", self.password))
+        if self.db:
+            self._roundtrip(connection, ("SELECT", self.db))
+        return connection
+
+    def _roundtrip(self, connection, args):
+        sock, reader = connection
+        sock.sendall(self._encode(args))
+        return self._read(reader)
+
+    def execute(self, *args):
+        try:
+            connection = self._pool.get_nowait()
+        except Empty:
+            connection = self._connect()
+        try:
+            reply = self._roundtrip(connection, args)
+        except RedisError:
+            self._release(connection)
+            raise
+        except BaseException:
+            self._discard(connection)
+            raise
+        self._release(connection)
+        return reply
+
+    def _release(self, connection) -> None:
+        try:
+            self._pool.put_nowait(connection)
+        except Exception:
+            self._discard(connection)
+
+    @staticmethod
+    def _discard(connection) -> None:
+        sock, reader = connection
+        reader.close()
+        sock.close()
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._discard(self._pool.get_nowait())
+            except Empty:
+                return
+
+
+def _glob_escape(text: str) -> str:
+    return "".join("\\" + ch if ch in "*?[]\\" else ch for ch in text)
+
+
+class RedisBackend(CacheBackend):
+    name = "redis"
+
+    def __init__(self, client: RedisClient):
+        self.client = client
+
+    @staticmethod
+    def _expiry(ttl: Optional[float]) -> list:
+        return [] if ttl is None else ["PX", max(1, int(ttl * 1000))]
+
+    def get(self, key):
+        return self.client.execute("GET", key)
+
+    def set(self, key, value, ttl):
+        self.client.execute("SET", key, value, *self._expiry(ttl))
+
+    def add(self, key, value, ttl):
+        return self.client.execute("SET", key, value, *self._expiry(ttl), "NX") is not None
+
+    def delete(self, key):
+        self.client.execute("DEL", key)
+
+    def clear(self, prefix):
+        cursor = b"0"
+        pattern = _glob_escape(prefix) + "*"
+        while True:
+            cursor, keys = self.client.execute("SCAN", cursor, "MATCH", pattern, "COUNT", 500)
+            if keys:
+                self.client.execute("DEL", *keys)
+            if cursor in (b"0", "0", 0):
+                return
+
+    def close(self):
+        self.client.close()
+
+
+def backend_from_url(url: str) -> CacheBackend:
+    scheme = url.split(":", 1)[0].lower()
+    if scheme == "memory":
+        return MemoryBackend()
+    if scheme in ("redis", "rediss"):
+        if scheme == "rediss":
+            raise ValueError("CACHE_URL: TLS (rediss://) is not supported; use a local TLS proxy")
+        return RedisBackend(RedisClient.from_url(url))
+    if scheme == "sql":
+        return SQLBackend()
+    if scheme.startswith(("sqlite", "postgresql")):
+        from sqlalchemy import create_engine
+        return SQLBackend(create_engine(url, pool_pre_ping=True))
+    raise ValueError(f"CACHE_URL: unknown cache backend {url!r}")
+
+
+class Cache:
+    def __init__(self, backend: CacheBackend, prefix: str = CACHE_PREFIX,
+                 lock_ttl_s: float = CACHE_LOCK_TTL_S, lock_wait_s: float = CACHE_LOCK_WAIT_S):
+        self.backend = backend
+        self.prefix = prefix
+        self.lock_ttl_s = lock_ttl_s
+        self.lock_wait_s = lock_wait_s
+        self._flights: Dict[str, threading.Event] = {}
+        self._flights_lock = threading.Lock()
+
+    def key(self, namespace: str, key: str) -> str:
+        if len(key) > MAX_KEY_LENGTH:
+            key = "sha256:" + hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return f"{self.prefix}{namespace}:{key}"
+
+    def _backend_call(self, operation: str, fn: Callable[[], T], fallback: T) -> T:
+        try:
+            return fn()
+        except Exception as exc:
+            CACHE_ERRORS.labels(self.backend.name, operation).inc()
+            logger.warning("Cache %s %s failed: %s", self.backend.name, operation, exc)
+            return fallback
+
+    def _lookup(self, full_key: str) -> Any:
+        raw = self._backend_call("get", lambda: self.backend.get(full_key), None)
+        if raw is None:
+            return _MISSING
+        try:
+            return orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            return _MISSING
+
+    def get(self, namespace: str, key: str, default: Any = None) -> Any:
+        value = self._lookup(self.key(namespace, key))
+        record_cache_access(namespace, value is not _MISSING)
+        return default if value is _MISSING else value
+
+    def _store(self, full_key: str, value: Any, ttl: Optional[float]) -> None:
+        raw = orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+        self._backend_call("set", lambda: self.backend.set(full_key, raw, ttl), None)
+
+    def set(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        self._store(self.key(namespace, key), value, ttl)
+
+    def add(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        """Store only if absent; True if stored, and also when the backend fails (callers go ahead)."""
+        full_key = self.key(namespace, key)
+        raw = orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+        return self._backend_call("add", lambda: self.backend.add(full_key, raw, ttl), True)
+
+    def delete(self, namespace: str, key: str) -> None:
+        full_key = self.key(namespace, key)
+        self._backend_call("delete", lambda: self.backend.delete(full_key), None)
+
+    def invalidate(self, namespace: str) -> None:
+        """Drop every key of `namespace`."""
+        prefix = f"{self.prefix}{namespace}:"
+        self._backend_call("clear", lambda: self.backend.clear(prefix), None)
+
+    def _wait_for_fill(self, full_key: str) -> Any:
+        deadline = time.monotonic() + self.lock_wait_s
+        while time.monotonic() < deadline:
+            time.sleep(LOCK_POLL_S)
+            value = self._lookup(full_key)
+            if value is not _MISSING:
+                return value
+        return _MISSING
+
+    def get_or_set(self, namespace: str, key: str, producer: Callable[[], T], ttl: Optional[float] = None) -> T:
+        """The cached value, or `producer()` stored for `ttl` seconds; concurrent misses call it once."""
+        full_key = self.key(namespace, key)
+        value = self._lookup(full_key)
+        if value is not _MISSING:
+            record_cache_access(namespace, True)
+            return value
+        record_cache_access(namespace, False)
+
+        with self._flights_lock:
+            flight = self._flights.get(full_key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[full_key] = threading.Event()
+        if not leader:
+            flight.wait(self.lock_wait_s)
+            value = self._lookup(full_key)
+            if value is not _MISSING:
+                CACHE_COALESCED.labels(namespace).inc()
+                return value
+            return self._fill(full_key, producer, ttl)
+        try:
+            lock_key = full_key + ":lock"
+            if self._backend_call("add", lambda: self.backend.add(lock_key, b"1", self.lock_ttl_s), True):
+                try:
+                    return self._fill(full_key, producer, ttl)
+                finally:
+                    self._backend_call("delete", lambda: self.backend.delete(lock_key), None)
+            value = self._wait_for_fill(full_key)  # another worker is filling it
+            if value is not _MISSING:
+                CACHE_COALESCED.labels(namespace).inc()
+                return value
+            return self._fill(full_key, producer, ttl)
+        finally:
+            with self._flights_lock:
+                self._flights.pop(full_key, None)
+            flight.set()
+
+    def _fill(self, full_key: str, producer: Callable[[], T], ttl: Optional[float]) -> T:
+        value = producer()
+        self._store(full_key, value, ttl)
+        return value
+
+    def close(self) -> None:
+        self.backend.close()
+
+
+_cache: Optional[Cache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> Cache:
+    """The process-wide cache, built from CACHE_URL on first use."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = Cache(backend_from_url(CACHE_URL))
+    return _cache
+
+
+def set_cache(cache: Optional[Cache]) -> Optional[Cache]:
+    """Replace the process-wide cache (tests, benchmarks); returns the previous one."""
+    global _cache
+    with _cache_lock:
+        previous, _cache = _cache, cache
+    return previous
+
+
+def close_cache() -> None:
+    previous = set_cache(None)
+    if previous is not None:
+        previous.close()
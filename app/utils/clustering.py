@@ -0,0 +1,318 @@
+"""
+Walkable neighbourhoods of a user's bookmarks.
+
+Bookmarks are grouped with DBSCAN: a bookmark with at least MIN_POINTS
+bookmarks (itself included) within EPS_KM is a core point, and core points
+within EPS_KM of each other share a cluster together with the bookmarks
+they reach. Lone bookmarks stay unclustered. Radius queries go through a
+grid of EPS_KM cells, so clustering is O(n) times the local density.
+
+In a dense city DBSCAN chains a whole district into one cluster, so a
+cluster wider than NEIGHBOURHOOD_KM is cut into tiles of that size and the
+tile borders are then moved to the natural gaps with a few k-means rounds
+(each bookmark only compares the centers of nearby tiles).
+
+Clusters are stored per user (BookmarkCluster) when bookmarks are uploaded
+and are used to pick the part of a city reachable from the start point.
+"""
+import math
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Sequence, Tuple
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from app.models.bookmark import Bookmark
+from app.models.bookmark_cluster import BookmarkCluster
+from app.utils.neighbors import Point, haversine_km
+
+EPS_KM = 0.6  # about 10 minutes on foot
+MIN_POINTS = 3
+NEIGHBOURHOOD_KM = 1.5  # clusters wider than this (radius) are split
+KMEANS_ROUNDS = 8
+
+KM_PER_DEGREE_LAT = 111.2
+NOISE = -1
+
+
+@dataclass
+class Cluster:
+    members: List[int]
+    latitude: float
+    longitude: float
+    radius_km: float
+    anchor_id: int  # the member closest to the middle
+
+
+class _RadiusGrid:
+    """
+    Rows of eps_km in latitude; within a row, columns of eps_km at the row's
+    poleward edge, so a cell is never narrower than eps_km.
+    """
+
+    def __init__(self, points: Dict[int, Point], eps_km: float):
+        self.points = points
+        self.eps_km = eps_km
+        self.row_deg = eps_km / KM_PER_DEGREE_LAT
+        self.cells: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+        for point_id, point in points.items():
+            self.cells[self._key(point)].append(point_id)
+
+    def _col_deg(self, row: int) -> float:
+        edge = max(abs(row), abs(row + 1)) * self.row_deg
+        return self.row_deg / max(math.cos(math.radians(min(edge, 89.0))), 0.02)
+
+    def _key(self, point: Point) -> Tuple[int, int]:
+        row = int(math.floor(point[0] / self.row_deg))
+        return row, int(math.floor(point[1] / self._col_deg(row)))
+
+    def region(self, point_id: int) -> List[int]:
+        """Ids within eps_km of the point, itself included."""
+        lat, lon = self.points[point_id]
+        row = int(math.floor(lat / self.row_deg))
+        # longitude span of eps_km at the most poleward latitude the search can reach
+        poleward = min(89.0, abs(lat) + self.row_deg)
+        lon_span = self.row_deg / max(math.cos(math.radians(poleward)), 0.02)
+        # equirectangular distance, well within 0.1% of haversine at this range
+        kx = KM_PER_DEGREE_LAT * math.cos(math.radians(lat))
+        eps2 = self.eps_km * self.eps_km
+        out = []
+        for r in (row - 1, row, row + 1):
+            width = self._col_deg(r)
+            for c in range(int(math.floor((lon - lon_span) / width)),
+                           int(math.floor((lon + lon_span) / width)) + 1):
+                for other in self.cells.get((r, c), ()):
+                    other_lat, other_lon = self.points[other]
+                    dx = (other_lon - lon) * kx
+                    dy = (other_lat - lat) * KM_PER_DEGREE_LAT
+                    if dx * dx + dy * dy <= eps2:
+                        out.append(other)
+        return out
+
+
+def dbscan(points: Dict[int, Point], eps_km: float = EPS_KM, min_points: int = MIN_POINTS) -> Dict[int, int]:
+    """Cluster label per point id, NOISE for unclustered points. Labels follow sorted ids."""
+    grid = _RadiusGrid(points, eps_km)
+    labels: Dict[int, int] = {}
+    next_label = 0
+    for point_id in sorted(points):
+        if point_id in labels:
+            continue
+        seeds = grid.region(point_id)
+        if len(seeds) < min_points:
+            labels[point_id] = NOISE  # may still become a border point of a later cluster
+            continue
+        label, next_label = next_label, next_label + 1
+        labels[point_id] = label
+        queue = [other for other in seeds if other != point_id]
+        while queue:
+            other = queue.pop()
+            if labels.get(other, NOISE) != NOISE:
+                continue
+            was_unvisited = other not in labels
+            labels[other] = label
+            if was_unvisited:
+                reach = grid.region(other)
+                if len(reach) >= min_points:
+                    queue.extend(n for n in reach if labels.get(n, NOISE) == NOISE)
+    return labels
+
+
+def _summarize(members: List[int], points: Dict[int, Point]) -> Cluster:
+    latitude = sum(points[m][0] for m in members) / len(members)
+    longitude = sum(points[m][1] for m in members) / len(members)
+    distances = {m: haversine_km((latitude, longitude), points[m]) for m in members}
+    anchor_id = min(members, key=lambda m: (distances[m], m))
+    return Cluster(sorted(members), latitude, longitude, max(distances.values()), anchor_id)
+
+
+def _split(members: List[int], points: Dict[int, Point], size_km: float) -> List[List[int]]:
+    """Tiles of size_km, then k-means rounds seeded with the tile centroids."""
+    lat0 = sum(points[m][0] for m in members) / len(members)
+    kx = KM_PER_DEGREE_LAT * math.cos(math.radians(lat0))
+    xy = {m: (points[m][1] * kx, points[m][0] * KM_PER_DEGREE_LAT) for m in members}
+
+    def tile(p):
+        return int(math.floor(p[0] / size_km)), int(math.floor(p[1] / size_km))
+
+    groups: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+    for m in members:
+        groups[tile(xy[m])].append(m)
+    pieces = [groups[key] for key in sorted(groups)]
+
+    for _ in range(KMEANS_ROUNDS):
+        centers = [
+            (sum(xy[m][0] for m in piece) / len(piece), sum(xy[m][1] for m in piece) / len(piece))
+            for piece in pieces
+        ]
+        by_tile: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+        for index, center in enumerate(centers):
+            by_tile[tile(center)].append(index)
+        nearby: Dict[Tuple[int, int], List[int]] = {}
+        assigned: List[List[int]] = [[] for _ in centers]
+        for m in members:
+            x, y = xy[m]
+            key = tile((x, y))
+            near = nearby.get(key)
+            if near is None:
+                near = sorted(
+                    i for di in (-1, 0, 1) for dj in (-1, 0, 1) for i in by_tile.get((key[0] + di, key[1] + dj), ())
+                ) or list(range(len(centers)))
+                nearby[key] = near
+            best, best_d2 = near[0], math.inf
+            for i in near:
+                cx, cy = centers[i]
+                d2 = (x - cx) * (x - cx) + (y - cy) * (y - cy)
+                if d2 < best_d2:
+                    best, best_d2 = i, d2
+            assigned[best].append(m)
+        assigned = [piece for piece in assigned if piece]
+        if assigned == pieces:
+            break
+        pieces = assigned
+    return pieces
+
+
+def cluster_points(points: Dict[int, Point], eps_km: float = EPS_KM, min_points: int = MIN_POINTS,
+                   neighbourhood_km: float = NEIGHBOURHOOD_KM) -> List[Cluster]:
+    """Walkable clusters of the points, largest first."""
+    by_label: Dict[int, List[int]] = defaultdict(list)
+    for point_id, label in dbscan(points, eps_km, min_points).items():
+        if label != NOISE:
+            by_label[label].append(point_id)
+    clusters = []
+    for label in sorted(by_label):
+        cluster = _summarize(by_label[label], points)
+        if cluster.radius_km <= neighbourhood_km:
+            clusters.append(cluster)
+        else:
+            clusters.extend(_summarize(piece, points) for piece in _split(by_label[label], points, neighbourhood_km))
+    clusters.sort(key=lambda c: (-len(c.members), c.members[0]))
+    return clusters
+
+
+def refresh_clusters(db: Session, user_id: int, bookmarks: Sequence[Bookmark]) -> List[BookmarkCluster]:
+    """
+    Recompute and store the user's clusters and every bookmark's cluster_id.
+    `bookmarks` are all of the user's bookmarks. The caller commits.
+    """
+    points = {b.id: (b.latitude, b.longitude) for b in bookmarks if b.latitude is not None and b.longitude is not None}
+    titles = {b.id: b.title for b in bookmarks}
+    clusters = cluster_points(points)
+
+    # "fetch" removes the deleted rows from the session, so new rows may reuse their ids
+    db.query(BookmarkCluster).filter(BookmarkCluster.user_id == user_id).delete(synchronize_session="fetch")
+    rows = [
+        BookmarkCluster(
+            user_id=user_id,
+            size=len(cluster.members),
+            latitude=cluster.latitude,
+            longitude=cluster.longitude,
+            radius_m=int(round(cluster.radius_km * 1000)),
+            anchor_bookmark_id=cluster.anchor_id,
+            name=titles.get(cluster.anchor_id),
+        )
+        for cluster in clusters
+    ]
+    db.add_all(rows)
+    db.flush()
+
+    assignment = {member: row.id for cluster, row in zip(clusters, rows) for member in cluster.members}
+    updates = [
+        {"id": b.id, "cluster_id": assignment.get(b.id)}
+        for b in bookmarks
+        if b.cluster_id != assignment.get(b.id)
+    ]
+    if updates:
+        db.execute(update(Bookmark), updates)
+    return rows
+
+
+def reach_km(max_commute_min: float, speed_kmh: float, detour_factor: float) -> float:
+    """Straight-line distance covered by one commute leg."""
+    return max_commute_min / 60.0 * speed_kmh / detour_factor
+
+
+def select_clusters(clusters: Sequence[BookmarkCluster], center: Point, reach: float,
+                    max_bookmarks: int) -> List[BookmarkCluster]:
+    """
+    The clusters whose edge is within one commute leg (`reach` km) of the
+    center, nearest first, until they hold max_bookmarks bookmarks. If none
+    is that close, the nearest cluster.
+    """
+    by_distance = sorted(
+        clusters,
+        key=lambda c: (haversine_km(center, (c.latitude, c.longitude)) - c.radius_m / 1000.0, c.id),
+    )
+    chosen: List[BookmarkCluster] = []
+    total = 0
+    for cluster in by_distance:
+        edge_km = haversine_km(center, (cluster.latitude, cluster.longitude)) - cluster.radius_m / 1000.0
+        if edge_km > reach or total >= max_bookmarks:
+            break
+        chosen.append(cluster)
+        total += cluster.size
+    return chosen or by_distance[:1]
+
+
+def partition_days(bookmarks: Sequence[Bookmark], days: int, center: Point) -> List[List[Bookmark]]:
+    """
+    Split bookmarks into at most `days` groups of nearby places for a
+    multi-day trip, keeping each stored cluster whole. Clusters and
+    unclustered bookmarks are grouped with size-weighted k-means (seeded
+    deterministically, k-means++ style). Groups come nearest to `center`
+    first; there are fewer groups than days when there are fewer places.
+    """
+    members: Dict[object, List[Bookmark]] = defaultdict(list)
+    for b in bookmarks:
+        members[("cluster", b.cluster_id) if b.cluster_id is not None else ("bookmark", b.id)].append(b)
+    units = [members[key] for key in sorted(members, key=lambda key: (key[0], key[1]))]
+    if not units or days < 1:
+        return []
+
+    lat0 = sum(b.latitude for b in bookmarks) / len(bookmarks)
+    kx = KM_PER_DEGREE_LAT * math.cos(math.radians(lat0))
+    xy = [
+        (sum(b.longitude for b in unit) / len(unit) * kx, sum(b.latitude for b in unit) / len(unit) * KM_PER_DEGREE_LAT)
+        for unit in units
+    ]
+    weights = [len(unit) for unit in units]
+
+    def d2(a, b):
+        return (a[0] - b[0]) ** 2 + (a[1] - b[1]) ** 2
+
+    # seeds: the heaviest unit, then the unit with the largest weight * squared distance to the seeds
+    seeds = [max(range(len(units)), key=lambda i: (weights[i], -i))]
+    while len(seeds) < min(days, len(units)):
+        score = [weights[i] * min(d2(xy[i], xy[s]) for s in seeds) for i in range(len(units))]
+        seeds.append(max(range(len(units)), key=lambda i: (score[i], -i)))
+    centers = [xy[s] for s in seeds]
+
+    groups: List[List[int]] = []
+    for _ in range(KMEANS_ROUNDS):
+        assigned: List[List[int]] = [[] for _ in centers]
+        for i, point in enumerate(xy):
+            assigned[min(range(len(centers)), key=lambda c: (d2(point, centers[c]), c))].append(i)
+        assigned = [group for group in assigned if group]
+        if assigned == groups:
+            break
+        groups = assigned
+        centers = [
+            (
+                sum(xy[i][0] * weights[i] for i in group) / sum(weights[i] for i in group),
+                sum(xy[i][1] * weights[i] for i in group) / sum(weights[i] for i in group),
+            )
+            for group in groups
+        ]
+
+    center_xy = (center[1] * kx, center[0] * KM_PER_DEGREE_LAT)
+    order = sorted(range(len(groups)), key=lambda g: (d2(centers[g], center_xy), g))
+    return [[b for i in groups[g] for b in units[i]] for g in order]
+
+
+def anchor_bookmark(bookmarks: Sequence[Bookmark]) -> Bookmark:
+    """The bookmark closest to the middle of a group."""
+    latitude = sum(b.latitude for b in bookmarks) / len(bookmarks)
+    longitude = sum(b.longitude for b in bookmarks) / len(bookmarks)
+    return min(bookmarks, key=lambda b: (haversine_km((latitude, longitude), (b.latitude, b.longitude)), b.id))
@@ -0,0 +1,78 @@
+"""
+Response compression.
+
+CompressionMiddleware negotiates Brotli or gzip from Accept-Encoding
+(honouring q=0) and compresses responses of at least COMPRESS_MIN_BYTES.
+Smaller bodies are sent as they are: the saving would not pay for the
+CPU. Brotli is preferred when the `brotli` package is installed; quality
+4 is about as fast as gzip level 6 and still noticeably smaller on JSON.
+
+Streaming responses (the NDJSON trip stream) are flushed chunk by chunk,
+so compression does not hold back the first day. Bodies that are already
+encoded (precompressed static files) and images are passed through. The
+work for large bodies runs in a worker thread, as Starlette's gzip does.
+"""
+import os
+from typing import Optional
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import DEFAULT_EXCLUDED_CONTENT_TYPES, GZipResponder, IdentityResponder
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.utils.static_files import accepted_encodings
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+THREAD_MIN_BYTES = 128 * 1024
+
+
+class BrotliResponder(IdentityResponder):
+    content_encoding = "br"
+
+    def __init__(self, app: ASGIApp, minimum_size: int, quality: int = BROTLI_QUALITY, **kwargs):
+        super().__init__(app, minimum_size, **kwargs)
+        self.quality = quality
+        self._compressor: Optional["brotli.Compressor"] = None
+
+    def _compress_body(self, body: bytes, more_body: bool) -> bytes:
+        if self._compressor is None:
+            self._compressor = brotli.Compressor(quality=self.quality)
+        compressed = self._compressor.process(body)
+        return compressed + (self._compressor.flush() if more_body else self._compressor.finish())
+
+    async def apply_compression(self, body: bytes, *, more_body: bool) -> bytes:
+        if len(body) >= THREAD_MIN_BYTES:
+            return await anyio.to_thread.run_sync(self._compress_body, body, more_body)
+        return self._compress_body(body, more_body)
+
+
+class CompressionMiddleware:
+    def __init__(self, app: ASGIApp, minimum_size: int = COMPRESS_MIN_BYTES, gzip_level: int = GZIP_LEVEL,
+                 brotli_quality: int = BROTLI_QUALITY, exclude_content_types=DEFAULT_EXCLUDED_CONTENT_TYPES):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.exclude_content_types = exclude_content_types
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encodings = accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+        options = {"exclude_content_types": self.exclude_content_types}
+        if "br" in encodings and brotli is not None:
+            responder = BrotliResponder(self.app, self.minimum_size, self.brotli_quality, **options)
+        elif "gzip" in encodings:
+            responder = GZipResponder(self.app, self.minimum_size, self.gzip_level,
+                                      thread_minimum_size=THREAD_MIN_BYTES, **options)
+        else:
+            responder = IdentityResponder(self.app, self.minimum_size, **options)
+        await responder(scope, receive, send)
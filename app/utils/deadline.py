@@ -0,0 +1,221 @@
+"""
+Request deadlines and cancellation.
+
+DeadlineMiddleware gives every HTTP request a Deadline: the client's
+`X-Request-Timeout` header (seconds, capped at REQUEST_TIMEOUT_MAX_S) or
+REQUEST_TIMEOUT_S. The deadline is cancelled early when the client
+disconnects before the response is complete.
+
+Work below the endpoint finds the deadline through a context variable
+(sync endpoints run in the threadpool with a copy of the request context,
+so they share the same object):
+
+- outbound calls cap their timeouts and retries at the time left and are
+  refused once the request is cancelled (app.utils.outbound),
+- session flushes (and so commits) are refused once it is cancelled, so
+  nothing is written for a client that has gone,
+- awaits in async endpoints are cancelled directly.
+
+A refused step raises RequestCancelled. It derives from BaseException,
+like asyncio.CancelledError, so the endpoints' `except Exception` fallbacks
+do not turn it into a 500. The middleware answers 504 when the deadline
+passed before a response started, and nothing when the client is gone.
+Cancelled requests and the time spent on them are counted
+(requests_cancelled_total, cancelled_work_seconds_total).
+
+Disconnects are noticed once the endpoint has read the request body,
+which covers every POST with a JSON body; bodiless requests only get the
+deadline.
+"""
+import logging
+import math
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+import anyio
+import orjson
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.utils.metrics import CANCELLED_WORK, REQUESTS_CANCELLED, UNMATCHED_ROUTE
+
+logger = logging.getLogger(__name__)
+
+# long enough for a multi-day trip stream; clients wanting less send X-Request-Timeout
+REQUEST_TIMEOUT_S = float(os.getenv("REQUEST_TIMEOUT_S", "180"))
+REQUEST_TIMEOUT_MAX_S = float(os.getenv("REQUEST_TIMEOUT_MAX_S", "600"))
+TIMEOUT_HEADER = "x-request-timeout"
+
+DEADLINE = "deadline"
+DISCONNECT = "disconnect"
+
+
+class RequestCancelled(BaseException):
+    """The request's deadline passed or its client disconnected; stop working on it."""
+
+    def __init__(self, reason: str, stage: str):
+        super().__init__(f"request cancelled ({reason}) before {stage}")
+        self.reason = reason
+        self.stage = stage
+
+
+class Deadline:
+    __slots__ = ("expires_at", "reason", "_cancelled")
+
+    def __init__(self, timeout_s: float):
+        self.expires_at = time.monotonic() + timeout_s
+        self.reason: Optional[str] = None
+        self._cancelled = threading.Event()
+
+    def remaining(self) -> float:
+        return 0.0 if self.reason is not None else max(0.0, self.expires_at - time.monotonic())
+
+    def cancel(self, reason: str) -> None:
+        if self.reason is None:
+            self.reason = reason
+            self._cancelled.set()
+
+    def cancelled_reason(self) -> Optional[str]:
+        if self.reason is None and time.monotonic() >= self.expires_at:
+            return DEADLINE
+        return self.reason
+
+    def check(self, stage: str) -> None:
+        reason = self.cancelled_reason()
+        if reason is not None:
+            raise RequestCancelled(reason, stage)
+
+    def wait(self, seconds: float) -> None:
+        """Sleep up to `seconds`, waking early if the request is cancelled."""
+        self._cancelled.wait(min(seconds, max(0.0, self.expires_at - time.monotonic())))
+
+
+_current: ContextVar[Optional[Deadline]] = ContextVar("request_deadline", default=None)
+
+
+def current() -> Optional[Deadline]:
+    return _current.get()
+
+
+def check(stage: str) -> None:
+    """Raise RequestCancelled if the current request is past its deadline or cancelled."""
+    deadline = _current.get()
+    if deadline is not None:
+        deadline.check(stage)
+
+
+def bounded(timeout_s: float) -> float:
+    """`timeout_s`, or the time the current request has left if that is shorter."""
+    deadline = _current.get()
+    return timeout_s if deadline is None else max(0.001, min(timeout_s, deadline.remaining()))
+
+
+def requested_timeout(headers: Headers) -> float:
+    raw = headers.get(TIMEOUT_HEADER)
+    if raw is not None:
+        try:
+            value = float(raw)
+        except ValueError:
+            value = math.nan
+        if value > 0:  # also false for nan
+            return min(value, REQUEST_TIMEOUT_MAX_S)
+    return REQUEST_TIMEOUT_S
+
+
+# before any SQL of the flush runs, so the session and its connection stay usable
+@event.listens_for(Session, "before_flush")
+def _refuse_cancelled_writes(session, flush_context, instances):
+    check("db")
+
+
+class DeadlineMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        deadline = Deadline(requested_timeout(Headers(scope=scope)))
+        token = _current.set(deadline)
+        started = time.perf_counter()
+        response_started = False
+        response_complete = False
+        disconnected = anyio.Event()
+        watching = False
+        error: Optional[BaseException] = None
+        stopped = False
+        app_scope = anyio.CancelScope(deadline=anyio.current_time() + deadline.remaining())
+
+        async def watch_disconnect() -> None:
+            while True:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    if not response_complete:
+                        deadline.cancel(DISCONNECT)
+                        app_scope.cancel()
+                    disconnected.set()
+                    return
+
+        async def receive_watched() -> Message:
+            nonlocal watching
+            if watching:
+                await disconnected.wait()
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                if not response_complete:
+                    deadline.cancel(DISCONNECT)
+                disconnected.set()
+                watching = True
+            elif not message.get("more_body", False):
+                # the body is read; from here on a receive() can only be the disconnect
+                watching = True
+                task_group.start_soon(watch_disconnect)
+            return message
+
+        async def send_tracked(message: Message) -> None:
+            nonlocal response_started, response_complete
+            if message["type"] == "http.response.start":
+                response_started = True
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                response_complete = True
+            await send(message)
+
+        try:
+            async with anyio.create_task_group() as task_group:
+                try:
+                    with app_scope:
+                        await self.app(scope, receive_watched, send_tracked)
+                except RequestCancelled:
+                    stopped = True
+                except BaseException as exc:  # re-raised below: the task group would wrap it in an ExceptionGroup
+                    error = exc
+                task_group.cancel_scope.cancel()
+        finally:
+            _current.reset(token)
+        if error is not None:
+            raise error
+
+        if not (stopped or app_scope.cancelled_caught):
+            return
+        reason = deadline.cancelled_reason() or DEADLINE
+        route = getattr(scope.get("route"), "path", None) or UNMATCHED_ROUTE
+        REQUESTS_CANCELLED.labels(route, reason).inc()
+        CANCELLED_WORK.labels(route, reason).inc(time.perf_counter() - started)
+        logger.info("Stopped %s %s after %.1fs (%s)", scope["method"], scope["path"],
+                    time.perf_counter() - started, reason)
+        if reason == DEADLINE and not response_started:
+            body = orjson.dumps({"detail": "Request deadline exceeded"})
+            await send({
+                "type": "http.response.start",
+                "status": 504,
+                "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+            })
+            await send({"type": "http.response.body", "body": body})
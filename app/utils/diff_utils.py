@@ -1,12 +1,27 @@
+import bisect
 import difflib
-from typing import Optional, List
+import logging
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Set, Tuple
 
-from unidiff import PatchSet
+logger = logging.getLogger(__name__)
+
+# Strategies reported by apply_diff_with_report, from most to least trustworthy.
+STRATEGY_EXACT = "exact"              # every hunk matched at the line numbers in its header
+STRATEGY_OFFSET = "offset"            # hunks matched verbatim, but at other line numbers
+STRATEGY_FUZZY = "fuzzy"              # needed trimmed context and/or whitespace-insensitive matching
+STRATEGY_LINE_BY_LINE = "line_by_line"  # hunks could not be anchored; lines applied one by one
+STRATEGY_ADDED_ONLY = "added_only"    # diff unusable; the added lines are taken as the new plan
+STRATEGIES = (STRATEGY_EXACT, STRATEGY_OFFSET, STRATEGY_FUZZY, STRATEGY_LINE_BY_LINE, STRATEGY_ADDED_ONLY)
+
+# Like GNU patch's --fuzz: how many leading/trailing context lines a hunk may ignore.
+MAX_FUZZ = 2
 
 
 def generate_diff(original_text: str, modified_text: str) -> str:
-    original_lines = original_text.splitlines(keepends=True)
-    modified_lines = modified_text.splitlines(keepends=True)
+    # lineterm="" expects lines without their endings; keeping them doubled every newline
+    original_lines = original_text.splitlines()
+    modified_lines = modified_text.splitlines()
 
     diff = difflib.unified_diff(
         original_lines,
@@ -18,140 +33,265 @@ def generate_diff(original_text: str, modified_text: str) -> str:
     )
 
     diff_text = "\n".join(diff)
-    return diff_text
+    return diff_text + "\n" if diff_text else diff_text
 
 
-def _apply_single_file_patch(src_lines: List[str], diff_text: str) -> Optional[str]:
-    """
-    Apply a unified diff to a single text blob using unidiff for correctness.
-    Returns the patched text or None if the patch cannot be applied.
-    """
-    try:
-        patch = PatchSet(diff_text.splitlines(True))
-    except Exception as exc:
-        print("❌ Failed to parse diff:", exc)
-        return None
+@dataclass
+class DiffApplyResult:
+    text: Optional[str]
+    strategy: Optional[str] = None  # one of STRATEGIES, None when nothing could be applied
+    hunks: int = 0
 
-    if not patch:
-        print("⚠️ Empty patch; nothing to apply.")
-        return "".join(src_lines)
 
-    if len(patch) > 1:
-        print("⚠️ Patch contains multiple files; only the first one will be applied.")
+@dataclass
+class _Hunk:
+    source_start: Optional[int]  # 1-based line number from the @@ header, if any
+    lines: List[Tuple[str, str]] = field(default_factory=list)  # (" " | "-" | "+", text without newline)
 
-    file_patch = patch[0]
-    lines = list(src_lines)
-    new_lines: List[str] = []
-    cursor = 0  # current index in original lines
+    def old_lines(self) -> List[str]:
+        return [text for op, text in self.lines if op != "+"]
 
-    for hunk in file_patch:
-        # Copy unchanged lines before this hunk
-        target_start = hunk.source_start - 1  # convert to 0-based
-        if target_start < cursor:
-            print("❌ Overlapping or out-of-order hunk; aborting patch.")
-            return None
 
-        new_lines.extend(lines[cursor:target_start])
-        cursor = target_start
-
-        # Apply hunk
-        for line in hunk:
-            if line.is_context:
-                if cursor >= len(lines) or lines[cursor].rstrip("\n") != line.value.rstrip("\n"):
-                    print("❌ Context mismatch while applying patch; aborting.")
-                    return None
-                new_lines.append(lines[cursor])
-                cursor += 1
-            elif line.is_removed:
-                if cursor >= len(lines) or lines[cursor].rstrip("\n") != line.value.rstrip("\n"):
-                    print("❌ Removal mismatch while applying patch; aborting.")
-                    return None
-                cursor += 1  # skip the removed line
-            elif line.is_added:
-                # Added lines are inserted into the output
-                new_lines.append(line.value if line.value.endswith("\n") else line.value + "\n")
-
-    # Append remaining original lines after last hunk
-    new_lines.extend(lines[cursor:])
-    return "".join(new_lines)
+def _parse_hunk_header(line: str) -> Optional[int]:
+    # "@@ -12,7 +12,8 @@ ..." -> 12; tolerate "@@ -12 +12 @@" and bare "@@"
+    parts = line.split()
+    if len(parts) > 1 and parts[1].startswith("-"):
+        start = parts[1][1:].split(",")[0]
+        if start.isdigit():
+            return int(start)
+    return None
 
 
-def apply_diff(original_text: str, diff_text: str) -> Optional[str]:
+def _parse_diff(diff_text: str) -> List[_Hunk]:
     """
-    Apply a unified diff to the original text.
-    Returns patched text or None if the patch fails. Falls back to a lenient
-    best-effort apply when strict parsing fails, to avoid hard failures from
-    slightly malformed hunks.
+    Lenient unified diff parser for LLM output: ignores file headers, code
+    fences and line counts, accepts context lines whose leading space was
+    dropped, and treats a body without any @@ header as a single hunk.
     """
-    try:
-        strict_result = _apply_single_file_patch(original_text.splitlines(True), diff_text)
-        if strict_result is not None:
-            return strict_result
-
-        # Fallback: lenient apply (ignores hunk headers and line counts).
-        print("⚠️ Falling back to best-effort diff apply due to parse/match failure.")
-        be_result = _apply_best_effort(original_text, diff_text)
-        if be_result is not None:
-            return be_result
-
-        # Last resort: if diff only provides additions, treat the added lines as the new plan
-        extracted = _extract_added_only(diff_text)
-        if extracted is not None:
-            print("⚠️ Using added-lines-only fallback (could not apply diff accurately).")
-            return extracted
-        return None
-    except Exception as exc:
-        print(f"❌ Error applying diff: {exc}")
+    hunks: List[_Hunk] = []
+    current: Optional[_Hunk] = None
+    raw_lines = diff_text.replace("\r\n", "\n").split("\n")
+
+    for i, raw in enumerate(raw_lines):
+        next_line = raw_lines[i + 1] if i + 1 < len(raw_lines) else ""
+        if raw.startswith("```"):
+            continue
+        if raw.startswith("@@"):
+            current = _Hunk(_parse_hunk_header(raw))
+            hunks.append(current)
+            continue
+        if raw.startswith("+++") or (raw.startswith("---") and (current is None or next_line.startswith("+++"))):
+            current = None  # file header; a new hunk must follow
+            continue
+        if raw.startswith(("diff --git", "\\ No newline")) or (current is None and raw.startswith("index ")):
+            continue
+        if current is None:
+            if not raw.startswith(("+", "-", " ")):
+                continue
+            current = _Hunk(None)
+            hunks.append(current)
+        if raw[:1] in ("+", "-", " "):
+            current.lines.append((raw[0], raw[1:]))
+        else:
+            current.lines.append((" ", raw))
+
+    # trailing blank lines after the last hunk are an artifact of split("\n")
+    for hunk in hunks:
+        while hunk.lines and hunk.lines[-1] == (" ", ""):
+            hunk.lines.pop()
+    return [h for h in hunks if any(op != " " for op, _ in h.lines)]
+
+
+def _exact_key(line: str) -> str:
+    return line.rstrip("\r\n")
+
+
+def _loose_key(line: str) -> str:
+    return " ".join(line.split())
+
+
+class _LineIndex:
+    """Positions of every line of the source, per normalized key, in ascending order."""
+
+    def __init__(self, keys: List[str]):
+        self.keys = keys
+        self.positions: Dict[str, List[int]] = {}
+        for pos, key in enumerate(keys):
+            self.positions.setdefault(key, []).append(pos)
+
+    def count(self, key: str) -> int:
+        return len(self.positions.get(key, ()))
+
+    def find_block(self, block: List[str], expected: int, lower: int) -> Optional[int]:
+        """
+        Start position >= lower where `block` occurs, closest to `expected`
+        (the GNU patch offset search). The rarest line of the block is used
+        as the pivot, so common lines such as blanks do not blow up the scan.
+        """
+        if not block:
+            return None
+        pivot = min(range(len(block)), key=lambda i: self.count(block[i]))
+        candidates = self.positions.get(block[pivot])
+        if not candidates:
+            return None
+
+        def matches(start: int) -> bool:
+            return start >= lower and start + len(block) <= len(self.keys) and \
+                self.keys[start:start + len(block)] == block
+
+        # walk outwards from the expected position
+        right = bisect.bisect_left(candidates, expected + pivot)
+        left = right - 1
+        while left >= 0 or right < len(candidates):
+            left_start = candidates[left] - pivot if left >= 0 else None
+            right_start = candidates[right] - pivot if right < len(candidates) else None
+            if right_start is not None and (left_start is None or right_start - expected <= expected - left_start):
+                if matches(right_start):
+                    return right_start
+                right += 1
+            else:
+                if left_start < lower:
+                    left = -1  # everything further left is before the cursor too
+                    continue
+                if matches(left_start):
+                    return left_start
+                left -= 1
         return None
 
 
-def _apply_best_effort(original_text: str, diff_text: str) -> Optional[str]:
+class _Edits:
+    """Deletions and insertions against source positions, rendered in one pass."""
+
+    def __init__(self):
+        self.deleted: Set[int] = set()
+        self.inserted: Dict[int, List[str]] = {}
+
+    def delete(self, pos: int) -> None:
+        self.deleted.add(pos)
+
+    def insert(self, pos: int, text: str) -> None:
+        self.inserted.setdefault(pos, []).append(text)
+
+    def __bool__(self) -> bool:
+        return bool(self.deleted or self.inserted)
+
+    def render(self, src_lines: List[str]) -> str:
+        out: List[str] = []
+        for pos in range(len(src_lines) + 1):
+            for text in self.inserted.get(pos, ()):
+                out.append(text + "\n")
+            if pos < len(src_lines) and pos not in self.deleted:
+                out.append(src_lines[pos])
+        # a source line without trailing newline may no longer be the last line
+        for i in range(len(out) - 1):
+            if not out[i].endswith("\n"):
+                out[i] += "\n"
+        return "".join(out)
+
+
+def _trim_context(lines: List[Tuple[str, str]], fuzz: int) -> Tuple[List[Tuple[str, str]], int]:
+    """Drop up to `fuzz` context lines from both ends; returns (lines, leading lines dropped)."""
+    start, end = 0, len(lines)
+    while start < min(fuzz, end) and lines[start][0] == " ":
+        start += 1
+    while end > start and len(lines) - end < fuzz and lines[end - 1][0] == " ":
+        end -= 1
+    return lines[start:end], start
+
+
+def _apply_hunks(src_lines: List[str], hunks: List[_Hunk]) -> Optional[Tuple[_Edits, str]]:
+    """Anchor every hunk as a block; None as soon as one cannot be placed."""
+    indexes: Dict[Callable[[str], str], _LineIndex] = {}
+
+    def index_for(normalize):
+        if normalize not in indexes:
+            indexes[normalize] = _LineIndex([normalize(line) for line in src_lines])
+        return indexes[normalize]
+
+    edits = _Edits()
+    cursor = 0   # first source line not yet consumed by a previous hunk
+    offset = 0   # drift between header line numbers and where hunks really matched
+    strategy = STRATEGY_EXACT
+
+    for hunk in hunks:
+        expected = hunk.source_start - 1 + offset if hunk.source_start else cursor
+        expected = max(expected, cursor)
+        placed = None
+
+        if not hunk.old_lines():
+            # pure insertion: "@@ -5,0 +6,2 @@" inserts after line 5
+            pos = hunk.source_start + offset if hunk.source_start else cursor
+            placed = (hunk.lines, min(max(pos, cursor), len(src_lines)), STRATEGY_EXACT)
+        else:
+            for normalize, level in ((_exact_key, None), (_loose_key, STRATEGY_FUZZY)):
+                index = index_for(normalize)
+                for fuzz in range(MAX_FUZZ + 1):
+                    lines, dropped = _trim_context(hunk.lines, fuzz)
+                    block = [normalize(text) for op, text in lines if op != "+"]
+                    if fuzz and len(lines) == len(hunk.lines):
+                        continue  # nothing left to trim
+                    start = index.find_block(block, expected + dropped, cursor)
+                    if start is not None:
+                        if level is None and fuzz == 0:
+                            at_header = hunk.source_start is not None and start == hunk.source_start - 1
+                            found_level = STRATEGY_EXACT if at_header else STRATEGY_OFFSET
+                        else:
+                            found_level = STRATEGY_FUZZY
+                        placed = (lines, start, found_level)
+                        break
+                if placed:
+                    break
+
+        if placed is None:
+            return None
+
+        lines, pos, level = placed
+        if STRATEGIES.index(level) > STRATEGIES.index(strategy):
+            strategy = level
+        if hunk.source_start and hunk.old_lines():
+            offset = pos - (hunk.source_start - 1)
+        for op, text in lines:
+            if op == "+":
+                edits.insert(pos, text)
+            else:
+                if op == "-":
+                    edits.delete(pos)
+                pos += 1
+        cursor = pos
+
+    return edits, strategy
+
+
+def _apply_line_by_line(src_lines: List[str], hunks: List[_Hunk]) -> Optional[_Edits]:
     """
-    A permissive diff apply:
-    - Ignores file headers/hunk headers.
-    - Tries to track position using context lines.
-    - Removes the first matching line at/after the cursor for '-' entries.
-    - Inserts '+' entries at the current cursor to avoid dumping them at the end.
-    This is to avoid hard failures on imperfect AI-generated diffs.
+    Last structured attempt for diffs whose hunks match nowhere as a whole:
+    each '-' removes, and each context line moves the cursor to, the next
+    matching line after the cursor; '+' lines are inserted at the cursor.
+    Lookups go through the line index, so this is linear in practice.
     """
-    try:
-        lines = original_text.splitlines(keepends=True)
-        output = list(lines)
-        cursor = 0  # current position in output we try to stay near
-        changed = False
+    index = _LineIndex([_exact_key(line) for line in src_lines])
+    edits = _Edits()
+    cursor = 0
+
+    def next_position(key: str) -> Optional[int]:
+        positions = index.positions.get(key, [])
+        i = bisect.bisect_left(positions, cursor)
+        while i < len(positions) and positions[i] in edits.deleted:
+            i += 1
+        return positions[i] if i < len(positions) else None
 
-        for raw in diff_text.splitlines():
-            if raw.startswith(("---", "+++", "@@")):
+    for hunk in hunks:
+        for op, text in hunk.lines:
+            if op == "+":
+                edits.insert(cursor, text)
                 continue
-            if not raw:
+            pos = next_position(text)
+            if pos is None:
                 continue
-            if raw[0] == "-":
-                target = raw[1:]
-                # find first line matching (ignore trailing newline)
-                for idx in range(cursor, len(output)):
-                    if output[idx].rstrip("\n") == target.rstrip("\n"):
-                        output.pop(idx)
-                        cursor = idx
-                        changed = True
-                        break
-            elif raw[0] == "+":
-                to_add = raw[1:]
-                if not to_add.endswith("\n"):
-                    to_add += "\n"
-                output.insert(cursor, to_add)
-                cursor += 1
-                changed = True
-            else:
-                # context line: try to advance cursor to the next matching line
-                for idx in range(cursor, len(output)):
-                    if output[idx].rstrip("\n") == raw.rstrip("\n"):
-                        cursor = idx + 1
-                        break
-
-        return "".join(output) if changed else None
-    except Exception as exc:
-        print(f"❌ Best-effort apply failed: {exc}")
-        return None
+            if op == "-":
+                edits.delete(pos)
+            cursor = pos + 1
+    return edits or None
 
 
 def _extract_added_only(diff_text: str) -> Optional[str]:
@@ -169,3 +309,49 @@ def _extract_added_only(diff_text: str) -> Optional[str]:
     if added:
         return "".join(added)
     return None
+
+
+def apply_diff_with_report(original_text: str, diff_text: str) -> DiffApplyResult:
+    """
+    Apply a (possibly malformed, LLM-written) unified diff to the original text
+    and report which strategy succeeded. Hunks are anchored through an index of
+    the source lines, searching outwards from the header line numbers with
+    increasing fuzz; the result is assembled in a single pass over the source.
+    """
+    src_lines = original_text.splitlines(keepends=True)
+    try:
+        hunks = _parse_diff(diff_text or "")
+        if not hunks:
+            logger.debug("Diff contains no changes.")
+            return DiffApplyResult(None)
+
+        # Only '+' lines with nothing to anchor them to means the model re-sent
+        # the whole plan; go straight to the added-lines fallback.
+        if not all(h.source_start is None and not h.old_lines() for h in hunks):
+            anchored = _apply_hunks(src_lines, hunks)
+            if anchored is not None:
+                edits, strategy = anchored
+                if strategy != STRATEGY_EXACT:
+                    logger.info("Applied diff with %s strategy.", strategy)
+                return DiffApplyResult(edits.render(src_lines), strategy, len(hunks))
+
+            logger.info("Falling back to line-by-line diff apply; hunks could not be anchored.")
+            edits = _apply_line_by_line(src_lines, hunks)
+            if edits is not None:
+                return DiffApplyResult(edits.render(src_lines), STRATEGY_LINE_BY_LINE, len(hunks))
+    except Exception as exc:
+        logger.exception("Error applying diff: %s", exc)
+
+    extracted = _extract_added_only(diff_text or "")
+    if extracted is not None:
+        logger.warning("Using added-lines-only fallback (could not apply diff accurately).")
+        return DiffApplyResult(extracted, STRATEGY_ADDED_ONLY)
+    return DiffApplyResult(None)
+
+
+def apply_diff(original_text: str, diff_text: str) -> Optional[str]:
+    """
+    Apply a unified diff to the original text.
+    Returns patched text or None if the patch fails.
+    """
+    return apply_diff_with_report(original_text, diff_text).text
@@ -0,0 +1,323 @@
+"""
+Bookmark categories, filled in the background.
+
+Categories belong to the shared places (app.utils.places), which uploads
+create with an empty one. Once an upload has committed, schedule(user_id)
+queues the user for the enrichment pool, which classifies the
+uncategorized places the user bookmarked and writes all their categories
+in one executemany; a place is classified once for every user. Each place
+is first looked up by fingerprint (place_fingerprint) in the shared cache
+(app.utils.cache, namespace "place_category"), which holds
+
+- categories of every Yelp business a search returned, stored by
+  app.utils.yelp under the business's name and rounded coordinates, so a
+  bookmark of the same place matches without an LLM call;
+- earlier LLM answers, also for the same place bookmarked with and
+  without a Google Maps link.
+
+The rest go to the LLM, ENRICH_BATCH_SIZE places per call, and the answers
+are cached for CATEGORY_CACHE_TTL_S. Places that could not be classified
+(OpenAI unavailable) stay empty and are retried after the next upload.
+
+A category is "<kind>" or "<kind>:<cuisine>,<cuisine>,...", the kind one of
+KINDS, e.g. "restaurant:ramen,japanese,asian". The generator drops bars
+when alcohol is not allowed and restaurants of other cuisines when
+cuisines are preferred (filter_by_preferences), and gives restaurants and
+bars their usual visiting hours; bookmarks without a category are kept
+and planned as before.
+"""
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import or_, update
+
+from app.database import SessionLocal
+from app.models.bookmark import Bookmark
+from app.models.place import Place
+from app.utils import outbound
+from app.utils.cache import get_cache
+from app.utils.itinerary import json_schema_format
+from app.utils.metrics import PLACES_CATEGORIZED, record_openai_usage
+from app.utils.name_index import normalize
+from app.utils.places import place_fingerprint
+
+KINDS = ("restaurant", "cafe", "bar", "museum", "park", "landmark", "shopping", "lodging", "other")
+ALCOHOL_KINDS = frozenset({"bar"})
+
+CACHE_NAMESPACE = "place_category"
+CATEGORY_CACHE_TTL_S = float(os.getenv("CATEGORY_CACHE_TTL_S", str(30 * 24 * 3600)))
+ENRICH_BATCH_SIZE = int(os.getenv("ENRICH_BATCH_SIZE", "40"))
+ENRICH_WORKERS = int(os.getenv("ENRICH_WORKERS", "1"))
+ENRICH_MODEL = os.getenv("ENRICH_MODEL", "gpt-4.1-mini")
+
+logger = logging.getLogger(__name__)
+
+CATEGORY_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "places": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "index": {"type": "integer"},
+                    "kind": {"type": "string", "enum": list(KINDS)},
+                    "cuisines": {"type": "array", "items": {"type": "string"}},
+                },
+                "required": ["index", "kind", "cuisines"],
+                "additionalProperties": False,
+            },
+        },
+    },
+    "required": ["places"],
+    "additionalProperties": False,
+}
+
+# Yelp category titles that are not cuisines; any other title of a business makes it a restaurant
+_YELP_TITLES = {
+    "bars": "bar", "pubs": "bar", "cocktail bars": "bar", "wine bars": "bar", "beer bar": "bar",
+    "dive bars": "bar", "sports bars": "bar", "whiskey bars": "bar", "champagne bars": "bar",
+    "irish pub": "bar", "lounges": "bar", "speakeasies": "bar", "breweries": "bar", "brewpubs": "bar",
+    "wineries": "bar", "beer gardens": "bar", "nightlife": "bar",
+    "cafes": "cafe", "coffee tea": "cafe", "coffee roasteries": "cafe", "tea rooms": "cafe",
+    "bakeries": "cafe", "desserts": "cafe", "ice cream frozen yogurt": "cafe",
+    "juice bars smoothies": "cafe", "patisserie cake shop": "cafe", "bubble tea": "cafe",
+    "art galleries": "museum", "landmarks historical buildings": "landmark",
+}
+_YELP_WORDS = (  # then by word (singular or plural)
+    ("museum", "museum"), ("park", "park"), ("garden", "park"),
+    ("church", "landmark"), ("cathedral", "landmark"), ("monument", "landmark"), ("castle", "landmark"),
+    ("market", "shopping"), ("shop", "shopping"), ("shopping", "shopping"), ("store", "shopping"),
+    ("hotel", "lodging"), ("hostel", "lodging"),
+)
+
+
+def _clean(value: str) -> str:
+    return " ".join(normalize(value).split())
+
+
+def _fingerprints(row) -> List[str]:
+    """The place's own fingerprint, then the one a Yelp business at the same spot would have."""
+    keys = [place_fingerprint(row.title, row.latitude, row.longitude, row.google_maps_url)]
+    if row.google_maps_url:
+        keys.append(place_fingerprint(row.title, row.latitude, row.longitude))
+    return keys
+
+
+def format_category(kind: str, cuisines: Iterable[str] = ()) -> str:
+    tags = []
+    for cuisine in cuisines:
+        tag = _clean(cuisine)
+        if tag and tag not in tags:
+            tags.append(tag)
+    return f"{kind}:{','.join(tags)}" if tags else kind
+
+
+def parse_category(category: Optional[str]) -> Tuple[str, List[str]]:
+    """(kind, cuisines); ("", []) for a bookmark that is not classified yet."""
+    kind, _, tags = (category or "").partition(":")
+    return kind, [tag for tag in tags.split(",") if tag]
+
+
+def yelp_category(titles: Sequence[str]) -> Optional[str]:
+    """Category of a Yelp business from its category titles ("Ramen", "Cocktail Bars", ...)."""
+    kinds, cuisines = [], []
+    for title in titles:
+        cleaned = _clean(title or "")
+        if not cleaned:
+            continue
+        kind = _YELP_TITLES.get(cleaned) or next(
+            (kind for word, kind in _YELP_WORDS if {word, f"{word}s", f"{word}es"} & set(cleaned.split())),
+            "restaurant",
+        )
+        kinds.append(kind)
+        if kind == "restaurant":
+            cuisines.append(cleaned)
+    if not kinds:
+        return None
+    if "restaurant" in kinds:
+        return format_category("restaurant", cuisines)
+    return kinds[0]
+
+
+def remember_yelp_places(places: Iterable[Dict]) -> None:
+    """Cache the categories of Yelp search results under their fingerprints, for matching bookmarks."""
+    cache = get_cache()
+    for place in places:
+        if not place.get("name") or place.get("latitude") is None or place.get("longitude") is None:
+            continue
+        category = yelp_category(place.get("categories") or [])
+        if category:
+            key = place_fingerprint(place["name"], place["latitude"], place["longitude"])
+            cache.set(CACHE_NAMESPACE, key, category, CATEGORY_CACHE_TTL_S)
+
+
+def classify_places(places: Sequence[Tuple[str, Optional[str]]]) -> List[Optional[str]]:
+    """One LLM call for a batch of (name, address); a category per place, None where the answer has none."""
+    lines = "\n".join(
+        f"{i}. {_one_line(name)} | {_one_line(address or '')}" for i, (name, address) in enumerate(places)
+    )
+    prompt = f"""
+Classify each bookmarked place below (index. name | address). For every index give:
+- kind: one of {", ".join(KINDS)}; "bar" for places mainly for drinking (pubs, wine and cocktail bars, breweries)
+- cuisines: for restaurants, lower-case cuisines from specific to broad
+  (e.g. "ramen", "japanese", "asian"); otherwise []
+
+Places:
+{lines}
+"""
+    messages = [{"role": "user", "content": prompt}]
+    max_tokens = 50 + 30 * len(places)
+    response = outbound.call("openai", "enrich_bookmarks", lambda: outbound.openai_client().chat.completions.create(
+        model=ENRICH_MODEL,
+        messages=messages,
+        max_tokens=max_tokens,
+        temperature=0,
+        response_format=json_schema_format("place_categories", CATEGORY_SCHEMA),
+    ), tokens=outbound.estimate_tokens(messages, max_tokens))
+    record_openai_usage("enrich_bookmarks", response)
+
+    categories: List[Optional[str]] = [None] * len(places)
+    for item in json.loads(response.choices[0].message.content).get("places", []):
+        index = item.get("index")
+        if isinstance(index, int) and 0 <= index < len(places) and item.get("kind") in KINDS:
+            categories[index] = format_category(item["kind"], item.get("cuisines") or [])
+    return categories
+
+
+def _one_line(value: str) -> str:
+    return " ".join(value.replace("|", " ").split())
+
+
+def categorize(rows: Sequence) -> Dict[int, str]:
+    """
+    Categories for place rows (id, title, address, latitude, longitude,
+    google_maps_url) by id: from the cache where the place is known, else
+    from the LLM in batches. Rows that could not be classified are missing.
+    """
+    cache = get_cache()
+    found: Dict[int, str] = {}
+    pending: Dict[str, List] = {}  # first fingerprint -> rows of that place
+    for row in rows:
+        keys = _fingerprints(row)
+        category = next(filter(None, (cache.get(CACHE_NAMESPACE, key) for key in keys)), None)
+        if category:
+            found[row.id] = category
+        else:
+            pending.setdefault(keys[0], []).append(row)
+    PLACES_CATEGORIZED.labels("cache").inc(len(found))
+
+    places = list(pending.values())
+    for start in range(0, len(places), ENRICH_BATCH_SIZE):
+        batch = places[start:start + ENRICH_BATCH_SIZE]
+        try:
+            categories = classify_places([(same[0].title, same[0].address) for same in batch])
+        except Exception as exc:
+            logger.warning("Could not classify %d places: %s", len(batch), exc)
+            PLACES_CATEGORIZED.labels("failed").inc(len(batch))
+            continue
+        for same, category in zip(batch, categories):
+            if category is None:
+                PLACES_CATEGORIZED.labels("failed").inc()
+                continue
+            PLACES_CATEGORIZED.labels("llm").inc()
+            for key in _fingerprints(same[0]):
+                cache.set(CACHE_NAMESPACE, key, category, CATEGORY_CACHE_TTL_S)
+            found.update((row.id, category) for row in same)
+    return found
+
+
+def enrich_user(user_id: int, session_factory=SessionLocal) -> int:
+    """Fill the category of the uncategorized places the user bookmarked; returns how many were filled."""
+    with _pending_lock:
+        _pending.discard(user_id)  # an upload from now on queues another run
+    uncategorized = or_(Place.category == "", Place.category.is_(None))
+    with session_factory() as db:
+        rows = (
+            db.query(Place.id, Place.title, Place.address, Place.latitude, Place.longitude, Place.google_maps_url)
+            .join(Bookmark, Bookmark.place_id == Place.id)
+            .filter(Bookmark.user_id == user_id, uncategorized)
+            .distinct()
+            .all()
+        )
+        if not rows:
+            return 0
+        categories = categorize(rows)
+        if categories:
+            # places classified since the query (another user's run) are left alone
+            db.execute(
+                update(Place).where(uncategorized).execution_options(synchronize_session=None),
+                [{"id": place_id, "category": category} for place_id, category in categories.items()],
+            )
+            db.commit()
+    logger.info("Categorized %d of %d places of user %s", len(categories), len(rows), user_id)
+    return len(categories)
+
+
+def filter_by_preferences(bookmarks: Sequence[Bookmark], allow_alcohol: bool,
+                          preferred_cuisine: Sequence[str], keep_ids: Set[int] = frozenset()) -> List[Bookmark]:
+    """
+    Drop bars when alcohol is not allowed and, when cuisines are preferred,
+    restaurants whose cuisines match none of them. Bookmarks in `keep_ids`
+    (must-visits), without a category or without known cuisines are kept.
+    """
+    preferred = [cleaned for cleaned in map(_clean, preferred_cuisine or ()) if cleaned]
+    if allow_alcohol and not preferred:
+        return list(bookmarks)
+    kept = []
+    for b in bookmarks:
+        kind, cuisines = parse_category(b.category)
+        if b.id not in keep_ids:
+            if not allow_alcohol and kind in ALCOHOL_KINDS:
+                continue
+            if preferred and kind == "restaurant" and cuisines and not any(
+                p in c or c in p for p in preferred for c in cuisines
+            ):
+                continue
+        kept.append(b)
+    return kept
+
+
+_pending: Set[int] = set()  # users queued and not started yet
+_pending_lock = threading.Lock()
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=ENRICH_WORKERS, thread_name_prefix="enrich")
+        return _executor
+
+
+def _run(user_id: int) -> None:
+    try:
+        enrich_user(user_id)
+    except Exception:
+        logger.exception("Enriching the bookmarks of user %s failed", user_id)
+
+
+def schedule(user_id: int) -> None:
+    """Queue enrich_user(user_id) in the enrichment pool, unless it is already waiting there."""
+    with _pending_lock:
+        if user_id in _pending:
+            return
+        _pending.add(user_id)
+    _pool().submit(_run, user_id)
+
+
+def shutdown_pool() -> None:
+    """Finish the running enrichment, drop the queued ones (they are retried after the next upload)."""
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True, cancel_futures=True)
+    with _pending_lock:
+        _pending.clear()
@@ -0,0 +1,205 @@
+"""
+Idempotency keys.
+
+A client that retries a POST/PUT/PATCH/DELETE after a timeout can send the
+same `Idempotency-Key` header with every attempt. IdempotencyMiddleware
+runs the first attempt and stores its response in the shared cache
+(app.utils.cache, namespace "idempotency") for IDEMPOTENCY_TTL_S seconds;
+later attempts get that response back, marked `Idempotent-Replayed: true`,
+without the endpoint running again (no second LLM call, no duplicate
+ChatMessage or saved route).
+
+- Keys are scoped to the user of the bearer token (or to anonymous
+  callers) and to the request: reusing a key for a different method, path,
+  query or body is answered with 422.
+- While the first attempt is running, duplicates wait for it, up to
+  IDEMPOTENCY_WAIT_S, then get 409. The in-progress marker expires after
+  IDEMPOTENCY_LOCK_TTL_S, so a crashed worker does not block the key.
+- Server errors (5xx), 409 and 429 are not stored, so a retry runs again.
+  Neither are bodies over IDEMPOTENCY_MAX_BODY_BYTES.
+- The request body is read into memory to fingerprint it, at most
+  IDEMPOTENCY_MAX_BODY_BYTES of it: a request whose Content-Length is
+  larger, or whose body turns out to be, runs as if it had no key (what
+  has been read is handed on), so large uploads still stream into the
+  endpoint and its own size limit.
+
+With the memory cache backend this holds per worker; point CACHE_URL at a
+database or Redis to share it between workers. If the cache fails, requests
+simply run as if they had no key.
+"""
+import base64
+import hashlib
+import os
+from typing import List, Optional, Tuple
+
+import anyio
+import orjson
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.utils.cache import get_cache
+from app.utils.token import verify_token
+
+IDEMPOTENCY_TTL_S = float(os.getenv("IDEMPOTENCY_TTL_S", str(24 * 3600)))
+IDEMPOTENCY_LOCK_TTL_S = float(os.getenv("IDEMPOTENCY_LOCK_TTL_S", "300"))
+IDEMPOTENCY_WAIT_S = float(os.getenv("IDEMPOTENCY_WAIT_S", "60"))
+IDEMPOTENCY_MAX_BODY_BYTES = int(os.getenv("IDEMPOTENCY_MAX_BODY_BYTES", str(1024 * 1024)))
+POLL_S = 0.1
+
+CACHE_NAMESPACE = "idempotency"
+MUTATING_METHODS = frozenset({"POST", "PUT", "PATCH", "DELETE"})
+MAX_KEY_LENGTH = 255
+# outcomes a retry should not inherit
+UNSTORED_STATUSES = frozenset({409, 429})
+
+
+def _caller(headers: Headers) -> str:
+    scheme, _, token = headers.get("authorization", "").partition(" ")
+    payload = verify_token(token) if scheme.lower() == "bearer" and token else None
+    return f"user:{payload['sub']}" if payload else "anonymous"
+
+
+def _fingerprint(scope: Scope, body: bytes) -> str:
+    digest = hashlib.sha256()
+    for part in (scope["method"].encode(), scope["path"].encode(), scope.get("query_string", b""), body):
+        digest.update(len(part).to_bytes(8, "big"))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+async def _send_error(send: Send, status: int, detail: str) -> None:
+    body = orjson.dumps({"detail": detail})
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _replay(send: Send, record: dict) -> None:
+    headers = [(name.encode("latin-1"), value.encode("latin-1")) for name, value in record["headers"]]
+    headers.append((b"idempotent-replayed", b"true"))
+    await send({"type": "http.response.start", "status": record["status"], "headers": headers})
+    await send({"type": "http.response.body", "body": base64.b64decode(record["body"])})
+
+
+def _replaying(messages: List[Message], receive: Receive) -> Receive:
+    """A receive that returns the already-read `messages` first, then reads on."""
+    replayed = iter(messages)
+
+    async def receive_buffered() -> Message:
+        return next(replayed, None) or await receive()
+
+    return receive_buffered
+
+
+class IdempotencyMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] not in MUTATING_METHODS:
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        idempotency_key = headers.get("idempotency-key")
+        if idempotency_key is None:
+            await self.app(scope, receive, send)
+            return
+        if not idempotency_key or len(idempotency_key) > MAX_KEY_LENGTH:
+            await _send_error(send, 400, f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters")
+            return
+
+        length = headers.get("content-length", "")
+        if length and not length.isdigit():
+            await _send_error(send, 400, "Invalid Content-Length header")
+            return
+        if length and int(length) > IDEMPOTENCY_MAX_BODY_BYTES:
+            await self.app(scope, receive, send)
+            return
+        messages, body = await self._read_body(receive)
+        if body is None:
+            # too large to fingerprint: run unkeyed, replaying what was read
+            await self.app(scope, _replaying(messages, receive), send)
+            return
+        fingerprint = _fingerprint(scope, body)
+        key = f"{_caller(headers)}:{idempotency_key}"
+        cache = get_cache()
+
+        record = await self._claim(cache, key, fingerprint)
+        if record is not None:
+            if record["fingerprint"] != fingerprint:
+                await _send_error(send, 422, "Idempotency-Key was already used for a different request")
+            elif record["state"] == "done":
+                await _replay(send, record)
+            else:
+                await _send_error(send, 409, "A request with this Idempotency-Key is still in progress")
+            return
+
+        receive_buffered = _replaying(messages, receive)
+        start: Optional[Message] = None
+        chunks: List[bytes] = []
+        size = 0
+
+        async def send_recording(message: Message) -> None:
+            nonlocal start, size
+            if message["type"] == "http.response.start":
+                start = message
+            elif message["type"] == "http.response.body" and size <= IDEMPOTENCY_MAX_BODY_BYTES:
+                chunk = message.get("body", b"")
+                size += len(chunk)
+                chunks.append(chunk)
+            await send(message)
+
+        stored = False
+        try:
+            await self.app(scope, receive_buffered, send_recording)
+            if (start is not None and start["status"] < 500 and start["status"] not in UNSTORED_STATUSES
+                    and size <= IDEMPOTENCY_MAX_BODY_BYTES):
+                record = {
+                    "state": "done",
+                    "fingerprint": fingerprint,
+                    "status": start["status"],
+                    "headers": [
+                        (name.decode("latin-1"), value.decode("latin-1")) for name, value in start.get("headers", [])
+                    ],
+                    "body": base64.b64encode(b"".join(chunks)).decode("ascii"),
+                }
+                await anyio.to_thread.run_sync(cache.set, CACHE_NAMESPACE, key, record, IDEMPOTENCY_TTL_S)
+                stored = True
+        finally:
+            if not stored:
+                with anyio.CancelScope(shield=True):
+                    await anyio.to_thread.run_sync(cache.delete, CACHE_NAMESPACE, key)
+
+    @staticmethod
+    async def _read_body(receive: Receive) -> Tuple[List[Message], Optional[bytes]]:
+        """The messages read and the whole body, or None for the body once it passes IDEMPOTENCY_MAX_BODY_BYTES."""
+        messages = []
+        size = 0
+        while True:
+            message = await receive()
+            messages.append(message)
+            if message["type"] != "http.request":
+                break
+            size += len(message.get("body", b""))
+            if size > IDEMPOTENCY_MAX_BODY_BYTES:
+                return messages, None
+            if not message.get("more_body", False):
+                break
+        return messages, b"".join(m.get("body", b"") for m in messages if m["type"] == "http.request")
+
+    @staticmethod
+    async def _claim(cache, key: str, fingerprint: str) -> Optional[dict]:
+        """None when this request should run; otherwise the stored or in-progress record."""
+        pending = {"state": "pending", "fingerprint": fingerprint}
+        with anyio.move_on_after(IDEMPOTENCY_WAIT_S):
+            while True:
+                if await anyio.to_thread.run_sync(cache.add, CACHE_NAMESPACE, key, pending, IDEMPOTENCY_LOCK_TTL_S):
+                    return None
+                record = await anyio.to_thread.run_sync(cache.get, CACHE_NAMESPACE, key)
+                if record is not None and (record["state"] == "done" or record["fingerprint"] != fingerprint):
+                    return record
+                await anyio.sleep(POLL_S)
+        return pending
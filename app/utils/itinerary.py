@@ -0,0 +1,225 @@
+"""
+Structured itineraries.
+
+A route is a list of stops. GeneratedRoute.route_text is their canonical
+rendering, one line per stop:
+
+    09:00 - 10:00: Café de Flore, breakfast in Saint-Germain
+
+The LLM is asked for stops (generation) or stop operations (chat edits)
+through JSON-schema structured output. Edits are applied here, so nothing
+depends on the model writing a diff that applies cleanly.
+"""
+import re
+from typing import Dict, List, Optional, Sequence
+
+from sqlalchemy.orm import Session
+
+from app.models.bookmark import Bookmark
+from app.models.generated_route import GeneratedRoute
+from app.models.itinerary_stop import ItineraryStop
+from app.schemas.itinerary import ItineraryStopBase, StopOperation
+
+STOP_LINE = re.compile(r"^((?:[01]\d|2[0-3]):[0-5]\d) - ((?:[01]\d|2[0-3]):[0-5]\d): (.+)$")
+
+_LLM_STOP_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "start_time": {"type": "string", "description": "HH:MM, 24h"},
+        "end_time": {"type": "string", "description": "HH:MM, 24h"},
+        "name": {"type": "string", "description": "Place name only"},
+        "description": {"type": "string", "description": "What to do there, one short sentence"},
+        "address": {"type": ["string", "null"]},
+        "bookmark_id": {"type": ["integer", "null"], "description": "id of the bookmark, if the place is one"},
+    },
+    "required": ["start_time", "end_time", "name", "description", "address", "bookmark_id"],
+    "additionalProperties": False,
+}
+
+ITINERARY_SCHEMA = {
+    "type": "object",
+    "properties": {"stops": {"type": "array", "items": _LLM_STOP_SCHEMA}},
+    "required": ["stops"],
+    "additionalProperties": False,
+}
+
+STOP_OPERATIONS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "chat_message": {"type": "string"},
+        "operations": {
+            "type": ["array", "null"],
+            "items": {
+                "type": "object",
+                "properties": {
+                    "op": {"type": "string", "enum": ["update", "insert", "remove"]},
+                    "index": {"type": "integer"},
+                    "stop": {"anyOf": [_LLM_STOP_SCHEMA, {"type": "null"}]},
+                },
+                "required": ["op", "index", "stop"],
+                "additionalProperties": False,
+            },
+        },
+    },
+    "required": ["chat_message", "operations"],
+    "additionalProperties": False,
+}
+
+
+def json_schema_format(name: str, schema: Dict) -> Dict:
+    """response_format argument for chat.completions with strict JSON-schema output."""
+    return {"type": "json_schema", "json_schema": {"name": name, "strict": True, "schema": schema}}
+
+
+def _one_line(value: str) -> str:
+    return " ".join(value.split())
+
+
+def render_stop(stop) -> str:
+    line = f"{stop.start_time} - {stop.end_time}: {_one_line(stop.name)}"
+    description = _one_line(stop.description or "")
+    return f"{line}, {description}" if description else line
+
+
+def _label(stop) -> str:
+    """The rendered line without its times."""
+    return render_stop(stop).partition(": ")[2]
+
+
+def render_itinerary(stops: Sequence) -> str:
+    return "".join(render_stop(stop) + "\n" for stop in stops)
+
+
+def parse_itinerary_text(text: str) -> Optional[List[ItineraryStopBase]]:
+    """
+    Stops of a route text, or None unless the text is exactly the canonical
+    rendering of some stops (free-form plans keep using text diffs).
+    """
+    stops = []
+    for line in text.splitlines():
+        match = STOP_LINE.match(line)
+        if not match:
+            return None
+        name, _, description = match.group(3).partition(", ")
+        stops.append(ItineraryStopBase(
+            start_time=match.group(1),
+            end_time=match.group(2),
+            name=name,
+            description=description,
+        ))
+    if not stops or render_itinerary(stops) != text:
+        return None
+    return stops
+
+
+def format_stops_for_prompt(stops: Sequence) -> str:
+    lines = []
+    for number, stop in enumerate(stops, start=1):
+        line = f"{number}. {render_stop(stop)}"
+        if stop.bookmark_id is not None:
+            line += f" [bookmark {stop.bookmark_id}]"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def apply_stop_operations(stops: Sequence, operations: Sequence[StopOperation]) -> List[ItineraryStopBase]:
+    """
+    Apply operations whose indexes all refer to `stops` as given (not to the
+    result of earlier operations). Raises ValueError for an invalid operation.
+    """
+    count = len(stops)
+    updated: Dict[int, ItineraryStopBase] = {}
+    removed = set()
+    inserted_after: Dict[int, List[ItineraryStopBase]] = {}
+
+    for operation in operations:
+        if operation.op == "insert":
+            if not 0 <= operation.index <= count or operation.stop is None:
+                raise ValueError(f"invalid insert at {operation.index}")
+            inserted_after.setdefault(operation.index, []).append(operation.stop)
+            continue
+        if not 1 <= operation.index <= count:
+            raise ValueError(f"no stop {operation.index}")
+        if operation.op == "remove":
+            removed.add(operation.index)
+        elif operation.stop is None:
+            raise ValueError(f"update of stop {operation.index} without a stop")
+        else:
+            updated[operation.index] = operation.stop
+    if removed & updated.keys():
+        raise ValueError("a stop cannot be both updated and removed")
+
+    result = list(inserted_after.get(0, []))
+    for number, stop in enumerate(stops, start=1):
+        if number in updated:
+            result.append(updated[number])
+        elif number not in removed:
+            result.append(ItineraryStopBase.model_validate(stop, from_attributes=True))
+        result.extend(inserted_after.get(number, []))
+    return result
+
+
+def locate_stops(db: Session, user_id: int, stops: Sequence[ItineraryStopBase],
+                 known_places: Sequence[Dict] = ()) -> None:
+    """
+    Fill in coordinates (and addresses) from the user's bookmarks, or from
+    known_places such as Yelp results matched by name. Unknown bookmark ids
+    are dropped rather than trusted.
+    """
+    bookmark_ids = {stop.bookmark_id for stop in stops if stop.bookmark_id is not None}
+    bookmarks = {}
+    if bookmark_ids:
+        bookmarks = {
+            b.id: b for b in db.query(Bookmark).filter(
+                Bookmark.user_id == user_id, Bookmark.id.in_(bookmark_ids)
+            )
+        }
+    places = {place["name"].casefold(): place for place in known_places if place.get("name")}
+
+    for stop in stops:
+        bookmark = bookmarks.get(stop.bookmark_id)
+        if bookmark is not None:
+            stop.latitude, stop.longitude = bookmark.latitude, bookmark.longitude
+            stop.address = stop.address or bookmark.address
+            continue
+        stop.bookmark_id = None
+        place = places.get(stop.name.casefold())
+        if place is not None and stop.latitude is None:
+            stop.latitude, stop.longitude = place.get("latitude"), place.get("longitude")
+            stop.address = stop.address or place.get("address")
+
+
+def replace_route_stops(route: GeneratedRoute, stops: Optional[Sequence]) -> None:
+    """Replace the stored stops of a route (None or [] clears them)."""
+    route.stops = [
+        ItineraryStop(
+            position=position,
+            **ItineraryStopBase.model_validate(stop, from_attributes=True).model_dump(),
+        )
+        for position, stop in enumerate(stops or [])
+    ]
+
+
+def sync_route_stops(route: GeneratedRoute) -> None:
+    """
+    Re-derive the stops after route_text was changed as text (diff apply,
+    revert). Places and coordinates are carried over from the previous stops
+    by name; a text that is no longer canonical clears the stops.
+    """
+    stops = parse_itinerary_text(route.route_text)
+    if stops is not None:
+        # a name containing ", " parses as a shorter name plus description,
+        # so a stop whose line is unchanged keeps its own split
+        by_label = {_label(stop): stop for stop in route.stops}
+        by_name = {stop.name: stop for stop in route.stops}
+        for stop in stops:
+            known = by_label.get(_label(stop))
+            if known is not None:
+                stop.name, stop.description = known.name, known.description or ""
+            else:
+                known = by_name.get(stop.name)
+            if known is not None:
+                stop.address = known.address
+                stop.bookmark_id = known.bookmark_id
+                stop.latitude, stop.longitude = known.latitude, known.longitude
+    replace_route_stops(route, stops)
@@ -0,0 +1,105 @@
+"""
+Logging setup for the API.
+
+All records go through a QueueHandler so request threads never block on
+stdout; a single QueueListener thread formats and writes them.
+
+Environment variables:
+- LOG_LEVEL: root level (default INFO)
+- LOG_LEVELS: per-module overrides, e.g. "app.routers.generate=DEBUG,httpx=WARNING"
+- LOG_FORMAT: "json" (default) or "text"
+- LOG_PAYLOAD_SAMPLE_RATE: fraction of verbose payload logs to keep (default 0.01)
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+# attributes every LogRecord has; anything else was passed through `extra=`
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_payload_sample_rate = 0.01
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including any `extra=` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+def parse_module_levels(spec: str) -> Dict[str, int]:
+    """Parse "module=LEVEL,module=LEVEL" into {module: level}; bad entries are ignored."""
+    levels = {}
+    for item in (spec or "").split(","):
+        name, sep, level = item.partition("=")
+        level_no = logging.getLevelName(level.strip().upper())
+        if sep and name.strip() and isinstance(level_no, int):
+            levels[name.strip()] = level_no
+    return levels
+
+
+def setup_logging(stream=None) -> None:
+    """Install the queue-based handler on the root logger. Safe to call more than once."""
+    global _listener, _payload_sample_rate
+
+    if _listener is not None:
+        return
+
+    _payload_sample_rate = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "0.01"))
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    if os.getenv("LOG_FORMAT", "json").lower() == "text":
+        output.setFormatter(logging.Formatter("%(asctime)s %(levelname)s [%(name)s] %(message)s"))
+    else:
+        output.setFormatter(JsonFormatter())
+
+    log_queue: queue.Queue = queue.Queue(-1)
+    root = logging.getLogger()
+    root.handlers = [logging.handlers.QueueHandler(log_queue)]
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    for name, level in parse_module_levels(os.getenv("LOG_LEVELS", "")).items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def log_payload(logger: logging.Logger, message: str, **payload) -> None:
+    """
+    Log a large debug payload (prompts, raw API responses, uploaded items).
+    Only emitted when the logger has DEBUG enabled, and then only for a
+    sampled fraction of calls, so callers can pass big objects freely.
+    """
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    if _payload_sample_rate < 1.0 and random.random() >= _payload_sample_rate:
+        return
+    logger.debug(message, extra={"payload": payload})
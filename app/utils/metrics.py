@@ -0,0 +1,256 @@
+"""
+Prometheus instrumentation.
+
+- MetricsMiddleware: ASGI middleware recording latency per route template
+  and the number/duration of DB queries issued while handling the request.
+- observe_upstream / record_openai_usage: latency, errors and token usage of
+  OpenAI and Yelp calls.
+- UPSTREAM_*: retries, rejections, queueing, in-flight calls and circuit
+  state of the outbound-call layer (app.utils.outbound).
+- REQUESTS_CANCELLED / CANCELLED_WORK: requests stopped by their deadline
+  or a client disconnect (app.utils.deadline), and the time they used.
+- record_cache_access: hit/miss counters for the caches; CACHE_ERRORS and
+  CACHE_COALESCED for the shared cache (app.utils.cache).
+- PLACES_CATEGORIZED: bookmark places classified by the enrichment pool
+  (app.utils.enrichment), by where the category came from.
+- metrics_endpoint: serves everything in the Prometheus text format.
+
+Multi-worker deployments: set PROMETHEUS_MULTIPROC_DIR to an empty,
+writable directory shared by all workers (wiped on deploy) before starting
+uvicorn. Each worker then writes its samples there and /metrics aggregates
+them, whichever worker answers the scrape.
+"""
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.requests import Request
+from starlette.responses import Response
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 60)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+DB_QUERIES_PER_REQUEST = Histogram(
+    "db_queries_per_request",
+    "Number of SQL statements executed while handling a request",
+    ["method", "route"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 250, 1000),
+)
+DB_TIME_PER_REQUEST = Histogram(
+    "db_query_seconds_per_request",
+    "Total time spent in SQL statements while handling a request",
+    ["method", "route"],
+    buckets=LATENCY_BUCKETS,
+)
+UPSTREAM_LATENCY = Histogram(
+    "upstream_request_duration_seconds",
+    "Latency of calls to external providers",
+    ["provider", "operation"],
+    buckets=LATENCY_BUCKETS,
+)
+UPSTREAM_ERRORS = Counter(
+    "upstream_errors_total",
+    "Failed calls to external providers",
+    ["provider", "operation"],
+)
+UPSTREAM_RETRIES = Counter(
+    "upstream_retries_total",
+    "Retried calls to external providers",
+    ["provider", "operation"],
+)
+UPSTREAM_REJECTIONS = Counter(
+    "upstream_rejections_total",
+    "Calls to external providers refused locally (circuit_open, concurrency, rate_limit, deadline, disconnect)",
+    ["provider", "reason"],
+)
+UPSTREAM_QUEUE_WAIT = Histogram(
+    "upstream_queue_wait_seconds",
+    "Time spent waiting for a concurrency slot and rate-limit budget before a call",
+    ["provider"],
+    buckets=LATENCY_BUCKETS,
+)
+UPSTREAM_IN_FLIGHT = Gauge(
+    "upstream_in_flight",
+    "Calls to external providers currently in progress",
+    ["provider"],
+    multiprocess_mode="livesum",
+)
+UPSTREAM_CIRCUIT_STATE = Gauge(
+    "upstream_circuit_state",
+    "Circuit breaker state: 0 closed, 1 half-open, 2 open",
+    ["provider"],
+    multiprocess_mode="max",
+)
+OPENAI_TOKENS = Counter(
+    "openai_tokens_total",
+    "OpenAI token usage",
+    ["model", "operation", "kind"],
+)
+CACHE_ACCESSES = Counter(
+    "cache_requests_total",
+    "Cache lookups by result; hit ratio = hit / (hit + miss)",
+    ["cache", "result"],
+)
+REQUESTS_CANCELLED = Counter(
+    "requests_cancelled_total",
+    "Requests stopped before completing: client disconnected or deadline passed",
+    ["route", "reason"],
+)
+CANCELLED_WORK = Counter(
+    "cancelled_work_seconds_total",
+    "Time spent on requests that were then cancelled",
+    ["route", "reason"],
+)
+CACHE_ERRORS = Counter(
+    "cache_errors_total",
+    "Failed shared-cache backend calls (served as a miss)",
+    ["backend", "operation"],
+)
+CACHE_COALESCED = Counter(
+    "cache_coalesced_total",
+    "Cache misses answered by another caller's fill instead of computing the value again",
+    ["cache"],
+)
+PLACES_CATEGORIZED = Counter(
+    "places_categorized_total",
+    "Bookmark places classified in the background: cache (incl. Yelp matches), llm, or failed",
+    ["source"],
+)
+
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+class RequestStats:
+    """Per-request accumulator for DB statements."""
+
+    __slots__ = ("db_queries", "db_seconds")
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_seconds = 0.0
+
+
+# Sync endpoints run in a threadpool with a copy of the request context, so
+# they share this (mutable) object with the middleware.
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def current_request_stats() -> Optional[RequestStats]:
+    return _request_stats.get()
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_start"].pop()
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.db_queries += 1
+        stats.db_seconds += time.perf_counter() - started
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context):
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("query_start"):
+        conn.info["query_start"].pop()
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware (no BaseHTTPMiddleware) so streaming responses and
+    background tasks are unaffected. Also adds a Server-Timing header with
+    the DB time and query count, handy when looking at a single request.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                timing = f'db;dur={stats.db_seconds * 1000:.1f};desc="{stats.db_queries} queries"'
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"server-timing", timing.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_stats.reset(token)
+            route = scope.get("route")
+            route_label = getattr(route, "path", None) or UNMATCHED_ROUTE
+            method = scope["method"]
+            REQUEST_LATENCY.labels(method, route_label, str(status_code)).observe(time.perf_counter() - start)
+            DB_QUERIES_PER_REQUEST.labels(method, route_label).observe(stats.db_queries)
+            DB_TIME_PER_REQUEST.labels(method, route_label).observe(stats.db_seconds)
+
+
+@contextmanager
+def observe_upstream(provider: str, operation: str):
+    """Time a call to an external provider; exceptions are counted and re-raised."""
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        UPSTREAM_ERRORS.labels(provider, operation).inc()
+        raise
+    finally:
+        UPSTREAM_LATENCY.labels(provider, operation).observe(time.perf_counter() - start)
+
+
+def record_openai_usage(operation: str, response) -> None:
+    """Count prompt/completion tokens from a chat.completions response."""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return
+    model = getattr(response, "model", None) or "unknown"
+    OPENAI_TOKENS.labels(model, operation, "prompt").inc(usage.prompt_tokens or 0)
+    OPENAI_TOKENS.labels(model, operation, "completion").inc(usage.completion_tokens or 0)
+
+
+def record_cache_access(cache: str, hit: bool) -> None:
+    CACHE_ACCESSES.labels(cache, "hit" if hit else "miss").inc()
+
+
+def metrics_endpoint(request: Request) -> Response:
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        data = generate_latest(registry)
+    else:
+        data = generate_latest()
+    return Response(data, media_type=CONTENT_TYPE_LATEST)
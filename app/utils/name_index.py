@@ -0,0 +1,195 @@
+"""
+Fuzzy place-name lookup.
+
+Must-visit entries are typed by the user ("louvre", "Cafe de flore",
+"172 bd saint germain") and have to be matched to bookmarks before the
+planner runs. Names are compared by trigrams the same way Postgres pg_trgm
+does it: each word is padded with two spaces in front and one behind, and
+
+- similarity(a, b) = shared trigrams / all trigrams of a and b
+- word_similarity(q, t) = shared trigrams / trigrams of q, i.e. how much of
+  q appears in t ("louvre" in "Musée du Louvre" scores 1.0)
+
+A name's score is the larger of the two. NameIndex keeps an inverted index
+from trigram to entries, so a lookup only scores entries that share at
+least one trigram with the query. On Postgres with the pg_trgm extension
+the bookmarks are searched in the database instead (GIN trigram indexes on
+the title and address of places).
+"""
+import unicodedata
+from collections import Counter, OrderedDict, defaultdict
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import func, literal, or_, text
+from sqlalchemy.orm import Session
+
+from app.models.bookmark import Bookmark
+from app.models.place import Place
+
+MATCH_THRESHOLD = 0.5
+INDEX_CACHE_SIZE = 64  # users whose bookmark index is kept in memory
+
+
+@dataclass
+class NameMatch:
+    key: int  # bookmark id, or the entry's position for other indexes
+    score: float
+    ambiguous: bool = False  # another entry scores the same
+
+
+def normalize(value: str) -> str:
+    """Lower case, accents stripped, anything but letters and digits turned into spaces."""
+    decomposed = unicodedata.normalize("NFKD", value.casefold())
+    return "".join(
+        ch if ch.isalnum() else " "
+        for ch in decomposed
+        if not unicodedata.combining(ch)
+    )
+
+
+def trigrams(value: str) -> FrozenSet[str]:
+    grams = set()
+    for word in normalize(value).split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return frozenset(grams)
+
+
+class NameIndex:
+    """Trigram index over (key, names) entries; an entry matches through its best-scoring name."""
+
+    def __init__(self, entries: Iterable[Tuple[int, Sequence[Optional[str]]]]):
+        self._grams: List[Tuple[int, FrozenSet[str]]] = []
+        self._postings: Dict[str, List[int]] = defaultdict(list)
+        for key, names in entries:
+            for name in names:
+                grams = trigrams(name or "")
+                if not grams:
+                    continue
+                position = len(self._grams)
+                self._grams.append((key, grams))
+                for gram in grams:
+                    self._postings[gram].append(position)
+
+    def __len__(self) -> int:
+        return len(self._grams)
+
+    def search(self, query: str, limit: int = 5, threshold: float = MATCH_THRESHOLD) -> List[NameMatch]:
+        """Best matches first (ties by key), at most one per key."""
+        q = trigrams(query)
+        if not q:
+            return []
+        shared = Counter()
+        for gram in q:
+            shared.update(self._postings.get(gram, ()))
+        best: Dict[int, float] = {}
+        for position, count in shared.items():
+            key, grams = self._grams[position]
+            score = max(count / (len(q) + len(grams) - count), count / len(q))
+            if score >= threshold and score > best.get(key, 0.0):
+                best[key] = score
+        ranked = sorted(best.items(), key=lambda item: (-item[1], item[0]))
+        return [NameMatch(key, round(score, 3)) for key, score in ranked[:limit]]
+
+    def resolve(self, query: str, threshold: float = MATCH_THRESHOLD) -> Optional[NameMatch]:
+        return _best(self.search(query, limit=2, threshold=threshold))
+
+
+def _best(matches: Sequence[NameMatch]) -> Optional[NameMatch]:
+    if not matches:
+        return None
+    best = matches[0]
+    best.ambiguous = len(matches) > 1 and matches[1].score == best.score
+    return best
+
+
+_bookmark_indexes: "OrderedDict[int, Tuple[int, NameIndex]]" = OrderedDict()
+
+
+def bookmark_index(user_id: int, bookmarks: Sequence[Bookmark]) -> NameIndex:
+    """The user's bookmark index, rebuilt only when their bookmarks' names changed."""
+    signature = hash(tuple((b.id, b.title, b.address) for b in bookmarks))
+    cached = _bookmark_indexes.get(user_id)
+    if cached is not None and cached[0] == signature:
+        _bookmark_indexes.move_to_end(user_id)
+        return cached[1]
+    index = NameIndex((b.id, (b.title, b.address)) for b in bookmarks)
+    _bookmark_indexes[user_id] = (signature, index)
+    _bookmark_indexes.move_to_end(user_id)
+    while len(_bookmark_indexes) > INDEX_CACHE_SIZE:
+        _bookmark_indexes.popitem(last=False)
+    return index
+
+
+_pg_trgm_available: Dict[str, bool] = {}
+
+
+def pg_trgm_available(db: Session) -> bool:
+    """Whether the database is Postgres with pg_trgm installed (checked once per database)."""
+    bind = db.get_bind()
+    if bind.dialect.name != "postgresql":
+        return False
+    url = bind.url.render_as_string(hide_password=True)
+    if url not in _pg_trgm_available:
+        _pg_trgm_available[url] = db.execute(
+            text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        ).first() is not None
+    return _pg_trgm_available[url]
+
+
+def _pg_set_thresholds(db: Session) -> None:
+    """
+    Make % and <% match from MATCH_THRESHOLD (their defaults are 0.3 and
+    0.6), for the current transaction only, so Postgres finds what the
+    in-memory index finds.
+    """
+    db.execute(
+        text("SELECT set_config('pg_trgm.similarity_threshold', :threshold, true), "
+             "set_config('pg_trgm.word_similarity_threshold', :threshold, true)"),
+        {"threshold": str(MATCH_THRESHOLD)},
+    )
+
+
+def _pg_resolve(db: Session, user_id: int, query: str) -> Optional[NameMatch]:
+    q = literal(query)
+    scores = [
+        func.greatest(func.similarity(column, q), func.word_similarity(q, column))
+        for column in (Place.title, Place.address)
+    ]
+    score = func.greatest(*(func.coalesce(s, 0.0) for s in scores))
+    rows = (
+        db.query(Bookmark.id, score.label("score"))
+        .join(Bookmark.place)
+        .filter(
+            Bookmark.user_id == user_id,
+            # % and <% are the trigram operators the GIN indexes serve
+            or_(
+                Place.title.op("%")(q), q.op("<%")(Place.title),
+                Place.address.op("%")(q), q.op("<%")(Place.address),
+            ),
+            score >= MATCH_THRESHOLD,
+        )
+        .order_by(score.desc(), Bookmark.id)
+        .limit(2)
+        .all()
+    )
+    return _best([NameMatch(row.id, round(float(row.score), 3)) for row in rows])
+
+
+def resolve_bookmarks(db: Session, user_id: int, queries: Sequence[str],
+                      bookmarks: Optional[Sequence[Bookmark]] = None) -> List[Optional[NameMatch]]:
+    """
+    The best-matching bookmark of the user for each query, or None. Uses
+    pg_trgm when available; otherwise indexes `bookmarks` (loaded if not
+    given) in memory.
+    """
+    if not queries:
+        return []
+    if pg_trgm_available(db):
+        _pg_set_thresholds(db)
+        return [_pg_resolve(db, user_id, query) for query in queries]
+    if bookmarks is None:
+        bookmarks = db.query(Bookmark).filter(Bookmark.user_id == user_id).all()
+    index = bookmark_index(user_id, bookmarks)
+    return [index.resolve(query) for query in queries]
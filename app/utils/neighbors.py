@@ -0,0 +1,163 @@
+"""
+k-nearest-neighbour graph of a user's bookmarks.
+
+Each bookmark keeps its K nearest other bookmarks as
+[[bookmark_id, distance_m, walk_min], ...], nearest first. The graph is
+built when bookmarks are uploaded and patched on later uploads: only
+bookmarks that are new, moved, lost a neighbour, or gained a closer one get
+their list recomputed.
+
+Neighbour search uses a uniform lat/lon grid sized from the data, so
+building the graph is roughly O(n·k) instead of the O(n²) of comparing all
+pairs.
+"""
+import math
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from app.utils.route_planner import DEFAULT_SPEED_KMH, DETOUR_FACTOR
+
+K = 8
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 110.57  # lower bound: a degree of latitude is 110.57-111.69 km
+
+# grid cells hold about this many points on average
+POINTS_PER_CELL = 4
+MIN_CELL_DEG = 0.002
+MAX_CELL_DEG = 2.0
+
+Point = Tuple[float, float]  # (latitude, longitude)
+NeighborList = List[List[float]]  # [[id, distance_m, walk_min], ...]
+
+
+def haversine_km(a: Point, b: Point) -> float:
+    lat1, lon1 = map(math.radians, a)
+    lat2, lon2 = map(math.radians, b)
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(h)))
+
+
+def walk_minutes(distance_km: float) -> float:
+    return round(distance_km * DETOUR_FACTOR / DEFAULT_SPEED_KMH * 60, 1)
+
+
+class _Grid:
+    def __init__(self, points: Dict[int, Point]):
+        self.points = points
+        # size cells from the central 90% so a few far-away bookmarks don't make every cell huge
+        lats = sorted(p[0] for p in points.values())
+        lons = sorted(p[1] for p in points.values())
+        trim = len(lats) // 20
+        area = (
+            max(lats[-1 - trim] - lats[trim], MIN_CELL_DEG)
+            * max(lons[-1 - trim] - lons[trim], MIN_CELL_DEG)
+        )
+        cell = math.sqrt(area * POINTS_PER_CELL / len(points))
+        self.cell = min(MAX_CELL_DEG, max(MIN_CELL_DEG, cell))
+        # past this ring, scanning cells costs more than comparing against every point
+        self.max_ring = int(math.sqrt(len(points))) + 1
+        self.cells: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+        for point_id, point in points.items():
+            self.cells[self._key(point)].append(point_id)
+
+    def _key(self, point: Point) -> Tuple[int, int]:
+        return int(math.floor(point[0] / self.cell)), int(math.floor(point[1] / self.cell))
+
+    def _ring(self, center: Tuple[int, int], r: int) -> Iterable[int]:
+        ci, cj = center
+        if r == 0:
+            yield from self.cells.get(center, ())
+            return
+        for i in range(ci - r, ci + r + 1):
+            for j in (cj - r, cj + r):
+                yield from self.cells.get((i, j), ())
+        for j in range(cj - r + 1, cj + r):
+            for i in (ci - r, ci + r):
+                yield from self.cells.get((i, j), ())
+
+    def _ring_bound_km(self, point: Point, r: int) -> float:
+        """Lower bound on the distance from point to anything outside rings 0..r."""
+        lat = min(89.9, abs(point[0]) + (r + 1) * self.cell)
+        return r * self.cell * KM_PER_DEGREE * math.cos(math.radians(lat))
+
+    def nearest(self, point_id: int, k: int) -> List[Tuple[float, int]]:
+        point = self.points[point_id]
+        center = self._key(point)
+        found: List[Tuple[float, int]] = []
+        for r in range(self.max_ring + 1):
+            for other in self._ring(center, r):
+                if other != point_id:
+                    found.append((haversine_km(point, self.points[other]), other))
+            if len(found) >= k:
+                found.sort()
+                if found[k - 1][0] <= self._ring_bound_km(point, r):
+                    return found[:k]
+            if len(found) == len(self.points) - 1:
+                break
+        else:
+            # sparse data: compare against everything
+            found = [(haversine_km(point, p), other) for other, p in self.points.items() if other != point_id]
+        found.sort()
+        return found[:k]
+
+    def within(self, point: Point, radius_km: float) -> Iterable[int]:
+        """Superset of the points within radius_km of point."""
+        center = self._key(point)
+        out = []
+        for r in range(self.max_ring + 1):
+            out.extend(self._ring(center, r))
+            if self._ring_bound_km(point, r) > radius_km:
+                return out
+        return self.points.keys()
+
+
+def _neighbor_list(nearest: List[Tuple[float, int]]) -> NeighborList:
+    return [[other, int(round(km * 1000)), walk_minutes(km)] for km, other in nearest]
+
+
+def build_neighbors(points: Dict[int, Point], k: int = K) -> Dict[int, NeighborList]:
+    if not points:
+        return {}
+    grid = _Grid(points)
+    return {point_id: _neighbor_list(grid.nearest(point_id, k)) for point_id in points}
+
+
+def update_neighbors(
+    graph: Dict[int, Optional[NeighborList]],
+    points: Dict[int, Point],
+    changed: Set[int],
+    removed: Set[int],
+    k: int = K,
+) -> Dict[int, NeighborList]:
+    """
+    Patch `graph` (id -> previous list, None if unknown) after an upload.
+    `points` are all current bookmarks, `changed` the ids that are new or
+    moved and `removed` the ids that are gone. Returns only the lists that
+    need to be written.
+    """
+    if not points:
+        return {}
+    stale = {point_id for point_id in points if graph.get(point_id) is None} | (changed & points.keys())
+    gone = removed | changed
+    for point_id, neighbors in graph.items():
+        if point_id in points and neighbors and any(n[0] in gone for n in neighbors):
+            stale.add(point_id)
+
+    if changed:
+        # a new or moved point also enters the list of every point it is now closer to than that point's k-th
+        grid = _Grid(points)
+        radius_km = max(
+            (graph[p][-1][1] / 1000 for p in points if graph.get(p) and len(graph[p]) >= k),
+            default=float("inf"),
+        )
+        for point_id in changed & points.keys():
+            for other in grid.within(points[point_id], radius_km):
+                if other in stale or other == point_id:
+                    continue
+                neighbors = graph.get(other)
+                if len(neighbors) < k or haversine_km(points[other], points[point_id]) * 1000 < neighbors[-1][1]:
+                    stale.add(other)
+    else:
+        grid = _Grid(points) if stale else None
+
+    return {point_id: _neighbor_list(grid.nearest(point_id, k)) for point_id in stale}
@@ -0,0 +1,417 @@
+"""
+Guarded calls to external providers (OpenAI, Yelp).
+
+Every outbound call goes through `call(provider, operation, fn)`, which per
+provider and worker process:
+
+- fails fast with UpstreamUnavailable while the circuit is open (after
+  FAILURE_THRESHOLD consecutive failures; one trial call is let through
+  once RESET_TIMEOUT_S has passed),
+- takes one request and the call's estimated tokens from token buckets
+  refilled at the provider's RPM/TPM quota, waiting for them if needed,
+- waits for one of MAX_CONCURRENCY slots, so a slow provider ties up a
+  bounded number of threadpool threads instead of all of them,
+- retries connection errors, timeouts, 429 and 5xx with exponential
+  backoff and full jitter (or the provider's Retry-After), as long as the
+  call's DEADLINE_S allows it.
+
+Queueing for budget or a slot is bounded by QUEUE_TIMEOUT_S; past that the
+call is refused (UpstreamUnavailable) rather than piling up. Each setting
+is read from <PROVIDER>_<SETTING>, e.g. OPENAI_MAX_CONCURRENCY or YELP_RPM;
+0 for RPM/TPM disables that bucket.
+
+The buckets, slots and breaker live in each worker process and are not
+coordinated between them. RPM, TPM and MAX_CONCURRENCY are therefore
+configured for the whole service and split evenly between the
+WEB_CONCURRENCY worker processes (the variable uvicorn and gunicorn take
+their worker count from; 1 if unset), so N workers together stay within
+the provider's quota. The breaker opens separately in each worker.
+
+Inside a request, DEADLINE_S and the client timeouts are capped at the
+time the request has left (app.utils.deadline). Once it is cancelled (the
+client went away or its deadline passed) no further attempt is made and
+RequestCancelled is raised; a call cut short that way does not count
+against the provider's circuit.
+
+openai_client() and http_client() return process-wide clients built with
+the policy's timeout and without retries of their own. They are created on
+first use (importing the OpenAI SDK alone takes ~0.4 s) and closed by
+close_clients() at shutdown.
+"""
+import logging
+import math
+import os
+import random
+import sys
+import threading
+import time
+from dataclasses import dataclass, fields
+from typing import Callable, Dict, Optional, TypeVar
+
+from fastapi import HTTPException
+
+from app.utils import deadline as request_deadline
+from app.utils.metrics import (
+    UPSTREAM_CIRCUIT_STATE,
+    UPSTREAM_IN_FLIGHT,
+    UPSTREAM_QUEUE_WAIT,
+    UPSTREAM_REJECTIONS,
+    UPSTREAM_RETRIES,
+    observe_upstream,
+)
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+CLOSED, HALF_OPEN, OPEN = 0, 1, 2
+BURST_SECONDS = 10  # a bucket holds this many seconds of its quota
+CHARS_PER_TOKEN = 4
+SHARED_LIMITS = ("max_concurrency", "rpm", "tpm")  # service-wide, split between worker processes
+
+
+def worker_count() -> int:
+    """Worker processes sharing the provider quotas (WEB_CONCURRENCY, default 1)."""
+    try:
+        return max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+    except ValueError:
+        return 1
+
+
+@dataclass
+class Policy:
+    max_concurrency: int
+    rpm: int
+    tpm: int
+    timeout_s: float
+    deadline_s: float
+    max_retries: int = 2
+    queue_timeout_s: float = 5.0
+    failure_threshold: int = 5
+    reset_timeout_s: float = 30.0
+    backoff_base_s: float = 0.5
+    backoff_max_s: float = 8.0
+
+    @classmethod
+    def from_env(cls, prefix: str, workers: Optional[int] = None, **defaults) -> "Policy":
+        """The defaults overridden by <prefix>_<SETTING>, with the shared limits divided between `workers` processes."""
+        values = {}
+        for field in fields(cls):
+            raw = os.getenv(f"{prefix}_{field.name.upper()}")
+            if raw is not None:
+                values[field.name] = field.type(raw)
+        return cls(**{**defaults, **values}).per_process(workers or worker_count())
+
+    def per_process(self, workers: int) -> "Policy":
+        """This process's share of the shared limits; 0 (no bucket) stays 0 and no share drops below 1."""
+        for name in SHARED_LIMITS:
+            value = getattr(self, name)
+            if value > 0:
+                setattr(self, name, max(1, value // workers))
+        return self
+
+
+class UpstreamUnavailable(Exception):
+    """A call refused locally: circuit open, no slot or budget in time, or out of time to retry."""
+
+    def __init__(self, provider: str, reason: str, retry_after: float = 1.0):
+        super().__init__(f"{provider} unavailable ({reason})")
+        self.provider = provider
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def upstream_unavailable(exc: UpstreamUnavailable) -> HTTPException:
+    """The 503 an endpoint answers with when its provider call was refused."""
+    return HTTPException(
+        status_code=503,
+        detail=f"{exc.provider} 暂时不可用，请稍后重试",
+        headers={"Retry-After": str(math.ceil(exc.retry_after))},
+    )
+
+
+class TokenBucket:
+    """Thread-safe token bucket; waiting callers reserve tokens so they are served in order."""
+
+    def __init__(self, per_minute: int, clock: Callable[[], float] = time.monotonic):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * BURST_SECONDS)
+        self.tokens = self.capacity
+        self.clock = clock
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def reserve(self, amount: float, max_wait: float) -> Optional[float]:
+        """Take `amount` tokens; returns how long to wait before using them, or None if that is over max_wait."""
+        amount = min(amount, self.capacity)
+        with self.lock:
+            now = self.clock()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            wait = max(0.0, (amount - self.tokens) / self.rate)
+            if wait > max_wait:
+                return None
+            self.tokens -= amount
+            return wait
+
+    def refund(self, amount: float) -> None:
+        with self.lock:
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int, reset_timeout_s: float, clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_s = reset_timeout_s
+        self.clock = clock
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_running = False
+        self.lock = threading.Lock()
+
+    def retry_after(self) -> float:
+        return max(1.0, self.opened_at + self.reset_timeout_s - self.clock())
+
+    def allow(self) -> bool:
+        with self.lock:
+            if self.state == OPEN and self.clock() >= self.opened_at + self.reset_timeout_s:
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN:
+                if self.trial_running:
+                    return False
+                self.trial_running = True
+            return self.state != OPEN
+
+    def cancel(self) -> None:
+        """The allowed call was not made after all."""
+        with self.lock:
+            self.trial_running = False
+
+    def record_success(self) -> None:
+        with self.lock:
+            self.state = CLOSED
+            self.failures = 0
+            self.trial_running = False
+
+    def record_failure(self) -> None:
+        with self.lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    logger.warning("Circuit opened after %d consecutive failures", self.failures)
+                self.state = OPEN
+                self.opened_at = self.clock()
+            self.trial_running = False
+
+
+def status_code(exc: BaseException) -> Optional[int]:
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def _connection_errors() -> tuple:
+    # an httpx or openai exception means its module is loaded already; don't import either just to check
+    return tuple(
+        getattr(sys.modules[module], name)
+        for module, name in (("httpx", "TransportError"), ("openai", "APIConnectionError"))
+        if module in sys.modules
+    )
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """Connection problems, timeouts, 408, 429 and 5xx; anything else is our request's fault."""
+    if isinstance(exc, _connection_errors()):
+        return True
+    status = status_code(exc)
+    return status is not None and (status in (408, 429) or status >= 500)
+
+
+def _retry_after(exc: BaseException) -> Optional[float]:
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    try:
+        return float(headers.get("retry-after")) if headers is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class Provider:
+    def __init__(self, name: str, policy: Policy,
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        self.name = name
+        self.policy = policy
+        self.clock = clock
+        self.sleep = sleep
+        self.slots = threading.BoundedSemaphore(policy.max_concurrency)
+        self.requests = TokenBucket(policy.rpm, clock) if policy.rpm else None
+        self.tokens = TokenBucket(policy.tpm, clock) if policy.tpm else None
+        self.breaker = CircuitBreaker(policy.failure_threshold, policy.reset_timeout_s, clock)
+        UPSTREAM_CIRCUIT_STATE.labels(name).set(CLOSED)
+
+    def _refuse(self, reason: str, retry_after: float = 1.0) -> UpstreamUnavailable:
+        UPSTREAM_REJECTIONS.labels(self.name, reason).inc()
+        return UpstreamUnavailable(self.name, reason, retry_after)
+
+    def _budget(self, tokens: int, deadline: float) -> None:
+        max_wait = min(self.policy.queue_timeout_s, deadline - self.clock())
+        wait = 0.0
+        taken = []
+        for bucket, amount in ((self.requests, 1), (self.tokens, tokens)):
+            if bucket is None or not amount:
+                continue
+            reserved = bucket.reserve(amount, max_wait)
+            if reserved is None:
+                for bucket, amount in taken:
+                    bucket.refund(amount)
+                raise self._refuse("rate_limit")
+            taken.append((bucket, amount))
+            wait = max(wait, reserved)
+        if wait:
+            self.sleep(wait)
+
+    def backoff(self, attempt: int, exc: BaseException) -> float:
+        retry_after = _retry_after(exc)
+        if retry_after is not None:
+            return retry_after
+        return random.uniform(0, min(self.policy.backoff_max_s, self.policy.backoff_base_s * 2 ** attempt))
+
+    def _check_request(self) -> None:
+        try:
+            request_deadline.check(self.name)
+        except request_deadline.RequestCancelled as exc:
+            UPSTREAM_REJECTIONS.labels(self.name, exc.reason).inc()
+            raise
+
+    def call(self, operation: str, fn: Callable[[], T], tokens: int = 0) -> T:
+        deadline = self.clock() + request_deadline.bounded(self.policy.deadline_s)
+        attempt = 0
+        while True:
+            self._check_request()
+            if not self.breaker.allow():
+                UPSTREAM_CIRCUIT_STATE.labels(self.name).set(self.breaker.state)
+                raise self._refuse("circuit_open", self.breaker.retry_after())
+            queued = self.clock()
+            try:
+                self._budget(tokens, deadline)
+                if not self.slots.acquire(timeout=max(0.0, min(self.policy.queue_timeout_s, deadline - self.clock()))):
+                    raise self._refuse("concurrency")
+            except UpstreamUnavailable:
+                self.breaker.cancel()
+                raise
+            UPSTREAM_QUEUE_WAIT.labels(self.name).observe(self.clock() - queued)
+            UPSTREAM_IN_FLIGHT.labels(self.name).inc()
+            try:
+                with observe_upstream(self.name, operation):
+                    result = fn()
+            except Exception as exc:
+                if self.tokens is not None and tokens:
+                    self.tokens.refund(tokens)  # failed requests are not billed against the quota
+                current = request_deadline.current()
+                reason = current.cancelled_reason() if current is not None else None
+                if reason is not None:
+                    # most likely our own shortened timeout; not the provider's fault
+                    self.breaker.cancel()
+                    UPSTREAM_REJECTIONS.labels(self.name, reason).inc()
+                    raise request_deadline.RequestCancelled(reason, self.name) from exc
+                retryable = is_retryable(exc)
+                if retryable:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()  # the provider answered; the request was wrong
+                UPSTREAM_CIRCUIT_STATE.labels(self.name).set(self.breaker.state)
+                if not retryable or attempt >= self.policy.max_retries:
+                    raise
+                delay = self.backoff(attempt, exc)
+                if self.clock() + delay >= deadline:
+                    UPSTREAM_REJECTIONS.labels(self.name, "deadline").inc()
+                    raise
+                logger.info("%s %s failed (%s); retry %d in %.2fs", self.name, operation, exc, attempt + 1, delay)
+                UPSTREAM_RETRIES.labels(self.name, operation).inc()
+            except BaseException:
+                self.breaker.cancel()
+                raise
+            else:
+                self.breaker.record_success()
+                UPSTREAM_CIRCUIT_STATE.labels(self.name).set(CLOSED)
+                used = getattr(getattr(result, "usage", None), "total_tokens", None)
+                if self.tokens is not None and tokens and isinstance(used, int) and used < tokens:
+                    self.tokens.refund(tokens - used)  # the estimate assumed the whole completion budget
+                return result
+            finally:
+                UPSTREAM_IN_FLIGHT.labels(self.name).dec()
+                self.slots.release()
+            self.sleep(delay)
+            attempt += 1
+
+
+PROVIDERS: Dict[str, Provider] = {
+    # gpt-4.1 tier-1 quota for the whole service; narration answers take up to ~30 s
+    "openai": Provider("openai", Policy.from_env(
+        "OPENAI", max_concurrency=16, rpm=500, tpm=30000, timeout_s=45.0, deadline_s=90.0,
+    )),
+    "yelp": Provider("yelp", Policy.from_env(
+        "YELP", max_concurrency=8, rpm=300, tpm=0, timeout_s=5.0, deadline_s=10.0, queue_timeout_s=2.0,
+    )),
+}
+
+
+def call(provider: str, operation: str, fn: Callable[[], T], tokens: int = 0) -> T:
+    """Run fn (one request to `provider`) under that provider's limits, retries and circuit breaker."""
+    return PROVIDERS[provider].call(operation, fn, tokens)
+
+
+def policy(provider: str) -> Policy:
+    return PROVIDERS[provider].policy
+
+
+def call_timeout(provider: str) -> float:
+    """Timeout for one request to `provider`: the policy's, or less if the current request is running out of time."""
+    return request_deadline.bounded(policy(provider).timeout_s)
+
+
+def estimate_tokens(messages, max_tokens: int) -> int:
+    """Rough TPM cost of a chat completion: prompt characters / 4 plus the completion budget."""
+    return sum(len(m["content"]) for m in messages) // CHARS_PER_TOKEN + max_tokens
+
+
+_clients: Dict[str, object] = {}
+_clients_lock = threading.Lock()
+
+
+def _shared(name: str, factory: Callable[[], T]) -> T:
+    client = _clients.get(name)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(name)
+            if client is None:
+                client = _clients[name] = factory()
+    return client
+
+
+def openai_client():
+    """The shared OpenAI client (reads OPENAI_API_KEY / OPENAI_BASE_URL), with call_timeout("openai")."""
+    def build():
+        from openai import OpenAI
+        return OpenAI(max_retries=0, timeout=policy("openai").timeout_s)
+    client = _shared("openai", build)
+    timeout = call_timeout("openai")
+    # with_options copies the client but shares its connection pool
+    return client if timeout >= policy("openai").timeout_s else client.with_options(timeout=timeout)
+
+
+def http_client(provider: str):
+    """A shared httpx.Client for `provider`, so its connections are kept alive between calls."""
+    def build():
+        import httpx
+        return httpx.Client(timeout=policy(provider).timeout_s)
+    return _shared(f"http:{provider}", build)
+
+
+def close_clients() -> None:
+    with _clients_lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        client.close()
@@ -0,0 +1,78 @@
+"""
+Shared place catalogue.
+
+The same cafe bookmarked by a thousand users is one row of `places`; each
+user's bookmark only references it (Bookmark.place_id) and keeps what is
+per user: its neighbour list and cluster. Places are keyed by
+place_fingerprint: the normalized name at coordinates rounded to
+COORDINATE_DECIMALS, after the Google Maps link when the bookmark has one.
+
+A place is written by the first upload that has it and never changed
+afterwards, so one user's upload never edits another user's bookmarks.
+A bookmark re-uploaded under another name or moved to another
+COORDINATE_DECIMALS cell, with or without a link, gets a different
+fingerprint: the upload points it at another place (the bookmark is
+replaced, as if deleted and added). Only a changed address goes unseen.
+Category enrichment (app.utils.enrichment) works on places, so each place
+is classified once for everybody. Places nobody bookmarks any more are
+kept; they cost one row and keep their category.
+"""
+import hashlib
+from typing import Dict, Optional
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app.models.place import Place
+from app.utils.name_index import normalize
+
+# ~110 m: Google Maps and Yelp put the same place a few metres apart
+COORDINATE_DECIMALS = 3
+MAX_FINGERPRINT_LENGTH = 255
+LOOKUP_CHUNK = 500  # fingerprints per IN (...) query
+
+
+def place_fingerprint(name: str, latitude: float, longitude: float, maps_url: Optional[str] = None) -> str:
+    """The normalized name at rounded coordinates, prefixed by the Google Maps link if there is one."""
+    name = " ".join(normalize(name).split())
+    key = f"geo:{latitude:.{COORDINATE_DECIMALS}f},{longitude:.{COORDINATE_DECIMALS}f}:{name}"
+    if maps_url:
+        key = "url:" + maps_url.strip().split("://", 1)[-1].removeprefix("www.") + " " + key
+    if len(key) > MAX_FINGERPRINT_LENGTH:
+        key = "sha256:" + hashlib.sha256(key.encode("utf-8")).hexdigest()
+    return key
+
+
+def _insert(db: Session):
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+        return pg_insert(Place).on_conflict_do_nothing(index_elements=["fingerprint"])
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+        return sqlite_insert(Place).on_conflict_do_nothing(index_elements=["fingerprint"])
+    return insert(Place)
+
+
+def _load(db: Session, fingerprints, found: Dict[str, Place]) -> None:
+    for start in range(0, len(fingerprints), LOOKUP_CHUNK):
+        chunk = fingerprints[start:start + LOOKUP_CHUNK]
+        for place in db.query(Place).filter(Place.fingerprint.in_(chunk)):
+            found[place.fingerprint] = place
+
+
+def get_or_create_places(db: Session, fields: Dict[str, Dict]) -> Dict[str, Place]:
+    """
+    The places for `fields` (fingerprint -> title, address, latitude,
+    longitude, google_maps_url), inserting in one executemany the ones no
+    user has bookmarked yet. A place inserted meanwhile by a concurrent
+    upload is used as is.
+    """
+    found: Dict[str, Place] = {}
+    _load(db, list(fields), found)
+    missing = [fingerprint for fingerprint in fields if fingerprint not in found]
+    if missing:
+        db.execute(_insert(db), [dict(fields[fingerprint], fingerprint=fingerprint, category="")
+                                 for fingerprint in missing])
+        _load(db, missing, found)
+    return found
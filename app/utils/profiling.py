@@ -0,0 +1,230 @@
+"""
+Opt-in per-request profiling.
+
+Disabled unless PROFILE_ADMIN_TOKEN is set; then a request carrying
+`X-Profile: <token>` (or `?profile=<token>`) runs its endpoint under
+cProfile. The stats are written to a bounded ring buffer on disk
+(PROFILE_DIR, at most PROFILE_MAX_FILES profiles) and the response carries
+an `X-Profile-Id` header to fetch them from /admin/profiles/{id}.
+
+Routers opt in with `APIRouter(route_class=ProfiledRoute)`. When
+profiling is disabled the endpoints are registered unwrapped.
+
+One request is profiled at a time per process: a flagged request that
+arrives while another is being profiled runs unprofiled (no X-Profile-Id).
+A sync endpoint's profile covers its own threadpool thread only. An async
+endpoint runs on the event loop, so its profile also contains whatever
+other requests the loop ran meanwhile; profile async endpoints on an
+otherwise idle worker.
+"""
+import cProfile
+import functools
+import hmac
+import inspect
+import io
+import json
+import logging
+import os
+import pstats
+import re
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs
+
+from fastapi.routing import APIRoute
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "x-profile"
+PROFILE_QUERY_PARAM = "profile"
+PROFILE_ID_PATTERN = re.compile(r"^[0-9]{13}-[0-9a-f]{8}$")
+
+
+def admin_token() -> Optional[str]:
+    return os.getenv("PROFILE_ADMIN_TOKEN") or None
+
+
+def profiling_enabled() -> bool:
+    return admin_token() is not None
+
+
+def is_admin_token(candidate: Optional[str]) -> bool:
+    token = admin_token()
+    return bool(token and candidate and hmac.compare_digest(candidate, token))
+
+
+class ProfileStore:
+    """Ring buffer of profiles on disk: <id>.prof (pstats) and <id>.json (metadata)."""
+
+    def __init__(self, directory: str, max_profiles: int):
+        self.directory = directory
+        self.max_profiles = max_profiles
+
+    def new_id(self) -> str:
+        # millisecond timestamp first so ids sort chronologically
+        return f"{int(time.time() * 1000):013d}-{uuid.uuid4().hex[:8]}"
+
+    def save(self, profile: cProfile.Profile, metadata: Dict) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        profile_id = self.new_id()
+        profile.dump_stats(os.path.join(self.directory, f"{profile_id}.prof"))
+        with open(os.path.join(self.directory, f"{profile_id}.json"), "w") as f:
+            json.dump({"id": profile_id, **metadata}, f)
+        self._evict()
+        return profile_id
+
+    def _ids(self) -> List[str]:
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(name[:-5] for name in os.listdir(self.directory) if name.endswith(".json"))
+
+    def _evict(self) -> None:
+        ids = self._ids()
+        for profile_id in ids[: max(0, len(ids) - self.max_profiles)]:
+            for ext in (".prof", ".json"):
+                try:
+                    os.remove(os.path.join(self.directory, profile_id + ext))
+                except FileNotFoundError:
+                    pass
+
+    def list(self) -> List[Dict]:
+        entries = []
+        for profile_id in reversed(self._ids()):
+            try:
+                with open(os.path.join(self.directory, f"{profile_id}.json")) as f:
+                    entries.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return entries
+
+    def stats_path(self, profile_id: str) -> Optional[str]:
+        if not PROFILE_ID_PATTERN.match(profile_id):
+            return None
+        path = os.path.join(self.directory, f"{profile_id}.prof")
+        return path if os.path.exists(path) else None
+
+    def render_text(self, profile_id: str, limit: int = 60) -> Optional[str]:
+        path = self.stats_path(profile_id)
+        if path is None:
+            return None
+        out = io.StringIO()
+        pstats.Stats(path, stream=out).sort_stats("cumulative").print_stats(limit)
+        return out.getvalue()
+
+
+store = ProfileStore(
+    directory=os.getenv("PROFILE_DIR", os.path.join("/tmp", "guidipper-profiles")),
+    max_profiles=int(os.getenv("PROFILE_MAX_FILES", "50")),
+)
+
+
+class _ProfileRequest:
+    __slots__ = ("method", "path", "profile_id")
+
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.profile_id: Optional[str] = None
+
+
+_active: ContextVar[Optional[_ProfileRequest]] = ContextVar("profile_request", default=None)
+# held while a request is profiled; cProfile cannot tell two requests on the event loop apart
+_profiling = threading.Lock()
+
+
+def _save(profile: cProfile.Profile, request: _ProfileRequest, endpoint, elapsed: float) -> None:
+    try:
+        request.profile_id = store.save(profile, {
+            "method": request.method,
+            "path": request.path,
+            "endpoint": f"{endpoint.__module__}.{endpoint.__qualname__}",
+            "duration_ms": round(elapsed * 1000, 2),
+            "created_at": time.time(),
+        })
+        logger.info("Saved profile %s for %s %s", request.profile_id, request.method, request.path)
+    except OSError:
+        logger.exception("Could not save profile")
+
+
+def profiled(endpoint):
+    """Wrap an endpoint so it runs under cProfile when the request asked for it."""
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def async_wrapper(*args, **kwargs):
+            request = _active.get()
+            if request is None or not _profiling.acquire(blocking=False):
+                return await endpoint(*args, **kwargs)
+            profile = cProfile.Profile()
+            start = time.perf_counter()
+            profile.enable()
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                profile.disable()
+                _profiling.release()
+                _save(profile, request, endpoint, time.perf_counter() - start)
+        return async_wrapper
+
+    @functools.wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        request = _active.get()
+        if request is None or not _profiling.acquire(blocking=False):
+            return endpoint(*args, **kwargs)
+        profile = cProfile.Profile()
+        start = time.perf_counter()
+        profile.enable()
+        try:
+            return endpoint(*args, **kwargs)
+        finally:
+            profile.disable()
+            _profiling.release()
+            _save(profile, request, endpoint, time.perf_counter() - start)
+    return wrapper
+
+
+class ProfiledRoute(APIRoute):
+    def __init__(self, path: str, endpoint, **kwargs):
+        if profiling_enabled():
+            endpoint = profiled(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+
+class ProfilingMiddleware:
+    """Marks requests that carry the admin profiling token; only installed when profiling is enabled."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._requested(scope):
+            await self.app(scope, receive, send)
+            return
+
+        request = _ProfileRequest(scope["method"], scope["path"])
+        token = _active.set(request)
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start" and request.profile_id:
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-profile-id", request.profile_id.encode())
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            _active.reset(token)
+
+    @staticmethod
+    def _requested(scope) -> bool:
+        for name, value in scope.get("headers", []):
+            if name == PROFILE_HEADER.encode():
+                return is_admin_token(value.decode("latin-1"))
+        query = scope.get("query_string", b"")
+        if PROFILE_QUERY_PARAM.encode() in query:
+            values = parse_qs(query.decode("latin-1")).get(PROFILE_QUERY_PARAM, [])
+            return any(is_admin_token(v) for v in values)
+        return False
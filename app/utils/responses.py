@@ -0,0 +1,52 @@
+"""
+JSON responses.
+
+FastJSONResponse renders with orjson and is the app's default response
+class. FastAPI still validates against the response_model (or runs
+jsonable_encoder when there is none); only the final dump changes, which
+on a 10k-row list is about a third faster than json.dumps.
+
+Large lists of rows can skip the ORM and Pydantic altogether:
+`schema_columns` selects only the columns a response schema has, and
+`rows_response` writes those tuples out with orjson. The values come
+straight from typed columns of our own tables, so validating them again on
+the way out buys nothing. Use it for flat schemas whose fields are all
+plain columns; anything with nested models still goes through the schema.
+"""
+from typing import Any, Iterable, List, Sequence, Type
+
+import orjson
+from pydantic import BaseModel
+from starlette.responses import JSONResponse, Response
+
+# naive datetimes as-is, UTC ones with "Z" like Pydantic
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, option=ORJSON_OPTIONS)
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def _keys(schema: Type[BaseModel]) -> List[str]:
+    return [field.serialization_alias or field.alias or name for name, field in schema.model_fields.items()]
+
+
+def schema_columns(schema: Type[BaseModel], entity, **columns) -> list:
+    """
+    The columns of `entity` that `schema` has, in field order:
+    `db.query(*schema_columns(S, Model))`. `columns` gives the fields that
+    come from another (joined) table.
+    """
+    return [columns[name] if name in columns else getattr(entity, name) for name in schema.model_fields]
+
+
+def rows_response(schema: Type[BaseModel], rows: Iterable[Sequence[Any]], status_code: int = 200) -> Response:
+    """A JSON list of `schema` objects from rows selected with `schema_columns`, without validating them."""
+    keys = _keys(schema)
+    body = dumps([dict(zip(keys, row)) for row in rows])
+    return Response(body, status_code=status_code, media_type="application/json")
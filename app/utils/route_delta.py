@@ -0,0 +1,54 @@
+"""
+Line deltas between two versions of a route text.
+
+A delta is a JSON list of operations applied to the parent's lines in
+order:
+
+- a positive int n: copy the next n lines of the parent
+- a negative int -n: skip the next n lines of the parent
+- a list of strings: insert these lines
+
+Lines keep their line endings, so applying a delta reproduces the new text
+byte for byte. Unchanged lines cost a single number, which keeps a delta
+proportional to the size of the edit rather than the size of the route.
+"""
+import difflib
+import json
+from typing import List, Union
+
+DeltaOp = Union[int, List[str]]
+
+
+def make_delta(old: str, new: str) -> str:
+    old_lines = old.splitlines(keepends=True)
+    new_lines = new.splitlines(keepends=True)
+    ops: List[DeltaOp] = []
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            ops.append(i2 - i1)
+            continue
+        if i2 > i1:
+            ops.append(-(i2 - i1))
+        if j2 > j1:
+            ops.append(new_lines[j1:j2])
+    return json.dumps(ops, ensure_ascii=False, separators=(",", ":"))
+
+
+def apply_delta(old: str, delta: str) -> str:
+    old_lines = old.splitlines(keepends=True)
+    out: List[str] = []
+    position = 0
+    for op in json.loads(delta):
+        if isinstance(op, list):
+            out.extend(op)
+        elif op >= 0:
+            if position + op > len(old_lines):
+                raise ValueError("delta does not match its parent text")
+            out.extend(old_lines[position:position + op])
+            position += op
+        else:
+            position -= op
+    if position != len(old_lines):
+        raise ValueError("delta does not match its parent text")
+    return "".join(out)
@@ -0,0 +1,350 @@
+"""
+Local day planner.
+
+Picks and orders stops from candidate places before the LLM is involved,
+so the model only narrates a sequence that is already feasible:
+
+- every leg is at most max_commute_min long,
+- every visit starts inside one of its time windows (waiting is allowed),
+- the last visit ends by the end of the day,
+- at most one visit per (group, window), e.g. one lunch and one dinner.
+
+The heuristic is the usual one for time-windowed orienteering problems:
+nearest-neighbour construction (must-visit places first), then 2-opt and
+Or-opt moves to shorten the day, then insertion of further candidates into
+the time that frees up. Travel times use an equirectangular projection
+around the origin, which is accurate to well under a percent at city
+scale, times a detour factor for the street network.
+"""
+import math
+import re
+from dataclasses import dataclass, field
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+# km/h, by transport mode; the fastest mode the user allows is used
+MODE_SPEEDS_KMH = {"walking": 5.0, "cycling": 15.0, "transit": 20.0, "driving": 25.0}
+DEFAULT_SPEED_KMH = MODE_SPEEDS_KMH["walking"]
+DETOUR_FACTOR = 1.3  # street distance / straight-line distance
+
+# Each score point is worth this many minutes of extra travel when choosing the next stop.
+SCORE_MINUTES = 10.0
+
+_CLOCK = re.compile(r"([01]?\d|2[0-3]):([0-5]\d)$")
+
+MAX_IMPROVEMENT_ROUNDS = 50
+
+
+@dataclass
+class Candidate:
+    name: str
+    latitude: float
+    longitude: float
+    duration_min: float = 60.0
+    score: float = 1.0
+    must_visit: bool = False
+    # allowed visit start times in minutes since midnight; empty = any time
+    windows: Tuple[Tuple[float, float], ...] = ()
+    group: Optional[str] = None  # at most one visit per (group, window)
+    address: Optional[str] = None
+    bookmark_id: Optional[int] = None
+
+
+@dataclass
+class PlannedStop:
+    candidate: Candidate
+    arrive_min: float
+    start_min: float
+    end_min: float
+    commute_min: float
+
+
+@dataclass
+class Plan:
+    stops: List[PlannedStop] = field(default_factory=list)
+    travel_min: float = 0.0
+    missed_must_visits: List[Candidate] = field(default_factory=list)
+
+
+def parse_clock(value: str) -> float:
+    """'09:30' -> 570.0; ValueError for anything but a 24h HH:MM time."""
+    match = _CLOCK.match(value.strip())
+    if not match:
+        raise ValueError(f"expected a 24h HH:MM time, got {value!r}")
+    return int(match.group(1)) * 60 + int(match.group(2))
+
+
+def format_clock(minutes: float) -> str:
+    minutes = int(round(minutes))
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def speed_for_modes(modes: Sequence[str]) -> float:
+    speeds = [MODE_SPEEDS_KMH[m.lower()] for m in modes if m.lower() in MODE_SPEEDS_KMH]
+    return max(speeds) if speeds else DEFAULT_SPEED_KMH
+
+
+class _Problem:
+    """Node 0 is the origin, node i > 0 is candidates[i - 1]."""
+
+    def __init__(self, candidates: Sequence[Candidate], origin: Tuple[float, float],
+                 start_min: float, end_min: float, max_leg_min: float, speed_kmh: float,
+                 neighbours: Optional[Sequence[Optional[Sequence[int]]]] = None):
+        self.candidates = list(candidates)
+        self.start_min = start_min
+        self.end_min = end_min
+        self.max_leg_min = max_leg_min
+
+        lat0, lon0 = origin
+        kx = 111.320 * math.cos(math.radians(lat0))
+        ky = 110.574
+        self.xs = [0.0] + [(c.longitude - lon0) * kx for c in self.candidates]
+        self.ys = [0.0] + [(c.latitude - lat0) * ky for c in self.candidates]
+        self.minutes_per_km = DETOUR_FACTOR / speed_kmh * 60.0
+
+        # node -> nearby nodes; None = no list, always considered
+        self.neighbours: Optional[List[Optional[List[int]]]] = None
+        if neighbours is not None:
+            self.neighbours = [None] + [
+                None if near is None else [n + 1 for n in near if 0 <= n < len(self.candidates)]
+                for near in neighbours
+            ]
+
+    def leg(self, a: int, b: int) -> float:
+        return math.hypot(self.xs[a] - self.xs[b], self.ys[a] - self.ys[b]) * self.minutes_per_km
+
+    def _visit(self, node: int, arrive: float, used: set) -> Optional[Tuple[float, float, Optional[tuple]]]:
+        """(start, end, slot) of a visit arriving at `arrive`, or None if it cannot fit."""
+        candidate = self.candidates[node - 1]
+        if not candidate.windows:
+            start = arrive
+            end = start + candidate.duration_min
+            return (start, end, None) if end <= self.end_min else None
+        for index, (opens, closes) in enumerate(candidate.windows):
+            slot = (candidate.group, index) if candidate.group else None
+            if slot is not None and slot in used:
+                continue
+            start = max(arrive, opens)
+            end = start + candidate.duration_min
+            if start <= closes and end <= self.end_min:
+                return start, end, slot
+        return None
+
+    def schedule(self, seq: Sequence[int]) -> Optional[List[Tuple[float, float, float, float]]]:
+        """[(arrive, start, end, leg)] per node, or None if the sequence is infeasible."""
+        out = []
+        used = set()
+        clock, prev = self.start_min, 0
+        for node in seq:
+            leg = self.leg(prev, node)
+            if leg > self.max_leg_min:
+                return None
+            arrive = clock + leg
+            visit = self._visit(node, arrive, used)
+            if visit is None:
+                return None
+            start, end, slot = visit
+            if slot is not None:
+                used.add(slot)
+            out.append((arrive, start, end, leg))
+            clock, prev = end, node
+        return out
+
+    def cost(self, seq: Sequence[int]) -> Optional[Tuple[float, float]]:
+        """(finish time, travel) of a feasible sequence; lower is better."""
+        timings = self.schedule(seq)
+        if timings is None:
+            return None
+        if not timings:
+            return (self.start_min, 0.0)
+        return (timings[-1][2], sum(t[3] for t in timings))
+
+    def always_considered(self, node: int) -> bool:
+        return (
+            self.neighbours is None
+            or self.neighbours[node] is None
+            or self.candidates[node - 1].must_visit
+        )
+
+    def near(self, nodes: Iterable[int], among: Sequence[int]) -> List[int]:
+        """The members of `among` that are neighbours of `nodes` or always considered."""
+        if self.neighbours is None:
+            return list(among)
+        close = set()
+        for node in nodes:
+            close.update(self.neighbours[node] or ())
+        return [n for n in among if n in close or self.always_considered(n)]
+
+
+def _feasible(problem: _Problem, prev: int, clock: float, used: set, nodes: Sequence[int]) -> List[tuple]:
+    feasible = []
+    for node in nodes:
+        leg = problem.leg(prev, node)
+        if leg > problem.max_leg_min:
+            continue
+        visit = problem._visit(node, clock + leg, used)
+        if visit is not None:
+            feasible.append((node, visit))
+    return feasible
+
+
+def _construct(problem: _Problem, pool: List[int]) -> List[int]:
+    """
+    Nearest neighbour biased towards higher scores. Must-visit places come
+    first; one that is more than a leg away is approached through the
+    optional stops that bring the day closest to it.
+    """
+    seq: List[int] = []
+    used = set()
+    clock, prev = problem.start_min, 0
+    remaining = list(pool)
+    musts = [n for n in remaining if problem.candidates[n - 1].must_visit]
+    while remaining:
+        # look at the previous stop's neighbours first, everything only if none of them fits
+        feasible = _feasible(problem, prev, clock, used, problem.near([prev], remaining) if prev else remaining)
+        if not feasible and prev and problem.neighbours is not None:
+            feasible = _feasible(problem, prev, clock, used, remaining)
+        if not feasible:
+            break
+
+        reachable_musts = [(n, v) for n, v in feasible if n in musts]
+        target = min(musts, key=lambda n: (problem.leg(prev, n), n)) if musts else None
+        if reachable_musts:
+            best, visit = min(reachable_musts, key=lambda nv: (nv[1][0], nv[0]))
+        elif target is not None and any(problem.leg(n, target) < problem.leg(prev, target) for n, _ in feasible):
+            best, visit = min(feasible, key=lambda nv: (problem.leg(nv[0], target), nv[0]))
+        else:
+            musts = []  # the remaining must-visit places are left to _insert_more
+            best, visit = min(
+                feasible,
+                key=lambda nv: (nv[1][0] - problem.candidates[nv[0] - 1].score * SCORE_MINUTES, nv[0]),
+            )
+
+        seq.append(best)
+        remaining.remove(best)
+        if best in musts:
+            musts.remove(best)
+        if visit[2] is not None:
+            used.add(visit[2])
+        clock, prev = visit[1], best
+    return seq
+
+
+def _two_opt(problem: _Problem, seq: List[int], cost) -> Tuple[List[int], tuple, bool]:
+    improved = False
+    for i in range(len(seq) - 1):
+        for j in range(i + 1, len(seq)):
+            trial = seq[:i] + seq[i:j + 1][::-1] + seq[j + 1:]
+            trial_cost = problem.cost(trial)
+            if trial_cost is not None and trial_cost < cost:
+                seq, cost, improved = trial, trial_cost, True
+    return seq, cost, improved
+
+
+def _or_opt(problem: _Problem, seq: List[int], cost) -> Tuple[List[int], tuple, bool]:
+    improved = False
+    for length in (1, 2, 3):
+        i = 0
+        while i + length <= len(seq):
+            segment = seq[i:i + length]
+            rest = seq[:i] + seq[i + length:]
+            for j in range(len(rest) + 1):
+                if j == i:
+                    continue
+                trial = rest[:j] + segment + rest[j:]
+                trial_cost = problem.cost(trial)
+                if trial_cost is not None and trial_cost < cost:
+                    seq, cost, improved = trial, trial_cost, True
+                    break
+            i += 1
+    return seq, cost, improved
+
+
+def _improve(problem: _Problem, seq: List[int]) -> List[int]:
+    cost = problem.cost(seq)
+    for _ in range(MAX_IMPROVEMENT_ROUNDS):
+        seq, cost, by_two_opt = _two_opt(problem, seq, cost)
+        seq, cost, by_or_opt = _or_opt(problem, seq, cost)
+        if not (by_two_opt or by_or_opt):
+            break
+    return seq
+
+
+def _best_insertion(problem: _Problem, seq: List[int], node: int) -> Optional[List[int]]:
+    best = best_cost = None
+    for position in range(len(seq) + 1):
+        trial = seq[:position] + [node] + seq[position:]
+        trial_cost = problem.cost(trial)
+        if trial_cost is not None and (best_cost is None or trial_cost < best_cost):
+            best, best_cost = trial, trial_cost
+    return best
+
+
+def _insert_more(problem: _Problem, seq: List[int], pool: List[int]) -> List[int]:
+    """
+    Insert unvisited candidates (must-visit and higher scores first) wherever
+    they still fit. With a neighbour graph only the neighbours of planned
+    stops are tried, which are the only ones with a short enough detour.
+    """
+    tried = set(seq)
+    while True:
+        order = sorted(
+            (n for n in problem.near(seq, pool) if n not in tried),
+            key=lambda n: (not problem.candidates[n - 1].must_visit, -problem.candidates[n - 1].score, n),
+        )
+        if not order:
+            return seq
+        for node in order:
+            tried.add(node)
+            candidate = problem.candidates[node - 1]
+            trial = _best_insertion(problem, seq, node)
+            if trial is None and candidate.must_visit:
+                # make room for a must-visit place by dropping one optional stop
+                for drop in [n for n in seq if not problem.candidates[n - 1].must_visit]:
+                    trial = _best_insertion(problem, [n for n in seq if n != drop], node)
+                    if trial is not None:
+                        break
+            if trial is not None:
+                seq = _improve(problem, trial)
+
+
+def plan_route(
+    candidates: Sequence[Candidate],
+    origin: Tuple[float, float],
+    start_time: str,
+    end_time: str,
+    max_commute_min: float,
+    speed_kmh: float = DEFAULT_SPEED_KMH,
+    neighbours: Optional[Sequence[Optional[Sequence[int]]]] = None,
+) -> Plan:
+    """
+    Choose and order stops among candidates for a day starting at `origin`
+    (latitude, longitude). Deterministic for a given input.
+
+    `neighbours[i]`, if given, lists the indexes of the candidates near
+    candidates[i] (e.g. from the bookmark neighbour graph); the search then
+    only looks at those after visiting candidates[i]. None for a candidate
+    means it has no list and is always looked at.
+    """
+    problem = _Problem(
+        candidates, origin, parse_clock(start_time), parse_clock(end_time), max_commute_min, speed_kmh,
+        neighbours,
+    )
+    # a candidate farther than a full day of travel from the origin can never be part of the plan
+    day = problem.end_min - problem.start_min
+    pool = [n for n in range(1, len(problem.candidates) + 1) if problem.leg(0, n) <= day]
+
+    seq = _construct(problem, pool)
+    seq = _improve(problem, seq)
+    seq = _insert_more(problem, seq, pool)
+
+    timings = problem.schedule(seq) or []
+    stops = [
+        PlannedStop(problem.candidates[node - 1], arrive, start, end, leg)
+        for node, (arrive, start, end, leg) in zip(seq, timings)
+    ]
+    visited = {id(stop.candidate) for stop in stops}
+    return Plan(
+        stops=stops,
+        travel_min=sum(stop.commute_min for stop in stops),
+        missed_must_visits=[c for c in problem.candidates if c.must_visit and id(c) not in visited],
+    )
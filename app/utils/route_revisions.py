@@ -0,0 +1,133 @@
+"""
+Revision history of saved routes.
+
+Every change to GeneratedRoute.route_text goes through record_revision(),
+which stores the change as a delta against the previous revision. Every
+SNAPSHOT_INTERVAL revisions (and whenever the delta would not be smaller
+than the text) a full snapshot is stored instead, so rebuilding any
+version applies at most SNAPSHOT_INTERVAL - 1 deltas. The latest version
+is GeneratedRoute.route_text and never needs rebuilding.
+"""
+from typing import List, Optional
+
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Session
+
+from app.models.generated_route import GeneratedRoute
+from app.models.route_revision import RouteRevision
+from app.utils.route_delta import apply_delta, make_delta
+from app.utils.route_summary import route_text_hash
+
+SNAPSHOT_INTERVAL = 10
+
+KIND_SNAPSHOT = "snapshot"
+KIND_DELTA = "delta"
+
+SOURCE_SAVE = "save"
+SOURCE_CHAT = "chat"
+SOURCE_REVERT = "revert"
+
+
+def _is_snapshot_number(number: int) -> bool:
+    return number % SNAPSHOT_INTERVAL == 1
+
+
+def _new_revision(db: Session, route: GeneratedRoute, number: int, kind: str, payload: str,
+                  text: str, source: str, source_id: Optional[int]) -> RouteRevision:
+    # assigning .route does not load the route's (possibly long) revision list
+    revision = RouteRevision(
+        route=route,
+        number=number,
+        kind=kind,
+        payload=payload,
+        content_hash=route_text_hash(text),
+        source=source,
+        source_id=source_id,
+    )
+    db.add(revision)
+    route.head_revision = number
+    return revision
+
+
+def ensure_initial_revision(db: Session, route: GeneratedRoute) -> Optional[RouteRevision]:
+    """Record the current text as revision 1 of a route that has no history yet."""
+    if route.head_revision is not None:
+        return None
+    return _new_revision(db, route, 1, KIND_SNAPSHOT, route.route_text, route.route_text, SOURCE_SAVE, None)
+
+
+def record_revision(db: Session, route: GeneratedRoute, new_text: str, source: str,
+                    source_id: Optional[int] = None) -> Optional[RouteRevision]:
+    """
+    Set route.route_text to new_text and record it as the next revision.
+    Returns None (and records nothing) if the text is unchanged. The caller
+    commits.
+    """
+    ensure_initial_revision(db, route)
+    old_text = route.route_text
+    if new_text == old_text:
+        return None
+
+    number = route.head_revision + 1
+    kind, payload = KIND_SNAPSHOT, new_text
+    if not _is_snapshot_number(number):
+        delta = make_delta(old_text, new_text)
+        if len(delta) < len(new_text):
+            kind, payload = KIND_DELTA, delta
+
+    route.route_text = new_text
+    return _new_revision(db, route, number, kind, payload, new_text, source, source_id)
+
+
+def list_revisions(db: Session, route_id: int) -> List[Row]:
+    """Revision metadata, newest first; payloads are not loaded."""
+    return (
+        db.query(
+            RouteRevision.number,
+            RouteRevision.kind,
+            RouteRevision.content_hash,
+            RouteRevision.source,
+            RouteRevision.source_id,
+            RouteRevision.created_at,
+        )
+        .filter(RouteRevision.route_id == route_id)
+        .order_by(RouteRevision.number.desc())
+        .all()
+    )
+
+
+def revision_text(db: Session, route: GeneratedRoute, number: int) -> Optional[str]:
+    """Rebuild the text of revision `number`; None if the route has no such revision."""
+    if route.head_revision is None or not 1 <= number <= route.head_revision:
+        return None
+    if number == route.head_revision:
+        return route.route_text
+
+    snapshot_number = (
+        db.query(RouteRevision.number)
+        .filter(
+            RouteRevision.route_id == route.id,
+            RouteRevision.number <= number,
+            RouteRevision.kind == KIND_SNAPSHOT,
+        )
+        .order_by(RouteRevision.number.desc())
+        .limit(1)
+        .scalar()
+    )
+    if snapshot_number is None:
+        return None
+
+    chain = (
+        db.query(RouteRevision.kind, RouteRevision.payload)
+        .filter(
+            RouteRevision.route_id == route.id,
+            RouteRevision.number >= snapshot_number,
+            RouteRevision.number <= number,
+        )
+        .order_by(RouteRevision.number)
+        .all()
+    )
+    text = chain[0].payload
+    for revision in chain[1:]:
+        text = apply_delta(text, revision.payload)
+    return text
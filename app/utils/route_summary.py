@@ -0,0 +1,51 @@
+import hashlib
+import re
+from typing import Tuple
+
+TITLE_MAX_LENGTH = 80
+PREVIEW_MAX_LENGTH = 200
+
+# "09:00 - 10:00: ..." / "9:00–10:30 ..." style prefixes produced by the generator
+_TIME_RANGE_PREFIX = re.compile(r"^\d{1,2}:\d{2}\s*(?:-|–|—|to)\s*\d{1,2}:\d{2}\s*:?\s*")
+_MARKDOWN_PREFIX = re.compile(r"^[#>*\-\s]+")
+
+
+def _truncate(text: str, max_length: int) -> str:
+    if len(text) <= max_length:
+        return text
+    return text[: max_length - 1].rstrip() + "…"
+
+
+def summarize_route_text(route_text: str) -> Tuple[str, str]:
+    """
+    Compute the (title, preview) pair shown in route listings.
+    The title is the first meaningful line without its time range,
+    the preview is the start of the plan collapsed onto one line.
+    """
+    lines = [line.strip() for line in (route_text or "").splitlines() if line.strip()]
+    if not lines:
+        return "", ""
+
+    first = _MARKDOWN_PREFIX.sub("", lines[0]).replace("**", "")
+    title = _TIME_RANGE_PREFIX.sub("", first).strip() or first.strip()
+
+    preview = " ".join(" ".join(lines).split()).replace("**", "")
+    return _truncate(title, TITLE_MAX_LENGTH), _truncate(preview, PREVIEW_MAX_LENGTH)
+
+
+def route_text_hash(route_text: str) -> str:
+    """Stable content hash of a route, used for ETags and change detection."""
+    return hashlib.sha256((route_text or "").encode("utf-8")).hexdigest()
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """
+    Whether an If-None-Match header value ("*" or a comma-separated list of
+    tags, weak or strong) matches `etag`. Tags are compared whole, ignoring
+    the W/ prefix, as the weak comparison of RFC 9110 does.
+    """
+    for tag in (if_none_match or "").split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") == etag.removeprefix("W/"):
+            return True
+    return False
@@ -0,0 +1,192 @@
+"""
+Static file serving with validators and cache headers.
+
+CachedStaticFiles is a drop-in StaticFiles that:
+
+- sends a strong ETag computed from the file's content (not mtime/size), so
+  the same bytes have the same tag on every worker and after redeploys,
+  and answers If-None-Match / If-Modified-Since with 304
+- marks content-addressed files (a hex digest of 32+ characters in the
+  name, as avatars are stored) `immutable` for a year; everything else is
+  `no-cache`, i.e. revalidated with the ETag on each use
+- serves a precompressed sibling (`name.br`, `name.gz`) when the client
+  accepts that encoding, with `Vary: Accept-Encoding`
+- keeps small files (STATIC_CACHE_MAX_FILE_BYTES) in an LRU bounded by
+  STATIC_CACHE_BYTES. Content-addressed files are then served without
+  touching the disk; other files are re-stat'ed at most every
+  STATIC_REVALIDATE_S seconds. Larger files are streamed from disk, with
+  their ETag cached.
+"""
+import hashlib
+import mimetypes
+import os
+import re
+import stat
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from email.utils import formatdate
+from typing import Optional, Tuple
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+from app.utils.metrics import record_cache_access
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "public, no-cache"
+CONTENT_HASH_NAME = re.compile(r"(?:^|[^0-9a-f])[0-9a-f]{32,}(?:[^0-9a-f]|$)")
+
+# preferred first
+PRECOMPRESSED = (("br", ".br"), ("gzip", ".gz"))
+
+STATIC_CACHE_BYTES = int(os.getenv("STATIC_CACHE_BYTES", str(32 * 1024 * 1024)))
+STATIC_CACHE_MAX_FILE_BYTES = int(os.getenv("STATIC_CACHE_MAX_FILE_BYTES", str(256 * 1024)))
+STATIC_REVALIDATE_S = float(os.getenv("STATIC_REVALIDATE_S", "2"))
+HASH_CHUNK = 1024 * 1024
+
+
+def is_content_addressed(path: str) -> bool:
+    return CONTENT_HASH_NAME.search(os.path.basename(path)) is not None
+
+
+def accepted_encodings(accept_encoding: str) -> Tuple[str, ...]:
+    """The precompressed encodings the client accepts, in our order of preference."""
+    accepted = {}
+    for item in accept_encoding.lower().split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[name.strip()] = quality
+    return tuple(
+        encoding for encoding, _ in PRECOMPRESSED
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0
+    )
+
+
+@dataclass
+class _Entry:
+    full_path: str
+    stat_result: os.stat_result
+    etag: str
+    encoding: Optional[str]
+    body: Optional[bytes]  # None when the file is too large to keep in memory
+    checked: float  # time.monotonic() of the last stat
+
+    def size(self) -> int:
+        return len(self.body) if self.body is not None else 0
+
+
+def _content_etag(full_path: str, max_body: int) -> Tuple[str, Optional[bytes]]:
+    digest = hashlib.blake2b(digest_size=16)
+    chunks = []
+    size = 0
+    with open(full_path, "rb") as handle:
+        while chunk := handle.read(HASH_CHUNK):
+            digest.update(chunk)
+            size += len(chunk)
+            if size <= max_body:
+                chunks.append(chunk)
+    return f'"{digest.hexdigest()}"', b"".join(chunks) if size <= max_body else None
+
+
+class CachedStaticFiles(StaticFiles):
+    def __init__(self, *args, cache_bytes: int = STATIC_CACHE_BYTES,
+                 max_file_bytes: int = STATIC_CACHE_MAX_FILE_BYTES,
+                 revalidate_s: float = STATIC_REVALIDATE_S, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache_bytes = cache_bytes
+        self.max_file_bytes = max_file_bytes
+        self.revalidate_s = revalidate_s
+        self._entries: "OrderedDict[Tuple[str, Tuple[str, ...]], _Entry]" = OrderedDict()
+        self._cached_bytes = 0
+
+    def _store(self, key, entry: _Entry) -> None:
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._cached_bytes -= old.size()
+        self._entries[key] = entry
+        self._cached_bytes += entry.size()
+        while self._cached_bytes > self.cache_bytes and len(self._entries) > 1:
+            _, evicted = self._entries.popitem(last=False)
+            self._cached_bytes -= evicted.size()
+
+    def _resolve(self, path: str, encodings: Tuple[str, ...], cached: Optional[_Entry]) -> Optional[_Entry]:
+        """Stat the best variant of `path`; reuses `cached` if that file did not change. Runs in a thread."""
+        chosen = None
+        for encoding, suffix in PRECOMPRESSED:
+            if encoding in encodings:
+                full_path, stat_result = self.lookup_path(path + suffix)
+                if stat_result is not None and stat.S_ISREG(stat_result.st_mode):
+                    chosen = (full_path, stat_result, encoding)
+                    break
+        if chosen is None:
+            full_path, stat_result = self.lookup_path(path)
+            if stat_result is None or not stat.S_ISREG(stat_result.st_mode):
+                return None
+            chosen = (full_path, stat_result, None)
+        full_path, stat_result, encoding = chosen
+        now = time.monotonic()
+        if (
+            cached is not None and cached.full_path == full_path
+            and cached.stat_result.st_mtime_ns == stat_result.st_mtime_ns
+            and cached.stat_result.st_size == stat_result.st_size
+        ):
+            cached.checked = now
+            return cached
+        etag, body = _content_etag(full_path, self.max_file_bytes)
+        return _Entry(full_path, stat_result, etag, encoding, body, now)
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        if scope["method"] not in ("GET", "HEAD"):
+            return await super().get_response(path, scope)
+        request_headers = Headers(scope=scope)
+        encodings = accepted_encodings(request_headers.get("accept-encoding", ""))
+        immutable = is_content_addressed(path)
+        key = (path, encodings)
+
+        entry = self._entries.get(key)
+        fresh = entry is not None and (immutable or time.monotonic() - entry.checked < self.revalidate_s)
+        if not fresh:
+            try:
+                entry = await anyio.to_thread.run_sync(self._resolve, path, encodings, entry)
+            except (OSError, ValueError):
+                entry = None
+            if entry is None:
+                self._entries.pop(key, None)
+                # directories, html mode, 404 and bad paths are handled as before
+                return await super().get_response(path, scope)
+            self._store(key, entry)
+        else:
+            self._entries.move_to_end(key)
+        record_cache_access("static", fresh)
+        return self._respond(path, entry, immutable, request_headers, scope)
+
+    def _respond(self, path: str, entry: _Entry, immutable: bool, request_headers: Headers, scope: Scope) -> Response:
+        headers = {
+            "etag": entry.etag,
+            "last-modified": formatdate(entry.stat_result.st_mtime, usegmt=True),
+            "cache-control": IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL,
+            "vary": "Accept-Encoding",
+        }
+        if self.is_not_modified(Headers(headers), request_headers):
+            return NotModifiedResponse(Headers(headers))
+        media_type = mimetypes.guess_type(path)[0] or "text/plain"
+        if entry.encoding is not None:
+            headers["content-encoding"] = entry.encoding
+        if entry.body is None:
+            response = FileResponse(entry.full_path, stat_result=entry.stat_result, media_type=media_type)
+            response.headers.update(headers)
+            return response
+        headers["content-length"] = str(len(entry.body))
+        body = b"" if scope["method"] == "HEAD" else entry.body
+        return Response(body, media_type=media_type, headers=headers)
@@ -1,3 +1,4 @@
+import logging
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
 from fastapi.security import OAuth2PasswordBearer
@@ -11,6 +12,8 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24  # 1 day
 # ✅ 用于 FastAPI 的依赖注入，配合 Depends 使用
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login")
 
+logger = logging.getLogger(__name__)
+
 # ✅ 创建 token（用于 login）
 def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
@@ -22,17 +25,15 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
 # ✅ 验证 token（用于 get_current_user）
 def verify_token(token: str):
     try:
-        print("🐛 Raw token:", token)
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        print("📦 Decoded payload:", payload)
 
         if "sub" not in payload:
-            print("❌ 'sub' not in payload")
+            logger.info("Rejected token without 'sub' claim")
             return None
 
         return payload
     except JWTError as e:
-        print("❌ JWTError:", e)
+        logger.info("Rejected token: %s", e)
         return None
 
 # ✅ 自定义 401 错误
@@ -1,10 +1,18 @@
+import logging
 import os
 from typing import List, Dict, Optional
 
-import httpx
+from app.utils import enrichment, outbound
+from app.utils.cache import get_cache
 
 YELP_API_KEY = os.getenv("YELP_API_KEY")
-BASE_URL = "https://api.yelp.com/v3/businesses/search"
+BASE_URL = os.getenv("YELP_API_URL", "https://api.yelp.com/v3/businesses/search")
+# results are shared across users and workers; failed searches are not cached
+YELP_CACHE_TTL_S = float(os.getenv("YELP_CACHE_TTL_S", "3600"))
+# ~110 m: searches around nearly the same point share one cache entry
+COORDINATE_DECIMALS = 3
+
+logger = logging.getLogger(__name__)
 
 
 def search_businesses(
@@ -17,11 +25,16 @@ def search_businesses(
     """
     Minimal Yelp Fusion search wrapper.
     Returns a small subset of fields used by the itinerary generator.
+    Results are cached for YELP_CACHE_TTL_S seconds (app.utils.cache), and
+    each business's categories are kept for bookmarks of the same place
+    (app.utils.enrichment).
     """
     if not YELP_API_KEY:
-        print("YELP_API_KEY not set; skip Yelp search.")
+        logger.debug("YELP_API_KEY not set; skip Yelp search.")
         return []
 
+    latitude = round(latitude, COORDINATE_DECIMALS)
+    longitude = round(longitude, COORDINATE_DECIMALS)
     headers = {"Authorization": f"Bearer {YELP_API_KEY}"}
     params = {
         "term": term or "food",
@@ -33,17 +46,31 @@ def search_businesses(
     if categories:
         params["categories"] = ",".join(categories)
 
-    print(f"Yelp search term={params['term']}, lat={latitude}, lon={longitude}")
+    logger.debug("Yelp search term=%s, lat=%s, lon=%s", params["term"], latitude, longitude)
+
+    def search():
+        resp = outbound.http_client("yelp").get(
+            BASE_URL, headers=headers, params=params, timeout=outbound.call_timeout("yelp")
+        )
+        resp.raise_for_status()
+        return resp
+
+    def fetch():
+        businesses = _simplify(outbound.call("yelp", "search", search).json().get("businesses", []))
+        enrichment.remember_yelp_places(businesses)
+        return businesses
 
+    key = "|".join(str(params.get(name, "")) for name in ("term", "latitude", "longitude", "categories", "limit"))
     try:
-        with httpx.Client(timeout=10.0) as client:
-            resp = client.get(BASE_URL, headers=headers, params=params)
-            resp.raise_for_status()
+        results = get_cache().get_or_set("yelp", key, fetch, YELP_CACHE_TTL_S)
     except Exception as exc:
-        print("Yelp API request failed:", exc)
+        logger.warning("Yelp API request failed: %s", exc)
         return []
+    logger.debug("Yelp returned %d businesses", len(results))
+    return results
+
 
-    data = resp.json().get("businesses", [])
+def _simplify(data: List[Dict]) -> List[Dict]:
     results = []
     for b in data:
         results.append(
@@ -58,5 +85,4 @@ def search_businesses(
                 "longitude": b.get("coordinates", {}).get("longitude"),
             }
         )
-    print(f"Yelp returned {len(results)} businesses")
     return results
@@ -0,0 +1,86 @@
+"""
+Benchmark avatar processing (app.utils.avatars).
+
+A phone-sized JPEG (4032x3024 by default) is turned into the avatar
+thumbnails. It reports:
+
+- bytes: the original upload vs each thumbnail a client would load
+- thumbnails ms: make_thumbnails with JPEG draft decoding vs a full decode
+- repeat ms: store_avatar for a picture that is already on disk
+- pool: wall time for --uploads uploads through 1 vs --workers threads
+
+    python -m benchmarks.bench_avatars --width 4032 --height 3024 --repeat 3 --uploads 8 --workers 2
+"""
+import argparse
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from PIL import Image, JpegImagePlugin  # noqa: E402
+
+from app.utils.avatars import make_thumbnails, store_avatar  # noqa: E402
+
+
+def photo(width, height, seed):
+    """A noisy gradient; compresses about like a real photo."""
+    gradient = Image.linear_gradient("L").resize((width, height))
+    noise = Image.effect_noise((width, height), 24 + seed)
+    image = Image.merge("RGB", (gradient, noise, gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT)))
+    out = io.BytesIO()
+    image.save(out, format="JPEG", quality=90)
+    return out.getvalue()
+
+
+def median_ms(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--width", type=int, default=4032)
+    parser.add_argument("--height", type=int, default=3024)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--uploads", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+
+    data = photo(args.width, args.height, 0)
+    thumbnails = make_thumbnails(data)
+    print(f"original upload: {len(data) / 1024:.0f} KiB ({args.width}x{args.height})")
+    for (size, ext), blob in sorted(thumbnails.items()):
+        print(f"  {size:>4} {ext:<5} {len(blob) / 1024:8.1f} KiB")
+
+    draft_ms = median_ms(lambda: make_thumbnails(data), args.repeat)
+    with mock.patch.object(JpegImagePlugin.JpegImageFile, "draft", lambda self, mode, size: None):
+        full_ms = median_ms(lambda: make_thumbnails(data), args.repeat)
+    with tempfile.TemporaryDirectory() as tmp:
+        store_avatar(data, tmp)
+        repeat_ms = median_ms(lambda: store_avatar(data, tmp), args.repeat)
+
+        uploads = [photo(args.width, args.height, seed) for seed in range(1, args.uploads + 1)]
+        pool_ms = {}
+        for workers in sorted({1, args.workers}):
+            with tempfile.TemporaryDirectory() as out, ThreadPoolExecutor(max_workers=workers) as pool:
+                start = time.perf_counter()
+                list(pool.map(lambda upload: store_avatar(upload, out), uploads))
+                pool_ms[workers] = (time.perf_counter() - start) * 1000
+
+    print(f"thumbnails ms: draft {draft_ms:.0f}, full decode {full_ms:.0f}; already stored {repeat_ms:.2f}")
+    for workers, ms in pool_ms.items():
+        print(f"{args.uploads} uploads with {workers} worker(s): {ms:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Benchmark the bookmark existence check (GET /check-bookmarks/{user_id}).
+
+For a user with --bookmarks bookmarks (SQLite) it reports ms per check:
+
+- load all: the old `.all()` and `len(...) > 0`
+- exists: an EXISTS query (users without a stats row)
+- stats row: primary-key lookup of BookmarkStats
+- cached: the shared cache (app.utils.cache, memory backend)
+
+    python -m benchmarks.bench_bookmark_check --bookmarks 10000 --checks 200
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+from sqlalchemy.pool import StaticPool  # noqa: E402
+
+import app.models  # noqa: E402,F401
+from app.database import Base  # noqa: E402
+from app.models.bookmark import Bookmark  # noqa: E402
+from app.models.place import Place  # noqa: E402
+from app.models.user import User  # noqa: E402
+from app.utils import bookmark_stats  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bookmarks", type=int, default=10000)
+    parser.add_argument("--checks", type=int, default=200)
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as session:
+        user = User(email="bench@example.com", hashed_password="x")
+        session.add(user)
+        session.commit()
+        user_id = user.id
+        session.bulk_insert_mappings(Place, [
+            {"id": i + 1, "title": f"Place {i}", "address": f"{i} Main St", "latitude": 40 + i * 1e-5,
+             "longitude": -74 + i * 1e-5, "category": ""}
+            for i in range(args.bookmarks)
+        ])
+        session.bulk_insert_mappings(Bookmark, [
+            {"user_id": user_id, "place_id": i + 1, "neighbors": [[i + k, 100.0 * k, k] for k in range(1, 9)]}
+            for i in range(args.bookmarks)
+        ])
+        session.commit()
+
+    def load_all(session):
+        return len(session.query(Bookmark).filter(Bookmark.user_id == user_id).all()) > 0
+
+    def uncached(session):
+        bookmark_stats.forget()
+        return bookmark_stats.has_bookmarks(session, user_id)
+
+    def cached(session):
+        return bookmark_stats.has_bookmarks(session, user_id)
+
+    rows = []
+    for label, check in (("load all", load_all), ("exists", uncached)):
+        rows.append((label, timed(Session, check, args.checks)))
+    with Session() as session:
+        bookmarks = session.query(Bookmark).filter(Bookmark.user_id == user_id).all()
+        bookmark_stats.refresh_stats(session, user_id, bookmarks)
+        session.commit()
+    for label, check in (("stats row", uncached), ("cached", cached)):
+        rows.append((label, timed(Session, check, args.checks)))
+
+    print(f"{args.bookmarks} bookmarks, {args.checks} checks")
+    for label, ms in rows:
+        print(f"{label:>10}{ms:>10.3f} ms/check")
+
+
+def timed(Session, check, checks):
+    start = time.perf_counter()
+    for _ in range(checks):
+        with Session() as session:
+            assert check(session)
+    return (time.perf_counter() - start) / checks * 1000
+
+
+if __name__ == "__main__":
+    main()
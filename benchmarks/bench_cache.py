@@ -0,0 +1,108 @@
+"""
+Benchmark the shared cache (app.utils.cache).
+
+Per backend it reports us per call for a hit (`get`), a write (`set`) and a
+`get_or_set` hit. Then --threads callers miss the same key at once with a
+producer that takes --producer-ms (an upstream call), and it counts producer
+calls with a plain get-then-set vs `get_or_set`, in one process and with two
+Cache objects sharing a SQLite file (two workers).
+
+The memory and SQLite backends always run; pass --redis-url to include a
+Redis-protocol server.
+
+    python -m benchmarks.bench_cache --calls 2000 --threads 16
+    python -m benchmarks.bench_cache --redis-url redis://127.0.0.1:6379/0
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine  # noqa: E402
+
+import app.models  # noqa: E402,F401
+from app.database import Base  # noqa: E402
+from app.utils.cache import Cache, MemoryBackend, RedisBackend, RedisClient, SQLBackend  # noqa: E402
+
+VALUE = [{"name": f"Cafe {i}", "rating": 4.5, "latitude": 48.85, "longitude": 2.35} for i in range(5)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--producer-ms", type=float, default=200.0)
+    parser.add_argument("--redis-url", default=None)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    engine = create_engine(f"sqlite:///{tmp}/cache.db", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    backends = [("memory", lambda: MemoryBackend()), ("sqlite", lambda: SQLBackend(engine))]
+    if args.redis_url:
+        backends.append(("redis", lambda: RedisBackend(RedisClient.from_url(args.redis_url))))
+
+    print(f"{'backend':>8}{'get':>10}{'set':>10}{'get_or_set':>12}  (us/call)")
+    for name, make in backends:
+        cache = Cache(make(), prefix="bench:")
+        cache.set("yelp", "hot", VALUE, 600)
+        get_us = timed(lambda: cache.get("yelp", "hot"), args.calls)
+        set_us = timed(lambda: cache.set("yelp", "hot", VALUE, 600), args.calls)
+        hit_us = timed(lambda: cache.get_or_set("yelp", "hot", lambda: VALUE, 600), args.calls)
+        print(f"{name:>8}{get_us:>10.1f}{set_us:>10.1f}{hit_us:>12.1f}")
+        cache.invalidate("yelp")
+        cache.close()
+
+    print(f"\n{args.threads} callers miss one key, producer {args.producer_ms:.0f} ms: producer calls")
+    rows = [
+        ("get + set, 1 process", stampede([Cache(MemoryBackend())], args, coalesce=False)),
+        ("get_or_set, 1 process", stampede([Cache(MemoryBackend())], args, coalesce=True)),
+        ("get + set, 2 workers", stampede([Cache(SQLBackend(engine)), Cache(SQLBackend(engine))], args, False)),
+        ("get_or_set, 2 workers", stampede([Cache(SQLBackend(engine)), Cache(SQLBackend(engine))], args, True)),
+    ]
+    for label, (calls, seconds) in rows:
+        print(f"{label:>24}{calls:>6} calls{seconds * 1000:>9.0f} ms")
+    engine.dispose()
+
+
+def timed(call, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        call()
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def stampede(caches, args, coalesce):
+    for cache in caches:
+        cache.invalidate("stampede")
+    calls = []
+    barrier = threading.Barrier(args.threads)
+
+    def producer():
+        calls.append(1)
+        time.sleep(args.producer_ms / 1000)
+        return VALUE
+
+    def caller(cache):
+        barrier.wait()
+        if coalesce:
+            cache.get_or_set("stampede", "key", producer, 600)
+        elif cache.get("stampede", "key") is None:
+            cache.set("stampede", "key", producer(), 600)
+
+    threads = [threading.Thread(target=caller, args=(caches[i % len(caches)],)) for i in range(args.threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return len(calls), time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    main()
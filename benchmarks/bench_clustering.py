@@ -0,0 +1,80 @@
+"""
+Benchmark bookmark clustering (app.utils.clustering).
+
+Bookmarks are spread over a metro area: most of them in a handful of dense
+districts, the rest scattered. For each size it reports the clustering
+time, the number of clusters, the largest cluster radius, and how many
+bookmarks generate-route hands to the planner for a 30-minute walk from
+the middle, compared with the 50 km radius filter used before.
+
+    python -m benchmarks.bench_clustering --sizes 500 2000 10000 --repeat 3
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+import types
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")  # app.database builds its engine at import
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.utils.clustering import cluster_points, reach_km, select_clusters  # noqa: E402
+from app.utils.neighbors import haversine_km  # noqa: E402
+from app.utils.route_planner import DEFAULT_SPEED_KMH, DETOUR_FACTOR  # noqa: E402
+
+CENTER = (48.8606, 2.3376)
+MAX_AREA_BOOKMARKS = 300
+
+
+def make_points(count, rng):
+    districts = [
+        (CENTER[0] + rng.uniform(-0.15, 0.15), CENTER[1] + rng.uniform(-0.2, 0.2), rng.uniform(0.004, 0.015))
+        for _ in range(12)
+    ]
+    points = {}
+    for i in range(count):
+        if i % 5 == 0:
+            points[i] = (CENTER[0] + rng.uniform(-0.25, 0.25), CENTER[1] + rng.uniform(-0.35, 0.35))
+        else:
+            lat, lon, spread = districts[i % len(districts)]
+            points[i] = (lat + rng.gauss(0, spread), lon + rng.gauss(0, spread * 1.5))
+    return points
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[500, 2000, 10000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    reach = reach_km(30, DEFAULT_SPEED_KMH, DETOUR_FACTOR)
+    print(f"{'bookmarks':>10}{'cluster ms':>12}{'clusters':>10}{'max radius m':>14}{'50 km':>8}{'selected':>10}")
+    for size in args.sizes:
+        points = make_points(size, random.Random(args.seed))
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            clusters = cluster_points(points)
+            timings.append(time.perf_counter() - start)
+
+        rows = [
+            types.SimpleNamespace(id=i, size=len(c.members), latitude=c.latitude, longitude=c.longitude,
+                                  radius_m=int(c.radius_km * 1000), members=c.members)
+            for i, c in enumerate(clusters)
+        ]
+        chosen = select_clusters(rows, CENTER, reach, MAX_AREA_BOOKMARKS)
+        clustered = {m for c in clusters for m in c.members}
+        selected = sum(c.size for c in chosen) + sum(
+            1 for i, p in points.items() if i not in clustered and haversine_km(CENTER, p) <= reach
+        )
+        within_50 = sum(1 for p in points.values() if haversine_km(CENTER, p) <= 50)
+        max_radius = max((c.radius_km for c in clusters), default=0) * 1000
+        print(f"{size:>10}{statistics.median(timings) * 1000:>12.1f}{len(clusters):>10}{max_radius:>14.0f}"
+              f"{within_50:>8}{selected:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Benchmark what a request costs after its client has given up (app.utils.deadline).
+
+A sync endpoint makes --calls OpenAI calls one after another (like geocode
+then narration in /generate-route) against the fake OpenAI server, then
+marks a DB write. Each request comes from a client that leaves after
+--leave-ms, either by disconnecting or because it sent X-Request-Timeout.
+For each case it reports, with and without DeadlineMiddleware, the
+upstream calls made, whether the write happened and how long the request
+held its worker thread.
+
+    python -m benchmarks.bench_deadline --calls 3 --openai-latency-ms 400 --leave-ms 200
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from starlette.applications import Starlette  # noqa: E402
+from starlette.concurrency import run_in_threadpool  # noqa: E402
+from starlette.responses import JSONResponse  # noqa: E402
+from starlette.routing import Route  # noqa: E402
+
+from benchmarks.fakes import FakeOpenAIHandler, start_fake_server  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=3)
+    parser.add_argument("--openai-latency-ms", type=float, default=400.0)
+    parser.add_argument("--leave-ms", type=float, default=200.0)
+    args = parser.parse_args()
+
+    server, url = start_fake_server(FakeOpenAIHandler, args.openai_latency_ms)
+    os.environ.update(OPENAI_BASE_URL=url + "/v1", OPENAI_API_KEY="bench", OPENAI_RPM="0", OPENAI_TPM="0")
+    from app.utils import outbound
+    from app.utils.deadline import DeadlineMiddleware
+
+    state = {"calls": 0, "writes": 0}
+
+    def work():
+        for _ in range(args.calls):
+            outbound.call("openai", "bench", lambda: outbound.openai_client().chat.completions.create(
+                model="gpt-4.1", messages=[{"role": "user", "content": "Eiffel Tower"}], max_tokens=50,
+            ))
+            state["calls"] += 1
+        state["writes"] += 1  # stands in for db.commit(), which a cancelled request may not reach
+
+    async def endpoint(request):
+        # what FastAPI does for a sync endpoint with a JSON body
+        await request.json()
+        await run_in_threadpool(work)
+        return JSONResponse({"ok": True})
+
+    work()  # warm up: SDK import and connection
+    starlette_app = Starlette(routes=[Route("/work", endpoint, methods=["POST"])])
+    print(f"{args.calls} sequential OpenAI calls of {args.openai_latency_ms:.0f} ms, client leaves after "
+          f"{args.leave_ms:.0f} ms")
+    print(f"{'client':>12}{'middleware':>12}{'calls':>7}{'write':>7}{'held ms':>9}")
+    for leave in ("disconnect", "timeout"):
+        for label, app in (("none", starlette_app), ("deadline", DeadlineMiddleware(starlette_app))):
+            state.update(calls=0, writes=0)
+            held = asyncio.run(request(app, leave, args.leave_ms / 1000))
+            print(f"{leave:>12}{label:>12}{state['calls']:>7}{'yes' if state['writes'] else 'no':>7}{held:>9.0f}")
+    outbound.close_clients()
+    server.shutdown()
+
+
+async def request(app, leave, leave_s):
+    headers = [(b"content-type", b"application/json")]
+    if leave == "timeout":
+        headers.append((b"x-request-timeout", str(leave_s).encode()))
+    scope = {"type": "http", "asgi": {"spec_version": "2.4"}, "http_version": "1.1", "method": "POST",
+             "path": "/work", "raw_path": b"/work", "root_path": "", "scheme": "http", "query_string": b"",
+             "headers": headers, "server": ("bench", 80), "client": ("bench", 1)}
+    messages = [{"type": "http.request", "body": b"{}", "more_body": False}]
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await asyncio.sleep(leave_s if leave == "disconnect" else 3600)
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        pass
+
+    start = time.perf_counter()
+    await app(scope, receive, send)
+    return (time.perf_counter() - start) * 1000
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Benchmark app.utils.diff_utils.apply_diff against the previous best-effort
+apply (a linear scan with list.pop/list.insert per line, reproduced below).
+
+The diffs are shaped like the ones the chat model writes: correct content,
+but hunk headers whose line numbers are off, which made the old strict
+apply fail and fall through to the best-effort path.
+
+    python -m benchmarks.bench_diff_apply --lines 500 2000 10000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.utils.diff_utils import apply_diff_with_report, generate_diff  # noqa: E402
+
+
+def legacy_best_effort(original_text, diff_text):
+    """The pre-index implementation, kept here as the baseline."""
+    output = original_text.splitlines(keepends=True)
+    cursor = 0
+    changed = False
+    for raw in diff_text.splitlines():
+        if raw.startswith(("---", "+++", "@@")) or not raw:
+            continue
+        if raw[0] == "-":
+            for idx in range(cursor, len(output)):
+                if output[idx].rstrip("\n") == raw[1:].rstrip("\n"):
+                    output.pop(idx)
+                    cursor = idx
+                    changed = True
+                    break
+        elif raw[0] == "+":
+            output.insert(cursor, raw[1:] if raw.endswith("\n") else raw[1:] + "\n")
+            cursor += 1
+            changed = True
+        else:
+            for idx in range(cursor, len(output)):
+                if output[idx].rstrip("\n") == raw.rstrip("\n"):
+                    cursor = idx + 1
+                    break
+    return "".join(output) if changed else None
+
+
+def make_plan(lines):
+    return "".join(
+        f"Day {i // 14 + 1} {i % 14 + 8:02d}:00 - {(i % 14 + 9):02d}:00: Visit place {i}, notes {i * 7 % 13}\n"
+        for i in range(lines)
+    )
+
+
+def make_llm_diff(original, every):
+    modified = "".join(
+        line.replace("Visit place", "Lunch near place") if i % every == 0 else line
+        for i, line in enumerate(original.splitlines(True))
+    )
+    diff = generate_diff(original, modified)
+    # shift every hunk header by a few lines, as the model tends to do
+    shifted = []
+    for line in diff.splitlines(True):
+        if line.startswith("@@"):
+            old, new = line.split()[1:3]
+            start = max(1, int(old[1:].split(",")[0]) - 3)
+            line = f"@@ -{start},{old.split(',')[-1]} {new} @@\n"
+        shifted.append(line)
+    return modified, "".join(shifted)
+
+
+def best_of(repeat, fn):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None or elapsed < best else best
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, nargs="+", default=[500, 2000, 10000])
+    parser.add_argument("--every", type=int, default=10, help="change one line in every N")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'lines':>7}{'hunks':>7}{'legacy ms':>12}{'new ms':>10}{'speedup':>9}  strategy   correct")
+    for lines in args.lines:
+        original = make_plan(lines)
+        modified, diff = make_llm_diff(original, args.every)
+        hunks = diff.count("\n@@")
+        legacy_time, legacy_text = best_of(args.repeat, lambda: legacy_best_effort(original, diff))
+        new_time, result = best_of(args.repeat, lambda: apply_diff_with_report(original, diff))
+        correct = f"legacy={legacy_text == modified} new={result.text == modified}"
+        print(
+            f"{lines:>7}{hunks:>7}{legacy_time * 1000:>12.2f}{new_time * 1000:>10.2f}"
+            f"{legacy_time / new_time:>8.1f}x  {result.strategy:<10} {correct}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Benchmark background bookmark enrichment (app.utils.enrichment).
+
+Classifies --bookmarks uncategorized places against the fake OpenAI server
+(--openai-latency-ms per call) and reports OpenAI calls, prompt tokens and
+time for
+
+- one place per call, which is what per-bookmark enrichment would cost
+- batches of --batch-size places per call
+- a second user bookmarking the same places (cross-user cache)
+- a user whose places a Yelp search returned earlier (--yelp-share of them)
+
+Then it counts the bookmarks a generate-route planner would get with
+alcohol not allowed and one preferred cuisine, before and after the
+category prefilter. One in --bar-every fake places is a bar.
+
+    python -m benchmarks.bench_enrichment --bookmarks 200 --batch-size 40 --openai-latency-ms 300
+"""
+import argparse
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")  # app.database builds its engine at import
+
+from benchmarks.fakes import FakeOpenAIHandler, start_fake_server  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bookmarks", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=40)
+    parser.add_argument("--openai-latency-ms", type=float, default=300.0)
+    parser.add_argument("--yelp-share", type=float, default=0.5)
+    parser.add_argument("--bar-every", type=int, default=8)
+    args = parser.parse_args()
+
+    server, url = start_fake_server(FakeOpenAIHandler, args.openai_latency_ms)
+    os.environ.update(OPENAI_BASE_URL=url + "/v1", OPENAI_API_KEY="bench", OPENAI_RPM="0", OPENAI_TPM="0")
+    from app.utils import enrichment, outbound
+    from app.utils.cache import Cache, MemoryBackend, set_cache
+    from app.utils.metrics import OPENAI_TOKENS
+
+    calls = []
+    classify = enrichment.classify_places
+
+    def counted(places):
+        calls.append(len(places))
+        return classify(places)
+
+    enrichment.classify_places = counted
+
+    def tokens():
+        return OPENAI_TOKENS.labels(enrichment.ENRICH_MODEL, "enrich_bookmarks", "prompt")._value.get()
+
+    def run(label, rows, batch_size):
+        enrichment.ENRICH_BATCH_SIZE = batch_size
+        calls.clear()
+        before = tokens()
+        start = time.perf_counter()
+        found = enrichment.categorize(rows)
+        elapsed = time.perf_counter() - start
+        print(f"{label:>24}{len(calls):>7}{tokens() - before:>9.0f}{elapsed * 1000:>10.0f}{len(found):>12}")
+        return found
+
+    def places(seed, url_prefix):
+        return [
+            SimpleNamespace(id=seed * 100000 + i, title=_name(i, args.bar_every), address=f"{i} Rue Bench, Paris",
+                            latitude=48.83 + (i % 40) * 0.002, longitude=2.30 + (i // 40) * 0.002,
+                            google_maps_url=f"{url_prefix}{i}")
+            for i in range(args.bookmarks)
+        ]
+
+    classify([("warm up", "")])
+    print(f"{args.bookmarks} bookmarks, OpenAI latency {args.openai_latency_ms:.0f} ms")
+    print(f"{'':>24}{'calls':>7}{'tokens':>9}{'ms':>10}{'classified':>12}")
+    set_cache(Cache(MemoryBackend()))
+    run("one place per call", places(1, "https://maps.google.com/?cid="), 1)
+    set_cache(Cache(MemoryBackend()))
+    found = run(f"batches of {args.batch_size}", places(1, "https://maps.google.com/?cid="), args.batch_size)
+    run("same places, other user", places(2, "http://www.maps.google.com/?cid="), args.batch_size)
+
+    set_cache(Cache(MemoryBackend()))
+    seen = places(3, "https://maps.google.com/?q=")[:int(args.bookmarks * args.yelp_share)]
+    enrichment.remember_yelp_places([
+        {"name": p.title.upper(), "latitude": p.latitude + 0.0002, "longitude": p.longitude - 0.0002,
+         "categories": ["Cocktail Bars"] if "Bar" in p.title else ["French"]}
+        for p in seen
+    ])
+    run(f"{args.yelp_share:.0%} seen by Yelp", places(3, "https://maps.google.com/?q="), args.batch_size)
+
+    bookmarks = [SimpleNamespace(id=i, category=category) for i, category in found.items()]
+    kept = enrichment.filter_by_preferences(bookmarks, allow_alcohol=False, preferred_cuisine=["Italian"])
+    print(f"\nno alcohol, Italian preferred: {len(bookmarks)} -> {len(kept)} bookmarks for the planner")
+
+    outbound.close_clients()
+    server.shutdown()
+
+
+def _name(i, bar_every):
+    return f"Bench Bar {i}" if i % bar_every == 0 else f"Bench Bistro {i}"
+
+
+if __name__ == "__main__":
+    main()
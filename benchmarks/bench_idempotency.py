@@ -0,0 +1,82 @@
+"""
+Benchmark IdempotencyMiddleware (app.utils.idempotency).
+
+Calls a POST endpoint that sleeps --work-ms (standing in for an LLM call)
+through the middleware and reports ms per request:
+
+- no key: the request passes straight through
+- new key: the first attempt, which also stores the response
+- retry: the same key again, answered from the cache
+
+Then --duplicates copies of one request are sent at once, as a client
+retrying after a timeout would, and it counts how often the endpoint ran.
+
+    python -m benchmarks.bench_idempotency --requests 200 --work-ms 50
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import httpx  # noqa: E402
+from starlette.applications import Starlette  # noqa: E402
+from starlette.responses import JSONResponse  # noqa: E402
+from starlette.routing import Route  # noqa: E402
+
+from app.utils.cache import Cache, MemoryBackend, set_cache  # noqa: E402
+from app.utils.idempotency import IdempotencyMiddleware  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--work-ms", type=float, default=50.0)
+    parser.add_argument("--duplicates", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+async def run(args):
+    set_cache(Cache(MemoryBackend()))
+    runs = []
+
+    async def send_message(request):
+        payload = await request.json()
+        runs.append(payload)
+        await asyncio.sleep(args.work_ms / 1000)
+        return JSONResponse({"id": len(runs), "role": "assistant", "content": "x" * 2000})
+
+    app = Starlette(routes=[Route("/messages", send_message, methods=["POST"])])
+    transport = httpx.ASGITransport(app=IdempotencyMiddleware(app))
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        body = {"message": "add a coffee stop after lunch"}
+
+        async def timed(headers_for):
+            start = time.perf_counter()
+            for i in range(args.requests):
+                await client.post("/messages", json=body, headers=headers_for(i))
+            return (time.perf_counter() - start) / args.requests * 1000
+
+        rows = [
+            ("no key", await timed(lambda i: {})),
+            ("new key", await timed(lambda i: {"Idempotency-Key": f"k{i}"})),
+            ("retry", await timed(lambda i: {"Idempotency-Key": f"k{i}"})),
+        ]
+        print(f"endpoint work {args.work_ms:.0f} ms, {args.requests} requests each")
+        for label, ms in rows:
+            print(f"{label:>8}{ms:>10.3f} ms/request")
+
+        runs.clear()
+        headers = {"Idempotency-Key": "burst"}
+        responses = await asyncio.gather(
+            *(client.post("/messages", json=body, headers=headers) for _ in range(args.duplicates))
+        )
+        same = len({r.content for r in responses}) == 1
+        print(f"\n{args.duplicates} duplicates at once: endpoint ran {len(runs)}x, identical responses: {same}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Compare the old print()-based upload logging with app.utils.log.
+
+Replays the logging done by /upload-bookmarks for a large synthetic upload:
+the baseline prints the first features as indented JSON and one line per
+parsed bookmark; the new path logs through the queue handler with payload
+sampling. Output goes to a temporary file in both cases so the numbers
+include the real write cost.
+
+    python -m benchmarks.bench_logging --features 20000
+"""
+import argparse
+import contextlib
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.utils import log as app_log  # noqa: E402
+
+
+def make_features(count):
+    return [
+        {
+            "geometry": {"coordinates": [2.29 + i * 1e-5, 48.85 + i * 1e-5], "type": "Point"},
+            "properties": {
+                "google_maps_url": f"http://maps.google.com/?cid={1000000 + i}",
+                "location": {"name": f"Place {i}", "address": f"{i} Rue de Rivoli, 75001 Paris, France"},
+            },
+            "type": "Feature",
+        }
+        for i in range(count)
+    ]
+
+
+def parse(item):
+    properties = item.get("properties", {})
+    location_info = properties.get("location", {})
+    longitude, latitude = item.get("geometry", {}).get("coordinates", [None, None])
+    return location_info.get("name"), location_info.get("address"), latitude, longitude
+
+
+def run_print(features, out):
+    with contextlib.redirect_stdout(out):
+        start = time.perf_counter()
+        print("🛠️ 上传的 features 内容如下：")
+        for f in features[:3]:
+            print(json.dumps(f, indent=2))
+        for item in features:
+            title, address, latitude, longitude = parse(item)
+            print(f"✅ Parsed bookmark: {title} | {address} | ({latitude}, {longitude})")
+        elapsed = time.perf_counter() - start
+        out.flush()
+    return elapsed, 0.0
+
+
+def run_logging(features, out, level):
+    os.environ["LOG_LEVEL"] = level
+    app_log.setup_logging(stream=out)
+    logger = logging.getLogger("app.routers.bookmark")
+
+    start = time.perf_counter()
+    app_log.log_payload(logger, "Uploaded bookmark features", sample=features[:3], total=len(features))
+    added = 0
+    for item in features:
+        title, address, latitude, longitude = parse(item)
+        logger.debug("Parsed bookmark: %s | %s | (%s, %s)", title, address, latitude, longitude)
+        added += 1
+    logger.info("User %s uploaded bookmarks: added=%d skipped=%d", 1, added, 0)
+    elapsed = time.perf_counter() - start
+
+    drain_start = time.perf_counter()
+    app_log.shutdown_logging()
+    return elapsed, time.perf_counter() - drain_start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--features", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    features = make_features(args.features)
+    variants = {
+        "print": lambda out: run_print(features, out),
+        "logging INFO": lambda out: run_logging(features, out, "INFO"),
+        "logging DEBUG": lambda out: run_logging(features, out, "DEBUG"),
+    }
+
+    print(f"{args.features} features, best of {args.repeat}")
+    for name, run in variants.items():
+        best = None
+        for _ in range(args.repeat):
+            with tempfile.TemporaryFile("w+", encoding="utf-8") as out:
+                timing = run(out)
+                size = out.tell()
+            best = timing if best is None or timing[0] < best[0] else best
+        request_ms, drain_ms = best[0] * 1000, best[1] * 1000
+        print(f"{name:<14} request path {request_ms:8.2f} ms   background drain {drain_ms:7.2f} ms   {size / 1024:9.1f} KiB written")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Benchmark must-visit resolution with app.utils.name_index.
+
+For each number of bookmarks it reports the time to build the in-memory
+trigram index, to resolve a batch of must-visit entries (exact names,
+typos, addresses and unknown places) with the index, and the same
+resolution done by scoring every bookmark, which is what a lookup without
+an index costs.
+
+    python -m benchmarks.bench_name_index --sizes 200 1000 5000 --queries 10
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+import types
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")  # app.database builds its engine at import
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.utils.name_index import MATCH_THRESHOLD, NameIndex, trigrams  # noqa: E402
+
+WORDS = ["cafe", "bar", "musee", "jardin", "place", "bistro", "le", "la", "du", "saint", "pont", "tour",
+         "marche", "galerie", "boulangerie", "parc", "eglise", "theatre", "librairie", "brasserie"]
+
+
+def make_bookmarks(count, rng):
+    return [
+        types.SimpleNamespace(
+            id=i,
+            title=" ".join(rng.choice(WORDS) for _ in range(3)) + f" {i}",
+            address=f"{i} rue {rng.choice(WORDS)}, 750{rng.randint(1, 20):02d} Paris",
+        )
+        for i in range(count)
+    ]
+
+
+def make_queries(bookmarks, count, rng):
+    queries = []
+    for i in range(count):
+        b = rng.choice(bookmarks)
+        kind = i % 4
+        if kind == 0:
+            queries.append(b.title)
+        elif kind == 1:
+            position = rng.randrange(len(b.title) - 1)
+            queries.append(b.title[:position] + b.title[position + 1:])  # typo
+        elif kind == 2:
+            queries.append(b.address.split(",")[0])
+        else:
+            queries.append(f"nowhere {i}")
+    return queries
+
+
+def scan(bookmarks, query):
+    q = trigrams(query)
+    best = None
+    for b in bookmarks:
+        for name in (b.title, b.address):
+            t = trigrams(name)
+            shared = len(q & t)
+            score = max(shared / len(q | t), shared / len(q)) if q and t else 0.0
+            if score >= MATCH_THRESHOLD and (best is None or score > best[1]):
+                best = (b.id, score)
+    return best
+
+
+def median_ms(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[200, 1000, 5000])
+    parser.add_argument("--queries", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{'bookmarks':>10}{'build ms':>10}{'resolve ms':>12}{'scan ms':>10}{'resolved':>10}")
+    for size in args.sizes:
+        rng = random.Random(args.seed)
+        bookmarks = make_bookmarks(size, rng)
+        queries = make_queries(bookmarks, args.queries, rng)
+        entries = [(b.id, (b.title, b.address)) for b in bookmarks]
+        build_ms = median_ms(lambda: NameIndex(entries), args.repeat)
+        index = NameIndex(entries)
+        resolve_ms = median_ms(lambda: [index.resolve(q) for q in queries], args.repeat)
+        scan_ms = median_ms(lambda: [scan(bookmarks, q) for q in queries], 1)
+        resolved = sum(1 for q in queries if index.resolve(q) is not None)
+        print(f"{size:>10}{build_ms:>10.1f}{resolve_ms:>12.2f}{scan_ms:>10.1f}{resolved:>7}/{len(queries)}")
+
+
+if __name__ == "__main__":
+    main()
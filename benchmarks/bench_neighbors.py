@@ -0,0 +1,109 @@
+"""
+Benchmark the bookmark neighbour graph (app.utils.neighbors).
+
+For each size it reports:
+
+- build: building the k-nearest-neighbour graph with the grid, and the
+  same with all pairs compared (skipped above --brute-limit)
+- update: patching the graph after an upload that adds, moves and removes
+  a few bookmarks, and how many lists had to be rewritten
+- plan: plan_route over all bookmarks without and with the graph, and the
+  number of stops each finds
+
+    python -m benchmarks.bench_neighbors --sizes 200 1000 5000 --repeat 3
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.utils.neighbors import K, build_neighbors, haversine_km, update_neighbors  # noqa: E402
+from app.utils.route_planner import Candidate, plan_route  # noqa: E402
+
+ORIGIN = (48.8606, 2.3376)
+
+
+def make_points(count, rng, start_id=0):
+    return {
+        start_id + i: (ORIGIN[0] + rng.uniform(-0.05, 0.05), ORIGIN[1] + rng.uniform(-0.08, 0.08))
+        for i in range(count)
+    }
+
+
+def brute_force(points, k=K):
+    return {
+        point_id: sorted(
+            (haversine_km(point, other_point), other)
+            for other, other_point in points.items() if other != point_id
+        )[:k]
+        for point_id, point in points.items()
+    }
+
+
+def median_ms(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def upload_changes(points, rng, count):
+    current = dict(points)
+    ids = list(points)
+    removed = set(rng.sample(ids, count))
+    for point_id in removed:
+        del current[point_id]
+    added = make_points(count, rng, start_id=max(ids) + 1)
+    current.update(added)
+    moved = sorted(rng.sample(sorted(current.keys() - added.keys()), count))
+    current.update(zip(moved, make_points(count, rng).values()))
+    return current, set(added) | set(moved), removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[200, 1000, 5000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--changes", type=int, default=5, help="bookmarks added, moved and removed per upload")
+    parser.add_argument("--brute-limit", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{'bookmarks':>10}{'build ms':>10}{'pairs ms':>10}{'update ms':>11}{'rewritten':>11}"
+          f"{'plan ms':>9}{'stops':>7}{'graph ms':>10}{'stops':>7}")
+    for size in args.sizes:
+        rng = random.Random(args.seed)
+        points = make_points(size, rng)
+        build_ms = median_ms(lambda: build_neighbors(points), args.repeat)
+        pairs_ms = median_ms(lambda: brute_force(points), 1) if size <= args.brute_limit else None
+        graph = build_neighbors(points)
+
+        current, changed, removed = upload_changes(points, rng, args.changes)
+        previous = {point_id: graph.get(point_id) for point_id in current}
+        update_ms = median_ms(lambda: update_neighbors(previous, current, changed, removed), args.repeat)
+        rewritten = len(update_neighbors(previous, current, changed, removed))
+
+        ids = sorted(points)
+        index = {point_id: i for i, point_id in enumerate(ids)}
+        candidates = [Candidate(f"Bookmark {point_id}", *points[point_id]) for point_id in ids]
+        neighbours = [[index[n[0]] for n in graph[point_id]] for point_id in ids]
+        plan_ms = median_ms(lambda: plan_route(candidates, ORIGIN, "09:00", "21:00", 20), args.repeat)
+        graph_ms = median_ms(
+            lambda: plan_route(candidates, ORIGIN, "09:00", "21:00", 20, neighbours=neighbours), args.repeat
+        )
+        stops = len(plan_route(candidates, ORIGIN, "09:00", "21:00", 20).stops)
+        graph_stops = len(plan_route(candidates, ORIGIN, "09:00", "21:00", 20, neighbours=neighbours).stops)
+
+        pairs = f"{pairs_ms:>10.1f}" if pairs_ms is not None else f"{'-':>10}"
+        print(f"{size:>10}{build_ms:>10.1f}{pairs}{update_ms:>11.1f}{rewritten:>11}"
+              f"{plan_ms:>9.1f}{stops:>7}{graph_ms:>10.1f}{graph_stops:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Benchmark the shared place catalogue (app.utils.places).
+
+--users users each bookmark --bookmarks places drawn from a city of
+--places places, popular ones far more often (Zipf-like weights), as
+real uploads of the same sights and cafes are. It compares the old layout,
+where every bookmark row carried its place's title, address, position,
+link and category, with `places` plus thin bookmarks:
+
+- rows and database size (SQLite file, after VACUUM)
+- places the enrichment pass has to classify: one per bookmark row before,
+  one per place now
+- time for every user's upload to resolve or create its places
+
+    python -m benchmarks.bench_places --users 500 --bookmarks 200 --places 5000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+import app.models  # noqa: E402,F401
+from app.database import Base  # noqa: E402
+from app.models.bookmark import Bookmark  # noqa: E402
+from app.models.place import Place  # noqa: E402
+from app.utils.places import get_or_create_places, place_fingerprint  # noqa: E402
+
+OLD_BOOKMARKS = """
+CREATE TABLE bookmarks (id INTEGER PRIMARY KEY, user_id INTEGER, title VARCHAR, address VARCHAR,
+    latitude FLOAT, longitude FLOAT, category VARCHAR, google_maps_url VARCHAR, neighbors JSON, cluster_id INTEGER);
+CREATE INDEX ix_bookmarks_user_id ON bookmarks (user_id);
+"""
+
+
+def city(count, rng):
+    return [
+        {"title": f"Cafe {rng.choice(['du Centre', 'de la Paix', 'Lumière', 'des Arts'])} {i}",
+         "address": f"{i} Rue de Rivoli, 75001 Paris, France",
+         "latitude": 48.80 + rng.random() * 0.1, "longitude": 2.25 + rng.random() * 0.17,
+         "google_maps_url": f"https://maps.google.com/?cid={10 ** 15 + i}"}
+        for i in range(count)
+    ]
+
+
+def uploads(places, users, per_user, rng):
+    weights = [1 / (rank + 1) for rank in range(len(places))]
+    chosen = []
+    for _ in range(users):
+        picked = set()
+        while len(picked) < min(per_user, len(places)):
+            picked.update(rng.choices(range(len(places)), weights, k=per_user - len(picked)))
+        chosen.append(sorted(picked))
+    return chosen
+
+
+def size_kib(path):
+    connection = sqlite3.connect(path)
+    connection.execute("VACUUM")
+    pages, page_size = connection.execute("PRAGMA page_count").fetchone()[0], \
+        connection.execute("PRAGMA page_size").fetchone()[0]
+    connection.close()
+    return pages * page_size / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--bookmarks", type=int, default=200, help="bookmarks per user")
+    parser.add_argument("--places", type=int, default=5000, help="places in the city")
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    places = city(args.places, rng)
+    chosen = uploads(places, args.users, args.bookmarks, rng)
+    neighbors = "[[1, 120.5, 2.0], [2, 241.0, 4.0], [3, 361.5, 6.0], [4, 482.0, 8.0]]"
+    total = sum(len(ids) for ids in chosen)
+
+    with tempfile.TemporaryDirectory() as directory:
+        old_path = os.path.join(directory, "old.db")
+        connection = sqlite3.connect(old_path)
+        connection.executescript(OLD_BOOKMARKS)
+        connection.executemany(
+            "INSERT INTO bookmarks (user_id, title, address, latitude, longitude, category, google_maps_url, "
+            "neighbors) VALUES (?, ?, ?, ?, ?, 'restaurant:french', ?, ?)",
+            [(user, p["title"], p["address"], p["latitude"], p["longitude"], p["google_maps_url"], neighbors)
+             for user, ids in enumerate(chosen) for p in map(places.__getitem__, ids)],
+        )
+        connection.commit()
+        connection.close()
+
+        new_path = os.path.join(directory, "new.db")
+        engine = create_engine(f"sqlite:///{new_path}")
+        Base.metadata.create_all(engine, tables=[Place.__table__, Bookmark.__table__])
+        Session = sessionmaker(bind=engine)
+        start = time.perf_counter()
+        for user, ids in enumerate(chosen):
+            with Session() as session:
+                fields = {place_fingerprint(p["title"], p["latitude"], p["longitude"], p["google_maps_url"]): p
+                          for p in map(places.__getitem__, ids)}
+                resolved = get_or_create_places(session, fields)
+                session.execute(Bookmark.__table__.insert(), [
+                    {"user_id": user, "place_id": place.id, "neighbors": None} for place in resolved.values()
+                ])
+                session.commit()
+        upload_ms = (time.perf_counter() - start) * 1000 / args.users
+        with Session() as session:
+            session.query(Place).update({"category": "restaurant:french"})
+            session.execute(Bookmark.__table__.update().values(neighbors=neighbors))
+            session.commit()
+            unique = session.query(Place).count()
+        engine.dispose()
+
+        print(f"{args.users} users x {args.bookmarks} bookmarks from {args.places} places: "
+              f"{total} bookmarks, {unique} distinct places")
+        print(f"{'':>16}{'rows':>9}{'KiB':>9}{'to classify':>13}")
+        print(f"{'old bookmarks':>16}{total:>9}{size_kib(old_path):>9.0f}{total:>13}")
+        print(f"{'places + refs':>16}{unique + total:>9}{size_kib(new_path):>9.0f}{unique:>13}")
+        print(f"\nresolving places: {upload_ms:.1f} ms per upload of {args.bookmarks}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Benchmark app.utils.route_planner.plan_route on 50-500 candidate places.
+
+Candidates are scattered around the Louvre like a bookmark export: a
+quarter of them are restaurants restricted to lunch/dinner windows, and
+two are must-visit places. For each size it reports the planning time and
+compares the plan with plain nearest-neighbour construction (no 2-opt,
+Or-opt or insertion): number of stops, total travel and end of the day.
+It also reports the size of the old pairwise-distance prompt section the
+planner replaces.
+
+    python -m benchmarks.bench_route_planner --sizes 50 100 200 500 --repeat 5
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.utils import route_planner  # noqa: E402
+from app.utils.route_planner import Candidate, format_clock, plan_route  # noqa: E402
+
+ORIGIN = (48.8606, 2.3376)
+MEAL_WINDOWS = ((11 * 60 + 30, 14 * 60), (18 * 60, 21 * 60))
+
+
+def make_candidates(count, seed):
+    rng = random.Random(seed)
+    candidates = []
+    for i in range(count):
+        food = i % 4 == 0
+        candidates.append(Candidate(
+            name=f"Place {i}",
+            latitude=ORIGIN[0] + rng.uniform(-0.04, 0.04),
+            longitude=ORIGIN[1] + rng.uniform(-0.06, 0.06),
+            duration_min=75.0 if food else 60.0,
+            score=2.0 if i % 3 == 0 else 1.0,
+            must_visit=i in (count // 3, 2 * count // 3),
+            windows=MEAL_WINDOWS if food else (),
+            group="meal" if food else None,
+        ))
+    return candidates
+
+
+def nearest_neighbour_only(candidates):
+    problem = route_planner._Problem(
+        candidates, ORIGIN, 9 * 60, 21 * 60, 30, route_planner.DEFAULT_SPEED_KMH
+    )
+    seq = route_planner._construct(problem, list(range(1, len(candidates) + 1)))
+    timings = problem.schedule(seq)
+    return len(seq), sum(t[3] for t in timings), timings[-1][2] if timings else problem.start_min
+
+
+def pairwise_prompt_chars(count):
+    # the "Distance between 'A' and 'B': distance 1.23 km, walk time 15 min - 22 min" lines
+    line = len("Distance between 'Place 123' and 'Place 456': distance 1.23 km, walk time 15 min - 22 min\n")
+    return count * (count - 1) // 2 * line
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 100, 200, 500])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{'candidates':>10}{'plan ms':>10}{'stops':>7}{'travel':>8}{'ends':>7}"
+          f"{'nn stops':>10}{'nn travel':>10}{'nn ends':>9}{'old prompt chars':>18}")
+    for size in args.sizes:
+        candidates = make_candidates(size, args.seed)
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            plan = plan_route(candidates, ORIGIN, "09:00", "21:00", max_commute_min=30)
+            timings.append(time.perf_counter() - start)
+        nn_stops, nn_travel, nn_end = nearest_neighbour_only(candidates)
+        ends = format_clock(plan.stops[-1].end_min) if plan.stops else "-"
+        print(
+            f"{size:>10}{statistics.median(timings) * 1000:>10.1f}{len(plan.stops):>7}{plan.travel_min:>8.0f}{ends:>7}"
+            f"{nn_stops:>10}{nn_travel:>10.0f}{format_clock(nn_end):>9}{pairwise_prompt_chars(size):>18,}"
+        )
+
+
+if __name__ == "__main__":
+    main()
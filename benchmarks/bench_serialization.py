@@ -0,0 +1,128 @@
+"""
+Benchmark serializing a large bookmark list (GET /bookmarks).
+
+--bookmarks rows (10k by default, with neighbour lists like real uploads)
+are read from SQLite and turned into the JSON body three ways:
+
+- orm + json.dumps: ORM objects, Pydantic validation, jsonable_encoder and
+  json.dumps (the old path)
+- orm + orjson: ORM objects, Pydantic validation, FastJSONResponse
+- columns + orjson: schema_columns + rows_response (what the endpoint does now)
+
+Then the body is compressed as CompressionMiddleware would: size and time
+for gzip and Brotli.
+
+    python -m benchmarks.bench_serialization --bookmarks 10000 --repeat 5
+"""
+import argparse
+import gzip
+import json
+import os
+import statistics
+import sys
+import time
+from typing import List
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from pydantic import TypeAdapter  # noqa: E402
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+from sqlalchemy.pool import StaticPool  # noqa: E402
+
+import app.models  # noqa: E402,F401
+from app.database import Base  # noqa: E402
+from app.models.bookmark import Bookmark  # noqa: E402
+from app.models.place import Place  # noqa: E402
+from app.models.user import User  # noqa: E402
+from app.schemas.bookmark import BookmarkResponse  # noqa: E402
+from app.utils.compression import BROTLI_QUALITY, GZIP_LEVEL, brotli  # noqa: E402
+from app.utils.responses import FastJSONResponse, rows_response, schema_columns  # noqa: E402
+
+
+def seed(session, count):
+    user = User(email="bench@example.com", hashed_password="x")
+    session.add(user)
+    session.commit()
+    session.bulk_insert_mappings(Place, [
+        {
+            "id": i + 1, "fingerprint": f"url:maps.google.com/?cid={i}", "title": f"Place {i}",
+            "address": f"{i} Market Street, San Francisco", "latitude": 37.7 + i * 1e-5,
+            "longitude": -122.4 - i * 1e-5, "category": "Cafe", "google_maps_url": f"https://maps.google.com/?cid={i}",
+        }
+        for i in range(count)
+    ])
+    session.bulk_insert_mappings(Bookmark, [
+        {"user_id": user.id, "place_id": i + 1, "neighbors": [[i + k, 120.5 * k, 2 * k] for k in range(1, 9)]}
+        for i in range(count)
+    ])
+    session.commit()
+    return user.id
+
+
+def median_ms(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bookmarks", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as session:
+        user_id = seed(session, args.bookmarks)
+    adapter = TypeAdapter(List[BookmarkResponse])
+
+    def orm_json():
+        with Session() as session:
+            rows = session.query(Bookmark).filter(Bookmark.user_id == user_id).all()
+            return json.dumps(jsonable_encoder(adapter.validate_python(rows, from_attributes=True)),
+                              ensure_ascii=False, separators=(",", ":")).encode()
+
+    def orm_orjson():
+        with Session() as session:
+            rows = session.query(Bookmark).filter(Bookmark.user_id == user_id).all()
+            return FastJSONResponse(adapter.dump_python(adapter.validate_python(rows, from_attributes=True))).body
+
+    def columns_orjson():
+        with Session() as session:
+            rows = (
+                session.query(*schema_columns(BookmarkResponse, Place, id=Bookmark.id))
+                .join(Bookmark.place)
+                .filter(Bookmark.user_id == user_id)
+                .all()
+            )
+            return rows_response(BookmarkResponse, rows).body
+
+    print(f"{args.bookmarks} bookmarks")
+    print(f"{'':>18}{'ms':>8}{'KiB':>9}")
+    results = {}
+    for label, func in (("orm + json.dumps", orm_json), ("orm + orjson", orm_orjson),
+                        ("columns + orjson", columns_orjson)):
+        ms, body = median_ms(func, args.repeat)
+        results[label] = body
+        print(f"{label:>18}{ms:>8.1f}{len(body) / 1024:>9.0f}")
+    assert json.loads(results["orm + json.dumps"]) == json.loads(results["columns + orjson"])
+
+    body = results["columns + orjson"]
+    compressors = [(f"gzip {GZIP_LEVEL}", lambda: gzip.compress(body, GZIP_LEVEL))]
+    if brotli is not None:
+        compressors.append((f"br {BROTLI_QUALITY}", lambda: brotli.compress(body, quality=BROTLI_QUALITY)))
+    for label, func in compressors:
+        ms, compressed = median_ms(func, args.repeat)
+        print(f"{label:>18}{ms:>8.1f}{len(compressed) / 1024:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Benchmark cold start of the API.
+
+Each run starts a fresh interpreter and reports:
+
+- import: time to `import app.main` (app factory included)
+- ready: time from launching uvicorn to the first 200 on `/`
+- modules: whether the OpenAI SDK got imported at startup (it should not;
+  it is loaded on the first OpenAI call)
+
+Exits non-zero when the median import or ready time is over its budget, so
+CI can enforce them:
+
+    python -m benchmarks.bench_startup --runs 5 --import-budget-ms 1200 --ready-budget-ms 2200
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+from benchmarks.e2e import free_port  # noqa: E402
+
+IMPORT_PROBE = (
+    "import sys, time, json\n"
+    "start = time.perf_counter()\n"
+    "import app.main\n"
+    "print(json.dumps({'ms': (time.perf_counter() - start) * 1000, 'openai': 'openai' in sys.modules}))\n"
+)
+
+
+def measure_import(env):
+    out = subprocess.run([sys.executable, "-c", IMPORT_PROBE], cwd=ROOT, env=env,
+                         check=True, capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def measure_ready(env, timeout=30.0):
+    port = free_port()
+    url = f"http://127.0.0.1:{port}/"
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            if process.poll() is not None:
+                raise SystemExit(f"app exited with code {process.returncode}")
+            try:
+                if httpx.get(url, timeout=0.5).status_code == 200:
+                    return (time.perf_counter() - start) * 1000
+            except httpx.HTTPError:
+                time.sleep(0.01)
+        raise SystemExit("app did not start in time")
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--import-budget-ms", type=float, default=1200.0)
+    parser.add_argument("--ready-budget-ms", type=float, default=2200.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(
+            os.environ,
+            DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'startup.db')}",
+            OPENAI_API_KEY="bench",
+            LOG_LEVEL=os.getenv("LOG_LEVEL", "WARNING"),
+        )
+        imports = [measure_import(env) for _ in range(args.runs)]
+        ready = [measure_ready(env) for _ in range(args.runs)]
+
+    import_ms = statistics.median(run["ms"] for run in imports)
+    ready_ms = statistics.median(ready)
+    openai_loaded = any(run["openai"] for run in imports)
+    print(f"{'':>8}{'median ms':>11}{'min ms':>9}{'max ms':>9}{'budget ms':>11}")
+    for name, values, median, budget in (
+        ("import", [run["ms"] for run in imports], import_ms, args.import_budget_ms),
+        ("ready", ready, ready_ms, args.ready_budget_ms),
+    ):
+        print(f"{name:>8}{median:>11.0f}{min(values):>9.0f}{max(values):>9.0f}{budget:>11.0f}")
+    print(f"openai imported at startup: {'yes' if openai_loaded else 'no'}")
+
+    over = [name for name, median, budget in (
+        ("import", import_ms, args.import_budget_ms), ("ready", ready_ms, args.ready_budget_ms),
+    ) if median > budget]
+    if over:
+        raise SystemExit(f"over budget: {', '.join(over)}")
+
+
+if __name__ == "__main__":
+    main()
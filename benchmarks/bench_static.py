@@ -0,0 +1,90 @@
+"""
+Benchmark static file serving (app.utils.static_files).
+
+The ASGI apps are called directly, without a server, so the numbers are
+the per-request cost of the static handler itself. For plain StaticFiles
+and CachedStaticFiles it reports, per request:
+
+- 200: a full response for a small content-addressed file (an avatar)
+- 304: a revalidation with If-None-Match
+- cache-control: what the browser is told; with `immutable` it does not
+  revalidate at all on repeat views
+
+    python -m benchmarks.bench_static --requests 2000 --size 8192
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from starlette.staticfiles import StaticFiles  # noqa: E402
+
+from app.utils.static_files import CachedStaticFiles  # noqa: E402
+
+NAME = "ab" * 32 + "-128.webp"
+
+
+async def request(app, path, headers=()):
+    scope = {
+        "type": "http", "asgi": {"spec_version": "2.4"}, "method": "GET", "path": path,
+        "root_path": "", "query_string": b"",
+        "headers": [(key.encode(), value.encode()) for key, value in headers],
+    }
+    sent = {"status": None, "headers": {}, "bytes": 0}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            sent["status"] = message["status"]
+            sent["headers"] = {key.decode(): value.decode() for key, value in message["headers"]}
+        elif message["type"] == "http.response.body":
+            sent["bytes"] += len(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return sent
+
+
+async def per_request_us(app, requests, headers=()):
+    await request(app, "/" + NAME, headers)  # warm up
+    start = time.perf_counter()
+    for _ in range(requests):
+        await request(app, "/" + NAME, headers)
+    return (time.perf_counter() - start) / requests * 1e6
+
+
+async def run(args, directory):
+    rows = []
+    for label, app in (("StaticFiles", StaticFiles(directory=directory)),
+                       ("CachedStaticFiles", CachedStaticFiles(directory=directory))):
+        first = await request(app, "/" + NAME)
+        etag = first["headers"]["etag"]
+        ok_us = await per_request_us(app, args.requests)
+        not_modified_us = await per_request_us(app, args.requests, [("if-none-match", etag)])
+        rows.append((label, ok_us, not_modified_us, first["headers"].get("cache-control", "-")))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--size", type=int, default=8192)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        with open(os.path.join(tmp, NAME), "wb") as handle:
+            handle.write(os.urandom(args.size))
+        rows = asyncio.run(run(args, tmp))
+
+    print(f"{'':>18}{'200 us':>9}{'304 us':>9}  cache-control")
+    for label, ok_us, not_modified_us, cache_control in rows:
+        print(f"{label:>18}{ok_us:>9.0f}{not_modified_us:>9.0f}  {cache_control}")
+
+
+if __name__ == "__main__":
+    main()
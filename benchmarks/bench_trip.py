@@ -0,0 +1,130 @@
+"""
+Benchmark multi-day trip generation (POST /generate-trip).
+
+The app runs under uvicorn in a thread of this process, against an
+in-memory SQLite database and the fake OpenAI/Yelp servers from
+benchmarks.fakes (TestClient would buffer the streamed response). For each trip length it reports
+the time to plan the same days with one /generate-route call per day, and
+with one /generate-trip call at several day concurrencies: total time and
+time until the first day arrives.
+
+    python -m benchmarks.bench_trip --days 3 7 --concurrency 1 3 6 --openai-latency-ms 300
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from benchmarks.e2e import PREFERENCES, free_port, make_bookmarks  # noqa: E402
+from benchmarks.fakes import FakeOpenAIHandler, FakeYelpHandler, start_fake_server  # noqa: E402
+
+
+def median_ms(timings):
+    return statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, nargs="+", default=[3, 7])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 3, 6])
+    parser.add_argument("--bookmarks", type=int, default=400)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--openai-latency-ms", type=float, default=300.0)
+    parser.add_argument("--yelp-latency-ms", type=float, default=20.0)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    _, openai_url = start_fake_server(FakeOpenAIHandler, args.openai_latency_ms)
+    _, yelp_url = start_fake_server(FakeYelpHandler, args.yelp_latency_ms)
+    os.environ.update(
+        DATABASE_URL="sqlite://",
+        OPENAI_API_KEY="bench",
+        OPENAI_BASE_URL=openai_url + "/v1",
+        YELP_API_KEY="bench",
+        YELP_API_URL=yelp_url + "/v3/businesses/search",
+        OPENAI_RPM=os.getenv("OPENAI_RPM", "0"),
+        OPENAI_TPM=os.getenv("OPENAI_TPM", "0"),
+        LOG_LEVEL=os.getenv("LOG_LEVEL", "WARNING"),
+    )
+
+    import httpx
+    import uvicorn
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import StaticPool
+
+    import app.routers.generate as generate
+    from app.database import Base, get_db
+    from app.main import app
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+
+    def override_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_db
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    client = httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=120.0)
+    client.post("/register", json={"email": "bench@example.com", "password": "bench"})
+    token = client.post("/login", json={"email": "bench@example.com", "password": "bench"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    client.post(
+        "/upload-bookmarks",
+        files={"file": ("bookmarks.json", make_bookmarks(args.bookmarks, args.seed), "application/json")},
+        headers=headers,
+    )
+
+    def per_day(days):
+        for _ in range(days):
+            client.post("/generate-route", json=PREFERENCES, headers=headers).raise_for_status()
+
+    def trip(days):
+        start = date(2026, 5, 1)
+        body = dict(PREFERENCES, startDate=start.isoformat(), endDate=(start + timedelta(days=days - 1)).isoformat())
+        began = time.perf_counter()
+        first = None
+        with client.stream("POST", "/generate-trip", json=body, headers=headers) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if first is None and json.loads(line)["type"] == "day":
+                    first = time.perf_counter() - began
+        return first
+
+    print(f"{'days':>5}{'per-day ms':>12}" + "".join(f"{f'trip c={c} ms':>15}{'first ms':>10}" for c in args.concurrency))
+    for days in args.days:
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            per_day(days)
+            timings.append(time.perf_counter() - start)
+        row = f"{days:>5}{median_ms(timings):>12.0f}"
+        for concurrency in args.concurrency:
+            generate.TRIP_DAY_CONCURRENCY = concurrency
+            totals, firsts = [], []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                firsts.append(trip(days))
+                totals.append(time.perf_counter() - start)
+            row += f"{median_ms(totals):>15.0f}{median_ms(firsts):>10.0f}"
+        print(row)
+    server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
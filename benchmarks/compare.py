@@ -0,0 +1,66 @@
+"""
+Compare two result files written by benchmarks/e2e.py.
+
+    python -m benchmarks.compare benchmarks/results/old.json benchmarks/results/new.json
+    python -m benchmarks.compare old.json new.json --fail-above 15
+
+With --fail-above, exits 1 when any operation's p95 latency or DB queries
+per request grew by more than the given percentage.
+"""
+import argparse
+import json
+import sys
+
+METRICS = ("throughput_rps", "p50_ms", "p95_ms", "p99_ms", "db_queries_per_request")
+# metrics where bigger is worse; used for --fail-above
+GATED = ("p95_ms", "db_queries_per_request")
+
+
+def change(old, new):
+    if old in (None, 0) or new is None:
+        return None
+    return (new - old) / old * 100
+
+
+def compare(baseline, candidate, fail_above=None):
+    regressions = []
+    rows = []
+    for operation in sorted(set(baseline["operations"]) | set(candidate["operations"])):
+        old = baseline["operations"].get(operation)
+        new = candidate["operations"].get(operation)
+        if old is None or new is None:
+            rows.append((operation, "only in " + ("candidate" if old is None else "baseline"), "", "", ""))
+            continue
+        for metric in METRICS:
+            delta = change(old.get(metric), new.get(metric))
+            rows.append((operation, metric, old.get(metric), new.get(metric), "" if delta is None else f"{delta:+.1f}%"))
+            if fail_above is not None and metric in GATED and delta is not None and delta > fail_above:
+                regressions.append(f"{operation} {metric} {delta:+.1f}%")
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--fail-above", type=float, default=None, metavar="PERCENT")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    print(f"baseline  {baseline['meta'].get('git_commit')} {baseline['meta'].get('label', '')}")
+    print(f"candidate {candidate['meta'].get('git_commit')} {candidate['meta'].get('label', '')}\n")
+    rows, regressions = compare(baseline, candidate, args.fail_above)
+    for operation, metric, old, new, delta in rows:
+        print(f"{operation:<20}{metric:<24}{str(old):>10}{str(new):>10}{delta:>10}")
+
+    if regressions:
+        print("\nregressions above {:.0f}%:\n  ".format(args.fail_above) + "\n  ".join(regressions))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
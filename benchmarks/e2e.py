@@ -0,0 +1,324 @@
+"""
+End-to-end benchmark of the real request paths.
+
+Boots the app with uvicorn against a fresh SQLite database and local fake
+OpenAI / Yelp servers (benchmarks/fakes.py), then drives a weighted mix of
+scenarios at a fixed concurrency:
+
+- upload:   POST /upload-bookmarks with --bookmarks features
+- generate: POST /generate-route
+- chat:     save a route, open a chat session, send a message, apply the diff
+- sessions: GET /chat/sessions and GET /saved-routes
+
+For every operation it reports throughput, p50/p95/p99 latency and DB
+queries per request (read from the Server-Timing header), and writes the
+results to a JSON file that benchmarks/compare.py can diff against another
+run.
+
+    python -m benchmarks.e2e --iterations 200 --concurrency 8
+    python -m benchmarks.e2e --mix upload=1,generate=2,chat=4,sessions=8 --workers 2
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+import httpx
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+from benchmarks.fakes import FakeOpenAIHandler, FakeYelpHandler, ITINERARY, start_fake_server  # noqa: E402
+
+DEFAULT_MIX = "upload=1,generate=2,chat=4,sessions=8"
+SERVER_TIMING_QUERIES = re.compile(r'desc="(\d+) queries"')
+
+PREFERENCES = {
+    "centerLandmark": "Louvre Museum",
+    "mustVisit": ["Café de Flore", "Tuileries Garden"],
+    "startTime": "09:00",
+    "endTime": "21:00",
+    "transportModes": ["walking"],
+    "allowAlcohol": True,
+    "preferredCuisine": ["French"],
+    "maxCommuteTime": 30,
+}
+
+
+def make_bookmarks(count, seed):
+    rng = random.Random(seed)
+    features = []
+    for i in range(count):
+        features.append({
+            "type": "Feature",
+            "geometry": {
+                "type": "Point",
+                "coordinates": [2.3376 + rng.uniform(-0.06, 0.06), 48.8606 + rng.uniform(-0.04, 0.04)],
+            },
+            "properties": {
+                "google_maps_url": f"http://maps.google.com/?cid={seed * 100000 + i}",
+                "location": {"name": f"Bench Place {i}", "address": f"{i} Rue Bench, 75001 Paris, France"},
+            },
+        })
+    return json.dumps({"type": "FeatureCollection", "features": features}).encode()
+
+
+def parse_mix(spec):
+    mix = {}
+    for item in spec.split(","):
+        name, _, weight = item.partition("=")
+        if name.strip() not in SCENARIOS:
+            raise SystemExit(f"unknown scenario {name!r}; choose from {', '.join(SCENARIOS)}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = defaultdict(list)  # operation -> [(seconds, status, db_queries)]
+
+    async def call(self, client, operation, method, url, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.samples[operation].append((time.perf_counter() - start, 0, None))
+            return None
+        elapsed = time.perf_counter() - start
+        match = SERVER_TIMING_QUERIES.search(response.headers.get("server-timing", ""))
+        self.samples[operation].append((elapsed, response.status_code, int(match.group(1)) if match else None))
+        return response
+
+    def summary(self, wall_seconds):
+        operations = {}
+        for operation, samples in sorted(self.samples.items()):
+            latencies = sorted(s[0] * 1000 for s in samples)
+            queries = [s[2] for s in samples if s[2] is not None]
+            errors = sum(1 for s in samples if not 200 <= s[1] < 400)
+            operations[operation] = {
+                "count": len(samples),
+                "errors": errors,
+                "throughput_rps": round(len(samples) / wall_seconds, 2),
+                "mean_ms": round(sum(latencies) / len(latencies), 2),
+                "p50_ms": round(percentile(latencies, 50), 2),
+                "p95_ms": round(percentile(latencies, 95), 2),
+                "p99_ms": round(percentile(latencies, 99), 2),
+                "db_queries_per_request": round(sum(queries) / len(queries), 2) if queries else None,
+            }
+        return operations
+
+
+async def scenario_upload(client, user, recorder, bookmarks):
+    await recorder.call(
+        client, "upload-bookmarks", "POST", "/upload-bookmarks",
+        headers=user, files={"file": ("bookmarks.json", bookmarks, "application/json")},
+    )
+
+
+async def scenario_generate(client, user, recorder, bookmarks):
+    await recorder.call(client, "generate-route", "POST", "/generate-route", headers=user, json=PREFERENCES)
+
+
+async def scenario_chat(client, user, recorder, bookmarks):
+    saved = await recorder.call(client, "save-route", "POST", "/save-route", headers=user, json={"route_text": ITINERARY})
+    if saved is None or saved.status_code != 200:
+        return
+    session = await recorder.call(
+        client, "create-session", "POST", "/chat/sessions",
+        headers=user, json={"generated_route_id": saved.json()["id"]},
+    )
+    if session is None or session.status_code != 200:
+        return
+    session_id = session.json()["id"]
+    message = await recorder.call(
+        client, "send-message", "POST", f"/chat/sessions/{session_id}/messages",
+        headers=user, json={"content": "Can we have Japanese food for lunch instead?"},
+    )
+    if message is None or message.status_code != 200:
+        return
+    await recorder.call(
+        client, "apply-diff", "POST", f"/chat/sessions/{session_id}/messages/{message.json()['id']}/apply-diff",
+        headers=user,
+    )
+
+
+async def scenario_sessions(client, user, recorder, bookmarks):
+    await recorder.call(client, "list-sessions", "GET", "/chat/sessions", headers=user)
+    await recorder.call(client, "list-saved-routes", "GET", "/saved-routes", headers=user)
+
+
+SCENARIOS = {
+    "upload": scenario_upload,
+    "generate": scenario_generate,
+    "chat": scenario_chat,
+    "sessions": scenario_sessions,
+}
+
+
+async def drive(base_url, args, mix):
+    bookmarks = make_bookmarks(args.bookmarks, args.seed)
+    limits = httpx.Limits(max_connections=args.concurrency * 2)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120.0, limits=limits) as client:
+        users = []
+        for i in range(args.users):
+            credentials = {"email": f"bench{i}@example.com", "password": "bench-password"}
+            await client.post("/register", json=credentials)
+            token = (await client.post("/login", json=credentials)).json()["access_token"]
+            user = {"Authorization": f"Bearer {token}"}
+            await client.post("/upload-bookmarks", headers=user, files={"file": ("b.json", bookmarks, "application/json")})
+            users.append(user)
+
+        rng = random.Random(args.seed)
+        names, weights = zip(*mix.items())
+        plan = [(rng.choice(users), rng.choices(names, weights)[0]) for _ in range(args.iterations)]
+        queue = asyncio.Queue()
+        for item in plan:
+            queue.put_nowait(item)
+
+        recorder = Recorder()
+
+        async def worker():
+            while not queue.empty():
+                user, name = queue.get_nowait()
+                await SCENARIOS[name](client, user, recorder, bookmarks)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        wall = time.perf_counter() - start
+    return recorder, wall
+
+
+def wait_for_server(base_url, process, timeout=30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"app exited with code {process.returncode}")
+        try:
+            if httpx.get(base_url + "/", timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    raise SystemExit("app did not start in time")
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200, help="number of scenarios to run")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--users", type=int, default=4)
+    parser.add_argument("--bookmarks", type=int, default=200, help="features per bookmark upload")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"scenario weights (default {DEFAULT_MIX})")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--openai-latency-ms", type=float, default=50.0)
+    parser.add_argument("--yelp-latency-ms", type=float, default=20.0)
+    parser.add_argument("--openai-error-rate", type=float, default=0.0, help="share of OpenAI calls failing with 503")
+    parser.add_argument("--yelp-error-rate", type=float, default=0.0, help="share of Yelp calls failing with 503")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--label", default="", help="free-form tag stored with the results")
+    parser.add_argument("--output-dir", default=os.path.join(ROOT, "benchmarks", "results"))
+    args = parser.parse_args()
+    mix = parse_mix(args.mix)
+
+    openai_server, openai_url = start_fake_server(FakeOpenAIHandler, args.openai_latency_ms, args.openai_error_rate)
+    yelp_server, yelp_url = start_fake_server(FakeYelpHandler, args.yelp_latency_ms, args.yelp_error_rate)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(
+            os.environ,
+            DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+            OPENAI_API_KEY="bench",
+            OPENAI_BASE_URL=openai_url + "/v1",
+            YELP_API_KEY="bench",
+            YELP_API_URL=yelp_url + "/v3/businesses/search",
+            # the fakes have no quota; measure our code, not the rate limiter
+            OPENAI_RPM=os.getenv("OPENAI_RPM", "0"),
+            OPENAI_TPM=os.getenv("OPENAI_TPM", "0"),
+            YELP_RPM=os.getenv("YELP_RPM", "0"),
+            # provider limits are split between the uvicorn workers
+            WEB_CONCURRENCY=str(args.workers),
+            LOG_LEVEL=os.getenv("LOG_LEVEL", "WARNING"),
+        )
+        subprocess.run(
+            [sys.executable, "-c", "from app.main import app\n"
+             "from app.database import Base, engine\n"
+             "Base.metadata.create_all(bind=engine)"],
+            cwd=ROOT, env=env, check=True,
+        )
+
+        port = free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port),
+             "--workers", str(args.workers), "--log-level", "warning"],
+            cwd=ROOT, env=env,
+        )
+        try:
+            wait_for_server(base_url, process)
+            recorder, wall = asyncio.run(drive(base_url, args, mix))
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+            openai_server.shutdown()
+            yelp_server.shutdown()
+
+    operations = recorder.summary(wall)
+    result = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_commit": git_commit(),
+            "label": args.label,
+            "python": sys.version.split()[0],
+            "wall_seconds": round(wall, 3),
+            "config": {k: v for k, v in vars(args).items() if k != "output_dir"},
+        },
+        "operations": operations,
+    }
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    path = os.path.join(args.output_dir, f"e2e-{stamp}{'-' + args.label if args.label else ''}.json")
+    with open(path, "w") as f:
+        json.dump(result, f, indent=2)
+
+    print(f"{'operation':<20}{'count':>7}{'err':>5}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>9}")
+    for operation, stats in operations.items():
+        queries = stats["db_queries_per_request"]
+        print(
+            f"{operation:<20}{stats['count']:>7}{stats['errors']:>5}{stats['throughput_rps']:>9}"
+            f"{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}"
+            f"{queries if queries is not None else '-':>9}"
+        )
+    print(f"\nresults written to {os.path.relpath(path, ROOT)}")
+
+
+if __name__ == "__main__":
+    main()
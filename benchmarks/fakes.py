@@ -0,0 +1,188 @@
+"""
+Local stand-ins for the OpenAI and Yelp HTTP APIs.
+
+Both run as threaded HTTP servers on 127.0.0.1 with a configurable fixed
+latency, and return responses shaped like the real APIs so the app and
+the OpenAI SDK parse them unchanged. A non-zero error rate makes that
+share of requests fail with 503, to exercise retries and the circuit
+breaker in app.utils.outbound.
+"""
+import difflib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+ITINERARY = """09:00 - 10:00: Head to Café de Flore, breakfast in Saint-Germain
+10:15 - 12:00: Visit the Louvre Museum, highlights tour
+12:15 - 13:30: Lunch at Le Fumoir, French bistro
+13:45 - 15:00: Walk through the Tuileries Garden
+15:15 - 16:30: Musée de l'Orangerie, Monet's Water Lilies
+16:45 - 18:00: Coffee break at Angelina, hot chocolate
+18:15 - 19:30: Stroll along the Seine to Pont Neuf
+19:45 - 21:30: Dinner at Le Procope, classic French cuisine
+"""
+
+MODIFIED_ITINERARY = ITINERARY.replace(
+    "12:15 - 13:30: Lunch at Le Fumoir, French bistro",
+    "12:15 - 13:30: Lunch at Kunitoraya, Japanese udon",
+)
+
+ITINERARY_STOPS = [
+    {"start_time": line[:5], "end_time": line[8:13], "name": line[15:].partition(", ")[0],
+     "description": line[15:].partition(", ")[2], "address": None, "bookmark_id": None}
+    for line in ITINERARY.splitlines()
+]
+
+# structured form of the lunch swap, as asked for when the plan is made of stops
+CHAT_OPERATIONS = [{
+    "op": "update",
+    "index": 3,
+    "stop": dict(ITINERARY_STOPS[2], name="Lunch at Kunitoraya", description="Japanese udon"),
+}]
+
+CHAT_DIFF = "".join(difflib.unified_diff(
+    ITINERARY.splitlines(True),
+    MODIFIED_ITINERARY.splitlines(True),
+    fromfile="a/tour_plan.txt",
+    tofile="b/tour_plan.txt",
+))
+
+
+PLANNED_STOP = re.compile(r"^\d+\. (\d\d:\d\d) - (\d\d:\d\d): ([^,\[(\n]+)", re.MULTILINE)
+CUISINES = ("french", "italian", "japanese")
+PLACE_LINE = re.compile(r"^(\d+)\. ([^|\n]*)\|", re.MULTILINE)
+
+
+class _FakeHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    error_rate = 0.0
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _inject_fault(self):
+        """Answer 503 for error_rate of the requests; True if it did."""
+        if self.error_rate and random.random() < self.error_rate:
+            self._reply(503, {"error": {"message": "injected fault"}})
+            return True
+        return False
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+
+class FakeOpenAIHandler(_FakeHandler):
+    """Answers POST /v1/chat/completions for the prompts the app sends."""
+
+    def do_POST(self):
+        request = self._read_json()
+        time.sleep(self.latency)
+        if self._inject_fault():
+            return
+        if not self.path.endswith("/chat/completions"):
+            self._reply(404, {"error": {"message": "not found"}})
+            return
+
+        messages = request.get("messages", [])
+        prompt = "\n".join(m.get("content") or "" for m in messages)
+        schema = (request.get("response_format") or {}).get("json_schema", {}).get("name")
+        if "geo-coordinate" in prompt:
+            content = json.dumps({"place_name": "Louvre", "longitude": 2.3376, "latitude": 48.8606})
+        elif schema == "itinerary":
+            content = json.dumps({"stops": self._narrate(prompt) or ITINERARY_STOPS})
+        elif schema == "place_categories":
+            content = json.dumps({"places": self._categorize(prompt)})
+        elif schema == "stop_operations":
+            content = json.dumps({"chat_message": "Swapped lunch for udon.", "operations": CHAT_OPERATIONS})
+        elif "tour guide assistant" in prompt:
+            content = json.dumps({"chat_message": "Swapped lunch for udon.", "diff": CHAT_DIFF})
+        else:
+            content = ITINERARY
+
+        prompt_tokens = len(prompt) // 4
+        completion_tokens = len(content) // 4
+        self._reply(200, {
+            "id": f"chatcmpl-bench{random.randint(0, 10 ** 9)}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "gpt-4.1"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        })
+
+
+    @staticmethod
+    def _narrate(prompt):
+        """Echo the planned stops listed in a generate-route prompt, with descriptions."""
+        return [
+            {"start_time": start, "end_time": end, "name": name.strip(), "description": "a pleasant visit",
+             "address": None, "bookmark_id": None}
+            for start, end, name in PLANNED_STOP.findall(prompt)
+        ]
+
+
+    @staticmethod
+    def _categorize(prompt):
+        """Bars by name, everything else a French, Italian or Japanese restaurant."""
+        return [
+            {"index": int(index), "kind": "bar", "cuisines": []} if "bar" in name.lower()
+            else {"index": int(index), "kind": "restaurant", "cuisines": [CUISINES[int(index) % len(CUISINES)]]}
+            for index, name in PLACE_LINE.findall(prompt)
+        ]
+
+
+class FakeYelpHandler(_FakeHandler):
+    """Answers GET /v3/businesses/search with businesses around the query point."""
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        if self._inject_fault():
+            return
+        query = parse_qs(urlparse(self.path).query)
+        latitude = float(query.get("latitude", [48.86])[0])
+        longitude = float(query.get("longitude", [2.34])[0])
+        limit = int(query.get("limit", [5])[0])
+        businesses = [
+            {
+                "name": f"Bench Bistro {i}",
+                "location": {"display_address": [f"{i} Rue de Rivoli", "75001 Paris"]},
+                "rating": 4.5,
+                "review_count": 100 + i,
+                "url": f"https://www.yelp.com/biz/bench-bistro-{i}",
+                "categories": [{"alias": "french", "title": "French"}],
+                "coordinates": {"latitude": latitude + i * 0.001, "longitude": longitude - i * 0.001},
+            }
+            for i in range(limit)
+        ]
+        self._reply(200, {"businesses": businesses, "total": limit})
+
+
+def start_fake_server(handler_class, latency_ms: float = 0.0, error_rate: float = 0.0):
+    """Start a fake API server in a daemon thread; returns (server, base_url)."""
+    handler = type(handler_class.__name__, (handler_class,), {"latency": latency_ms / 1000.0, "error_rate": error_rate})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
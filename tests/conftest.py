@@ -0,0 +1,34 @@
+"""
+Shared fixtures for the test suite.
+"""
+import os
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")  # app.database builds its engine at import
+
+import app.models  # noqa: E402,F401  (registers all mappers)
+from app.database import Base  # noqa: E402
+
+
+@pytest.fixture
+def engine():
+    """An in-memory SQLite database with every table; all its connections see the same data."""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    try:
+        yield engine
+    finally:
+        engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    session = sessionmaker(bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
@@ -0,0 +1,135 @@
+"""
+Test cases for avatar processing.
+Tests thumbnail sizes and formats, EXIF orientation, content-addressed storage and the streamed size limit.
+"""
+import asyncio
+import io
+import os
+
+import pytest
+from fastapi import HTTPException
+from PIL import Image
+from starlette.requests import Request
+
+from app.utils.avatars import (
+    AVATAR_SIZES,
+    ENCODINGS,
+    InvalidImage,
+    avatar_urls,
+    make_thumbnails,
+    read_upload,
+    store_avatar,
+)
+
+
+def _jpeg(width=1200, height=800, color=(200, 30, 30), orientation=None):
+    image = Image.new("RGB", (width, height), color)
+    out = io.BytesIO()
+    exif = Image.Exif()
+    if orientation is not None:
+        exif[0x0112] = orientation
+    image.save(out, format="JPEG", exif=exif.tobytes())
+    return out.getvalue()
+
+
+def _multipart_request(body: bytes, boundary="avatar-boundary", chunk=4096, content_length=True):
+    payload = (
+        f"--{boundary}\r\n"
+        'Content-Disposition: form-data; name="file"; filename="me.jpg"\r\n'
+        "Content-Type: image/jpeg\r\n\r\n"
+    ).encode() + body + f"\r\n--{boundary}--\r\n".encode()
+    chunks = [payload[i:i + chunk] for i in range(0, len(payload), chunk)]
+    sent = []
+
+    async def receive():
+        if not chunks:
+            return {"type": "http.request", "body": b"", "more_body": False}
+        part = chunks.pop(0)
+        sent.append(len(part))
+        return {"type": "http.request", "body": part, "more_body": bool(chunks)}
+
+    headers = [(b"content-type", f"multipart/form-data; boundary={boundary}".encode())]
+    if content_length:
+        headers.append((b"content-length", str(len(payload)).encode()))
+    scope = {"type": "http", "method": "POST", "path": "/upload-avatar", "headers": headers}
+    return Request(scope, receive), sent
+
+
+class TestMakeThumbnails:
+    """Test cases for make_thumbnails"""
+
+    def test_sizes_and_formats(self):
+        """Test that every size is a square in both WebP and JPEG"""
+        thumbnails = make_thumbnails(_jpeg())
+        assert set(thumbnails) == {(size, ext) for size in AVATAR_SIZES for ext in ENCODINGS}
+        for (size, ext), blob in thumbnails.items():
+            image = Image.open(io.BytesIO(blob))
+            assert image.size == (size, size)
+            assert image.format == ENCODINGS[ext]["format"]
+
+    def test_exif_orientation_applied_and_dropped(self):
+        """Test that a rotated phone photo comes out upright and without EXIF"""
+        # a tall image stored sideways: left half red, right half blue before rotation
+        image = Image.new("RGB", (800, 400), (255, 0, 0))
+        image.paste((0, 0, 255), (400, 0, 800, 400))
+        out = io.BytesIO()
+        exif = Image.Exif()
+        exif[0x0112] = 6  # rotate 90 degrees clockwise to display
+        image.save(out, format="JPEG", exif=exif.tobytes())
+        thumbnail = Image.open(io.BytesIO(make_thumbnails(out.getvalue())[(128, "jpeg")]))
+        top, bottom = thumbnail.getpixel((64, 5)), thumbnail.getpixel((64, 122))
+        assert top[0] > 200 and top[2] < 60  # red ends up on top
+        assert bottom[2] > 200 and bottom[0] < 60
+        assert not thumbnail.getexif()
+
+    def test_transparency_on_white(self):
+        """Test that transparent PNG areas become white instead of black"""
+        out = io.BytesIO()
+        Image.new("RGBA", (300, 300), (0, 0, 0, 0)).save(out, format="PNG")
+        thumbnail = Image.open(io.BytesIO(make_thumbnails(out.getvalue())[(128, "jpeg")]))
+        assert min(thumbnail.getpixel((10, 10))) > 245
+
+    def test_rejects_non_images(self):
+        """Test that bytes that are not an image raise InvalidImage"""
+        with pytest.raises(InvalidImage):
+            make_thumbnails(b"not an image at all")
+
+
+class TestStoreAvatar:
+    """Test cases for store_avatar"""
+
+    def test_content_addressed_and_deduplicated(self, tmp_path):
+        """Test that files are named by content hash and the same upload is not processed twice"""
+        data = _jpeg()
+        digest = store_avatar(data, str(tmp_path))
+        names = sorted(os.listdir(tmp_path))
+        assert names == sorted(os.path.basename(url) for urls in avatar_urls(digest).values() for url in urls.values())
+        mtimes = {name: os.stat(tmp_path / name).st_mtime_ns for name in names}
+        assert store_avatar(data, str(tmp_path)) == digest
+        assert {name: os.stat(tmp_path / name).st_mtime_ns for name in names} == mtimes
+        assert store_avatar(_jpeg(color=(0, 90, 0)), str(tmp_path)) != digest
+
+
+class TestReadUpload:
+    """Test cases for read_upload"""
+
+    def test_reads_file_field(self):
+        """Test that the file field of a multipart body is returned"""
+        request, _ = _multipart_request(b"x" * 10000)
+        assert asyncio.run(read_upload(request, max_bytes=20000)) == b"x" * 10000
+
+    def test_declared_length_over_limit(self):
+        """Test that a Content-Length over the limit is refused before reading the body"""
+        request, sent = _multipart_request(b"x" * 100000)
+        with pytest.raises(HTTPException) as refused:
+            asyncio.run(read_upload(request, max_bytes=1000))
+        assert refused.value.status_code == 413
+        assert sent == []
+
+    def test_stream_cut_off_at_limit(self):
+        """Test that a body without Content-Length stops being read once it passes the limit"""
+        request, sent = _multipart_request(b"x" * 200000, content_length=False)
+        with pytest.raises(HTTPException) as refused:
+            asyncio.run(read_upload(request, max_bytes=1000))
+        assert refused.value.status_code == 413
+        assert sum(sent) < 200000
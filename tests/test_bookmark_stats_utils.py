@@ -0,0 +1,103 @@
+"""
+Test cases for the per-user bookmark summary.
+Tests the fingerprint, refresh on upload, the cache and the fallbacks for users without a stats row.
+"""
+import os
+
+import pytest
+from sqlalchemy import event
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")  # app.database builds its engine at import
+
+import app.models  # noqa: F401  (registers all mappers)
+from app.models.bookmark import Bookmark
+from app.models.place import Place
+from app.models.bookmark_stats import BookmarkStats
+from app.models.user import User
+from app.utils import bookmark_stats
+from app.utils.bookmark_stats import bookmark_fingerprint, get_stats, has_bookmarks, refresh_stats
+
+
+@pytest.fixture
+def db(db, engine):
+    """The shared session, recording the SQL it runs, with an empty stats cache."""
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    db.statements = statements
+    bookmark_stats.forget()
+    yield db
+    bookmark_stats.forget()
+
+
+def _user_with_bookmarks(db, points):
+    user = User(email=f"u{len(points)}@example.com", hashed_password="x")
+    db.add(user)
+    db.flush()
+    bookmarks = [
+        Bookmark(user_id=user.id, place=Place(title=f"Place {i}", address=f"{i} Street", latitude=lat, longitude=lng))
+        for i, (lat, lng) in enumerate(points)
+    ]
+    db.add_all(bookmarks)
+    db.commit()
+    return user, bookmarks
+
+
+class TestBookmarkFingerprint:
+    """Test cases for bookmark_fingerprint"""
+
+    def test_order_independent_and_change_sensitive(self):
+        """Test that the order does not matter but a moved bookmark does"""
+        a = Bookmark(place=Place(title="A", address="1", latitude=1.0, longitude=2.0))
+        b = Bookmark(place=Place(title="B", address="2", latitude=3.0, longitude=4.0))
+        moved = Bookmark(place=Place(title="B", address="2", latitude=3.0, longitude=4.5))
+        assert bookmark_fingerprint([a, b]) == bookmark_fingerprint([b, a])
+        assert bookmark_fingerprint([a, b]) != bookmark_fingerprint([a, moved])
+
+
+class TestBookmarkStats:
+    """Test cases for refresh_stats, get_stats and has_bookmarks"""
+
+    def test_refresh_and_read(self, db):
+        """Test that the stored row holds the count, bounding box and fingerprint"""
+        user, bookmarks = _user_with_bookmarks(db, [(48.85, 2.30), (48.87, 2.35), (48.86, 2.28)])
+        refresh_stats(db, user.id, bookmarks)
+        db.commit()
+        stats = get_stats(db, user.id)
+        assert stats["count"] == 3
+        assert stats["bounds"] == {"south": 48.85, "west": 2.28, "north": 48.87, "east": 2.35}
+        assert stats["fingerprint"] == bookmark_fingerprint(bookmarks)
+        assert stats["uploaded_at"] is not None
+        assert has_bookmarks(db, user.id)
+
+    def test_cached_until_refreshed(self, db):
+        """Test that repeat lookups skip the database and the entry is only cleared by forget after the commit"""
+        user, bookmarks = _user_with_bookmarks(db, [(1.0, 1.0)])
+        user_id = user.id
+        refresh_stats(db, user_id, bookmarks)
+        db.commit()
+        get_stats(db, user_id)
+        db.expire_all()
+        before = len(db.statements)
+        assert has_bookmarks(db, user_id)
+        assert get_stats(db, user_id)["count"] == 1
+        assert len(db.statements) == before
+
+        refresh_stats(db, user_id, [])
+        assert has_bookmarks(db, user_id)  # not committed yet: the cached row still stands
+        db.commit()
+        bookmark_stats.forget(user_id)
+        assert not has_bookmarks(db, user_id)
+        assert get_stats(db, user_id)["bounds"] is None
+
+    def test_without_stats_row(self, db):
+        """Test the EXISTS and aggregate fallbacks for users who have not uploaded since the table was added"""
+        user, _ = _user_with_bookmarks(db, [(10.0, 20.0), (11.0, 19.0)])
+        assert db.get(BookmarkStats, user.id) is None
+        before = len(db.statements)
+        assert has_bookmarks(db, user.id)
+        assert any("EXISTS" in sql for sql in db.statements[before:])
+        stats = get_stats(db, user.id)
+        assert stats["count"] == 2
+        assert stats["bounds"] == {"south": 10.0, "west": 19.0, "north": 11.0, "east": 20.0}
+        assert stats["fingerprint"] is None
+        assert not has_bookmarks(db, user.id + 100)
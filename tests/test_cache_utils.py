@@ -0,0 +1,234 @@
+"""
+Test cases for the shared cache.
+Tests the memory, SQL and Redis-protocol backends, namespaces, stampede protection and error handling.
+"""
+import fnmatch
+import os
+import socketserver
+import threading
+import time
+
+import pytest
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")  # app.database builds its engine at import
+
+import app.models  # noqa: F401  (registers all mappers)
+from app.utils.cache import Cache, MemoryBackend, RedisBackend, SQLBackend, backend_from_url
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class _RespHandler(socketserver.StreamRequestHandler):
+    """Just enough of the Redis protocol for RedisBackend."""
+
+    def handle(self):
+        store = self.server.store
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            args = []
+            for _ in range(int(line[1:])):
+                length = int(self.rfile.readline()[1:])
+                args.append(self.rfile.read(length + 2)[:-2])
+            command = args[0].upper()
+            with self.server.lock:
+                self.server.commands.append(command)
+                for key in [k for k, (_, expires) in store.items() if expires and expires <= time.time()]:
+                    del store[key]
+                if command in (b"PING", b"AUTH", b"SELECT"):
+                    self.wfile.write(b"+OK\r\n")
+                elif command == b"GET":
+                    value = store.get(args[1], (None,))[0]
+                    self.wfile.write(b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value))
+                elif command == b"SET":
+                    options = [a.upper() for a in args[3:]]
+                    expires = time.time() + int(args[4]) / 1000 if b"PX" in options else None
+                    if b"NX" in options and args[1] in store:
+                        self.wfile.write(b"$-1\r\n")
+                    else:
+                        store[args[1]] = (args[2], expires)
+                        self.wfile.write(b"+OK\r\n")
+                elif command == b"DEL":
+                    removed = sum(store.pop(key, None) is not None for key in args[1:])
+                    self.wfile.write(b":%d\r\n" % removed)
+                elif command == b"SCAN":
+                    pattern = args[args.index(b"MATCH") + 1].decode()
+                    keys = [k for k in store if fnmatch.fnmatchcase(k.decode(), pattern.replace("\\", ""))]
+                    reply = b"*2\r\n$1\r\n0\r\n*%d\r\n" % len(keys)
+                    reply += b"".join(b"$%d\r\n%s\r\n" % (len(k), k) for k in keys)
+                    self.wfile.write(reply)
+                else:
+                    self.wfile.write(b"-ERR unknown command\r\n")
+
+
+@pytest.fixture
+def redis_server():
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), _RespHandler)
+    server.daemon_threads = True
+    server.store, server.commands, server.lock = {}, [], threading.Lock()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+class BrokenBackend(MemoryBackend):
+    name = "broken"
+
+    def _fail(self, *args):
+        raise ConnectionError("backend down")
+
+    get = set = add = delete = clear = _fail
+
+
+class TestBackends:
+    """Test cases for MemoryBackend, SQLBackend and RedisBackend"""
+
+    def _exercise(self, backend, clock=None):
+        backend.set("ns:a", b"1", 60)
+        backend.set("ns:b", b"2", None)
+        backend.set("other:a", b"3", 60)
+        assert backend.get("ns:a") == b"1"
+        assert not backend.add("ns:a", b"x", 60)
+        assert backend.add("ns:c", b"4", 60)
+        backend.delete("ns:b")
+        assert backend.get("ns:b") is None
+        backend.clear("ns:")
+        assert backend.get("ns:a") is None and backend.get("ns:c") is None
+        assert backend.get("other:a") == b"3"
+        if clock is not None:
+            clock.now += 61
+            assert backend.get("other:a") is None
+            assert backend.add("other:a", b"5", 60)
+
+    def test_memory(self):
+        """Test get/set/add/delete/clear and expiry of the in-process backend"""
+        clock = FakeClock()
+        self._exercise(MemoryBackend(clock=clock), clock)
+
+    def test_memory_lru_bound(self):
+        """Test that the least recently used entry is evicted first"""
+        backend = MemoryBackend(max_entries=2)
+        backend.set("a", b"1", None)
+        backend.set("b", b"2", None)
+        backend.get("a")
+        backend.set("c", b"3", None)
+        assert backend.get("b") is None
+        assert backend.get("a") == b"1" and backend.get("c") == b"3"
+
+    def test_sql(self, engine):
+        """Test the cache_entries backend, including LIKE wildcards in the cleared prefix"""
+        clock = FakeClock()
+        backend = SQLBackend(engine, clock=clock)
+        self._exercise(backend, clock)
+        backend.set("n_s:a", b"1", None)
+        backend.set("nxs:a", b"2", None)
+        backend.clear("n_s:")
+        assert backend.get("nxs:a") == b"2"
+
+    def test_redis(self, redis_server):
+        """Test the RESP client against a stand-in server, with AUTH and SELECT from the URL"""
+        host, port = redis_server.server_address
+        backend = backend_from_url(f"redis://:secret@{host}:{port}/2")
+        assert isinstance(backend, RedisBackend)
+        try:
+            self._exercise(backend)
+        finally:
+            backend.close()
+        assert redis_server.commands[:2] == [b"AUTH", b"SELECT"]
+        assert redis_server.commands.count(b"AUTH") == 1  # connection reused
+
+    def test_unknown_url(self):
+        """Test that an unsupported CACHE_URL fails at startup"""
+        with pytest.raises(ValueError):
+            backend_from_url("memcached://localhost")
+
+
+class TestCache:
+    """Test cases for Cache"""
+
+    def test_values_namespaces_and_long_keys(self):
+        """Test JSON round trips, namespace invalidation and hashing of long keys"""
+        cache = Cache(MemoryBackend(), prefix="t:")
+        cache.set("geocode", "eiffel tower", [2.29, 48.86], ttl=60)
+        cache.set("yelp", "x" * 500, [{"name": "Cafe"}])
+        assert cache.get("geocode", "eiffel tower") == [2.29, 48.86]
+        assert cache.get("yelp", "x" * 500) == [{"name": "Cafe"}]
+        assert len(cache.key("yelp", "x" * 500)) < 100
+
+        cache.invalidate("geocode")
+        assert cache.get("geocode", "eiffel tower", "missing") == "missing"
+        assert cache.get("yelp", "x" * 500) == [{"name": "Cafe"}]
+
+    def test_get_or_set_coalesces_in_process(self):
+        """Test that concurrent misses call the producer once"""
+        cache = Cache(MemoryBackend())
+        calls = []
+
+        def producer():
+            calls.append(1)
+            time.sleep(0.2)
+            return {"value": 42}
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(cache.get_or_set("ns", "k", producer, 60)))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(calls) == 1
+        assert results == [{"value": 42}] * 8
+
+    def test_get_or_set_coalesces_across_workers(self, engine):
+        """Test that two caches sharing a backend (two workers) fill a key once"""
+        workers = [Cache(SQLBackend(engine)), Cache(SQLBackend(engine))]
+        calls = []
+
+        def producer():
+            calls.append(1)
+            time.sleep(0.3)
+            return "filled"
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda c=cache: results.append(c.get_or_set("ns", "k", producer, 60)))
+            for cache in workers
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(calls) == 1
+        assert results == ["filled", "filled"]
+
+    def test_failures_are_not_cached(self):
+        """Test that a producer exception reaches the caller and the next call tries again"""
+        cache = Cache(MemoryBackend())
+
+        def failing():
+            raise RuntimeError("upstream down")
+
+        with pytest.raises(RuntimeError):
+            cache.get_or_set("ns", "k", failing, 60)
+        assert cache.get_or_set("ns", "k", lambda: "ok", 60) == "ok"
+
+    def test_backend_errors_degrade_to_misses(self):
+        """Test that a failing backend never fails the caller"""
+        cache = Cache(BrokenBackend())
+        cache.set("ns", "k", 1)
+        cache.invalidate("ns")
+        assert cache.get("ns", "k", "default") == "default"
+        assert cache.get_or_set("ns", "k", lambda: "computed", 60) == "computed"
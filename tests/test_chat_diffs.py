@@ -0,0 +1,78 @@
+"""
+Test cases for the chat diffs applied in advance.
+Tests that _precompute_diff stores the patched plan (or why it failed) with
+the reply and that /apply-diff uses it only while the route is unchanged.
+"""
+import pytest
+from fastapi import HTTPException
+
+from app.models.chat_message import ChatMessage
+from app.routers.chat import DIFF_NOT_APPLICABLE, _patched_route_text, _precompute_diff
+from app.utils.diff_utils import generate_diff
+from app.utils.route_summary import route_text_hash
+
+PLAN = "09:00 - 10:00: Breakfast at Cafe\n10:30 - 12:00: Louvre\n12:30 - 13:30: Lunch\n"
+EDITED = "09:00 - 10:00: Breakfast at Cafe\n10:30 - 12:30: Louvre (Denon wing)\n12:30 - 13:30: Lunch\n"
+UNAPPLICABLE = "--- a/tour_plan.txt\n+++ b/tour_plan.txt\n@@ -1,1 +0,0 @@\n-Dinner on a boat\n"
+
+
+def reply(diff):
+    return ChatMessage(role="assistant", content="ok", diff_content=diff)
+
+
+def must_not_load():
+    raise AssertionError("the route text should not be needed")
+
+
+class TestPrecomputeDiff:
+    """Test cases for storing the diff's outcome with the reply"""
+
+    def test_stores_patched_text(self):
+        """An applicable diff stores the patched plan and the hash of the plan it was applied to"""
+        message = reply(generate_diff(PLAN, EDITED))
+        _precompute_diff(message, PLAN)
+        assert message.diff_patched_text == EDITED
+        assert message.diff_base_hash == route_text_hash(PLAN)
+        assert message.diff_apply_error is None
+
+    def test_stores_failure(self):
+        """A diff that does not apply stores the error instead of a patched plan"""
+        message = reply(UNAPPLICABLE)
+        _precompute_diff(message, PLAN)
+        assert message.diff_patched_text is None
+        assert message.diff_apply_error == DIFF_NOT_APPLICABLE
+
+
+class TestPatchedRouteText:
+    """Test cases for picking the precomputed or the re-applied plan"""
+
+    def test_stored_diff_hit(self):
+        """An unchanged route uses the stored result without loading its text"""
+        message = reply(generate_diff(PLAN, EDITED))
+        _precompute_diff(message, PLAN)
+        assert _patched_route_text(message, route_text_hash(PLAN), must_not_load) == EDITED
+
+    def test_stale_diff_reapplied(self):
+        """A route edited since the reply re-applies the diff to its current text"""
+        message = reply(generate_diff(PLAN, EDITED))
+        _precompute_diff(message, PLAN)
+        current = PLAN + "14:00 - 15:00: Tuileries\n"
+        patched = _patched_route_text(message, route_text_hash(current), lambda: current)
+        assert patched == EDITED + "14:00 - 15:00: Tuileries\n"
+
+    def test_diff_failed(self):
+        """An unchanged route whose diff failed is refused with the stored error, without retrying"""
+        message = reply(UNAPPLICABLE)
+        _precompute_diff(message, PLAN)
+        with pytest.raises(HTTPException) as excinfo:
+            _patched_route_text(message, route_text_hash(PLAN), must_not_load)
+        assert excinfo.value.status_code == 400
+        assert excinfo.value.detail == DIFF_NOT_APPLICABLE
+
+    def test_stale_diff_failed(self):
+        """A stale diff that no longer applies is refused"""
+        message = reply(UNAPPLICABLE)
+        _precompute_diff(message, PLAN)
+        with pytest.raises(HTTPException) as excinfo:
+            _patched_route_text(message, route_text_hash("other plan\n"), lambda: "other plan\n")
+        assert excinfo.value.status_code == 400
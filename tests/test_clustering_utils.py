@@ -0,0 +1,224 @@
+"""
+Test cases for bookmark clustering.
+Tests DBSCAN against comparing all pairs, splitting of city-wide clusters, cluster selection and storage,
+and splitting bookmarks across the days of a trip.
+"""
+import os
+import random
+from collections import defaultdict
+
+import pytest
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")  # app.database builds its engine at import
+
+import app.models  # noqa: F401  (registers all mappers)
+from app.models.bookmark import Bookmark
+from app.models.place import Place
+from app.models.bookmark_cluster import BookmarkCluster
+from app.models.user import User
+from app.utils.clustering import (
+    EPS_KM,
+    MIN_POINTS,
+    NEIGHBOURHOOD_KM,
+    NOISE,
+    anchor_bookmark,
+    cluster_points,
+    dbscan,
+    partition_days,
+    reach_km,
+    refresh_clusters,
+    select_clusters,
+)
+from app.utils.neighbors import haversine_km
+
+NEIGHBOURHOODS = [(48.860, 2.330), (48.880, 2.360), (48.840, 2.290)]
+
+
+def _neighbourhoods(seed=1, per_group=30, strays=10):
+    rng = random.Random(seed)
+    points = {}
+    for lat, lon in NEIGHBOURHOODS:
+        for _ in range(per_group):
+            points[len(points)] = (lat + rng.gauss(0, 0.002), lon + rng.gauss(0, 0.003))
+    for _ in range(strays):
+        points[len(points)] = (48.7 + rng.uniform(-0.3, 0.3), 2.3 + rng.uniform(-0.3, 0.3))
+    return points
+
+
+def _brute_force_core_clusters(points):
+    ids = sorted(points)
+    region = {i: [j for j in ids if haversine_km(points[i], points[j]) <= EPS_KM] for i in ids}
+    core = {i for i in ids if len(region[i]) >= MIN_POINTS}
+    labels, label = {}, 0
+    for i in sorted(core):
+        if i in labels:
+            continue
+        labels[i] = label
+        stack = [i]
+        while stack:
+            for j in region[stack.pop()]:
+                if j in core and j not in labels:
+                    labels[j] = label
+                    stack.append(j)
+        label += 1
+    return labels
+
+
+def _groups(labels, only=None):
+    groups = defaultdict(set)
+    for point_id, label in labels.items():
+        if label != NOISE and (only is None or point_id in only):
+            groups[label].add(point_id)
+    return sorted(sorted(g) for g in groups.values())
+
+
+class TestDbscan:
+    """Test cases for dbscan"""
+
+    def test_core_points_match_brute_force(self):
+        """Test that core points are grouped exactly as when comparing all pairs"""
+        rng = random.Random(2)
+        points = {i: (48.86 + rng.uniform(-0.03, 0.03), 2.34 + rng.uniform(-0.04, 0.04)) for i in range(300)}
+        expected = _brute_force_core_clusters(points)
+        assert _groups(dbscan(points), only=expected.keys()) == _groups(expected)
+
+    def test_high_latitude(self):
+        """Test that the grid stays exact where a degree of longitude is short"""
+        rng = random.Random(3)
+        points = {i: (69.65 + rng.uniform(-0.03, 0.03), 18.95 + rng.uniform(-0.15, 0.15)) for i in range(200)}
+        expected = _brute_force_core_clusters(points)
+        assert _groups(dbscan(points), only=expected.keys()) == _groups(expected)
+
+    def test_strays_are_noise(self):
+        """Test that isolated bookmarks are left unclustered"""
+        points = _neighbourhoods()
+        labels = dbscan(points)
+        assert all(labels[i] == NOISE for i in range(90, 100))
+        assert dbscan({}) == {}
+
+
+class TestClusterPoints:
+    """Test cases for cluster_points"""
+
+    def test_finds_neighbourhoods(self):
+        """Test that three separate neighbourhoods give three clusters with the right centers"""
+        clusters = cluster_points(_neighbourhoods())
+        assert sorted(len(c.members) for c in clusters) == [30, 30, 30]
+        for cluster in clusters:
+            assert min(haversine_km((cluster.latitude, cluster.longitude), n) for n in NEIGHBOURHOODS) < 0.3
+            assert cluster.anchor_id in cluster.members
+
+    def test_city_wide_cluster_is_split(self):
+        """Test that an evenly covered city is cut into walkable pieces covering every bookmark"""
+        rng = random.Random(4)
+        points = {i: (48.86 + rng.uniform(-0.05, 0.05), 2.34 + rng.uniform(-0.07, 0.07)) for i in range(2000)}
+        clusters = cluster_points(points)
+        assert len(clusters) > 10
+        assert all(c.radius_km <= NEIGHBOURHOOD_KM for c in clusters)
+        assert sorted(m for c in clusters for m in c.members) == sorted(points)
+
+    def test_deterministic(self):
+        """Test that the same bookmarks give the same clusters"""
+        first = [c.members for c in cluster_points(_neighbourhoods())]
+        second = [c.members for c in cluster_points(_neighbourhoods())]
+        assert first == second
+
+
+class TestSelectClusters:
+    """Test cases for reach_km and select_clusters"""
+
+    def test_selects_reachable_nearest_first(self):
+        """Test that clusters within one leg are chosen nearest first and capped by size"""
+        clusters = [
+            BookmarkCluster(id=1, size=50, latitude=48.860, longitude=2.330, radius_m=500),
+            BookmarkCluster(id=2, size=50, latitude=48.880, longitude=2.360, radius_m=500),
+            BookmarkCluster(id=3, size=50, latitude=48.700, longitude=2.100, radius_m=500),
+        ]
+        reach = reach_km(30, 5.0, 1.3)
+        assert 1.9 < reach < 2.0
+        chosen = select_clusters(clusters, (48.865, 2.335), reach, max_bookmarks=500)
+        assert [c.id for c in chosen] == [1]
+        chosen = select_clusters(clusters, (48.87, 2.345), 3.0, max_bookmarks=500)
+        assert sorted(c.id for c in chosen) == [1, 2]
+        assert len(select_clusters(clusters, (48.87, 2.345), 3.0, max_bookmarks=50)) == 1
+
+    def test_falls_back_to_nearest(self):
+        """Test that the nearest cluster is chosen when none is within reach"""
+        clusters = [BookmarkCluster(id=3, size=5, latitude=48.7, longitude=2.1, radius_m=200)]
+        assert [c.id for c in select_clusters(clusters, (48.86, 2.33), 1.0, 300)] == [3]
+
+
+class TestPartitionDays:
+    """Test cases for partition_days and anchor_bookmark"""
+
+    def _bookmarks(self):
+        labels = {}
+        for cluster_id, (lat, lon) in enumerate(NEIGHBOURHOODS, start=1):
+            labels.update({(lat, lon): cluster_id})
+        bookmarks = []
+        for point_id, (lat, lon) in _neighbourhoods().items():
+            nearest = min(NEIGHBOURHOODS, key=lambda n: haversine_km(n, (lat, lon)))
+            cluster_id = labels[nearest] if haversine_km(nearest, (lat, lon)) < EPS_KM else None
+            bookmarks.append(Bookmark(id=point_id + 1, place=Place(latitude=lat, longitude=lon), cluster_id=cluster_id))
+        return bookmarks
+
+    def test_every_bookmark_once_and_clusters_whole(self):
+        """Test that each bookmark goes to exactly one day and a cluster is never split"""
+        bookmarks = self._bookmarks()
+        groups = partition_days(bookmarks, 3, NEIGHBOURHOODS[0])
+        assert len(groups) == 3
+        assert sorted(b.id for group in groups for b in group) == sorted(b.id for b in bookmarks)
+        for cluster_id in (1, 2, 3):
+            days = {i for i, group in enumerate(groups) for b in group if b.cluster_id == cluster_id}
+            assert len(days) == 1
+        # the day nearest the center is its neighbourhood, started from a bookmark in the middle of it
+        assert anchor_bookmark(groups[0]).cluster_id == 1
+
+    def test_fewer_places_than_days(self):
+        """Test that a short list gives fewer groups than days and nothing for no bookmarks"""
+        bookmarks = [Bookmark(id=1, place=Place(latitude=48.86, longitude=2.33)),
+                     Bookmark(id=2, place=Place(latitude=48.88, longitude=2.36))]
+        groups = partition_days(bookmarks, 5, (48.86, 2.33))
+        assert [[b.id for b in group] for group in groups] == [[1], [2]]
+        assert partition_days([], 3, (48.86, 2.33)) == []
+
+    def test_deterministic(self):
+        """Test that the same bookmarks give the same days"""
+        first = [[b.id for b in group] for group in partition_days(self._bookmarks(), 2, (48.86, 2.33))]
+        second = [[b.id for b in group] for group in partition_days(self._bookmarks(), 2, (48.86, 2.33))]
+        assert first == second
+
+
+class TestRefreshClusters:
+    """Test cases for refresh_clusters"""
+
+    def test_stores_clusters_and_assignments(self, db):
+        """Test that clusters are stored per user and bookmarks point to them"""
+        user = User(email="clusters@example.com", hashed_password="x")
+        db.add(user)
+        db.flush()
+        bookmarks = [
+            Bookmark(user_id=user.id, place=Place(title=f"Place {i}", latitude=lat, longitude=lon))
+            for i, (lat, lon) in _neighbourhoods().items()
+        ]
+        db.add_all(bookmarks)
+        db.flush()
+
+        refresh_clusters(db, user.id, bookmarks)
+        db.commit()
+        rows = db.query(BookmarkCluster).filter(BookmarkCluster.user_id == user.id).all()
+        assert sorted(r.size for r in rows) == [30, 30, 30]
+        db.expire_all()
+        counts = defaultdict(int)
+        for b in db.query(Bookmark):
+            counts[b.cluster_id] += 1
+        assert counts[None] == 10
+        assert sorted(v for k, v in counts.items() if k is not None) == [30, 30, 30]
+        anchor = db.get(Bookmark, rows[0].anchor_bookmark_id)
+        assert rows[0].name == anchor.title
+
+        # recomputing replaces the user's clusters instead of adding to them
+        refresh_clusters(db, user.id, db.query(Bookmark).all())
+        db.commit()
+        assert db.query(BookmarkCluster).count() == 3
+        assert db.query(Bookmark).filter(Bookmark.cluster_id.is_(None)).count() == 10
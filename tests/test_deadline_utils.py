@@ -0,0 +1,181 @@
+"""
+Test cases for request deadlines and cancellation.
+Tests the timeout header, 504 on an expired deadline, stopping work when the client disconnects,
+and how outbound calls and DB writes respect a cancelled request.
+"""
+import asyncio
+import os
+import time
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from starlette.applications import Starlette
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")  # app.database builds its engine at import
+
+import app.models  # noqa: F401  (registers all mappers)
+from app.database import Base
+from app.models.user import User
+from app.utils import deadline
+from app.utils.deadline import DISCONNECT, Deadline, DeadlineMiddleware, RequestCancelled, requested_timeout
+from app.utils.metrics import REQUESTS_CANCELLED
+from app.utils.outbound import CLOSED, Policy, Provider
+
+
+def _cancelled_count(route, reason):
+    return REQUESTS_CANCELLED.labels(route, reason)._value.get()
+
+
+@pytest.fixture
+def cancelled_deadline():
+    current = Deadline(60)
+    current.cancel(DISCONNECT)
+    token = deadline._current.set(current)
+    try:
+        yield current
+    finally:
+        deadline._current.reset(token)
+
+
+class TestRequestedTimeout:
+    """Test cases for requested_timeout"""
+
+    def test_header_default_and_cap(self, monkeypatch):
+        """Test the header value, its cap, and the default for missing or unusable values"""
+        monkeypatch.setattr(deadline, "REQUEST_TIMEOUT_S", 30.0)
+        monkeypatch.setattr(deadline, "REQUEST_TIMEOUT_MAX_S", 60.0)
+        assert requested_timeout(Headers({"x-request-timeout": "2.5"})) == 2.5
+        assert requested_timeout(Headers({"x-request-timeout": "3600"})) == 60.0
+        for raw in ("0", "-1", "soon", "nan"):
+            assert requested_timeout(Headers({"x-request-timeout": raw})) == 30.0
+        assert requested_timeout(Headers({})) == 30.0
+
+
+class TestDeadlineMiddleware:
+    """Test cases for DeadlineMiddleware"""
+
+    def _app(self, events):
+        async def slow_async(request):
+            await request.body()
+            await asyncio.sleep(0.5)
+            events.append("wrote")
+            return JSONResponse({"ok": True})
+
+        def slow_sync(request):
+            for _ in range(50):
+                deadline.check("work")
+                time.sleep(0.01)
+            events.append("wrote")
+            return JSONResponse({"ok": True})
+
+        async def fast(request):
+            return JSONResponse({"left": deadline.current().remaining()})
+
+        return DeadlineMiddleware(Starlette(routes=[
+            Route("/async", slow_async, methods=["POST"]),
+            Route("/sync", slow_sync, methods=["POST"]),
+            Route("/fast", fast),
+        ]))
+
+    def test_within_deadline(self):
+        """Test that the endpoint sees the time the client allowed"""
+        client = TestClient(self._app([]))
+        left = client.get("/fast", headers={"X-Request-Timeout": "5"}).json()["left"]
+        assert 4 < left <= 5
+
+    @pytest.mark.parametrize("path", ["/async", "/sync"])
+    def test_deadline_exceeded(self, path):
+        """Test that both async awaits and sync checks stop at the deadline with a 504"""
+        events = []
+        before = _cancelled_count(path, "deadline")
+        response = TestClient(self._app(events)).post(path, headers={"X-Request-Timeout": "0.1"}, content=b"{}")
+        assert response.status_code == 504
+        assert events == []
+        assert _cancelled_count(path, "deadline") == before + 1
+
+    def test_client_disconnect_stops_work(self):
+        """Test that a disconnect after the body was read cancels the endpoint and sends nothing"""
+        events, sent = [], []
+        app = self._app(events)
+
+        async def run():
+            messages = [{"type": "http.request", "body": b"{}", "more_body": False}]
+
+            async def receive():
+                if messages:
+                    return messages.pop(0)
+                await asyncio.sleep(0.05)
+                return {"type": "http.disconnect"}
+
+            async def send(message):
+                sent.append(message)
+
+            scope = {"type": "http", "asgi": {"spec_version": "2.4"}, "method": "POST", "path": "/async",
+                     "raw_path": b"/async", "root_path": "", "scheme": "http", "query_string": b"",
+                     "headers": [], "server": ("test", 80), "client": ("test", 1)}
+            before = _cancelled_count("/async", DISCONNECT)
+            started = time.perf_counter()
+            await app(scope, receive, send)
+            return time.perf_counter() - started, _cancelled_count("/async", DISCONNECT) - before
+
+        elapsed, counted = asyncio.run(run())
+        assert elapsed < 0.4
+        assert events == [] and sent == []
+        assert counted == 1
+
+
+class TestCancelledRequestWork:
+    """Test cases for outbound calls and DB writes of a cancelled request"""
+
+    def test_outbound_call_refused(self, cancelled_deadline):
+        """Test that no attempt is made once the request is cancelled"""
+        provider = Provider("test", Policy(max_concurrency=1, rpm=0, tpm=0, timeout_s=1, deadline_s=5))
+        calls = []
+        with pytest.raises(RequestCancelled):
+            provider.call("op", lambda: calls.append(1))
+        assert calls == []
+
+    def test_cut_call_does_not_trip_circuit(self):
+        """Test that a call failing because the request ran out of time is not the provider's failure"""
+        provider = Provider("test", Policy(max_concurrency=1, rpm=0, tpm=0, timeout_s=1, deadline_s=5,
+                                           failure_threshold=1))
+        current = Deadline(60)
+        token = deadline._current.set(current)
+
+        def cut_short():
+            current.cancel(DISCONNECT)
+            raise TimeoutError("read timed out")
+
+        try:
+            with pytest.raises(RequestCancelled):
+                provider.call("op", cut_short)
+        finally:
+            deadline._current.reset(token)
+        assert provider.breaker.failures == 0
+        assert provider.breaker.state == CLOSED
+
+    def test_timeouts_bounded_by_deadline(self):
+        """Test that per-call timeouts shrink to the time the request has left"""
+        assert deadline.bounded(45.0) == 45.0
+        token = deadline._current.set(Deadline(2.0))
+        try:
+            assert 1.5 < deadline.bounded(45.0) <= 2.0
+        finally:
+            deadline._current.reset(token)
+
+    def test_writes_refused(self, cancelled_deadline):
+        """Test that a cancelled request cannot flush, and the session is fine afterwards"""
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        with sessionmaker(bind=engine)() as session:
+            session.add(User(email="gone@example.com", hashed_password="x"))
+            with pytest.raises(RequestCancelled):
+                session.commit()
+            session.rollback()
+            assert session.query(User).count() == 0
+        engine.dispose()
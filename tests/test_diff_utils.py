@@ -0,0 +1,89 @@
+"""
+Test cases for diff utilities.
+Tests generate_diff / apply_diff round trips and the apply engine against a
+corpus of malformed, LLM-style diffs in tests/fixtures/llm_diffs.
+"""
+import json
+import os
+
+import pytest
+
+from app.utils.diff_utils import (
+    STRATEGY_EXACT,
+    STRATEGY_OFFSET,
+    apply_diff,
+    apply_diff_with_report,
+    generate_diff,
+)
+
+CORPUS_DIR = os.path.join(os.path.dirname(__file__), "fixtures", "llm_diffs")
+with open(os.path.join(CORPUS_DIR, "manifest.json"), encoding="utf-8") as _f:
+    CORPUS = json.load(_f)["cases"]
+
+
+def read_case(name, filename):
+    path = os.path.join(CORPUS_DIR, name, filename)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8", newline="") as f:
+        return f.read()
+
+
+class TestLlmDiffCorpus:
+    """Every corpus case must produce the expected text with the expected strategy"""
+
+    @pytest.mark.parametrize("case", CORPUS, ids=[c["name"] for c in CORPUS])
+    def test_corpus_case(self, case):
+        """Test one malformed diff from the corpus"""
+        result = apply_diff_with_report(read_case(case["name"], "original.txt"), read_case(case["name"], "patch.diff"))
+        assert result.text == read_case(case["name"], "expected.txt")
+        assert result.strategy == case["strategy"]
+
+
+class TestGenerateAndApply:
+    """Round trips between generate_diff and apply_diff"""
+
+    def test_round_trip(self):
+        """Test that a generated diff applies exactly"""
+        original = "".join(f"{h:02d}:00 - Stop {h}\n" for h in range(6, 24))
+        modified = original.replace("08:00 - Stop 8", "08:00 - Breakfast").replace("20:00 - Stop 20\n", "")
+        result = apply_diff_with_report(original, generate_diff(original, modified))
+        assert result.text == modified
+        assert result.strategy == STRATEGY_EXACT
+        assert result.hunks == 2
+
+    def test_round_trip_after_unrelated_edit_above(self):
+        """Test that hunks still land after lines were inserted above them"""
+        original = "".join(f"line {i}\n" for i in range(100))
+        modified = original.replace("line 80\n", "line 80 changed\n")
+        diff = generate_diff(original, modified)
+        drifted = "intro\nmore intro\n" + original
+        result = apply_diff_with_report(drifted, diff)
+        assert result.text == "intro\nmore intro\n" + modified
+        assert result.strategy == STRATEGY_OFFSET
+
+    def test_closest_match_wins_for_repeated_blocks(self):
+        """Test that identical blocks are resolved to the one nearest the header position"""
+        day = "09:00 - Breakfast\n10:00 - Museum\n11:00 - Walk\n"
+        original = "Day 1\n" + day + "Day 2\n" + day
+        diff = "@@ -6,3 +6,3 @@\n 09:00 - Breakfast\n-10:00 - Museum\n+10:00 - Zoo\n 11:00 - Walk\n"
+        assert apply_diff(original, diff) == "Day 1\n" + day + "Day 2\n" + day.replace("Museum", "Zoo")
+
+    def test_large_plan_many_hunks(self):
+        """Test a long multi-day plan with a change every few lines"""
+        original = "".join(f"Day {i // 12 + 1} {i % 12 + 8:02d}:00 - Place {i}\n" for i in range(3000))
+        modified = "".join(
+            line.replace("Place", "New place") if i % 7 == 0 else line
+            for i, line in enumerate(original.splitlines(True))
+        )
+        assert apply_diff(original, generate_diff(original, modified)) == modified
+
+    def test_empty_diff(self):
+        """Test that an empty diff applies nothing"""
+        assert apply_diff("a\nb\n", "") is None
+        assert apply_diff_with_report("a\nb\n", "").strategy is None
+
+    def test_empty_original(self):
+        """Test a diff that creates the plan from nothing"""
+        diff = "--- a/plan\n+++ b/plan\n@@ -0,0 +1,2 @@\n+09:00 - Cafe\n+10:00 - Museum\n"
+        assert apply_diff("", diff) == "09:00 - Cafe\n10:00 - Museum\n"
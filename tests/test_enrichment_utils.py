@@ -0,0 +1,189 @@
+"""
+Test cases for background bookmark enrichment.
+Tests categories from Yelp titles and the LLM, batching and the cross-user cache,
+the background write to places and the preference filter used by the generator.
+"""
+import json
+import os
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")  # app.database builds its engine at import
+
+import app.models  # noqa: F401  (registers all mappers)
+from app.models.bookmark import Bookmark
+from app.models.place import Place
+from app.models.user import User
+from app.utils import enrichment
+from app.utils.cache import Cache, MemoryBackend, set_cache
+from app.utils.enrichment import (
+    categorize,
+    classify_places,
+    enrich_user,
+    filter_by_preferences,
+    format_category,
+    parse_category,
+    remember_yelp_places,
+    yelp_category,
+)
+from app.utils.places import place_fingerprint
+
+
+@pytest.fixture(autouse=True)
+def cache():
+    fresh = Cache(MemoryBackend())
+    previous = set_cache(fresh)
+    yield fresh
+    set_cache(previous)
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    """classify_places stand-in: every place is a ramen restaurant; records the batches."""
+    batches = []
+
+    def classify(places):
+        batches.append(list(places))
+        return [format_category("restaurant", ["ramen", "japanese"]) for _ in places]
+
+    monkeypatch.setattr(enrichment, "classify_places", classify)
+    return batches
+
+
+def _row(i, title, latitude=48.8606, longitude=2.3376, url=""):
+    return SimpleNamespace(id=i, title=title, address=f"{i} Rue", latitude=latitude, longitude=longitude,
+                           google_maps_url=url)
+
+
+class TestCategories:
+    """Test cases for format_category, parse_category and yelp_category"""
+
+    def test_round_trip(self):
+        """Test the kind and cuisines survive formatting, and empty means unclassified"""
+        category = format_category("restaurant", ["Ramen", "Japanese", "ramen"])
+        assert category == "restaurant:ramen,japanese"
+        assert parse_category(category) == ("restaurant", ["ramen", "japanese"])
+        assert parse_category("bar") == ("bar", [])
+        assert parse_category("") == ("", []) and parse_category(None) == ("", [])
+
+    def test_yelp_titles(self):
+        """Test that cuisine titles make a restaurant and the others map to their kind"""
+        assert yelp_category(["Ramen", "Japanese"]) == "restaurant:ramen,japanese"
+        assert yelp_category(["Cocktail Bars", "Lounges"]) == "bar"
+        assert yelp_category(["Wine Bars", "French"]) == "restaurant:french"
+        assert yelp_category(["Coffee & Tea"]) == "cafe"
+        assert yelp_category(["Art Museums"]) == "museum"
+        assert yelp_category(["Parks"]) == "park"
+        assert yelp_category([]) is None
+
+
+class TestClassifyPlaces:
+    """Test cases for classify_places"""
+
+    def test_one_call_per_batch(self, monkeypatch):
+        """Test that a batch is one call, answers are mapped by index and unusable ones are None"""
+        prompts = []
+        answer = {"places": [
+            {"index": 1, "kind": "bar", "cuisines": []},
+            {"index": 0, "kind": "restaurant", "cuisines": ["Udon", "Japanese"]},
+            {"index": 7, "kind": "cafe", "cuisines": []},
+        ]}
+
+        def call(provider, operation, fn, tokens=None):
+            prompts.append(tokens)
+            return SimpleNamespace(usage=None, choices=[SimpleNamespace(message=SimpleNamespace(
+                content=json.dumps(answer)))])
+
+        monkeypatch.setattr(enrichment.outbound, "call", call)
+        places = [("Kunitoraya", "39 Rue Sainte-Anne"), ("Le Syndicat", "51 Rue du Faubourg"), ("Somewhere", None)]
+        assert classify_places(places) == ["restaurant:udon,japanese", "bar", None]
+        assert len(prompts) == 1
+
+
+class TestCategorize:
+    """Test cases for categorize"""
+
+    def test_yelp_match_needs_no_llm(self, llm):
+        """Test that a bookmark of a place Yelp returned takes the Yelp categories"""
+        remember_yelp_places([{"name": "Kunitoraya", "latitude": 48.86612, "longitude": 2.33589,
+                               "categories": ["Udon", "Japanese"]}])
+        found = categorize([_row(1, "KUNITORAYA", 48.86631, 2.33571, url="https://maps.google.com/?cid=9")])
+        assert found == {1: "restaurant:udon,japanese"}
+        assert llm == []
+
+    def test_batches_and_shared_across_users(self, llm, monkeypatch):
+        """Test that unknown places go to the LLM in batches, and are then known for everyone"""
+        monkeypatch.setattr(enrichment, "ENRICH_BATCH_SIZE", 2)
+        rows = [_row(i, f"Place {i}", longitude=2.3 + i / 100) for i in range(5)]
+        assert len(categorize(rows)) == 5
+        assert [len(batch) for batch in llm] == [2, 2, 1]
+
+        other_user = [_row(10 + i, row.title, row.latitude, row.longitude) for i, row in enumerate(rows)]
+        assert set(categorize(other_user).values()) == {"restaurant:ramen,japanese"}
+        assert len(llm) == 3
+
+    def test_failed_batches_left_out(self, monkeypatch):
+        """Test that places are left unclassified, and uncached, when the LLM call fails"""
+        def unavailable(places):
+            raise RuntimeError("openai down")
+
+        monkeypatch.setattr(enrichment, "classify_places", unavailable)
+        assert categorize([_row(1, "Place")]) == {}
+        assert enrichment.get_cache().get(enrichment.CACHE_NAMESPACE, place_fingerprint("Place", 48.8606, 2.3376)) \
+            is None
+
+
+class TestEnrichUser:
+    """Test cases for enrich_user"""
+
+    def test_fills_only_uncategorized(self, llm, engine):
+        """Test that the empty categories of one user's places are written and existing ones are kept"""
+        factory = sessionmaker(bind=engine)
+        with factory() as db:
+            user = User(email="a@example.com", hashed_password="x")
+            other = User(email="b@example.com", hashed_password="x")
+            db.add_all([user, other])
+            db.flush()
+            db.add_all([
+                Bookmark(user_id=user.id, place=Place(title="Ramen A", address="1", latitude=48.86, longitude=2.33)),
+                Bookmark(user_id=user.id, place=Place(title="Louvre", address="2", latitude=48.861, longitude=2.336,
+                                                      category="museum")),
+                Bookmark(user_id=other.id, place=Place(title="Ramen B", address="3", latitude=48.87, longitude=2.34)),
+            ])
+            db.commit()
+            user_id = user.id
+
+        assert enrich_user(user_id, factory) == 1
+        with factory() as db:
+            categories = {b.title: b.category for b in db.query(Bookmark)}
+        assert categories == {"Ramen A": "restaurant:ramen,japanese", "Louvre": "museum", "Ramen B": ""}
+        assert enrich_user(user_id, factory) == 0
+
+
+class TestFilterByPreferences:
+    """Test cases for filter_by_preferences"""
+
+    def _bookmarks(self):
+        return [
+            Bookmark(id=i, place=Place(title=title, category=category))
+            for i, (title, category) in enumerate([
+                ("Ramen", "restaurant:ramen,japanese"), ("Trattoria", "restaurant:italian"), ("Wine bar", "bar"),
+                ("Museum", "museum"), ("Unknown", ""), ("Bistro", "restaurant"),
+            ], start=1)
+        ]
+
+    def test_no_preferences_keeps_all(self):
+        """Test that nothing is dropped when alcohol is allowed and no cuisine preferred"""
+        assert len(filter_by_preferences(self._bookmarks(), True, [])) == 6
+
+    def test_cuisine_and_alcohol(self):
+        """Test that bars and other cuisines go, unclassified places and unknown cuisines stay"""
+        kept = filter_by_preferences(self._bookmarks(), False, ["Japanese"])
+        assert [b.id for b in kept] == [1, 4, 5, 6]
+
+    def test_must_visit_kept(self):
+        """Test that must-visit bookmarks are kept whatever their category"""
+        kept = filter_by_preferences(self._bookmarks(), False, ["japanese"], keep_ids={2, 3})
+        assert [b.id for b in kept] == [1, 2, 3, 4, 5, 6]
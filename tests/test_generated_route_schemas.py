@@ -5,7 +5,12 @@ Tests Pydantic schema validation for GeneratedRouteCreate and GeneratedRouteResp
 import pytest
 from pydantic import ValidationError
 from datetime import datetime
-from app.schemas.generated_route import GeneratedRouteCreate, GeneratedRouteResponse
+from app.schemas.generated_route import (
+    GeneratedRouteCreate,
+    GeneratedRouteResponse,
+    GeneratedRouteSummary,
+    GeneratedRouteSummaryPage,
+)
 
 
 class TestGeneratedRouteCreate:
@@ -166,3 +171,37 @@ class TestGeneratedRouteResponse:
         )
         assert route.route_text == ""
 
+
+
+class TestGeneratedRouteSummary:
+    """Test cases for GeneratedRouteSummary and GeneratedRouteSummaryPage schemas"""
+
+    def test_summary_valid_data(self):
+        """Test GeneratedRouteSummary with valid data"""
+        now = datetime.utcnow()
+        summary = GeneratedRouteSummary(id=1, title="Louvre", preview="09:00 - 10:00: Louvre", created_at=now)
+        assert summary.id == 1
+        assert summary.title == "Louvre"
+        assert summary.created_at == now
+
+    def test_summary_has_no_route_text(self):
+        """Test that the summary does not expose the full route text"""
+        summary = GeneratedRouteSummary(id=1, created_at=datetime.utcnow())
+        assert "route_text" not in summary.model_dump()
+        assert summary.title is None
+        assert summary.preview is None
+
+    def test_summary_page_last_page(self):
+        """Test that next_cursor defaults to None"""
+        page = GeneratedRouteSummaryPage(routes=[])
+        assert page.routes == []
+        assert page.next_cursor is None
+
+    def test_summary_page_with_cursor(self):
+        """Test GeneratedRouteSummaryPage with a cursor"""
+        page = GeneratedRouteSummaryPage(
+            routes=[{"id": 7, "title": "Park", "preview": "Park", "created_at": datetime.utcnow()}],
+            next_cursor=7,
+        )
+        assert page.routes[0].id == 7
+        assert page.next_cursor == 7
@@ -0,0 +1,191 @@
+"""
+Test cases for Idempotency-Key handling.
+Tests replays, request mismatches, concurrent duplicates, unstored errors, per-user scoping and large request bodies.
+"""
+import asyncio
+import json
+
+import httpx
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from app.utils import idempotency
+from app.utils.cache import Cache, MemoryBackend, set_cache
+from app.utils.idempotency import IdempotencyMiddleware
+from app.utils.token import create_access_token
+
+
+@pytest.fixture
+def cache():
+    cache = Cache(MemoryBackend())
+    previous = set_cache(cache)
+    try:
+        yield cache
+    finally:
+        set_cache(previous)
+
+
+@pytest.fixture
+def calls():
+    return []
+
+
+@pytest.fixture
+def client(cache, calls):
+    async def create(request):
+        payload = await request.json()
+        calls.append(payload)
+        await asyncio.sleep(payload.get("delay", 0))
+        if payload.get("fail"):
+            return JSONResponse({"detail": "upstream"}, status_code=502)
+        return JSONResponse({"id": len(calls), "title": payload.get("title")}, status_code=201)
+
+    app = Starlette(routes=[Route("/items", create, methods=["POST"])])
+    transport = httpx.ASGITransport(app=IdempotencyMiddleware(app))
+    return httpx.AsyncClient(transport=transport, base_url="http://testserver")
+
+
+def _post(client, key, payload, token=None):
+    headers = {"Idempotency-Key": key}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    return client.post("/items", json=payload, headers=headers)
+
+
+class TestIdempotencyMiddleware:
+    """Test cases for IdempotencyMiddleware"""
+
+    def test_retry_replays_first_response(self, client, calls):
+        """Test that a retry gets the stored response without running the endpoint"""
+        async def run():
+            first = await _post(client, "k1", {"title": "Day 1"})
+            retry = await _post(client, "k1", {"title": "Day 1"})
+            return first, retry
+
+        first, retry = asyncio.run(run())
+        assert len(calls) == 1
+        assert (retry.status_code, retry.json()) == (first.status_code, first.json()) == (201, {"id": 1, "title": "Day 1"})
+        assert retry.headers["idempotent-replayed"] == "true"
+        assert "idempotent-replayed" not in first.headers
+
+    def test_without_key_runs_every_time(self, client, calls):
+        """Test that requests without the header are untouched"""
+        async def run():
+            for _ in range(2):
+                await client.post("/items", json={"title": "x"})
+
+        asyncio.run(run())
+        assert len(calls) == 2
+
+    def test_key_reused_for_another_request(self, client, calls):
+        """Test that the same key with a different body is rejected"""
+        async def run():
+            await _post(client, "k1", {"title": "A"})
+            return await _post(client, "k1", {"title": "B"})
+
+        response = asyncio.run(run())
+        assert response.status_code == 422
+        assert len(calls) == 1
+
+    def test_concurrent_duplicates_wait(self, client, calls):
+        """Test that a duplicate sent while the first is running waits for its response"""
+        async def run():
+            return await asyncio.gather(*(_post(client, "k1", {"title": "A", "delay": 0.3}) for _ in range(3)))
+
+        responses = asyncio.run(run())
+        assert len(calls) == 1
+        assert [r.json() for r in responses] == [{"id": 1, "title": "A"}] * 3
+        assert sum(r.headers.get("idempotent-replayed") == "true" for r in responses) == 2
+
+    def test_wait_times_out(self, client, calls, monkeypatch):
+        """Test that a duplicate gives up with 409 when the first takes too long"""
+        monkeypatch.setattr(idempotency, "IDEMPOTENCY_WAIT_S", 0.15)
+
+        async def run():
+            first = asyncio.ensure_future(_post(client, "k1", {"delay": 0.6}))
+            await asyncio.sleep(0.05)
+            second = await _post(client, "k1", {"delay": 0.6})
+            return await first, second
+
+        first, second = asyncio.run(run())
+        assert (first.status_code, second.status_code) == (201, 409)
+        assert len(calls) == 1
+
+    def test_server_errors_are_not_stored(self, client, calls):
+        """Test that a retry after a 5xx runs the endpoint again"""
+        async def run():
+            await _post(client, "k1", {"fail": True})
+            return await _post(client, "k1", {"fail": True})
+
+        assert asyncio.run(run()).status_code == 502
+        assert len(calls) == 2
+
+    def test_keys_are_scoped_per_user(self, client, calls):
+        """Test that two users may pick the same key"""
+        alice = create_access_token({"sub": "1"})
+        bob = create_access_token({"sub": "2"})
+
+        async def run():
+            await _post(client, "k1", {"title": "A"}, alice)
+            await _post(client, "k1", {"title": "A"}, bob)
+            await _post(client, "k1", {"title": "A"}, alice)
+
+        asyncio.run(run())
+        assert len(calls) == 2
+
+    def test_oversized_key(self, client, calls):
+        """Test that overlong keys are rejected before the endpoint runs"""
+        response = asyncio.run(_post(client, "k" * 300, {"title": "A"}))
+        assert response.status_code == 400
+        assert calls == []
+
+    def test_large_body_runs_unkeyed(self, client, calls, monkeypatch):
+        """Test that a body over the limit by Content-Length is not buffered or stored, and still reaches the endpoint"""
+        monkeypatch.setattr(idempotency, "IDEMPOTENCY_MAX_BODY_BYTES", 64)
+        payload = {"title": "x" * 200}
+
+        async def run():
+            return [await _post(client, "k1", payload) for _ in range(2)]
+
+        responses = asyncio.run(run())
+        assert [r.status_code for r in responses] == [201, 201]
+        assert "idempotent-replayed" not in responses[1].headers
+        assert calls == [payload, payload]
+
+    def test_large_streamed_body_runs_unkeyed(self, client, calls, monkeypatch):
+        """Test that reading stops past the limit without Content-Length and the read chunks are handed on"""
+        monkeypatch.setattr(idempotency, "IDEMPOTENCY_MAX_BODY_BYTES", 64)
+        payload = {"title": "y" * 200}
+        body = json.dumps(payload).encode()
+
+        async def chunks():
+            for start in range(0, len(body), 50):
+                yield body[start:start + 50]
+
+        async def run():
+            return await client.post("/items", content=chunks(), headers={"Idempotency-Key": "k1"})
+
+        response = asyncio.run(run())
+        assert response.status_code == 201
+        assert calls == [payload]
+
+    def test_malformed_content_length(self, cache, calls):
+        """Test that a Content-Length that is not a number is a 400, not a server error"""
+        async def app(scope, receive, send):
+            calls.append(scope)
+
+        async def receive():
+            return {"type": "http.request", "body": b"{}", "more_body": False}
+
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {"type": "http", "method": "POST", "path": "/items", "query_string": b"",
+                 "headers": [(b"idempotency-key", b"k1"), (b"content-length", b"12abc")]}
+        asyncio.run(IdempotencyMiddleware(app)(scope, receive, send))
+        assert sent[0]["status"] == 400
+        assert calls == []
@@ -0,0 +1,167 @@
+"""
+Test cases for structured itinerary utilities.
+Tests rendering, parsing and stop operations used by route generation and chat edits.
+"""
+import os
+
+import pytest
+from pydantic import ValidationError
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")  # app.database builds its engine at import
+
+from app.models.generated_route import GeneratedRoute
+from app.schemas.itinerary import ItineraryStopBase, StopOperation
+from app.utils.itinerary import (
+    apply_stop_operations,
+    format_stops_for_prompt,
+    parse_itinerary_text,
+    render_itinerary,
+    replace_route_stops,
+    sync_route_stops,
+)
+
+
+def _stop(start, end, name, description="", **kwargs):
+    return ItineraryStopBase(start_time=start, end_time=end, name=name, description=description, **kwargs)
+
+
+STOPS = [
+    _stop("09:00", "10:00", "Café de Flore", "breakfast", bookmark_id=4, latitude=48.854, longitude=2.333),
+    _stop("10:15", "12:00", "Louvre Museum", "highlights tour"),
+    _stop("12:15", "13:30", "Le Fumoir", "French bistro"),
+]
+TEXT = (
+    "09:00 - 10:00: Café de Flore, breakfast\n"
+    "10:15 - 12:00: Louvre Museum, highlights tour\n"
+    "12:15 - 13:30: Le Fumoir, French bistro\n"
+)
+
+
+class TestRenderAndParse:
+    """Test cases for render_itinerary and parse_itinerary_text"""
+
+    def test_render(self):
+        """Test the canonical one-line-per-stop rendering"""
+        assert render_itinerary(STOPS) == TEXT
+
+    def test_render_keeps_each_stop_on_one_line(self):
+        """Test that newlines in model output cannot break the line format"""
+        text = render_itinerary([_stop("09:00", "10:00", "Cafe\nX", "coffee\n and  cake")])
+        assert text == "09:00 - 10:00: Cafe X, coffee and cake\n"
+
+    def test_parse_round_trip(self):
+        """Test that a canonical text parses back to the same rendering"""
+        stops = parse_itinerary_text(TEXT)
+        assert [s.name for s in stops] == ["Café de Flore", "Louvre Museum", "Le Fumoir"]
+        assert render_itinerary(stops) == TEXT
+
+    @pytest.mark.parametrize("text", [
+        "",
+        "Day plan\n" + TEXT,
+        TEXT.rstrip("\n"),
+        TEXT + "\n",
+        "9:00 - 10:00: Cafe\n",
+        "24:00 - 25:30: Late bar\n",
+    ])
+    def test_parse_rejects_free_text(self, text):
+        """Test that anything but the canonical rendering is left to text diffs"""
+        assert parse_itinerary_text(text) is None
+
+    def test_prompt_numbers_stops(self):
+        """Test that the prompt lists numbered stops with bookmark ids"""
+        lines = format_stops_for_prompt(STOPS).splitlines()
+        assert lines[0] == "1. 09:00 - 10:00: Café de Flore, breakfast [bookmark 4]"
+        assert lines[2].startswith("3. 12:15 - 13:30: Le Fumoir")
+
+    @pytest.mark.parametrize("time", ["24:00", "12:60", "noon", "12:00:00"])
+    def test_stop_times_are_validated(self, time):
+        """Test that a stop with an invalid time is rejected instead of reaching the database"""
+        with pytest.raises(ValidationError):
+            _stop(time, "13:00", "Cafe")
+        with pytest.raises(ValidationError):
+            _stop("09:00", time, "Cafe")
+
+
+class TestApplyStopOperations:
+    """Test cases for apply_stop_operations"""
+
+    def test_update(self):
+        """Test replacing a stop"""
+        udon = _stop("12:15", "13:30", "Kunitoraya", "Japanese udon")
+        result = apply_stop_operations(STOPS, [StopOperation(op="update", index=3, stop=udon)])
+        assert [s.name for s in result] == ["Café de Flore", "Louvre Museum", "Kunitoraya"]
+
+    def test_indexes_refer_to_original_plan(self):
+        """Test that operations do not shift each other's indexes"""
+        walk = _stop("10:00", "10:15", "Pont des Arts", "walk")
+        result = apply_stop_operations(STOPS, [
+            StopOperation(op="remove", index=1),
+            StopOperation(op="insert", index=1, stop=walk),
+            StopOperation(op="insert", index=0, stop=walk),
+            StopOperation(op="remove", index=3),
+        ])
+        assert [s.name for s in result] == ["Pont des Arts", "Pont des Arts", "Louvre Museum"]
+
+    def test_unchanged_stops_keep_places(self):
+        """Test that untouched stops keep their bookmark and coordinates"""
+        result = apply_stop_operations(STOPS, [StopOperation(op="remove", index=2)])
+        assert result[0].bookmark_id == 4
+        assert result[0].latitude == 48.854
+
+    def test_operations_on_orm_like_objects(self):
+        """Test that stops can be any objects with stop attributes"""
+        class Row:
+            def __init__(self, stop):
+                self.__dict__.update(stop.model_dump())
+
+        result = apply_stop_operations([Row(s) for s in STOPS], [])
+        assert render_itinerary(result) == TEXT
+
+    @pytest.mark.parametrize("operation", [
+        StopOperation(op="remove", index=4),
+        StopOperation(op="update", index=0, stop=STOPS[0]),
+        StopOperation(op="update", index=1),
+        StopOperation(op="insert", index=4, stop=STOPS[0]),
+        StopOperation(op="insert", index=1),
+    ])
+    def test_invalid_operations(self, operation):
+        """Test that operations outside the plan are rejected"""
+        with pytest.raises(ValueError):
+            apply_stop_operations(STOPS, [operation])
+
+    def test_update_and_remove_same_stop(self):
+        """Test that contradictory operations are rejected"""
+        with pytest.raises(ValueError):
+            apply_stop_operations(STOPS, [
+                StopOperation(op="remove", index=2),
+                StopOperation(op="update", index=2, stop=STOPS[0]),
+            ])
+
+
+class TestSyncRouteStops:
+    """Test cases for re-deriving stored stops after a text edit"""
+
+    def _route(self, stops):
+        route = GeneratedRoute(route_text=render_itinerary(stops))
+        replace_route_stops(route, stops)
+        return route
+
+    def test_places_carried_over_by_name(self):
+        """Test that an edited stop keeps the place of the stop with its name"""
+        route = self._route(STOPS)
+        route.route_text = TEXT.replace("09:00 - 10:00: Café de Flore, breakfast",
+                                        "08:30 - 09:30: Café de Flore, coffee")
+        sync_route_stops(route)
+        assert (route.stops[0].start_time, route.stops[0].description) == ("08:30", "coffee")
+        assert (route.stops[0].bookmark_id, route.stops[0].latitude) == (4, 48.854)
+
+    def test_name_containing_separator(self):
+        """Test that a name with ", " in it keeps its split and its place when its line is unchanged"""
+        joes = _stop("09:00", "10:00", "Joe's, Downtown", bookmark_id=7, latitude=40.7, longitude=-74.0)
+        route = self._route([joes, STOPS[1]])
+        route.route_text = route.route_text.replace("09:00 - 10:00", "09:30 - 10:30")
+        sync_route_stops(route)
+        stop = route.stops[0]
+        assert (stop.start_time, stop.name, stop.description) == ("09:30", "Joe's, Downtown", "")
+        assert (stop.bookmark_id, stop.latitude, stop.longitude) == (7, 40.7, -74.0)
+        assert route.route_text == render_itinerary(route.stops)
@@ -0,0 +1,119 @@
+"""
+Test cases for logging utilities.
+Tests parse_module_levels, JsonFormatter, log_payload sampling and setup_logging.
+"""
+import io
+import json
+import logging
+
+import pytest
+
+from app.utils import log as app_log
+from app.utils.log import JsonFormatter, parse_module_levels, log_payload, setup_logging, shutdown_logging
+
+
+class TestParseModuleLevels:
+    """Test cases for parse_module_levels function"""
+
+    def test_parse_multiple_modules(self):
+        """Test parsing several module=LEVEL pairs"""
+        levels = parse_module_levels("app.routers.generate=DEBUG, httpx=warning")
+        assert levels == {"app.routers.generate": logging.DEBUG, "httpx": logging.WARNING}
+
+    def test_parse_ignores_invalid_entries(self):
+        """Test that malformed entries and unknown levels are skipped"""
+        assert parse_module_levels("nolevel,app=LOUD,=INFO,") == {}
+
+    def test_parse_empty(self):
+        """Test that empty or missing spec gives no overrides"""
+        assert parse_module_levels("") == {}
+        assert parse_module_levels(None) == {}
+
+
+class TestJsonFormatter:
+    """Test cases for JsonFormatter"""
+
+    def test_format_includes_extra_fields(self):
+        """Test that extra= fields end up in the JSON object"""
+        record = logging.makeLogRecord({
+            "name": "app.test", "levelname": "INFO", "levelno": logging.INFO,
+            "msg": "uploaded %d", "args": (3,), "user_id": 7,
+        })
+        entry = json.loads(JsonFormatter().format(record))
+        assert entry["message"] == "uploaded 3"
+        assert entry["logger"] == "app.test"
+        assert entry["level"] == "INFO"
+        assert entry["user_id"] == 7
+
+    def test_format_non_serializable_values(self):
+        """Test that arbitrary objects are stringified instead of failing"""
+        record = logging.makeLogRecord({"msg": "payload", "payload": {"obj": object()}})
+        entry = json.loads(JsonFormatter().format(record))
+        assert entry["payload"]["obj"].startswith("<object object")
+
+
+class TestLogPayload:
+    """Test cases for log_payload sampling"""
+
+    @pytest.fixture
+    def logger(self):
+        logger = logging.getLogger("tests.payload")
+        records = []
+        handler = logging.Handler()
+        handler.emit = records.append
+        logger.addHandler(handler)
+        logger.propagate = False
+        yield logger, records
+        logger.removeHandler(handler)
+        logger.setLevel(logging.NOTSET)
+
+    def test_skipped_when_debug_disabled(self, logger, monkeypatch):
+        """Test that nothing is logged unless DEBUG is enabled"""
+        logger, records = logger
+        logger.setLevel(logging.INFO)
+        monkeypatch.setattr(app_log, "_payload_sample_rate", 1.0)
+        log_payload(logger, "prompt", prompt="x" * 1000)
+        assert records == []
+
+    def test_logged_when_sample_rate_is_one(self, logger, monkeypatch):
+        """Test that every payload is kept at sample rate 1.0"""
+        logger, records = logger
+        logger.setLevel(logging.DEBUG)
+        monkeypatch.setattr(app_log, "_payload_sample_rate", 1.0)
+        for _ in range(5):
+            log_payload(logger, "prompt", prompt="hello")
+        assert len(records) == 5
+        assert records[0].payload == {"prompt": "hello"}
+
+    def test_dropped_when_sample_rate_is_zero(self, logger, monkeypatch):
+        """Test that payloads are dropped at sample rate 0"""
+        logger, records = logger
+        logger.setLevel(logging.DEBUG)
+        monkeypatch.setattr(app_log, "_payload_sample_rate", 0.0)
+        for _ in range(50):
+            log_payload(logger, "prompt", prompt="hello")
+        assert records == []
+
+
+class TestSetupLogging:
+    """Test cases for setup_logging"""
+
+    def test_setup_writes_json_through_queue(self, monkeypatch):
+        """Test that records reach the stream as JSON once the listener is flushed"""
+        monkeypatch.setenv("LOG_FORMAT", "json")
+        monkeypatch.setenv("LOG_LEVEL", "INFO")
+        monkeypatch.setenv("LOG_LEVELS", "tests.noisy=ERROR")
+        root = logging.getLogger()
+        saved_handlers, saved_level = root.handlers[:], root.level
+        stream = io.StringIO()
+        try:
+            setup_logging(stream=stream)
+            logging.getLogger("tests.setup").info("hello %s", "world")
+            logging.getLogger("tests.noisy").warning("filtered out")
+            shutdown_logging()
+        finally:
+            root.handlers, root.level = saved_handlers, saved_level
+            logging.getLogger("tests.noisy").setLevel(logging.NOTSET)
+
+        lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+        assert [line["message"] for line in lines] == ["hello world"]
@@ -0,0 +1,118 @@
+"""
+Test cases for metrics utilities.
+Tests upstream/token/cache counters and MetricsMiddleware with a minimal app.
+"""
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+from sqlalchemy import create_engine, text
+
+from app.utils.metrics import (
+    MetricsMiddleware,
+    metrics_endpoint,
+    observe_upstream,
+    record_cache_access,
+    record_openai_usage,
+)
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+class TestObserveUpstream:
+    """Test cases for observe_upstream context manager"""
+
+    def test_success_records_latency_only(self):
+        """Test that a successful call is timed but not counted as error"""
+        before = sample("upstream_request_duration_seconds_count", provider="test", operation="ok")
+        with observe_upstream("test", "ok"):
+            pass
+        assert sample("upstream_request_duration_seconds_count", provider="test", operation="ok") == before + 1
+        assert sample("upstream_errors_total", provider="test", operation="ok") == 0
+
+    def test_failure_is_counted_and_reraised(self):
+        """Test that exceptions increment the error counter and propagate"""
+        before = sample("upstream_errors_total", provider="test", operation="fail")
+        with pytest.raises(RuntimeError):
+            with observe_upstream("test", "fail"):
+                raise RuntimeError("boom")
+        assert sample("upstream_errors_total", provider="test", operation="fail") == before + 1
+
+
+class TestCounters:
+    """Test cases for token usage and cache counters"""
+
+    def test_record_openai_usage(self):
+        """Test that prompt and completion tokens are counted separately"""
+        response = SimpleNamespace(model="test-model", usage=SimpleNamespace(prompt_tokens=120, completion_tokens=30))
+        before = sample("openai_tokens_total", model="test-model", operation="unit", kind="prompt")
+        record_openai_usage("unit", response)
+        assert sample("openai_tokens_total", model="test-model", operation="unit", kind="prompt") == before + 120
+        assert sample("openai_tokens_total", model="test-model", operation="unit", kind="completion") >= 30
+
+    def test_record_openai_usage_without_usage(self):
+        """Test that responses without usage are ignored"""
+        record_openai_usage("unit", SimpleNamespace())
+
+    def test_record_cache_access(self):
+        """Test hit and miss counters"""
+        before_hit = sample("cache_requests_total", cache="unit", result="hit")
+        before_miss = sample("cache_requests_total", cache="unit", result="miss")
+        record_cache_access("unit", True)
+        record_cache_access("unit", True)
+        record_cache_access("unit", False)
+        assert sample("cache_requests_total", cache="unit", result="hit") == before_hit + 2
+        assert sample("cache_requests_total", cache="unit", result="miss") == before_miss + 1
+
+
+class TestMetricsMiddleware:
+    """Test cases for MetricsMiddleware"""
+
+    @pytest.fixture
+    def client(self):
+        engine = create_engine("sqlite://")
+        app = FastAPI()
+        app.add_middleware(MetricsMiddleware)
+        app.add_route("/metrics", metrics_endpoint)
+
+        @app.get("/items/{item_id}")
+        def read_item(item_id: int):
+            with engine.connect() as conn:
+                for _ in range(3):
+                    conn.execute(text("SELECT 1"))
+            return {"id": item_id}
+
+        return TestClient(app)
+
+    def test_latency_recorded_per_route_template(self, client):
+        """Test that the route template, not the raw path, is used as label"""
+        before = sample("http_request_duration_seconds_count", method="GET", route="/items/{item_id}", status="200")
+        client.get("/items/1")
+        client.get("/items/2")
+        after = sample("http_request_duration_seconds_count", method="GET", route="/items/{item_id}", status="200")
+        assert after == before + 2
+
+    def test_db_queries_counted_per_request(self, client):
+        """Test that SQL statements issued by the handler are attributed to the request"""
+        before = sample("db_queries_per_request_sum", method="GET", route="/items/{item_id}")
+        response = client.get("/items/1")
+        assert sample("db_queries_per_request_sum", method="GET", route="/items/{item_id}") == before + 3
+        assert 'desc="3 queries"' in response.headers["server-timing"]
+
+    def test_unmatched_route_label(self, client):
+        """Test that unknown paths share one label"""
+        before = sample("http_request_duration_seconds_count", method="GET", route="<unmatched>", status="404")
+        client.get("/does/not/exist")
+        assert sample("http_request_duration_seconds_count", method="GET", route="<unmatched>", status="404") == before + 1
+
+    def test_metrics_endpoint_text_format(self, client):
+        """Test that /metrics serves the Prometheus text format"""
+        client.get("/items/1")
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert "http_request_duration_seconds_bucket" in response.text
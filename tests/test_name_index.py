@@ -0,0 +1,110 @@
+"""
+Test cases for fuzzy place-name lookup.
+Tests trigram scoring, NameIndex lookups and resolve_bookmarks against an in-memory database.
+"""
+import os
+
+import pytest
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")  # app.database builds its engine at import
+
+import app.models  # noqa: F401  (registers all mappers)
+from app.models.bookmark import Bookmark
+from app.models.place import Place
+from app.models.user import User
+from app.utils import name_index
+from app.utils.name_index import NameIndex, normalize, resolve_bookmarks, trigrams
+
+PLACES = [
+    (1, ("Musée du Louvre", "Rue de Rivoli, 75001 Paris")),
+    (2, ("Café de Flore", "172 Bd Saint-Germain, 75006 Paris")),
+    (3, ("Bench Place 7", "7 Rue Bench")),
+    (4, ("Bench Place 78", "78 Rue Bench")),
+    (5, ("Tour Eiffel", "Champ de Mars")),
+]
+
+
+class TestTrigrams:
+    """Test cases for normalize and trigrams"""
+
+    def test_normalize(self):
+        """Test that case, accents and punctuation are ignored"""
+        assert normalize("Café de Flore!").split() == ["cafe", "de", "flore"]
+        assert normalize("Sacré-Cœur").split() == ["sacre", "cœur"]
+
+    def test_pg_trgm_padding(self):
+        """Test the pg_trgm word padding: two spaces in front, one behind"""
+        assert trigrams("cat") == {"  c", " ca", "cat", "at "}
+        assert trigrams("  ") == frozenset()
+
+
+class TestNameIndex:
+    """Test cases for NameIndex"""
+
+    def test_partial_name(self):
+        """Test that a word of the name finds the place"""
+        match = NameIndex(PLACES).resolve("louvre")
+        assert match.key == 1 and match.score == 1.0
+
+    def test_typo_and_accents(self):
+        """Test that misspelled and unaccented names still match"""
+        index = NameIndex(PLACES)
+        assert index.resolve("Lovre").key == 1
+        assert index.resolve("cafe de flor").key == 2
+
+    def test_address(self):
+        """Test that an address finds the place"""
+        assert NameIndex(PLACES).resolve("172 bd saint germain").key == 2
+
+    def test_numbers_are_not_prefixes(self):
+        """Test that "Bench Place 7" prefers the exact name over "Bench Place 78" """
+        index = NameIndex(PLACES)
+        assert index.resolve("Bench Place 7").key == 3
+        assert index.resolve("Bench Place 78").key == 4
+
+    def test_unrelated_name(self):
+        """Test that a place that is not in the index is not matched"""
+        assert NameIndex(PLACES).resolve("Statue of Liberty") is None
+
+    def test_ambiguous(self):
+        """Test that a query that fits several entries equally well is flagged"""
+        match = NameIndex(PLACES).resolve("Paris")
+        assert match.ambiguous
+        assert not NameIndex(PLACES).resolve("louvre").ambiguous
+
+
+class TestResolveBookmarks:
+    """Test cases for resolve_bookmarks"""
+
+    def test_resolves_per_user(self, db):
+        """Test that queries are resolved against the user's own bookmarks only"""
+        alice, bob = User(email="alice@example.com", hashed_password="x"), User(email="bob@example.com", hashed_password="x")
+        db.add_all([alice, bob])
+        db.flush()
+        db.add_all([
+            Bookmark(user_id=alice.id, place=Place(title="Musée du Louvre", address="Rue de Rivoli",
+                                                   latitude=48.86, longitude=2.34)),
+            Bookmark(user_id=bob.id, place=Place(title="Café de Flore", address="172 Bd Saint-Germain",
+                                                 latitude=48.85, longitude=2.33)),
+        ])
+        db.commit()
+
+        louvre, flore = resolve_bookmarks(db, alice.id, ["louvre", "cafe de flore"])
+        assert db.get(Bookmark, louvre.key).title == "Musée du Louvre"
+        assert flore is None
+        assert resolve_bookmarks(db, alice.id, []) == []
+
+    def test_index_is_cached_until_bookmarks_change(self, db):
+        """Test that the in-memory index is reused until a bookmark's place has another title or address"""
+        user = User(email="cache@example.com", hashed_password="x")
+        db.add(user)
+        db.flush()
+        bookmark = Bookmark(user_id=user.id, place=Place(title="Tour Eiffel", address="Champ de Mars",
+                                                          latitude=48.85, longitude=2.29))
+        db.add(bookmark)
+        db.commit()
+
+        first = name_index.bookmark_index(user.id, [bookmark])
+        assert name_index.bookmark_index(user.id, [bookmark]) is first
+        bookmark.place = Place(title="Eiffel Tower", address="Champ de Mars", latitude=48.85, longitude=2.29)
+        assert name_index.bookmark_index(user.id, [bookmark]) is not first
@@ -0,0 +1,104 @@
+"""
+Test cases for the bookmark neighbour graph.
+Tests that the grid search agrees with comparing all pairs and that incremental updates match a rebuild.
+"""
+import random
+
+from app.utils.neighbors import K, build_neighbors, haversine_km, update_neighbors, walk_minutes
+
+
+def _points(count, seed=3, start_id=0):
+    rng = random.Random(seed)
+    return {
+        start_id + i: (48.86 + rng.uniform(-0.05, 0.05), 2.33 + rng.uniform(-0.08, 0.08))
+        for i in range(count)
+    }
+
+
+def _brute_force(points, k=K):
+    return {
+        point_id: [
+            other for _, other in sorted(
+                (haversine_km(point, other_point), other)
+                for other, other_point in points.items() if other != point_id
+            )[:k]
+        ]
+        for point_id, point in points.items()
+    }
+
+
+def _ids(graph):
+    return {point_id: [n[0] for n in neighbors] for point_id, neighbors in graph.items()}
+
+
+class TestBuildNeighbors:
+    """Test cases for build_neighbors"""
+
+    def test_matches_brute_force(self):
+        """Test that the grid search finds the same neighbours as comparing all pairs"""
+        points = _points(400)
+        assert _ids(build_neighbors(points)) == _brute_force(points)
+
+    def test_outliers(self):
+        """Test that far-away points still get (far-away) neighbours"""
+        points = _points(200)
+        points[-1] = (40.7, -74.0)
+        points[-2] = (-33.9, 151.2)
+        assert _ids(build_neighbors(points)) == _brute_force(points)
+
+    def test_fewer_points_than_k(self):
+        """Test that with fewer than k + 1 points every point lists all the others"""
+        points = _points(4)
+        graph = build_neighbors(points)
+        assert all(len(neighbors) == 3 for neighbors in graph.values())
+        assert build_neighbors({}) == {}
+        assert build_neighbors({1: (48.86, 2.33)}) == {1: []}
+
+    def test_entries(self):
+        """Test the [id, distance_m, walk_min] entries, nearest first"""
+        graph = build_neighbors({1: (48.86, 2.33), 2: (48.87, 2.33), 3: (48.90, 2.33)})
+        other, meters, minutes = graph[1][0]
+        assert other == 2
+        assert 1100 < meters < 1120
+        assert minutes == walk_minutes(meters / 1000)
+        assert graph[1][0][1] < graph[1][1][1]
+
+
+class TestUpdateNeighbors:
+    """Test cases for update_neighbors"""
+
+    def test_matches_rebuild(self):
+        """Test that patching after removals, additions and moves gives the full rebuild"""
+        points = _points(300)
+        graph = build_neighbors(points)
+
+        current = dict(points)
+        removed = set(list(points)[:5])
+        for point_id in removed:
+            del current[point_id]
+        added = _points(5, seed=4, start_id=1000)
+        current.update(added)
+        moved = {20, 21}
+        current.update({20: (48.85, 2.30), 21: (48.88, 2.36)})
+
+        changes = update_neighbors(
+            {point_id: graph.get(point_id) for point_id in current}, current, set(added) | moved, removed
+        )
+        merged = {point_id: changes.get(point_id, graph.get(point_id)) for point_id in current}
+        assert _ids(merged) == _ids(build_neighbors(current))
+        assert len(changes) < len(current)
+
+    def test_nothing_changed(self):
+        """Test that an unchanged upload rewrites nothing"""
+        points = _points(50)
+        graph = build_neighbors(points)
+        assert update_neighbors(graph, points, set(), set()) == {}
+
+    def test_missing_lists_are_filled(self):
+        """Test that points without a list (e.g. before the column existed) get one"""
+        points = _points(50)
+        graph = build_neighbors(points)
+        graph[7] = None
+        changes = update_neighbors(graph, points, set(), set())
+        assert set(changes) == {7}
+        assert changes[7] == build_neighbors(points)[7]
@@ -0,0 +1,305 @@
+"""
+Test cases for the outbound-call layer.
+Tests the per-process split of the limits, token buckets and the circuit breaker on a fake clock, and retries, fail-fast and concurrency limits
+against a local HTTP stub that injects faults (5xx, 429, slow responses).
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+from openai import OpenAI
+
+from app.utils.outbound import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    Policy,
+    Provider,
+    TokenBucket,
+    UpstreamUnavailable,
+    is_retryable,
+    worker_count,
+)
+
+COMPLETION = {
+    "id": "chatcmpl-stub",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "gpt-4.1",
+    "choices": [{"index": 0, "message": {"role": "assistant", "content": "{}"}, "finish_reason": "stop"}],
+    "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+class FaultyStub(BaseHTTPRequestHandler):
+    """Answers each request with the next scripted fault: an int status, ("slow", seconds) or None for success."""
+
+    protocol_version = "HTTP/1.1"
+    script = []
+    hits = 0
+
+    def log_message(self, format, *args):
+        pass
+
+    def _serve(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        self.rfile.read(length)
+        cls = type(self)
+        cls.hits += 1
+        fault = cls.script.pop(0) if cls.script else None
+        status, headers = 200, {}
+        if isinstance(fault, tuple):
+            time.sleep(fault[1])
+        elif fault == 429:
+            status, headers = 429, {"Retry-After": "0.01"}
+        elif fault is not None:
+            status = fault
+        body = json.dumps(COMPLETION if status == 200 else {"error": {"message": "injected"}}).encode()
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = _serve
+    do_POST = _serve
+
+
+@pytest.fixture
+def stub():
+    handler = type("Stub", (FaultyStub,), {"script": [], "hits": 0})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+    try:
+        yield handler, f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def _provider(clock=None, **overrides):
+    settings = dict(max_concurrency=4, rpm=0, tpm=0, timeout_s=0.5, deadline_s=30.0,
+                    backoff_base_s=0.01, backoff_max_s=0.05)
+    settings.update(overrides)
+    if clock is None:
+        return Provider("stub", Policy(**settings), sleep=lambda seconds: None)
+    return Provider("stub", Policy(**settings), clock=clock, sleep=clock.sleep)
+
+
+def _get(url, timeout=0.5):
+    def request():
+        response = httpx.get(url + "/search", timeout=timeout)
+        response.raise_for_status()
+        return response
+    return request
+
+
+class TestPolicy:
+    """Test cases for Policy.from_env and worker_count"""
+
+    def test_limits_split_between_workers(self, monkeypatch):
+        """Test that RPM, TPM and concurrency are divided between WEB_CONCURRENCY workers and the rest is kept"""
+        monkeypatch.setenv("WEB_CONCURRENCY", "4")
+        monkeypatch.setenv("STUB_RPM", "100")
+        assert worker_count() == 4
+        policy = Policy.from_env("STUB", max_concurrency=16, rpm=500, tpm=0, timeout_s=5.0, deadline_s=10.0)
+        assert (policy.max_concurrency, policy.rpm, policy.tpm) == (4, 25, 0)
+        assert (policy.timeout_s, policy.deadline_s) == (5.0, 10.0)
+        assert Policy.from_env("STUB", workers=200, max_concurrency=16, rpm=500, tpm=0, timeout_s=5.0,
+                               deadline_s=10.0).max_concurrency == 1
+
+    def test_single_worker_by_default(self, monkeypatch):
+        """Test that an unset or invalid WEB_CONCURRENCY means one worker with the whole quota"""
+        monkeypatch.delenv("WEB_CONCURRENCY", raising=False)
+        assert worker_count() == 1
+        monkeypatch.setenv("WEB_CONCURRENCY", "many")
+        assert worker_count() == 1
+
+
+class TestTokenBucket:
+    """Test cases for TokenBucket"""
+
+    def test_burst_then_wait(self):
+        """Test that a full bucket serves a burst and later callers are told how long to wait"""
+        clock = FakeClock()
+        bucket = TokenBucket(60, clock)  # one per second, ten seconds of burst
+        assert [bucket.reserve(1, 0) for _ in range(10)] == [0.0] * 10
+        assert bucket.reserve(1, 0.5) is None
+        assert bucket.reserve(1, 5) == pytest.approx(1.0)
+        assert bucket.reserve(1, 5) == pytest.approx(2.0)
+        clock.now += 3
+        assert bucket.reserve(1, 0) == pytest.approx(0.0)
+
+    def test_refund(self):
+        """Test that refunded tokens can be used again, up to the capacity"""
+        clock = FakeClock()
+        bucket = TokenBucket(600, clock)
+        assert bucket.reserve(100, 0) == 0.0
+        assert bucket.reserve(100, 0) is None
+        bucket.refund(1000)
+        assert bucket.tokens == bucket.capacity == 100
+
+
+class TestCircuitBreaker:
+    """Test cases for CircuitBreaker"""
+
+    def test_opens_and_recovers(self):
+        """Test that the circuit opens after the threshold and lets one trial through after the reset timeout"""
+        clock = FakeClock()
+        breaker = CircuitBreaker(3, 30, clock)
+        for _ in range(3):
+            assert breaker.allow()
+            breaker.record_failure()
+        assert breaker.state == OPEN and not breaker.allow()
+        assert breaker.retry_after() == pytest.approx(30)
+        clock.now += 30
+        assert breaker.allow() and breaker.state == HALF_OPEN
+        assert not breaker.allow()  # only one trial at a time
+        breaker.record_success()
+        assert breaker.state == CLOSED and breaker.allow()
+
+    def test_failed_trial_reopens(self):
+        """Test that a failed half-open trial opens the circuit again"""
+        clock = FakeClock()
+        breaker = CircuitBreaker(1, 10, clock)
+        breaker.record_failure()
+        clock.now += 10
+        assert breaker.allow()
+        breaker.record_failure()
+        assert breaker.state == OPEN and not breaker.allow()
+
+
+class TestProvider:
+    """Test cases for Provider.call against a fault-injecting stub"""
+
+    def test_retries_server_errors(self, stub):
+        """Test that 5xx and 429 answers are retried until the stub succeeds"""
+        handler, url = stub
+        handler.script = [503, 429, None]
+        provider = _provider(max_retries=2)
+        assert provider.call("search", _get(url)).status_code == 200
+        assert handler.hits == 3
+
+    def test_gives_up_after_max_retries(self, stub):
+        """Test that the last error is raised once retries are used up"""
+        handler, url = stub
+        handler.script = [500, 502, 503]
+        with pytest.raises(httpx.HTTPStatusError):
+            _provider(max_retries=2).call("search", _get(url))
+        assert handler.hits == 3
+
+    def test_client_errors_are_not_retried(self, stub):
+        """Test that a 400 is raised at once and does not count towards opening the circuit"""
+        handler, url = stub
+        handler.script = [400, 400]
+        provider = _provider(failure_threshold=1)
+        with pytest.raises(httpx.HTTPStatusError):
+            provider.call("search", _get(url))
+        assert handler.hits == 1 and provider.breaker.state == CLOSED
+
+    def test_timeouts_are_retried(self, stub):
+        """Test that a response slower than the client timeout is retried"""
+        handler, url = stub
+        handler.script = [("slow", 0.3), None]
+        assert _provider().call("search", _get(url, timeout=0.1)).status_code == 200
+        assert handler.hits == 2
+
+    def test_open_circuit_fails_fast(self, stub):
+        """Test that an open circuit refuses calls without reaching the provider, then recovers"""
+        handler, url = stub
+        clock = FakeClock()
+        provider = _provider(clock, max_retries=0, failure_threshold=2, reset_timeout_s=30)
+        handler.script = [500, 500]
+        for _ in range(2):
+            with pytest.raises(httpx.HTTPStatusError):
+                provider.call("search", _get(url))
+        with pytest.raises(UpstreamUnavailable) as refused:
+            provider.call("search", _get(url))
+        assert refused.value.reason == "circuit_open" and refused.value.retry_after == pytest.approx(30)
+        assert handler.hits == 2
+        clock.now += 30
+        assert provider.call("search", _get(url)).status_code == 200
+        assert provider.breaker.state == CLOSED
+
+    def test_deadline_stops_retries(self, stub):
+        """Test that no retry is started when its backoff would pass the deadline"""
+        handler, url = stub
+        clock = FakeClock()
+        handler.script = [429, None]
+        provider = _provider(clock, deadline_s=0.005)
+        with pytest.raises(httpx.HTTPStatusError):
+            provider.call("search", _get(url))
+        assert handler.hits == 1
+
+    def test_concurrency_limit(self, stub):
+        """Test that calls beyond max_concurrency wait at most queue_timeout_s and are then refused"""
+        handler, url = stub
+        handler.script = [("slow", 0.4)]
+        provider = _provider(max_concurrency=1, queue_timeout_s=0.05, timeout_s=2)
+        slow = threading.Thread(target=provider.call, args=("search", _get(url, timeout=2)))
+        slow.start()
+        while handler.hits == 0:
+            time.sleep(0.01)
+        with pytest.raises(UpstreamUnavailable) as refused:
+            provider.call("search", _get(url))
+        slow.join()
+        assert refused.value.reason == "concurrency"
+        assert provider.call("search", _get(url)).status_code == 200
+
+    def test_rate_limit(self):
+        """Test that calls queue for request budget and are refused when the wait exceeds queue_timeout_s"""
+        clock = FakeClock()
+        slept = []
+        # the clock does not move while waiting, as with callers arriving together
+        policy = Policy(max_concurrency=4, rpm=6, tpm=0, timeout_s=1, deadline_s=30, queue_timeout_s=15)
+        provider = Provider("stub", policy, clock=clock, sleep=slept.append)  # one request per 10 s
+        assert provider.call("search", lambda: "first") == "first"
+        assert provider.call("search", lambda: "second") == "second"
+        assert slept == [pytest.approx(10)]
+        with pytest.raises(UpstreamUnavailable) as refused:
+            provider.call("search", lambda: "third")
+        assert refused.value.reason == "rate_limit"
+
+    def test_openai_sdk_errors(self, stub):
+        """Test that OpenAI SDK errors from the stub are classified and the token estimate is refunded"""
+        handler, url = stub
+        clock = FakeClock()
+        handler.script = [429, 503, None]
+        provider = _provider(clock, tpm=6000)
+        client = OpenAI(api_key="test", base_url=url + "/v1", max_retries=0, timeout=1)
+
+        def complete():
+            return client.chat.completions.create(model="gpt-4.1", messages=[{"role": "user", "content": "hi"}])
+
+        response = provider.call("chat", complete, tokens=800)
+        assert response.choices[0].message.content == "{}"
+        assert handler.hits == 3
+        assert provider.tokens.tokens == pytest.approx(provider.tokens.capacity - 15, abs=1)
+
+    def test_is_retryable(self):
+        """Test the classification of connection errors and statuses"""
+        request = httpx.Request("GET", "http://stub")
+        assert is_retryable(httpx.ConnectError("refused", request=request))
+        assert is_retryable(httpx.HTTPStatusError("", request=request, response=httpx.Response(502, request=request)))
+        assert not is_retryable(httpx.HTTPStatusError("", request=request, response=httpx.Response(404, request=request)))
+        assert not is_retryable(ValueError("bad json"))
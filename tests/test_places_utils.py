@@ -0,0 +1,95 @@
+"""
+Test cases for the shared place catalogue.
+Tests place fingerprints, sharing places between users and bookmarks reading, never writing, their place.
+"""
+import os
+
+import pytest
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")  # app.database builds its engine at import
+
+import app.models  # noqa: F401  (registers all mappers)
+from app.models.bookmark import Bookmark
+from app.models.place import Place
+from app.models.user import User
+from app.utils.places import get_or_create_places, place_fingerprint
+
+
+def _fields(title, latitude, longitude, url=""):
+    return {"title": title, "address": f"{title} street", "latitude": latitude, "longitude": longitude,
+            "google_maps_url": url}
+
+
+class TestPlaceFingerprint:
+    """Test cases for place_fingerprint"""
+
+    def test_link_name_and_position(self):
+        """Test that links ignore scheme and www, and names their case, accents and punctuation"""
+        assert place_fingerprint("A", 1, 2, "https://www.google.com/maps?cid=1") == \
+            place_fingerprint("a", 1, 2, "http://google.com/maps?cid=1")
+        assert place_fingerprint("Café de Flore", 48.85411, 2.33212) == \
+            place_fingerprint("cafe de  flore!", 48.85389, 2.33248)
+        assert place_fingerprint("Café de Flore", 48.854, 2.332) != place_fingerprint("Les Deux Magots", 48.854, 2.332)
+
+    def test_renamed_or_moved_link_changes(self):
+        """Test that a bookmark with a link gets a new fingerprint when its name or position is corrected"""
+        link = "https://maps.google.com/?cid=7"
+        fingerprint = place_fingerprint("Flore", 48.854, 2.333, link)
+        assert place_fingerprint("Café de Flore", 48.854, 2.333, link) != fingerprint
+        assert place_fingerprint("Flore", 48.8541, 2.3374, link) != fingerprint
+        assert place_fingerprint("Flore", 48.854, 2.333) != fingerprint
+
+    def test_long_links_fit_the_column(self):
+        """Test that a link longer than the column is hashed"""
+        fingerprint = place_fingerprint("A", 1, 2, "https://www.google.com/maps/place/" + "x" * 400)
+        assert fingerprint.startswith("sha256:") and len(fingerprint) <= 255
+
+
+class TestGetOrCreatePlaces:
+    """Test cases for get_or_create_places"""
+
+    def test_shared_between_uploads(self, db):
+        """Test that a place is inserted once and returned as is to later uploads"""
+        first = {place_fingerprint("Louvre", 48.8606, 2.3376): _fields("Louvre", 48.8606, 2.3376),
+                 place_fingerprint("Flore", 48.854, 2.333, "u/1"): _fields("Flore", 48.854, 2.333, "u/1")}
+        places = get_or_create_places(db, first)
+        db.commit()
+
+        # a second user with the Louvre under another spelling, Flore by another link form, and a new place
+        second = {place_fingerprint("LOUVRE", 48.86062, 2.33758): _fields("LOUVRE", 48.86062, 2.33758),
+                  place_fingerprint("FLORE", 48.854, 2.333, "https://u/1"): _fields("FLORE", 48.854, 2.333),
+                  place_fingerprint("Orsay", 48.86, 2.326): _fields("Orsay", 48.86, 2.326)}
+        again = get_or_create_places(db, second)
+        db.commit()
+        assert {p.id for p in places.values()} < {p.id for p in again.values()}
+        assert db.query(Place).count() == 3
+        assert sorted(p.title for p in again.values()) == ["Flore", "Louvre", "Orsay"]
+
+
+class TestBookmarkPlace:
+    """Test cases for bookmarks referencing places"""
+
+    def test_bookmarks_read_their_place(self, db):
+        """Test that two users' bookmarks of one place share its row and its columns"""
+        place = get_or_create_places(db, {"geo:louvre": _fields("Louvre", 48.8606, 2.3376)})["geo:louvre"]
+        users = [User(email=f"{name}@example.com", hashed_password="x") for name in ("a", "b")]
+        db.add_all(users)
+        db.flush()
+        db.add_all([Bookmark(user_id=user.id, place=place) for user in users])
+        db.commit()
+        place.category = "museum"
+        db.commit()
+        db.expire_all()
+
+        bookmarks = db.query(Bookmark).all()
+        assert {b.place_id for b in bookmarks} == {place.id}
+        assert [(b.title, b.latitude, b.category) for b in bookmarks] == [("Louvre", 48.8606, "museum")] * 2
+
+    def test_place_columns_are_read_only(self, db):
+        """Test that a bookmark cannot edit the place other users' bookmarks share"""
+        bookmark = Bookmark(place=Place(title="Orsay", address="1 Rue", latitude=48.86, longitude=2.326))
+        with pytest.raises(AttributeError):
+            bookmark.title = "Musée d'Orsay"
+        with pytest.raises(AttributeError):
+            Bookmark(title="Orsay")
+        assert bookmark.place.title == "Orsay"
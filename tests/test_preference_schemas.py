@@ -0,0 +1,50 @@
+"""
+Test cases for preference schemas validation.
+Tests Pydantic schema validation for PreferenceRequest times and TripRequest dates.
+"""
+import pytest
+from pydantic import ValidationError
+from app.schemas.preference import MAX_TRIP_DAYS, PreferenceRequest, TripRequest
+
+PREFERENCES = {
+    "centerLandmark": "Louvre Museum",
+    "mustVisit": [],
+    "startTime": "09:00",
+    "endTime": "21:00",
+    "transportModes": ["walking"],
+    "allowAlcohol": True,
+    "preferredCuisine": [],
+    "maxCommuteTime": 30,
+}
+
+
+class TestPreferenceRequest:
+    """Test cases for PreferenceRequest schema"""
+
+    def test_clock_times(self):
+        """Test that start and end times must be 24h HH:MM"""
+        assert PreferenceRequest(**dict(PREFERENCES, startTime="9:30")).start_time == "9:30"
+        for value in ("9:00 AM", "noon", "24:00", "21:5"):
+            with pytest.raises(ValidationError):
+                PreferenceRequest(**dict(PREFERENCES, endTime=value))
+
+
+class TestTripRequest:
+    """Test cases for TripRequest schema"""
+
+    def test_trip_request_day_count(self):
+        """Test TripRequest counts both the first and the last day"""
+        trip = TripRequest(**PREFERENCES, startDate="2026-05-01", endDate="2026-05-03")
+        assert trip.day_count == 3
+        assert TripRequest(**PREFERENCES, startDate="2026-05-01", endDate="2026-05-01").day_count == 1
+
+    def test_trip_request_end_before_start(self):
+        """Test TripRequest rejects an end date before the start date"""
+        with pytest.raises(ValidationError):
+            TripRequest(**PREFERENCES, startDate="2026-05-03", endDate="2026-05-01")
+
+    def test_trip_request_too_long(self):
+        """Test TripRequest rejects trips longer than MAX_TRIP_DAYS"""
+        TripRequest(**PREFERENCES, startDate="2026-05-01", endDate=f"2026-05-{MAX_TRIP_DAYS:02d}")
+        with pytest.raises(ValidationError):
+            TripRequest(**PREFERENCES, startDate="2026-05-01", endDate=f"2026-05-{MAX_TRIP_DAYS + 1:02d}")
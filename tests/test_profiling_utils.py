@@ -0,0 +1,169 @@
+"""
+Test cases for profiling utilities.
+Tests the on-disk ring buffer, admin token checks and the endpoint wrapper, one profiled request at a time.
+"""
+import asyncio
+import cProfile
+
+import pytest
+
+from app.utils import profiling
+from app.utils.profiling import ProfileStore, ProfilingMiddleware, is_admin_token, profiled
+
+
+def make_profile():
+    profile = cProfile.Profile()
+    profile.enable()
+    sum(range(1000))
+    profile.disable()
+    return profile
+
+
+class TestProfileStore:
+    """Test cases for ProfileStore"""
+
+    def test_save_and_list(self, tmp_path):
+        """Test that saved profiles are listed newest first with metadata"""
+        store = ProfileStore(str(tmp_path), max_profiles=10)
+        first = store.save(make_profile(), {"path": "/a"})
+        second = store.save(make_profile(), {"path": "/b"})
+        assert [p["id"] for p in store.list()] == sorted([first, second], reverse=True)
+        assert store.list()[0]["path"] in ("/a", "/b")
+
+    def test_ring_buffer_evicts_oldest(self, tmp_path):
+        """Test that only max_profiles profiles are kept"""
+        store = ProfileStore(str(tmp_path), max_profiles=2)
+        ids = [store.save(make_profile(), {}) for _ in range(4)]
+        kept = {p["id"] for p in store.list()}
+        assert len(kept) == 2
+        assert kept == set(sorted(ids)[-2:])
+        assert len(list(tmp_path.iterdir())) == 4  # .prof + .json per profile
+
+    def test_render_text(self, tmp_path):
+        """Test the text report of a stored profile"""
+        store = ProfileStore(str(tmp_path), max_profiles=5)
+        profile_id = store.save(make_profile(), {})
+        assert "function calls" in store.render_text(profile_id)
+
+    def test_rejects_unknown_or_malformed_ids(self, tmp_path):
+        """Test that ids outside the expected format are never turned into paths"""
+        store = ProfileStore(str(tmp_path), max_profiles=5)
+        assert store.stats_path("../../etc/passwd") is None
+        assert store.render_text("0000000000000-deadbeef") is None
+
+    def test_list_missing_directory(self, tmp_path):
+        """Test listing before anything was saved"""
+        assert ProfileStore(str(tmp_path / "missing"), max_profiles=5).list() == []
+
+
+class TestAdminToken:
+    """Test cases for is_admin_token"""
+
+    def test_disabled_without_token(self, monkeypatch):
+        """Test that nothing is accepted when PROFILE_ADMIN_TOKEN is unset"""
+        monkeypatch.delenv("PROFILE_ADMIN_TOKEN", raising=False)
+        assert not is_admin_token("anything")
+        assert not is_admin_token(None)
+
+    def test_matching_token(self, monkeypatch):
+        """Test exact token matching"""
+        monkeypatch.setenv("PROFILE_ADMIN_TOKEN", "s3cret")
+        assert is_admin_token("s3cret")
+        assert not is_admin_token("s3cret ")
+        assert not is_admin_token("")
+
+    @pytest.mark.parametrize("scope, expected", [
+        ({"headers": [(b"x-profile", b"s3cret")]}, True),
+        ({"headers": [(b"x-profile", b"nope")]}, False),
+        ({"headers": [], "query_string": b"a=1&profile=s3cret"}, True),
+        ({"headers": [], "query_string": b"profile=nope"}, False),
+        ({"headers": []}, False),
+    ])
+    def test_middleware_trigger(self, monkeypatch, scope, expected):
+        """Test header and query flag detection"""
+        monkeypatch.setenv("PROFILE_ADMIN_TOKEN", "s3cret")
+        assert ProfilingMiddleware._requested(scope) is expected
+
+
+class TestProfiledWrapper:
+    """Test cases for the profiled endpoint wrapper"""
+
+    @pytest.fixture
+    def store(self, tmp_path, monkeypatch):
+        store = ProfileStore(str(tmp_path), max_profiles=5)
+        monkeypatch.setattr(profiling, "store", store)
+        return store
+
+    def test_not_profiled_without_request_flag(self, store):
+        """Test that endpoints run untouched when the request did not ask for a profile"""
+        @profiled
+        def endpoint(x: int):
+            return x * 2
+
+        assert endpoint(21) == 42
+        assert store.list() == []
+
+    def test_sync_endpoint_profiled(self, store):
+        """Test that a flagged request stores a profile and records its id"""
+        @profiled
+        def endpoint(x: int):
+            return x * 2
+
+        request = profiling._ProfileRequest("GET", "/items")
+        token = profiling._active.set(request)
+        try:
+            assert endpoint(21) == 42
+        finally:
+            profiling._active.reset(token)
+        assert request.profile_id == store.list()[0]["id"]
+        assert store.list()[0]["path"] == "/items"
+
+    def test_async_endpoint_profiled(self, store):
+        """Test that coroutine endpoints stay coroutines and are profiled"""
+        @profiled
+        async def endpoint():
+            return "ok"
+
+        async def run():
+            token = profiling._active.set(profiling._ProfileRequest("POST", "/chat"))
+            try:
+                return await endpoint()
+            finally:
+                profiling._active.reset(token)
+
+        assert asyncio.run(run()) == "ok"
+        assert len(store.list()) == 1
+
+    def test_one_profiled_request_at_a_time(self, store):
+        """Test that a flagged request overlapping a profiled one runs unprofiled"""
+        started, release = asyncio.Event(), asyncio.Event()
+
+        @profiled
+        async def slow():
+            started.set()
+            await release.wait()
+            return "slow"
+
+        @profiled
+        async def fast():
+            return "fast"
+
+        async def flagged(endpoint, path):
+            request = profiling._ProfileRequest("GET", path)
+            token = profiling._active.set(request)
+            try:
+                return await endpoint(), request.profile_id
+            finally:
+                profiling._active.reset(token)
+
+        async def run():
+            first = asyncio.ensure_future(flagged(slow, "/slow"))
+            await started.wait()
+            second = await flagged(fast, "/fast")
+            release.set()
+            return await first, second
+
+        (_, first_id), (result, second_id) = asyncio.run(run())
+        assert result == "fast" and second_id is None
+        assert [p["path"] for p in store.list()] == ["/slow"] and first_id is not None
+        assert asyncio.run(flagged(fast, "/fast"))[1] is not None
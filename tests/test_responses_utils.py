@@ -0,0 +1,141 @@
+"""
+Test cases for JSON responses and compression.
+Tests orjson rendering, row serialization without validation, and Brotli/gzip negotiation with the size threshold.
+"""
+import asyncio
+import json
+import zlib
+from datetime import datetime, timezone
+from typing import Optional
+
+import pytest
+from pydantic import BaseModel, ConfigDict, Field
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from app.utils import compression
+from app.utils.compression import CompressionMiddleware
+from app.utils.responses import FastJSONResponse, rows_response, schema_columns
+
+
+class Place(BaseModel):
+    id: int
+    title: str
+    category: Optional[str] = None
+    map_url: Optional[str] = Field(default=None, serialization_alias="mapUrl")
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class TestFastJSONResponse:
+    """Test cases for FastJSONResponse"""
+
+    def test_render_matches_stdlib(self):
+        """Test that the body decodes to the same value json.dumps would produce"""
+        content = {"title": "Café 東京", "stops": [1, 2.5, None, True], 3: "int key"}
+        body = FastJSONResponse(content).body
+        assert json.loads(body) == json.loads(json.dumps(content, ensure_ascii=False))
+        assert "Café 東京".encode() in body
+
+    def test_utc_datetime(self):
+        """Test that UTC datetimes end in Z like Pydantic's"""
+        body = FastJSONResponse({"at": datetime(2026, 1, 2, 3, 4, 5, tzinfo=timezone.utc)}).body
+        assert json.loads(body) == {"at": "2026-01-02T03:04:05Z"}
+
+
+class TestRowsResponse:
+    """Test cases for schema_columns and rows_response"""
+
+    def test_schema_columns_in_field_order(self):
+        """Test that the columns follow the schema's fields"""
+        class Entity:
+            id, title, category, map_url, unused = "c_id", "c_title", "c_category", "c_map_url", "c_unused"
+
+        assert schema_columns(Place, Entity) == ["c_id", "c_title", "c_category", "c_map_url"]
+
+    def test_rows_match_pydantic_output(self):
+        """Test that row tuples serialize like the schema would, aliases included"""
+        rows = [(1, "Cafe", None, "https://maps/1"), (2, "Park", "park", None)]
+        response = rows_response(Place, rows)
+        assert response.media_type == "application/json"
+        expected = [Place(id=i, title=t, category=c, map_url=u).model_dump(by_alias=True) for i, t, c, u in rows]
+        assert json.loads(response.body) == expected
+
+
+def _app(body: bytes, media_type="application/json"):
+    async def endpoint(request):
+        return Response(body, media_type=media_type)
+
+    async def stream(request):
+        async def lines():
+            for i in range(3):
+                yield json.dumps({"day": i, "pad": "x" * 600}).encode() + b"\n"
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    async def small(request):
+        return PlainTextResponse("ok")
+
+    app = Starlette(routes=[Route("/", endpoint), Route("/stream", stream), Route("/small", small)])
+    return TestClient(CompressionMiddleware(app, minimum_size=500))
+
+
+class TestCompressionMiddleware:
+    """Test cases for CompressionMiddleware"""
+
+    BODY = json.dumps([{"id": i, "title": f"Place {i}"} for i in range(200)]).encode()
+
+    def test_brotli_preferred(self):
+        """Test that Brotli is chosen when accepted and installed"""
+        pytest.importorskip("brotli")
+        raw = _app(self.BODY).get("/", headers={"accept-encoding": "gzip, br"})
+        assert raw.headers["content-encoding"] == "br"
+        assert raw.headers["vary"] == "Accept-Encoding"
+        assert int(raw.headers["content-length"]) < len(self.BODY) / 3
+        assert raw.content == self.BODY  # httpx decodes br
+
+    def test_gzip_when_brotli_refused(self):
+        """Test that br;q=0 or a missing brotli package falls back to gzip"""
+        response = _app(self.BODY).get("/", headers={"accept-encoding": "gzip, br;q=0"})
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.content == self.BODY
+
+    def test_gzip_without_brotli_package(self, monkeypatch):
+        """Test that br is not offered when the brotli package is missing"""
+        monkeypatch.setattr(compression, "brotli", None)
+        response = _app(self.BODY).get("/", headers={"accept-encoding": "br, gzip"})
+        assert response.headers["content-encoding"] == "gzip"
+
+    def test_identity_and_small_bodies(self):
+        """Test that nothing is compressed without Accept-Encoding or below the threshold"""
+        client = _app(self.BODY)
+        assert "content-encoding" not in client.get("/", headers={"accept-encoding": "identity"}).headers
+        assert "content-encoding" not in client.get("/small", headers={"accept-encoding": "gzip"}).headers
+
+    def test_images_not_recompressed(self):
+        """Test that already compressed media types pass through"""
+        response = _app(b"\xff" * 2000, media_type="image/jpeg").get("/", headers={"accept-encoding": "gzip"})
+        assert "content-encoding" not in response.headers
+
+    def test_stream_flushed_per_chunk(self):
+        """Test that every chunk of a streamed NDJSON body can be decoded as soon as it arrives"""
+        middleware = _app(self.BODY).app
+        scope = {"type": "http", "asgi": {"spec_version": "2.4"}, "method": "GET", "path": "/stream",
+                 "root_path": "", "query_string": b"", "headers": [(b"accept-encoding", b"gzip")]}
+        decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        days, decoded_after_chunk = [], []
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                assert (b"content-encoding", b"gzip") in message["headers"]
+            elif message.get("body"):
+                days.extend(json.loads(line)["day"] for line in decoder.decompress(message["body"]).splitlines())
+                decoded_after_chunk.append(len(days))
+
+        asyncio.run(middleware(scope, receive, send))
+        assert days == [0, 1, 2]
+        assert decoded_after_chunk[:3] == [1, 2, 3]
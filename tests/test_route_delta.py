@@ -0,0 +1,53 @@
+"""
+Test cases for route delta utilities.
+Tests make_delta and apply_delta used by the route revision history.
+"""
+import json
+
+import pytest
+
+from app.utils.route_delta import make_delta, apply_delta
+
+ROUTE = "".join(f"{9 + i:02d}:00 - {10 + i:02d}:00: Stop number {i}\n" for i in range(40))
+
+
+class TestRouteDelta:
+    """Test cases for make_delta and apply_delta"""
+
+    @pytest.mark.parametrize("new", [
+        ROUTE.replace("Stop number 7", "Lunch at Kunitoraya"),
+        ROUTE + "21:00 - 22:00: Night walk\n",
+        "08:00 - 09:00: Breakfast\n" + ROUTE,
+        ROUTE.replace("13:00 - 14:00: Stop number 4\n", ""),
+        ROUTE.rstrip("\n"),
+        "",
+    ])
+    def test_round_trip(self, new):
+        """Test that applying the delta to the old text gives the new text exactly"""
+        assert apply_delta(ROUTE, make_delta(ROUTE, new)) == new
+
+    def test_round_trip_from_empty(self):
+        """Test that a delta from an empty parent inserts everything"""
+        assert apply_delta("", make_delta("", ROUTE)) == ROUTE
+
+    def test_delta_size_tracks_edit_not_route(self):
+        """Test that a one-line change produces a delta much smaller than the route"""
+        delta = make_delta(ROUTE, ROUTE.replace("Stop number 20", "Stop number twenty"))
+        assert len(delta) < 100
+        assert len(delta) < len(ROUTE) // 10
+
+    def test_unchanged_text_is_single_copy(self):
+        """Test that identical texts give a single copy operation"""
+        assert json.loads(make_delta(ROUTE, ROUTE)) == [40]
+
+    def test_crlf_preserved(self):
+        """Test that line endings are kept byte for byte"""
+        old = "a\r\nb\r\nc\r\n"
+        new = "a\r\nB\r\nc\r\n"
+        assert apply_delta(old, make_delta(old, new)) == new
+
+    def test_wrong_parent_raises(self):
+        """Test that applying a delta to a different parent is detected"""
+        delta = make_delta(ROUTE, ROUTE.replace("Stop number 3", "X"))
+        with pytest.raises(ValueError):
+            apply_delta("short\ntext\n", delta)
@@ -0,0 +1,137 @@
+"""
+Test cases for the local route planner.
+Tests that plan_route only produces feasible days and honours must-visit places.
+"""
+import random
+import pytest
+
+from app.utils.route_planner import (
+    Candidate,
+    format_clock,
+    parse_clock,
+    plan_route,
+    speed_for_modes,
+)
+
+ORIGIN = (48.8606, 2.3376)
+LUNCH_AND_DINNER = ((11 * 60 + 30, 14 * 60), (18 * 60, 21 * 60))
+
+
+def _candidates(count, seed=1, spread=0.04):
+    rng = random.Random(seed)
+    return [
+        Candidate(
+            name=f"Place {i}",
+            latitude=ORIGIN[0] + rng.uniform(-spread, spread),
+            longitude=ORIGIN[1] + rng.uniform(-spread, spread),
+            duration_min=75.0 if i % 4 == 0 else 60.0,
+            windows=LUNCH_AND_DINNER if i % 4 == 0 else (),
+            group="meal" if i % 4 == 0 else None,
+        )
+        for i in range(count)
+    ]
+
+
+class TestClock:
+    """Test cases for parse_clock and format_clock"""
+
+    def test_round_trip(self):
+        """Test converting between HH:MM and minutes"""
+        assert parse_clock("09:30") == 570
+        assert format_clock(570) == "09:30"
+        assert format_clock(parse_clock("21:05")) == "21:05"
+        assert parse_clock("9:00") == 540
+
+    def test_rejects_other_formats(self):
+        """Test that times other than 24h HH:MM raise a ValueError naming the value"""
+        for value in ("9:00 AM", "noon", "25:00", "09:60", ""):
+            with pytest.raises(ValueError, match="HH:MM"):
+                parse_clock(value)
+
+    def test_speed_uses_fastest_allowed_mode(self):
+        """Test that the fastest known transport mode is used"""
+        assert speed_for_modes(["walking", "Transit"]) == 20.0
+        assert speed_for_modes(["teleport"]) == 5.0
+
+
+class TestPlanRoute:
+    """Test cases for plan_route"""
+
+    def test_plan_is_feasible(self):
+        """Test legs, windows and the end of the day on a large candidate set"""
+        candidates = _candidates(300)
+        plan = plan_route(candidates, ORIGIN, "09:00", "21:00", max_commute_min=20)
+
+        assert len(plan.stops) >= 5
+        clock = parse_clock("09:00")
+        meals = set()
+        for stop in plan.stops:
+            assert stop.commute_min <= 20
+            assert stop.arrive_min >= clock
+            assert stop.start_min >= stop.arrive_min
+            assert stop.end_min == stop.start_min + stop.candidate.duration_min
+            if stop.candidate.windows:
+                window = next(i for i, (a, b) in enumerate(stop.candidate.windows) if a <= stop.start_min <= b)
+                assert window not in meals  # one lunch, one dinner
+                meals.add(window)
+            clock = stop.end_min
+        assert clock <= parse_clock("21:00")
+        assert len({id(s.candidate) for s in plan.stops}) == len(plan.stops)
+
+    def test_deterministic(self):
+        """Test that the same input gives the same plan"""
+        first = plan_route(_candidates(120), ORIGIN, "09:00", "18:00", 30)
+        second = plan_route(_candidates(120), ORIGIN, "09:00", "18:00", 30)
+        assert [s.candidate.name for s in first.stops] == [s.candidate.name for s in second.stops]
+
+    def test_must_visit_beyond_one_leg_is_reached(self):
+        """Test that a far must-visit place is reached through intermediate stops"""
+        candidates = _candidates(80, spread=0.02)
+        far = Candidate("Far Away", ORIGIN[0] + 0.026, ORIGIN[1] + 0.026, must_visit=True)
+        plan = plan_route(candidates + [far], ORIGIN, "09:00", "21:00", max_commute_min=20)
+        assert far in [s.candidate for s in plan.stops]
+        assert plan.missed_must_visits == []
+
+    def test_unreachable_must_visit_is_reported(self):
+        """Test that a must-visit place that cannot fit is reported, not forced in"""
+        moon = Candidate("Moon", ORIGIN[0] + 1.0, ORIGIN[1] + 1.0, must_visit=True)
+        plan = plan_route(_candidates(20), ORIGIN, "09:00", "21:00", max_commute_min=30)
+        plan_with_moon = plan_route(_candidates(20) + [moon], ORIGIN, "09:00", "21:00", max_commute_min=30)
+        assert [m.name for m in plan_with_moon.missed_must_visits] == ["Moon"]
+        assert len(plan_with_moon.stops) == len(plan.stops)
+
+    def test_improvement_removes_crossing(self):
+        """Test that the improved tour is no longer than the nearest-neighbour order"""
+        # four stops on a line, ordered so that nearest neighbour zig-zags
+        line = [Candidate(f"P{i}", ORIGIN[0], ORIGIN[1] + d, duration_min=30)
+                for i, d in enumerate((0.004, -0.002, 0.010, -0.008))]
+        plan = plan_route(line, ORIGIN, "09:00", "21:00", max_commute_min=60)
+        assert len(plan.stops) == 4
+        longitudes = [s.candidate.longitude for s in plan.stops]
+        # one sweep in each direction at most: the order changes direction once
+        turns = sum(
+            1 for a, b, c in zip(longitudes, longitudes[1:], longitudes[2:]) if (b - a) * (c - b) < 0
+        )
+        assert turns <= 1
+
+    def test_no_candidates(self):
+        """Test that an empty candidate list gives an empty plan"""
+        plan = plan_route([], ORIGIN, "09:00", "21:00", 30)
+        assert plan.stops == [] and plan.travel_min == 0
+
+    def test_neighbour_graph(self):
+        """Test that a plan searched through a neighbour graph is feasible and about as good"""
+        candidates = _candidates(300)
+        problem_points = [(c.latitude, c.longitude) for c in candidates]
+        neighbours = [
+            sorted(range(len(candidates)), key=lambda j: (
+                (problem_points[i][0] - problem_points[j][0]) ** 2 + (problem_points[i][1] - problem_points[j][1]) ** 2
+            ))[1:9]
+            for i in range(len(candidates))
+        ]
+        full = plan_route(candidates, ORIGIN, "09:00", "21:00", max_commute_min=20)
+        pruned = plan_route(candidates, ORIGIN, "09:00", "21:00", max_commute_min=20, neighbours=neighbours)
+
+        assert len(pruned.stops) >= len(full.stops) - 1
+        assert all(stop.commute_min <= 20 for stop in pruned.stops)
+        assert pruned.stops[-1].end_min <= parse_clock("21:00")
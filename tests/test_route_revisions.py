@@ -0,0 +1,107 @@
+"""
+Test cases for route revision history.
+Tests record_revision, revision_text and list_revisions against an in-memory database.
+"""
+import os
+
+import pytest
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")  # app.database builds its engine at import
+
+import app.models  # noqa: F401  (registers all mappers)
+from app.models.generated_route import GeneratedRoute
+from app.models.route_revision import RouteRevision
+from app.models.user import User
+from app.utils.route_revisions import (
+    KIND_DELTA,
+    KIND_SNAPSHOT,
+    SNAPSHOT_INTERVAL,
+    SOURCE_CHAT,
+    ensure_initial_revision,
+    list_revisions,
+    record_revision,
+    revision_text,
+)
+
+ROUTE = "".join(f"{9 + i:02d}:00 - {10 + i:02d}:00: Stop number {i}\n" for i in range(12))
+
+
+@pytest.fixture
+def route(db):
+    user = User(email="rev@example.com", hashed_password="x")
+    db.add(user)
+    db.flush()
+    route = GeneratedRoute(user_id=user.id, route_text=ROUTE)
+    db.add(route)
+    ensure_initial_revision(db, route)
+    db.commit()
+    return route
+
+
+def _edit(text, i):
+    lines = text.splitlines(keepends=True)
+    lines[i % len(lines)] = lines[i % len(lines)].rstrip("\n") + f" (edit {i})\n"
+    return "".join(lines)
+
+
+class TestRouteRevisions:
+    """Test cases for the route revision helpers"""
+
+    def test_initial_revision_is_snapshot(self, db, route):
+        """Test that a new route starts at revision 1 holding the full text"""
+        assert route.head_revision == 1
+        first = db.query(RouteRevision).filter_by(route_id=route.id).one()
+        assert (first.number, first.kind, first.payload) == (1, KIND_SNAPSHOT, ROUTE)
+
+    def test_every_revision_can_be_rebuilt(self, db, route):
+        """Test that each stored version is reconstructed exactly"""
+        texts = [ROUTE]
+        for i in range(2 * SNAPSHOT_INTERVAL + 3):
+            texts.append(_edit(texts[-1], i))
+            record_revision(db, route, texts[-1], SOURCE_CHAT, source_id=i)
+        db.commit()
+
+        assert route.head_revision == len(texts)
+        for number, text in enumerate(texts, start=1):
+            assert revision_text(db, route, number) == text
+
+    def test_snapshots_bound_the_delta_chain(self, db, route):
+        """Test that a snapshot is stored every SNAPSHOT_INTERVAL revisions"""
+        text = ROUTE
+        for i in range(2 * SNAPSHOT_INTERVAL):
+            text = _edit(text, i)
+            record_revision(db, route, text, SOURCE_CHAT)
+        db.commit()
+
+        kinds = {row.number: row.kind for row in list_revisions(db, route.id)}
+        snapshots = sorted(n for n, kind in kinds.items() if kind == KIND_SNAPSHOT)
+        assert snapshots == [1, SNAPSHOT_INTERVAL + 1, 2 * SNAPSHOT_INTERVAL + 1]
+        assert kinds[2] == KIND_DELTA
+
+    def test_delta_smaller_than_route(self, db, route):
+        """Test that a small edit is stored as a delta much smaller than the text"""
+        revision = record_revision(db, route, _edit(ROUTE, 3), SOURCE_CHAT)
+        assert revision.kind == KIND_DELTA
+        assert len(revision.payload) < len(ROUTE) // 4
+
+    def test_unchanged_text_records_nothing(self, db, route):
+        """Test that recording the current text is a no-op"""
+        assert record_revision(db, route, ROUTE, SOURCE_CHAT) is None
+        assert route.head_revision == 1
+
+    def test_unknown_revision(self, db, route):
+        """Test that out-of-range revision numbers return None"""
+        assert revision_text(db, route, 0) is None
+        assert revision_text(db, route, 2) is None
+
+    def test_legacy_route_gets_initial_revision(self, db, route):
+        """Test that a route without history is snapshotted before its first change"""
+        legacy = GeneratedRoute(user_id=route.user_id, route_text="old text\n")
+        db.add(legacy)
+        db.commit()
+        assert legacy.head_revision is None
+
+        record_revision(db, legacy, "new text\n", SOURCE_CHAT)
+        db.commit()
+        assert legacy.head_revision == 2
+        assert revision_text(db, legacy, 1) == "old text\n"
@@ -0,0 +1,82 @@
+"""
+Test cases for route summary utilities.
+Tests summarize_route_text, route_text_hash and etag_matches used by the route listing and detail.
+"""
+from app.utils.route_summary import (
+    etag_matches,
+    summarize_route_text,
+    route_text_hash,
+    TITLE_MAX_LENGTH,
+    PREVIEW_MAX_LENGTH,
+)
+
+
+class TestSummarizeRouteText:
+    """Test cases for summarize_route_text function"""
+
+    def test_title_strips_time_range(self):
+        """Test that the leading time range is removed from the title"""
+        title, _ = summarize_route_text("09:00 - 10:00: Head to Louvre Museum\n10:00 - 11:00: Lunch")
+        assert title == "Head to Louvre Museum"
+
+    def test_title_skips_blank_lines_and_markdown(self):
+        """Test that blank lines and markdown markers are ignored"""
+        title, _ = summarize_route_text("\n\n## **Paris Day Trip**\n09:00 - 10:00: Cafe")
+        assert title == "Paris Day Trip"
+
+    def test_preview_collapses_lines(self):
+        """Test that the preview is a single line"""
+        _, preview = summarize_route_text("09:00 - 10:00: Cafe\n\n10:00 - 11:00:   Museum")
+        assert preview == "09:00 - 10:00: Cafe 10:00 - 11:00: Museum"
+
+    def test_long_text_is_truncated(self):
+        """Test that title and preview respect their maximum lengths"""
+        title, preview = summarize_route_text("Visit " * 200)
+        assert len(title) == TITLE_MAX_LENGTH
+        assert len(preview) == PREVIEW_MAX_LENGTH
+        assert preview.endswith("…")
+
+    def test_empty_text(self):
+        """Test that empty or whitespace-only text yields empty strings"""
+        assert summarize_route_text("") == ("", "")
+        assert summarize_route_text("   \n\t ") == ("", "")
+
+    def test_unicode_text(self):
+        """Test that unicode text is preserved"""
+        title, preview = summarize_route_text("路线：第一天参观博物馆")
+        assert title == "路线：第一天参观博物馆"
+        assert preview == title
+
+
+class TestRouteTextHash:
+    """Test cases for route_text_hash function"""
+
+    def test_hash_is_stable(self):
+        """Test that the same text always hashes the same"""
+        assert route_text_hash("Day 1: Museum") == route_text_hash("Day 1: Museum")
+
+    def test_hash_changes_with_text(self):
+        """Test that different texts hash differently"""
+        assert route_text_hash("Day 1: Museum") != route_text_hash("Day 1: Park")
+
+    def test_hash_is_hex_sha256(self):
+        """Test the hash format"""
+        digest = route_text_hash("")
+        assert len(digest) == 64
+        int(digest, 16)
+
+
+class TestEtagMatches:
+    """Test cases for etag_matches function"""
+
+    def test_whole_tags_from_a_list(self):
+        """Test that any listed tag, weak or strong, matches but a tag inside another does not"""
+        assert etag_matches('"abc"', '"abc"')
+        assert etag_matches('"x", W/"abc" ,"y"', '"abc"')
+        assert not etag_matches('"abcd"', '"abc"')
+        assert not etag_matches('"x""abc"', '"abc"')
+        assert not etag_matches("", '"abc"')
+
+    def test_star_matches_anything(self):
+        """Test that If-None-Match: * matches any current representation"""
+        assert etag_matches("*", '"abc"')
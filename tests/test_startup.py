@@ -0,0 +1,51 @@
+"""
+Test cases for application startup.
+Tests that importing app.main has no side effects: no OpenAI SDK import, no tables created unless opted in.
+"""
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+PROBE = """
+import json, sys
+import sqlalchemy
+import app.main
+from fastapi.testclient import TestClient
+result = {"openai_on_import": "openai" in sys.modules}
+inspector = lambda: sqlalchemy.inspect(app.main.engine).get_table_names()
+result["tables_on_import"] = inspector()
+with TestClient(app.main.create_app()) as client:
+    result["root"] = client.get("/").status_code
+    result["tables_after_startup"] = inspector()
+print(json.dumps(result))
+"""
+
+
+def _probe(tmp_path, **env):
+    environment = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp_path / 'startup.db'}", LOG_LEVEL="WARNING")
+    environment.pop("DB_CREATE_ALL", None)
+    environment.update(env)
+    out = subprocess.run([sys.executable, "-c", PROBE], cwd=ROOT, env=environment,
+                         check=True, capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+class TestStartup:
+    """Test cases for create_app and its lifespan"""
+
+    def test_import_has_no_side_effects(self, tmp_path):
+        """Test that importing and starting the app neither loads the OpenAI SDK nor creates tables"""
+        result = _probe(tmp_path)
+        assert result["openai_on_import"] is False
+        assert result["root"] == 200
+        assert result["tables_on_import"] == []
+        assert result["tables_after_startup"] == []
+
+    def test_create_all_is_opt_in(self, tmp_path):
+        """Test that DB_CREATE_ALL=1 creates the tables at startup"""
+        result = _probe(tmp_path, DB_CREATE_ALL="1")
+        assert result["tables_on_import"] == []
+        assert "bookmarks" in result["tables_after_startup"]
@@ -0,0 +1,156 @@
+"""
+Test cases for cached static file serving.
+Tests content ETags and 304s, immutable vs revalidated Cache-Control, precompressed variants and the in-memory LRU.
+"""
+import gzip
+import os
+
+import pytest
+from starlette.applications import Starlette
+from starlette.routing import Mount
+from starlette.testclient import TestClient
+
+from app.utils.static_files import (
+    IMMUTABLE_CACHE_CONTROL,
+    REVALIDATE_CACHE_CONTROL,
+    CachedStaticFiles,
+    accepted_encodings,
+    is_content_addressed,
+)
+
+DIGEST = "ab" * 32
+
+
+class CountingStaticFiles(CachedStaticFiles):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lookups = 0
+
+    def lookup_path(self, path):
+        self.lookups += 1
+        return super().lookup_path(path)
+
+
+@pytest.fixture
+def static(tmp_path):
+    (tmp_path / "app.js").write_text("console.log('hi')")
+    (tmp_path / f"{DIGEST}-128.webp").write_bytes(b"RIFF-webp")
+    files = CountingStaticFiles(directory=str(tmp_path), revalidate_s=60)
+    client = TestClient(Starlette(routes=[Mount("/static", files)]))
+    return tmp_path, files, client
+
+
+class TestHelpers:
+    """Test cases for the path and header helpers"""
+
+    def test_content_addressed(self):
+        """Test that only names with a long hex digest count as content-addressed"""
+        assert is_content_addressed(f"avatars/{DIGEST}-512.jpeg")
+        assert is_content_addressed("app.0123456789abcdef0123456789abcdef.js")
+        assert not is_content_addressed("app.js")
+        assert not is_content_addressed("deadbeef.js")
+
+    def test_accepted_encodings(self):
+        """Test that q=0 and wildcards are honoured and br comes first"""
+        assert accepted_encodings("gzip, deflate, br") == ("br", "gzip")
+        assert accepted_encodings("gzip;q=0.5, br;q=0") == ("gzip",)
+        assert accepted_encodings("*") == ("br", "gzip")
+        assert accepted_encodings("") == ()
+
+
+class TestCachedStaticFiles:
+    """Test cases for CachedStaticFiles"""
+
+    def test_etag_and_not_modified(self, static):
+        """Test that a strong content ETag is sent and If-None-Match gets a 304"""
+        _, _, client = static
+        response = client.get("/static/app.js")
+        assert response.status_code == 200
+        assert response.text == "console.log('hi')"
+        etag = response.headers["etag"]
+        assert etag.startswith('"') and not etag.startswith("W/")
+        assert response.headers["cache-control"] == REVALIDATE_CACHE_CONTROL
+        assert response.headers["last-modified"]
+
+        again = client.get("/static/app.js", headers={"if-none-match": etag})
+        assert again.status_code == 304
+        assert again.content == b""
+        assert again.headers["etag"] == etag
+        assert client.get("/static/app.js", headers={"if-none-match": '"other"'}).status_code == 200
+        since = client.get("/static/app.js", headers={"if-modified-since": response.headers["last-modified"]})
+        assert since.status_code == 304
+
+    def test_same_content_same_etag(self, static):
+        """Test that the ETag depends on the bytes, not on the file's mtime"""
+        tmp_path, _, client = static
+        (tmp_path / "copy.js").write_text("console.log('hi')")
+        os.utime(tmp_path / "copy.js", (1, 1))
+        assert client.get("/static/copy.js").headers["etag"] == client.get("/static/app.js").headers["etag"]
+
+    def test_content_addressed_is_immutable_and_cached(self, static):
+        """Test that hashed names are immutable and served from memory without touching the disk"""
+        _, files, client = static
+        first = client.get(f"/static/{DIGEST}-128.webp")
+        assert first.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+        assert first.headers["content-type"] == "image/webp"
+        lookups = files.lookups
+        for _ in range(5):
+            assert client.get(f"/static/{DIGEST}-128.webp").content == b"RIFF-webp"
+        assert files.lookups == lookups
+
+    def test_mutable_file_revalidated(self, static):
+        """Test that a changed file is picked up once the revalidation interval passes"""
+        tmp_path, files, client = static
+        old = client.get("/static/app.js").headers["etag"]
+        (tmp_path / "app.js").write_text("console.log('changed')")
+        os.utime(tmp_path / "app.js", (10, 10))
+        assert client.get("/static/app.js").headers["etag"] == old  # within revalidate_s
+        files.revalidate_s = 0
+        response = client.get("/static/app.js")
+        assert response.text == "console.log('changed')"
+        assert response.headers["etag"] != old
+
+    def test_precompressed_variant(self, static):
+        """Test that a .gz sibling is served to clients that accept it, with Vary"""
+        tmp_path, _, client = static
+        (tmp_path / "app.js.gz").write_bytes(gzip.compress(b"console.log('hi')"))
+        response = client.get("/static/app.js", headers={"accept-encoding": "gzip"})
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.headers["vary"] == "Accept-Encoding"
+        assert response.headers["content-type"].startswith("text/javascript")
+        assert response.text == "console.log('hi')"
+        plain = client.get("/static/app.js", headers={"accept-encoding": "identity"})
+        assert "content-encoding" not in plain.headers
+        assert plain.text == "console.log('hi')"
+        assert plain.headers["etag"] != response.headers["etag"]
+
+    def test_large_file_streamed_from_disk(self, tmp_path):
+        """Test that files over max_file_bytes are not kept in memory but still get a content ETag"""
+        (tmp_path / "big.bin").write_bytes(b"x" * 5000)
+        files = CachedStaticFiles(directory=str(tmp_path), max_file_bytes=1000)
+        client = TestClient(Starlette(routes=[Mount("/static", files)]))
+        response = client.get("/static/big.bin")
+        assert response.content == b"x" * 5000
+        assert files._cached_bytes == 0
+        assert client.get("/static/big.bin", headers={"if-none-match": response.headers["etag"]}).status_code == 304
+
+    def test_lru_bounded(self, tmp_path):
+        """Test that the least recently used files are evicted past cache_bytes"""
+        for name in ("a", "b", "c"):
+            (tmp_path / f"{name}.txt").write_bytes(name.encode() * 400)
+        files = CachedStaticFiles(directory=str(tmp_path), cache_bytes=1000)
+        client = TestClient(Starlette(routes=[Mount("/static", files)]))
+        for name in ("a", "b", "c"):
+            client.get(f"/static/{name}.txt")
+        assert [path for path, _ in files._entries] == ["b.txt", "c.txt"]
+        assert files._cached_bytes == 800
+
+    def test_head_and_missing(self, static):
+        """Test HEAD without a body and 404 for missing files"""
+        _, _, client = static
+        head = client.head("/static/app.js")
+        assert head.status_code == 200
+        assert head.content == b""
+        assert head.headers["content-length"] == str(len("console.log('hi')"))
+        assert client.get("/static/missing.js").status_code == 404
+        assert client.get("/static/../secret").status_code == 404